@@ -94,12 +94,25 @@ _NUMERIC_SETTINGS: dict[str, tuple] = {
     "DEFAULT_ALERT_SCORE":            (78,   1,   100, _int_env),
     "SWEEP_INTERVAL_HOURS":           (24,   1,   168, _int_env),
     "SWEEP_HARD_CAP_SECONDS":         (7200, 60, 86400, _int_env),
+    "SWEEP_CONCURRENCY":              (3,     1,    16, _int_env),
+    "SWEEP_SLICE_SECONDS":            (900,  60, 86400, _int_env),
     "HEALTH_CHECK_INTERVAL":          (300,  30, 86400, _int_env),
     "DB_KEEPALIVE_INTERVAL":          (270,  30, 86400, _int_env),
     "NAME_CHANGE_VELOCITY_THRESHOLD": (3,    1,   100, _int_env),
     "NAME_CHANGE_WINDOW_MINUTES":     (60,   1,  1440, _int_env),
     "BIO_FETCH_MIN_INTERVAL":         (1.2,  0.0, 60.0, _float_env),
     "PFP_FETCH_MIN_INTERVAL":         (0.7,  0.0, 60.0, _float_env),
+    "MEMBER_PAGE_MIN_INTERVAL":       (0.5,  0.0, 60.0, _float_env),
+    "PHOTO_INDEX_MAX_ENTRIES":        (50_000, 1000, 2_000_000, _int_env),
+    "PHOTO_INDEX_REFRESH_SECONDS":    (300,  30, 86400, _int_env),
+    "WRITE_BEHIND_FLUSH_MS":          (500,   0, 60000, _int_env),
+    "WRITE_BEHIND_BATCH_ROWS":        (500,   1, 10000, _int_env),
+    "WRITE_BEHIND_MAX_PENDING":       (50_000, 1000, 1_000_000, _int_env),
+    "DB_ASYNC_POOL":                  (0,     0,     1, _int_env),
+    "CACHE_NOTIFY":                   (1,     0,     1, _int_env),
+    "CACHE_NOTIFY_TTL":               (3600, 60, 86400, _int_env),
+    "WHITELIST_PREFILTER_MIN":        (2000,  0, 1_000_000, _int_env),
+    "WHITELIST_PREFILTER_SIMILARITY": (0.3,  0.05, 0.9, _float_env),
 }
 
 
@@ -232,6 +245,15 @@ DB_KEEPALIVE_INTERVAL          = _SETTINGS["DB_KEEPALIVE_INTERVAL"]
 NAME_CHANGE_VELOCITY_THRESHOLD = _SETTINGS["NAME_CHANGE_VELOCITY_THRESHOLD"]
 NAME_CHANGE_WINDOW_MINUTES     = _SETTINGS["NAME_CHANGE_WINDOW_MINUTES"]
 
+# ── Scheduled sweeps ────────────────────────────────────────────────────────
+# The periodic sweep runs up to SWEEP_CONCURRENCY groups at once, through the
+# shared fetch pacers below, in turns of at most SWEEP_SLICE_SECONDS: a group
+# not finished in its turn goes back in the queue behind the others, resuming
+# where it stopped, until it is done or has used SWEEP_HARD_CAP_SECONDS in the
+# cycle. See src.watcher.scheduler.
+SWEEP_CONCURRENCY   = _SETTINGS["SWEEP_CONCURRENCY"]
+SWEEP_SLICE_SECONDS = _SETTINGS["SWEEP_SLICE_SECONDS"]
+
 # ── MTProto fetch pacing ────────────────────────────────────────────────────
 # Minimum seconds between users.GetFullUser calls (bio fetches) and between
 # profile-photo downloads, across ALL callers. These are proactive floors —
@@ -240,3 +262,53 @@ NAME_CHANGE_WINDOW_MINUTES     = _SETTINGS["NAME_CHANGE_WINDOW_MINUTES"]
 # up automatically, so these only need to be roughly right.
 BIO_FETCH_MIN_INTERVAL = _SETTINGS["BIO_FETCH_MIN_INTERVAL"]
 PFP_FETCH_MIN_INTERVAL = _SETTINGS["PFP_FETCH_MIN_INTERVAL"]
+# The same floor for the pages of a sweep's member list (GetParticipants).
+MEMBER_PAGE_MIN_INTERVAL = _SETTINGS["MEMBER_PAGE_MIN_INTERVAL"]
+
+# ── Cross-group photo index ─────────────────────────────────────────────────
+# Every protected identity's photo hash and every known bad actor's logged
+# photo, across all groups, held in memory for radius lookups (see
+# src.utils.photo_index). The cap bounds its footprint — about 0.75 KB per
+# entry, so ~40 MB at the default — and the refresh interval is how often new
+# rows are pulled in.
+PHOTO_INDEX_MAX_ENTRIES = _SETTINGS["PHOTO_INDEX_MAX_ENTRIES"]
+PHOTO_INDEX_REFRESH_SECONDS = _SETTINGS["PHOTO_INDEX_REFRESH_SECONDS"]
+
+# ── Write-behind batching ───────────────────────────────────────────────────
+# mark_seen, insert_log, log_name_change and record_sweep_run are queued and
+# written in batches of up to WRITE_BEHIND_BATCH_ROWS, at the latest every
+# WRITE_BEHIND_FLUSH_MS (src.utils.write_behind). 0 writes each row
+# immediately, as before. A crash loses at most one interval's rows; a clean
+# shutdown flushes. WRITE_BEHIND_MAX_PENDING bounds each queue while the
+# database is unreachable.
+WRITE_BEHIND_FLUSH_MS = _SETTINGS["WRITE_BEHIND_FLUSH_MS"]
+WRITE_BEHIND_BATCH_ROWS = _SETTINGS["WRITE_BEHIND_BATCH_ROWS"]
+WRITE_BEHIND_MAX_PENDING = _SETTINGS["WRITE_BEHIND_MAX_PENDING"]
+
+# ── Async database pool ─────────────────────────────────────────────────────
+# 1 serves the hot-path reads and writes (group config, whitelist, seen marks,
+# detection logs, the detection context) from a psycopg AsyncConnectionPool on
+# the event loop instead of hopping each call onto the DB_POOL_MAX_SIZE-thread
+# executor. 0 (the default) keeps every helper on the executor. See
+# src.db's "Async connection pool" section.
+DB_ASYNC_POOL = _SETTINGS["DB_ASYNC_POOL"]
+
+# ── Cross-process cache invalidation ────────────────────────────────────────
+# 1 (the default) has every write to a cached table publish a Postgres NOTIFY,
+# and a listener in each process evict its copy, so replicas sharing a database
+# agree on whitelists, keywords, group config and the blocklist. While the
+# listener is connected those caches live for CACHE_NOTIFY_TTL seconds instead
+# of their 1-5 minute defaults; when it drops they fall back to the defaults.
+# See src.db's "Cross-process cache invalidation" section.
+CACHE_NOTIFY = _SETTINGS["CACHE_NOTIFY"]
+CACHE_NOTIFY_TTL = _SETTINGS["CACHE_NOTIFY_TTL"]
+
+# ── Trigram whitelist prefilter ─────────────────────────────────────────────
+# A whitelist with at least WHITELIST_PREFILTER_MIN entries (0 = never) is
+# narrowed in Postgres to the entries whose folded name or handle shares
+# enough trigrams with the suspect's (pg_trgm similarity at least
+# WHITELIST_PREFILTER_SIMILARITY) before rapidfuzz scores them. Needs the
+# pg_trgm extension; without it every entry is scored as before. See src.db's
+# "Trigram prefilter" section.
+WHITELIST_PREFILTER_MIN = _SETTINGS["WHITELIST_PREFILTER_MIN"]
+WHITELIST_PREFILTER_SIMILARITY = _SETTINGS["WHITELIST_PREFILTER_SIMILARITY"]
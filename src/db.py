@@ -1,12 +1,31 @@
 
 import asyncio
+import hashlib
+import inspect
+import itertools
+import json
 import threading
 import time
 import logging
+import math
+import re
+import uuid
+from typing import Callable, NamedTuple
+from psycopg import AsyncConnection, OperationalError, Pipeline
 from psycopg.rows import dict_row
-from psycopg_pool import ConnectionPool
-from src.config import DATABASE_URL, BLOCKLIST_TRUSTED_GROUPS
-from datetime import UTC
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+from src.config import (
+    DATABASE_URL, BLOCKLIST_TRUSTED_GROUPS, PFP_HASH_THRESHOLD, PHOTO_INDEX_MAX_ENTRIES,
+    WRITE_BEHIND_FLUSH_MS, WRITE_BEHIND_BATCH_ROWS, WRITE_BEHIND_MAX_PENDING, DB_ASYNC_POOL,
+    CACHE_NOTIFY, CACHE_NOTIFY_TTL, WHITELIST_PREFILTER_MIN, WHITELIST_PREFILTER_SIMILARITY,
+)
+from src.utils.detector import KeywordMatcher, handle_skeleton, name_skeleton
+from src.utils.id_set import SortedIdSet
+from src.utils.photo_index import PhotoHashIndex, PhotoMatch, PhotoRef
+from src.utils.ttl_cache import TTLCache
+from src.utils.whitelist_index import WhitelistIndex
+from src.utils.write_behind import WriteBehindQueue
+from datetime import UTC, date, datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +44,7 @@ class DatabaseUnavailable(Exception):
     """
 
 
-def _stale_or_raise(cache: dict, key, what: str):
+def _stale_or_raise(cache: TTLCache, key, what: str):
     """
     Fall back to an expired cache entry when a live read fails, or raise.
 
@@ -33,7 +52,7 @@ def _stale_or_raise(cache: dict, key, what: str):
     minutes out of date still protects the people it lists, whereas no
     whitelist at all actively authorises bans.
     """
-    cached = cache.get(key)
+    cached = cache.stale(key)
     if cached is not None:
         age = time.time() - cached[0]
         logger.warning(
@@ -44,6 +63,34 @@ def _stale_or_raise(cache: dict, key, what: str):
     raise DatabaseUnavailable(f"{what} unavailable for {key} and nothing cached")
 
 
+def _stale_or(cache: TTLCache, key, default):
+    """_stale_or_raise for the readers that fail open: the stale copy, else `default`."""
+    cached = cache.stale(key)
+    return default if cached is None else cached[1]
+
+
+class _NoConnection(Exception):
+    """get_connection() gave up; it has already logged why."""
+
+
+def _read_all(sql: str, params: tuple) -> list[dict]:
+    """One read on a borrowed connection, for a TTLCache loader. Raises on failure."""
+    conn = get_connection()
+    if not conn:
+        raise _NoConnection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+    finally:
+        put_connection(conn)
+
+
+def _read_one(sql: str, params: tuple) -> dict | None:
+    rows = _read_all(sql, params)
+    return rows[0] if rows else None
+
+
 def _run_once(cur, name: str, statements) -> bool:
     """
     Apply a one-time DATA migration, at most once per database.
@@ -55,13 +102,19 @@ def _run_once(cur, name: str, statements) -> bool:
     /import_admins would correctly mark a human named @talbot as human and the
     next redeploy flipped them back to a bot — permanently, in a loop.
 
+    `statements` is one SQL string, a list of them, or a callable taking the
+    cursor, for a migration whose statements depend on what it finds.
+
     Returns True if the migration ran this time.
     """
     cur.execute("SELECT 1 FROM schema_migrations WHERE name = %s", (name,))
     if cur.fetchone():
         return False
-    for sql in ([statements] if isinstance(statements, str) else statements):
-        cur.execute(sql)
+    if callable(statements):
+        statements(cur)
+    else:
+        for sql in ([statements] if isinstance(statements, str) else statements):
+            cur.execute(sql)
     cur.execute(
         "INSERT INTO schema_migrations (name) VALUES (%s) ON CONFLICT DO NOTHING",
         (name,),
@@ -198,7 +251,14 @@ async def run_db(fn, *args, **kwargs):
 
     The default executor is bounded to the pool size in main(), so threads can
     never outnumber available connections and queue up inside getconn.
+
+    With DB_ASYNC_POOL on, the hot-path helpers in _ASYNC_TWINS are awaited on
+    the event loop instead (see "Async connection pool" below).
     """
+    if DB_ASYNC_POOL:
+        twin = _ASYNC_TWINS.get(fn)
+        if twin is not None:
+            return await twin(*args, **kwargs)
     return await asyncio.to_thread(fn, *args, **kwargs)
 
 
@@ -265,6 +325,15 @@ def init_db():
                     ADD COLUMN IF NOT EXISTS sweep_offset INTEGER NOT NULL DEFAULT 0;
             """)
 
+            # What the sweep scheduler ranks groups by: the member count the
+            # last sweep saw, and when the last complete pass finished (the
+            # group's coverage age is NOW() minus that).
+            cur.execute("""
+                ALTER TABLE groups
+                    ADD COLUMN IF NOT EXISTS member_count INTEGER,
+                    ADD COLUMN IF NOT EXISTS swept_through_at TIMESTAMPTZ;
+            """)
+
             # Migration: drop the legacy check_mode column. We only support
             # the equivalent of RELAXED now (real-time Pyrogram watcher +
             # 6h auto-sweep cover what STRICT used to add).
@@ -317,6 +386,16 @@ def init_db():
             cur.execute("CREATE INDEX IF NOT EXISTS idx_wl_username ON whitelisted_users(group_id, username);")
             cur.execute("CREATE INDEX IF NOT EXISTS idx_wl_pfp     ON whitelisted_users(group_id, pfp_hash);")
             cur.execute("CREATE INDEX IF NOT EXISTS idx_wl_user_id ON whitelisted_users(user_id);")
+            # Folded name and handle, for the trigram prefilter (see
+            # "Trigram prefilter"). Written by upsert_whitelisted_user; rows
+            # from before the columns, or from an older replica, are filled in
+            # here on each boot.
+            cur.execute("""
+                ALTER TABLE whitelisted_users
+                    ADD COLUMN IF NOT EXISTS name_skeleton TEXT,
+                    ADD COLUMN IF NOT EXISTS username_skeleton TEXT;
+            """)
+            _backfill_whitelist_skeletons(cur)
 
             # Tracks which users have already been checked (drives RELAXED mode)
             cur.execute("""
@@ -329,6 +408,13 @@ def init_db():
                 );
             """)
 
+            # Hash of the profile (and of the group's detection state) a sweep
+            # last screened the member clean under; a delta sweep skips the
+            # member while it matches. NULL: never recorded.
+            cur.execute("""
+                ALTER TABLE seen_members ADD COLUMN IF NOT EXISTS fingerprint BIGINT;
+            """)
+
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS logs (
                     log_id           BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
@@ -543,6 +629,116 @@ def init_db():
                 );
             """)
 
+            # Perceptual hashes of profile photos, keyed by Telegram's
+            # file_unique_id — the same for every account and for as long as
+            # the photo exists — so a photo already hashed once is never
+            # downloaded again (src.watcher.fetch.fetch_pfp_fingerprint). NULL
+            # hashes record a photo that couldn't be hashed (video avatars).
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS photo_hashes (
+                    file_unique_id  TEXT PRIMARY KEY,
+                    pfp_hash        TEXT,
+                    pfp_mirror_hash TEXT,
+                    computed_at     TIMESTAMPTZ DEFAULT NOW()
+                );
+            """)
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS idx_photo_hashes_computed ON photo_hashes(computed_at);"
+            )
+
+            # Daily rollups behind /stats and the daily summary, which used to
+            # COUNT(*) over logs and sweep_runs — nine scans per /stats, and a
+            # groups × whitelist × logs fan-out for the all-groups view, all
+            # growing with history. Kept by triggers on insert, keyed by UTC
+            # day, and never purged: all-time figures survive log retention.
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS detection_daily_rollup (
+                    group_id       BIGINT NOT NULL,
+                    day            DATE   NOT NULL,
+                    detection_type TEXT   NOT NULL,
+                    action_taken   TEXT   NOT NULL,
+                    detections     BIGINT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (group_id, day, detection_type, action_taken)
+                );
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS sweep_daily_rollup (
+                    group_id BIGINT NOT NULL,
+                    day      DATE   NOT NULL,
+                    sweeps   BIGINT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (group_id, day)
+                );
+            """)
+            cur.execute("""
+                CREATE OR REPLACE FUNCTION rollup_detection() RETURNS trigger AS $$
+                BEGIN
+                    IF NEW.group_id IS NOT NULL THEN
+                        INSERT INTO detection_daily_rollup AS r
+                            (group_id, day, detection_type, action_taken, detections)
+                        VALUES (NEW.group_id,
+                                (COALESCE(NEW.created_at, NOW()) AT TIME ZONE 'UTC')::date,
+                                NEW.detection_type, COALESCE(NEW.action_taken, ''), 1)
+                        ON CONFLICT (group_id, day, detection_type, action_taken)
+                        DO UPDATE SET detections = r.detections + 1;
+                    END IF;
+                    RETURN NULL;
+                END $$ LANGUAGE plpgsql;
+            """)
+            cur.execute("""
+                CREATE OR REPLACE FUNCTION rollup_sweep() RETURNS trigger AS $$
+                BEGIN
+                    INSERT INTO sweep_daily_rollup AS r (group_id, day, sweeps)
+                    VALUES (NEW.group_id,
+                            (COALESCE(NEW.created_at, NOW()) AT TIME ZONE 'UTC')::date, 1)
+                    ON CONFLICT (group_id, day) DO UPDATE SET sweeps = r.sweeps + 1;
+                    RETURN NULL;
+                END $$ LANGUAGE plpgsql;
+            """)
+            # Triggers and backfill in one transaction: CREATE TRIGGER locks out
+            # inserts until it commits, so every row is counted exactly once —
+            # by the backfill if it was committed before, by the trigger after.
+            with conn.transaction():
+                _run_once(cur, "create_daily_rollups", [
+                    """
+                    CREATE TRIGGER logs_daily_rollup AFTER INSERT ON logs
+                        FOR EACH ROW EXECUTE FUNCTION rollup_detection();
+                    """,
+                    """
+                    CREATE TRIGGER sweep_runs_daily_rollup AFTER INSERT ON sweep_runs
+                        FOR EACH ROW EXECUTE FUNCTION rollup_sweep();
+                    """,
+                    """
+                    INSERT INTO detection_daily_rollup
+                        (group_id, day, detection_type, action_taken, detections)
+                    SELECT group_id, (created_at AT TIME ZONE 'UTC')::date, detection_type,
+                           COALESCE(action_taken, ''), COUNT(*)
+                      FROM logs
+                     WHERE group_id IS NOT NULL AND created_at IS NOT NULL
+                     GROUP BY 1, 2, 3, 4;
+                    """,
+                    """
+                    INSERT INTO sweep_daily_rollup (group_id, day, sweeps)
+                    SELECT group_id, (created_at AT TIME ZONE 'UTC')::date, COUNT(*)
+                      FROM sweep_runs
+                     WHERE created_at IS NOT NULL
+                     GROUP BY 1, 2;
+                    """,
+                ])
+
+            # pg_trgm and the trigram indexes, where the role may create them.
+            # Before the partitioning below, so the logs indexes move across.
+            _enable_trigram_search(conn, cur)
+
+            # Monthly range partitions for the append-only history tables, so
+            # retention drops a month in one statement instead of deleting it
+            # row by row (see "Monthly partitions"). Last, so the rollup
+            # triggers above move across with their tables. One transaction
+            # per table: the copy holds that table's lock until it commits.
+            for table, key, pk in _PARTITIONED_TABLES:
+                with conn.transaction():
+                    _run_once(cur, f"partition_{table}_by_month",
+                              lambda cur, t=table, k=key, p=pk: _partition_by_month(cur, t, k, p))
+
         conn.commit()
         logger.info("Database initialized.")
     except Exception as e:
@@ -558,20 +754,56 @@ def init_db():
 # Short-lived in-process caches so the sweep doesn't open a new DB connection
 # for every member.  get_group / get_reserved_keywords are called once per
 # checked member; without a cache a 1000-member sweep = 2000+ DB connections.
-_group_cache:    dict[int, tuple[float, dict | None]]        = {}
-_kw_cache:       dict[int, tuple[float, list[dict]]]          = {}
-_fp_cache:       dict[tuple[int, int], tuple[float, bool]]    = {}
+#
+# Each is a TTLCache (src/utils/ttl_cache.py): LRU-bounded, single-flight, with
+# counters (cache_info()) and a stale-if-error window. The window is unlimited
+# for group config and the whitelist, which fail closed on a stale-less error;
+# elsewhere an hour of staleness beats the empty answer the getter would give.
 _GROUP_CACHE_TTL = 300   # 5 minutes — changes only via admin commands
 _KW_CACHE_TTL    = 300
 _FP_CACHE_TTL    = 300   # false-positive entries last 30 days; 5-min cache is fine
-
-
-def _invalidate_group_cache(group_id: int):
+_STALE_IF_ERROR  = 3600
+_group_cache = TTLCache("group", _GROUP_CACHE_TTL, stale_ttl=None, max_entries=10_000)
+_kw_cache = TTLCache("keywords", _KW_CACHE_TTL, stale_ttl=_STALE_IF_ERROR,
+                     max_entries=10_000, max_weight=200_000, weigh=len)
+# Keyed per (group, user), so bounded by how many users are active at once
+# rather than by how many the bot has ever seen.
+_fp_cache = TTLCache("false_positive", _FP_CACHE_TTL, stale_ttl=_STALE_IF_ERROR,
+                     max_entries=200_000)
+# Compiled form of each group's keyword list, keyed on the pattern set it was
+# built from. The 5-minute _kw_cache refresh re-reads the same rows into a new
+# list; comparing contents means that alone never triggers a rebuild — only
+# add_reserved_keyword / remove_reserved_keyword do.
+_kw_matcher_cache: dict[int, tuple[tuple, KeywordMatcher, int]] = {}
+
+# Per-group versions of everything a detection verdict depends on besides the
+# profile itself: the whitelist, the keyword set and the group's config. Each
+# moves only when what the checker would see actually changes — a rebuilt
+# whitelist index or keyword matcher, or different config values — so
+# checker.py can key cached verdicts on them. The first two are issued with the
+# index or matcher and handed back beside it, so a verdict is always keyed on
+# the version of what it was computed from, whatever another thread rebuilt in
+# the meantime. Drawn from one counter, so a version is never reissued after an
+# invalidation drops the old one.
+_version_counter = itertools.count(1)
+_group_versions: dict[int, tuple[tuple, int]] = {}
+# Bookkeeping columns that change without changing any verdict; upsert_group
+# touches updated_at on almost every admin command.
+_GROUP_VERSION_IGNORED = frozenset({"added_at", "updated_at", "sweep_offset",
+                                    "member_count", "swept_through_at"})
+
+
+def _invalidate_group_cache(group_id: int, conn=None):
+    # _group_versions stays: get_detection_versions compares the config's
+    # content, so a sweep's offset or coverage write keeps the cached verdicts.
     _group_cache.pop(group_id, None)
+    _publish_invalidation(conn, "group", group_id)
 
 
-def _invalidate_kw_cache(group_id: int):
+def _invalidate_kw_cache(group_id: int, conn=None):
     _kw_cache.pop(group_id, None)
+    _kw_matcher_cache.pop(group_id, None)
+    _publish_invalidation(conn, "keywords", group_id)
 
 
 def upsert_group(group_id: int, title: str = None,
@@ -600,7 +832,7 @@ def upsert_group(group_id: int, title: str = None,
                 """, (group_id, title, log_channel_id))
             updated = cur.rowcount
         conn.commit()
-        _invalidate_group_cache(group_id)
+        _invalidate_group_cache(group_id, conn)
         # rowcount 0 means no such group — the UPDATE matched nothing. Reporting
         # that as success let admins believe a config change had applied while
         # detection carried on with the old settings.
@@ -621,24 +853,14 @@ def get_group(group_id: int) -> dict | None:
     all. None means "no such group" and nothing else — callers make ban/alert
     decisions from this, so "I don't know" must not look like "nothing is set".
     """
-    cached = _group_cache.get(group_id)
-    if cached and time.time() - cached[0] < _GROUP_CACHE_TTL:
-        return cached[1]
-
-    conn = get_connection()
-    if not conn:
-        return _stale_or_raise(_group_cache, group_id, "group config")
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT * FROM groups WHERE group_id = %s", (group_id,))
-            row = cur.fetchone()
-        _group_cache[group_id] = (time.time(), row)
-        return row
+        return _group_cache.load(group_id, lambda: _read_one(
+            "SELECT * FROM groups WHERE group_id = %s", (group_id,)))
+    except _NoConnection:
+        return _stale_or_raise(_group_cache, group_id, "group config")
     except Exception as e:
         logger.error(f"get_group error: {e}")
         return _stale_or_raise(_group_cache, group_id, "group config")
-    finally:
-        put_connection(conn)
 
 
 def get_all_group_ids() -> list[int]:
@@ -668,7 +890,7 @@ def set_group_log_channel(group_id: int, log_channel_id: int | None) -> bool:
             )
             updated = cur.rowcount
         conn.commit()
-        _invalidate_group_cache(group_id)
+        _invalidate_group_cache(group_id, conn)
         # rowcount 0 means no such group — the UPDATE matched nothing. Reporting
         # that as success let admins believe a config change had applied while
         # detection carried on with the old settings.
@@ -710,7 +932,7 @@ def set_group_sweep_offset(group_id: int, offset: int) -> bool:
             )
             updated = cur.rowcount
         conn.commit()
-        _invalidate_group_cache(group_id)
+        _invalidate_group_cache(group_id, conn)
         return updated > 0
     except Exception as e:
         logger.error(f"set_group_sweep_offset error: {e}")
@@ -732,7 +954,7 @@ def set_group_action_mode(group_id: int, mode: str) -> bool:
             )
             updated = cur.rowcount
         conn.commit()
-        _invalidate_group_cache(group_id)
+        _invalidate_group_cache(group_id, conn)
         # rowcount 0 means no such group — the UPDATE matched nothing. Reporting
         # that as success let admins believe a config change had applied while
         # detection carried on with the old settings.
@@ -747,12 +969,23 @@ def set_group_action_mode(group_id: int, mode: str) -> bool:
 
 # ── Whitelist helpers ──────────────────────────────────────────────────────────
 
-_whitelist_cache: dict[int, tuple[float, list[dict]]] = {}  # group_id -> (timestamp, rows)
 _WHITELIST_CACHE_TTL = 60  # seconds
+# group_id -> (timestamp, rows), bounded by groups and by rows held in total.
+_whitelist_cache = TTLCache("whitelist", _WHITELIST_CACHE_TTL, stale_ttl=None,
+                            max_entries=10_000, max_weight=500_000, weigh=len)
+
+# group_id -> (the rows list it was built from, their match-relevant content,
+# index, its version). Checked by the IDENTITY of the cached rows first; a TTL refresh in
+# get_whitelist stores a new list, and the index survives it only if the
+# content it was built from is unchanged.
+_whitelist_index_cache: dict[int, tuple[list[dict], tuple, WhitelistIndex, int]] = {}
 
 
-def _invalidate_whitelist_cache(group_id: int):
+def _invalidate_whitelist_cache(group_id: int, conn=None):
     _whitelist_cache.pop(group_id, None)
+    _whitelist_index_cache.pop(group_id, None)
+    _photo_index_dirty_groups.add(group_id)
+    _publish_invalidation(conn, "whitelist", group_id)
 
 
 def get_whitelist(group_id: int) -> list[dict]:
@@ -765,24 +998,39 @@ def get_whitelist(group_id: int) -> list[dict]:
     copy is always preferred to raising — protection going briefly out of date
     is far better than protection disappearing.
     """
-    cached = _whitelist_cache.get(group_id)
-    if cached and time.time() - cached[0] < _WHITELIST_CACHE_TTL:
-        return cached[1]
-
-    conn = get_connection()
-    if not conn:
-        return _stale_or_raise(_whitelist_cache, group_id, "whitelist")
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT * FROM whitelisted_users WHERE group_id = %s", (group_id,))
-            rows = cur.fetchall()
-        _whitelist_cache[group_id] = (time.time(), rows)
-        return rows
+        return _whitelist_cache.load(group_id, lambda: _read_all(
+            "SELECT * FROM whitelisted_users WHERE group_id = %s", (group_id,)))
+    except _NoConnection:
+        return _stale_or_raise(_whitelist_cache, group_id, "whitelist")
     except Exception as e:
         logger.error(f"get_whitelist error: {e}")
         return _stale_or_raise(_whitelist_cache, group_id, "whitelist")
-    finally:
-        put_connection(conn)
+
+
+def get_whitelist_index(group_id: int, rows: list[dict]) -> tuple[WhitelistIndex, int]:
+    """
+    The precompiled match index for `rows`, the group's current whitelist, and
+    its whitelist version.
+
+    Takes the rows rather than reading them so the caller's fail-closed
+    get_whitelist() call stays the single source of truth: the index is reused
+    while get_whitelist keeps returning the same rows, and rebuilt under a new
+    version the moment it returns different content.
+    """
+    cached = _whitelist_index_cache.get(group_id)
+    if cached and cached[0] is rows:
+        return cached[2], cached[3]
+    content = tuple(
+        (r["user_id"], r["username"], r["first_name"], r["last_name"], r["pfp_hash"])
+        for r in rows
+    )
+    if cached and cached[1] == content:
+        _whitelist_index_cache[group_id] = (rows, content, cached[2], cached[3])
+        return cached[2], cached[3]
+    index, version = WhitelistIndex.build(rows), next(_version_counter)
+    _whitelist_index_cache[group_id] = (rows, content, index, version)
+    return index, version
 
 
 def is_whitelisted(group_id: int, user_id: int) -> bool:
@@ -815,6 +1063,146 @@ def _is_whitelisted_db(group_id: int, user_id: int) -> bool:
         put_connection(conn)
 
 
+# ── Trigram prefilter ─────────────────────────────────────────────────────────
+#
+# Stages 1-3 of the checker score a suspect against every entry of the group's
+# whitelist. At a few hundred entries that costs nothing; a group protecting
+# thousands of identities paid thousands of rapidfuzz comparisons per join,
+# message and profile change. Each entry also stores the skeletons those
+# stages compare — the folded, leet-folded name and the normalized handle —
+# GIN-indexed with pg_trgm, and a whitelist of at least WHITELIST_PREFILTER_MIN
+# entries is first narrowed in Postgres to the entries whose skeletons share
+# enough trigrams with the suspect's. rapidfuzz then scores that shortlist
+# with the same thresholds as ever.
+#
+# It is a shortlist, not a verdict. WHITELIST_PREFILTER_SIMILARITY sits far
+# below anything rapidfuzz would call a match, and entries the index can't
+# judge — a skeleton not written yet, or one with too little Latin text to
+# have meaningful trigrams, stored as '' — are always kept. Anything else
+# (no extension, no connection, a query error, a suspect name the index can't
+# judge) returns None, and the caller scores the whole list.
+
+_prefilter = {"available": False, "queries": 0, "fallbacks": 0, "entries": 0, "shortlisted": 0}
+
+# A skeleton needs this many ASCII letters and digits, and at least half its
+# characters to be ones, for its trigrams to stand for it: pg_trgm ignores
+# other characters outright under a C-locale database.
+_TRIGRAM_MIN_ALNUM = 3
+_ASCII_ALNUM = re.compile(r"[0-9a-z]")
+
+
+def _trigram_text(skeleton: str) -> str:
+    """`skeleton`, or '' when trigrams can't judge it (see _TRIGRAM_MIN_ALNUM)."""
+    alnum = len(_ASCII_ALNUM.findall(skeleton))
+    compact = len(skeleton.replace(" ", ""))
+    return skeleton if alnum >= _TRIGRAM_MIN_ALNUM and 2 * alnum >= compact else ""
+
+
+def _whitelist_skeletons(username, first_name, last_name) -> tuple[str, str]:
+    """(name_skeleton, username_skeleton) column values for a whitelist row."""
+    name = f"{first_name or ''} {last_name or ''}".strip()
+    return _trigram_text(name_skeleton(name)), handle_skeleton(username)
+
+
+def _backfill_whitelist_skeletons(cur) -> None:
+    cur.execute("SELECT group_id, user_id, username, first_name, last_name "
+                "FROM whitelisted_users WHERE name_skeleton IS NULL")
+    rows = cur.fetchall()
+    if rows:
+        cur.executemany(
+            "UPDATE whitelisted_users SET name_skeleton = %s, username_skeleton = %s "
+            "WHERE group_id = %s AND user_id = %s",
+            [(*_whitelist_skeletons(r["username"], r["first_name"], r["last_name"]),
+              r["group_id"], r["user_id"]) for r in rows],
+        )
+        logger.info(f"Filled in name skeletons for {len(rows)} whitelist entries.")
+
+
+def _enable_trigram_search(conn, cur) -> None:
+    """
+    Create pg_trgm and the trigram indexes. A role that may not create the
+    extension (or a server without it) leaves the prefilter and fuzzy log
+    search off rather than failing startup.
+    """
+    try:
+        with conn.transaction():
+            cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    except Exception as e:
+        logger.warning(f"pg_trgm unavailable; whitelist prefilter and fuzzy /logs search off: {e}")
+        _prefilter["available"] = False
+        return
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_wl_name_trgm "
+                "ON whitelisted_users USING gin (name_skeleton gin_trgm_ops);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_wl_username_trgm "
+                "ON whitelisted_users USING gin (username_skeleton gin_trgm_ops);")
+    # Entries the prefilter always keeps, so that arm of its OR is indexed too.
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_wl_name_untrigrammed ON whitelisted_users(group_id) "
+                "WHERE name_skeleton IS NULL OR name_skeleton = '';")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_full_name_trgm "
+                "ON logs USING gin (full_name gin_trgm_ops);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_username_trgm "
+                "ON logs USING gin (username gin_trgm_ops);")
+    _prefilter["available"] = True
+
+
+def _set_trigram_thresholds(cur) -> None:
+    """Set this transaction's `%`, `%>` and `<%` cutoffs to WHITELIST_PREFILTER_SIMILARITY."""
+    cur.execute(
+        "SELECT set_config('pg_trgm.similarity_threshold', %(t)s, true), "
+        "set_config('pg_trgm.word_similarity_threshold', %(t)s, true)",
+        {"t": str(WHITELIST_PREFILTER_SIMILARITY)},
+    )
+
+
+def whitelist_candidates(group_id: int, rows: list[dict], full_name: str,
+                         username: str | None) -> frozenset[int] | None:
+    """
+    The user_ids among `rows` — the group's whitelist — worth scoring against
+    this suspect, or None to score every row. Blocking.
+    """
+    if (not _prefilter["available"] or not WHITELIST_PREFILTER_MIN
+            or len(rows) < WHITELIST_PREFILTER_MIN):
+        return None
+    name = _trigram_text(name_skeleton(full_name))
+    if not name:
+        return None
+    conn = get_connection()
+    if not conn:
+        return None
+    try:
+        with conn.transaction(), conn.cursor() as cur:
+            _set_trigram_thresholds(cur)
+            # `%` catches a similar name either way round; `%>` also catches
+            # the suspect's name inside a longer stored one ("John" against
+            # "John Smith"), and `<%` a stored name inside the suspect's ("Bob"
+            # against "Bob Support Team"), both of which token_set scoring
+            # rates highly.
+            cur.execute("""
+                SELECT user_id FROM whitelisted_users
+                 WHERE group_id = %(gid)s
+                   AND (name_skeleton %% %(name)s OR name_skeleton %%> %(name)s
+                        OR name_skeleton <%% %(name)s
+                        OR username_skeleton %% %(handle)s
+                        OR name_skeleton IS NULL OR name_skeleton = '')
+            """, {"gid": group_id, "name": name, "handle": handle_skeleton(username)})
+            shortlist = frozenset(r["user_id"] for r in cur.fetchall())
+        _prefilter["queries"] += 1
+        _prefilter["entries"] += len(rows)
+        _prefilter["shortlisted"] += len(shortlist)
+        return shortlist
+    except Exception as e:
+        logger.error(f"whitelist_candidates error: {e}")
+        _prefilter["fallbacks"] += 1
+        return None
+    finally:
+        put_connection(conn)
+
+
+def prefilter_info() -> dict:
+    """Whether the trigram prefilter is on, and how much it has narrowed."""
+    return dict(_prefilter)
+
+
 def get_watched_groups_for_user(user_id: int) -> list[int]:
     """
     Return group_ids where this user is a *watched* member — i.e. they've been
@@ -826,6 +1214,8 @@ def get_watched_groups_for_user(user_id: int) -> list[int]:
     anyway), and including them would fire the name-change velocity alert for
     admins instead of scammers.
     """
+    if any(uid == user_id for _, uid in _write_queue.pending("seen")):
+        flush_writes()
     conn = get_connection()
     if not conn:
         return []
@@ -864,8 +1254,9 @@ def upsert_whitelisted_user(group_id: int, user_id: int, username: str,
         with conn.cursor() as cur:
             cur.execute("""
                 INSERT INTO whitelisted_users
-                    (group_id, user_id, username, first_name, last_name, pfp_hash, whitelisted_by, user_type, is_bot)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    (group_id, user_id, username, first_name, last_name, pfp_hash, whitelisted_by, user_type, is_bot,
+                     name_skeleton, username_skeleton)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 ON CONFLICT (group_id, user_id) DO UPDATE SET
                     username   = EXCLUDED.username,
                     first_name = EXCLUDED.first_name,
@@ -873,10 +1264,13 @@ def upsert_whitelisted_user(group_id: int, user_id: int, username: str,
                     pfp_hash   = COALESCE(EXCLUDED.pfp_hash, whitelisted_users.pfp_hash),
                     user_type  = EXCLUDED.user_type,
                     is_bot     = EXCLUDED.is_bot,
+                    name_skeleton     = EXCLUDED.name_skeleton,
+                    username_skeleton = EXCLUDED.username_skeleton,
                     updated_at = NOW();
-            """, (group_id, user_id, username, first_name, last_name, pfp_hash, whitelisted_by, user_type, is_bot))
+            """, (group_id, user_id, username, first_name, last_name, pfp_hash, whitelisted_by, user_type, is_bot,
+                  *_whitelist_skeletons(username, first_name, last_name)))
         conn.commit()
-        _invalidate_whitelist_cache(group_id)
+        _invalidate_whitelist_cache(group_id, conn)
         return True
     except Exception as e:
         logger.error(f"upsert_whitelisted_user error: {e}")
@@ -918,7 +1312,7 @@ def remove_stale_admin_whitelist(group_id: int, keep_user_ids: set[int]) -> int:
                 )
             count = cur.rowcount
         conn.commit()
-        _invalidate_whitelist_cache(group_id)
+        _invalidate_whitelist_cache(group_id, conn)
         return count
     except Exception as e:
         logger.error(f"remove_stale_admin_whitelist error: {e}")
@@ -940,7 +1334,7 @@ def remove_whitelisted_user(group_id: int, user_id: int) -> bool:
             )
             deleted = cur.rowcount > 0
         conn.commit()
-        _invalidate_whitelist_cache(group_id)
+        _invalidate_whitelist_cache(group_id, conn)
         return deleted
     except Exception as e:
         logger.error(f"remove_whitelisted_user error: {e}")
@@ -950,9 +1344,124 @@ def remove_whitelisted_user(group_id: int, user_id: int) -> bool:
         put_connection(conn)
 
 
+# ── Write-behind batching ──────────────────────────────────────────────────────
+#
+# mark_seen, insert_log, log_name_change and record_sweep_run don't write
+# directly: they queue a row (src/utils/write_behind.py) that goes out in one
+# executemany with its batch — when the queue reaches WRITE_BEHIND_BATCH_ROWS,
+# every WRITE_BEHIND_FLUSH_MS from main._write_behind_loop, and at shutdown.
+# Readers that must see their own writes consult the queue: is_seen and
+# load_detection_context answer from it, unmark_seen drops queued marks before
+# deleting, and get_watched_groups_for_user, get_latest_log_entry and
+# count_recent_name_changes flush the rows they would read first.
+# WRITE_BEHIND_FLUSH_MS=0 writes every row immediately instead.
+
+_write_queue = WriteBehindQueue(batch_rows=WRITE_BEHIND_BATCH_ROWS,
+                                max_pending=WRITE_BEHIND_MAX_PENDING)
+
+_WRITE_BEHIND_SQL = {
+    "seen": """
+        INSERT INTO seen_members (group_id, user_id)
+        VALUES (%s, %s)
+        ON CONFLICT (group_id, user_id) DO UPDATE SET last_checked_at = NOW();
+    """,
+    "log": """
+        INSERT INTO logs
+            (group_id, user_id, username, full_name, target_user_id, target_name,
+             detection_type, similarity_score, action_taken, details, trigger,
+             invite_link, bio, user_pfp_hash)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """,
+    # An upsert, so it lands whichever of it and the member's seen mark is
+    # flushed first.
+    "fingerprint": """
+        INSERT INTO seen_members (group_id, user_id, fingerprint)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (group_id, user_id) DO UPDATE SET fingerprint = EXCLUDED.fingerprint;
+    """,
+    "photo_hash": """
+        INSERT INTO photo_hashes (file_unique_id, pfp_hash, pfp_mirror_hash)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (file_unique_id) DO NOTHING;
+    """,
+    "name_change": "INSERT INTO name_change_log (user_id, changed_at) VALUES (%s, %s)",
+    "sweep_run": """
+        INSERT INTO sweep_runs
+            (group_id, iterated, checked, flagged, errors, trigger,
+             partial, bios_skipped, pfps_skipped)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """,
+}
+
+
+def _write_rows(kind: str, rows: list[tuple]) -> bool:
+    """
+    Write one batch. False means "keep it and retry": no connection, or the
+    connection failed mid-batch. A batch the database rejects for its content
+    is retried row by row and only the refused rows are dropped — one bad row
+    must not hold up everything queued behind it.
+    """
+    sql = _WRITE_BEHIND_SQL[kind]
+    conn = get_connection()
+    if not conn:
+        return False
+    try:
+        if len(rows) == 1:
+            with conn.cursor() as cur:
+                cur.execute(sql, rows[0])
+            conn.commit()
+            return True
+        # One transaction, so a failed batch left nothing behind to duplicate
+        # when it is retried.
+        with conn.transaction(), conn.cursor() as cur:
+            cur.executemany(sql, rows)
+        return True
+    except OperationalError as e:
+        logger.error(f"write-behind {kind} error, {len(rows)} row(s) kept for retry: {e}")
+        conn.rollback()
+        return False
+    except Exception as e:
+        logger.error(f"write-behind {kind} error: {e}")
+        conn.rollback()
+        if len(rows) > 1:
+            for row in rows:
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(sql, row)
+                    conn.commit()
+                except Exception as row_error:
+                    logger.error(f"write-behind {kind} row dropped: {row_error}")
+                    conn.rollback()
+        return True
+    finally:
+        put_connection(conn)
+
+
+def _queue_write(kind: str, row: tuple) -> None:
+    if not WRITE_BEHIND_FLUSH_MS:
+        _write_rows(kind, [row])
+        return
+    if _write_queue.add(kind, row):
+        # A full batch goes out now, on the caller's (worker) thread — unless
+        # another thread is already flushing, in which case it picks this up.
+        _write_queue.flush(_write_rows, block=False)
+
+
+def flush_writes() -> int:
+    """Write every queued row now. Returns the rows written."""
+    return _write_queue.flush(_write_rows)
+
+
+def write_behind_info() -> dict:
+    """Queue depth per kind, flush counts and flush latency."""
+    return _write_queue.info()
+
+
 # ── Seen-member helpers (RELAXED mode) ────────────────────────────────────────
 
 def is_seen(group_id: int, user_id: int) -> bool:
+    if _write_queue.contains("seen", (group_id, user_id)):
+        return True
     conn = get_connection()
     if not conn:
         return False
@@ -971,26 +1480,25 @@ def is_seen(group_id: int, user_id: int) -> bool:
 
 
 def mark_seen(group_id: int, user_id: int):
-    conn = get_connection()
-    if not conn:
-        return
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO seen_members (group_id, user_id)
-                VALUES (%s, %s)
-                ON CONFLICT (group_id, user_id) DO UPDATE SET last_checked_at = NOW();
-            """, (group_id, user_id))
-        conn.commit()
-    except Exception as e:
-        logger.error(f"mark_seen error: {e}")
-        conn.rollback()
-    finally:
-        put_connection(conn)
+    _queue_write("seen", (group_id, user_id))
+
+
+def set_member_fingerprint(group_id: int, user_id: int, fingerprint: int):
+    """
+    Record the profile fingerprint a sweep just screened a member clean under
+    (see src.watcher.members.member_fingerprint), alongside their seen mark. A
+    delta sweep skips them while it still matches and the mark is recent;
+    unmark_seen drops both.
+    """
+    _queue_write("fingerprint", (group_id, user_id, fingerprint))
 
 
 def unmark_seen(group_id: int, user_id: int):
     """Force a re-check of this user on their next message (used after profile change events)."""
+    _write_queue.discard("seen", (group_id, user_id))
+    for row in _write_queue.pending("fingerprint"):
+        if row[:2] == (group_id, user_id):
+            _write_queue.discard("fingerprint", row)
     conn = get_connection()
     if not conn:
         return
@@ -1014,30 +1522,15 @@ def insert_log(group_id: int, user_id: int, username: str, full_name: str,
                similarity_score: float, action_taken: str, details: str,
                trigger: str = "join", invite_link: str = None,
                bio: str = None, user_pfp_hash: str = None):
-    conn = get_connection()
-    if not conn:
-        return
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO logs
-                    (group_id, user_id, username, full_name, target_user_id, target_name,
-                     detection_type, similarity_score, action_taken, details, trigger,
-                     invite_link, bio, user_pfp_hash)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (group_id, user_id, username, full_name, target_user_id, target_name,
-                  detection_type, similarity_score, action_taken, details, trigger,
-                  invite_link, bio, user_pfp_hash))
-        conn.commit()
-    except Exception as e:
-        logger.error(f"insert_log error: {e}")
-        conn.rollback()
-    finally:
-        put_connection(conn)
+    _queue_write("log", (group_id, user_id, username, full_name, target_user_id, target_name,
+                         detection_type, similarity_score, action_taken, details, trigger,
+                         invite_link, bio, user_pfp_hash))
 
 
 def get_latest_log_entry(group_id: int, user_id: int) -> dict | None:
     """Return the most recent log row for a user in a group (used by callback handlers)."""
+    if any(r[0] == group_id and r[1] == user_id for r in _write_queue.pending("log")):
+        flush_writes()
     conn = get_connection()
     if not conn:
         return None
@@ -1055,35 +1548,68 @@ def get_latest_log_entry(group_id: int, user_id: int) -> dict | None:
         put_connection(conn)
 
 
+# The windowed counts below read the daily rollups init_db keeps (see
+# detection_daily_rollup), so their cost no longer grows with history. A window
+# starting at `since` takes whole UTC days after since's day from the rollup,
+# and the rest of since's own day from the raw table — at most one day of one
+# group's rows, through idx_logs_group / idx_sweep_group — so it is still exact
+# to the second. The all-time figure is the rollup alone.
+_ROLLUPS = {"logs": ("detection_daily_rollup", "detections"),
+            "sweep_runs": ("sweep_daily_rollup", "sweeps")}
+
+
+def _rollup_count(table: str, since: str | None = None, action: str | None = None,
+                  group: str = "%(gid)s") -> str:
+    """
+    SQL for how many `table` rows of `group` (optionally with `action_taken =
+    action`) were created after the SQL expression `since`, or ever if None.
+    Every argument is a fixed string from this module, never user input.
+    """
+    rollup, total = _ROLLUPS[table]
+    where = f"group_id = {group}" + (f" AND action_taken = '{action}'" if action else "")
+    if since is None:
+        return f"(SELECT COALESCE(SUM({total}), 0) FROM {rollup} WHERE {where})::bigint"  # noqa: S608
+    day = f"(({since}) AT TIME ZONE 'UTC')"
+    return (
+        f"((SELECT COALESCE(SUM({total}), 0) FROM {rollup}"  # noqa: S608
+        f" WHERE {where} AND day > {day}::date)"
+        f" + (SELECT COUNT(*) FROM {table}"
+        f" WHERE {where} AND created_at > ({since})"
+        f" AND created_at < (date_trunc('day', {day}) + INTERVAL '1 day') AT TIME ZONE 'UTC'"
+        f"))::bigint"
+    )
+
+
+_30D, _7D = "NOW() - INTERVAL '30 days'", "NOW() - INTERVAL '7 days'"
+
+
 def get_stats_windowed(group_id: int) -> dict:
     """
     Stats split into three windows: all-time / last 30d / last 7d.
 
     Returns a dict with `whitelisted` (current count) plus, for each of
     {detections, banned, sweeps}, the keys `<metric>_all`, `<metric>_30d`,
-    and `<metric>_7d`. A single round-trip to the DB.
+    and `<metric>_7d`. A single round-trip to the DB, answered from the daily
+    rollups; all-time counts include rows since purged by retention.
     """
     conn = get_connection()
     if not conn:
         return {}
     try:
         with conn.cursor() as cur:
-            cur.execute("""
+            cur.execute(f"""
                 SELECT
                   (SELECT COUNT(*) FROM whitelisted_users WHERE group_id = %(gid)s) AS whitelisted,
-
-                  (SELECT COUNT(*) FROM logs WHERE group_id = %(gid)s)                                                                   AS detections_all,
-                  (SELECT COUNT(*) FROM logs WHERE group_id = %(gid)s AND created_at > NOW() - INTERVAL '30 days')                       AS detections_30d,
-                  (SELECT COUNT(*) FROM logs WHERE group_id = %(gid)s AND created_at > NOW() - INTERVAL '7 days')                        AS detections_7d,
-
-                  (SELECT COUNT(*) FROM logs WHERE group_id = %(gid)s AND action_taken = 'banned')                                       AS banned_all,
-                  (SELECT COUNT(*) FROM logs WHERE group_id = %(gid)s AND action_taken = 'banned' AND created_at > NOW() - INTERVAL '30 days') AS banned_30d,
-                  (SELECT COUNT(*) FROM logs WHERE group_id = %(gid)s AND action_taken = 'banned' AND created_at > NOW() - INTERVAL '7 days')  AS banned_7d,
-
-                  (SELECT COUNT(*) FROM sweep_runs WHERE group_id = %(gid)s)                                                             AS sweeps_all,
-                  (SELECT COUNT(*) FROM sweep_runs WHERE group_id = %(gid)s AND created_at > NOW() - INTERVAL '30 days')                 AS sweeps_30d,
-                  (SELECT COUNT(*) FROM sweep_runs WHERE group_id = %(gid)s AND created_at > NOW() - INTERVAL '7 days')                  AS sweeps_7d
-            """, {"gid": group_id})
+                  {_rollup_count("logs")}                         AS detections_all,
+                  {_rollup_count("logs", _30D)}                   AS detections_30d,
+                  {_rollup_count("logs", _7D)}                    AS detections_7d,
+                  {_rollup_count("logs", action="banned")}        AS banned_all,
+                  {_rollup_count("logs", _30D, "banned")}         AS banned_30d,
+                  {_rollup_count("logs", _7D, "banned")}          AS banned_7d,
+                  {_rollup_count("sweep_runs")}                   AS sweeps_all,
+                  {_rollup_count("sweep_runs", _30D)}             AS sweeps_30d,
+                  {_rollup_count("sweep_runs", _7D)}              AS sweeps_7d
+            """, {"gid": group_id})  # noqa: S608
             return cur.fetchone() or {}
     except Exception as e:
         logger.error(f"get_stats_windowed error: {e}")
@@ -1096,30 +1622,33 @@ def get_all_group_stats_windowed() -> list[dict]:
     """
     Per-group rollup with All / 30d / 7d windows for detections + bans,
     in a single round-trip. Used by /stats in private chat.
+
+    Each figure is a per-group subquery on the rollup rather than a join:
+    joining groups to both whitelisted_users and logs multiplied every
+    group's whitelist by its log history before COUNT(DISTINCT) undid it.
     """
     conn = get_connection()
     if not conn:
         return []
+    g = "g.group_id"
     try:
         with conn.cursor() as cur:
-            cur.execute("""
+            cur.execute(f"""
                 SELECT
                     g.group_id,
                     g.title,
                     g.action_mode,
-                    COUNT(DISTINCT w.user_id)                                                                          AS whitelisted,
-                    COUNT(DISTINCT l.log_id)                                                                           AS detections_all,
-                    COUNT(DISTINCT CASE WHEN l.created_at > NOW() - INTERVAL '30 days' THEN l.log_id END)              AS detections_30d,
-                    COUNT(DISTINCT CASE WHEN l.created_at > NOW() - INTERVAL '7 days'  THEN l.log_id END)              AS detections_7d,
-                    COUNT(DISTINCT CASE WHEN l.action_taken = 'banned' THEN l.log_id END)                              AS banned_all,
-                    COUNT(DISTINCT CASE WHEN l.action_taken = 'banned' AND l.created_at > NOW() - INTERVAL '30 days' THEN l.log_id END) AS banned_30d,
-                    COUNT(DISTINCT CASE WHEN l.action_taken = 'banned' AND l.created_at > NOW() - INTERVAL '7 days'  THEN l.log_id END) AS banned_7d
+                    (SELECT COUNT(*) FROM whitelisted_users w WHERE w.group_id = g.group_id)
+                                                                      AS whitelisted,
+                    {_rollup_count("logs", group=g)}                  AS detections_all,
+                    {_rollup_count("logs", _30D, group=g)}            AS detections_30d,
+                    {_rollup_count("logs", _7D, group=g)}             AS detections_7d,
+                    {_rollup_count("logs", action="banned", group=g)} AS banned_all,
+                    {_rollup_count("logs", _30D, "banned", group=g)}  AS banned_30d,
+                    {_rollup_count("logs", _7D, "banned", group=g)}   AS banned_7d
                 FROM groups g
-                LEFT JOIN whitelisted_users w ON w.group_id = g.group_id
-                LEFT JOIN logs l              ON l.group_id = g.group_id
-                GROUP BY g.group_id, g.title, g.action_mode
                 ORDER BY g.group_id
-            """)
+            """)  # noqa: S608
             return cur.fetchall()
     except Exception as e:
         logger.error(f"get_all_group_stats_windowed error: {e}")
@@ -1138,19 +1667,20 @@ def get_recent_activity(group_id: int, hours: int = 24) -> dict:
     rather than `make_interval()` — make_interval refuses parameter binding
     in older psycopg builds, which silently broke the window.
     """
+    since = "NOW() - (%(h)s * INTERVAL '1 hour')"
     conn = get_connection()
     if not conn:
         return {}
     try:
         with conn.cursor() as cur:
-            cur.execute("""
+            cur.execute(f"""
                 SELECT
-                  (SELECT COUNT(*) FROM logs       WHERE group_id = %(gid)s AND created_at > NOW() - (%(h)s * INTERVAL '1 hour'))                                AS detections,
-                  (SELECT COUNT(*) FROM logs       WHERE group_id = %(gid)s AND action_taken = 'banned'  AND created_at > NOW() - (%(h)s * INTERVAL '1 hour'))   AS banned,
-                  (SELECT COUNT(*) FROM logs       WHERE group_id = %(gid)s AND action_taken = 'kicked'  AND created_at > NOW() - (%(h)s * INTERVAL '1 hour'))   AS kicked,
-                  (SELECT COUNT(*) FROM logs       WHERE group_id = %(gid)s AND action_taken = 'alerted' AND created_at > NOW() - (%(h)s * INTERVAL '1 hour'))   AS alerted,
-                  (SELECT COUNT(*) FROM sweep_runs WHERE group_id = %(gid)s AND created_at > NOW() - (%(h)s * INTERVAL '1 hour'))                                AS sweeps
-            """, {"gid": group_id, "h": hours})
+                  {_rollup_count("logs", since)}              AS detections,
+                  {_rollup_count("logs", since, "banned")}    AS banned,
+                  {_rollup_count("logs", since, "kicked")}    AS kicked,
+                  {_rollup_count("logs", since, "alerted")}   AS alerted,
+                  {_rollup_count("sweep_runs", since)}        AS sweeps
+            """, {"gid": group_id, "h": hours})  # noqa: S608
             return cur.fetchone() or {}
     except Exception as e:
         logger.error(f"get_recent_activity error: {e}")
@@ -1167,8 +1697,9 @@ def record_sweep_run(
     bios_skipped: int = 0, pfps_skipped: int = 0,
 ) -> None:
     """
-    Persist the result of one sweep_group() call so we can show
-    'sweeps in the last 24h / 30d' and a per-run summary.
+    Persist the result of one sweep — a sweep_group() call, or all of a
+    scheduled group's turns in a cycle — so we can show 'sweeps in the last
+    24h / 30d' and a per-run summary.
 
     partial / bios_skipped / pfps_skipped are the caveats. They used to be
     dropped here, so a run that covered 12% of a group before hitting the time
@@ -1177,24 +1708,205 @@ def record_sweep_run(
     and was thrown away at exactly the point where it becomes the record an
     operator later trusts.
     """
+    _queue_write("sweep_run", (group_id, iterated, checked, flagged, errors, trigger,
+                               bool(partial), int(bios_skipped), int(pfps_skipped)))
+
+
+def record_sweep_coverage(group_id: int, member_count: int | None, complete: bool) -> bool:
+    """
+    Note the group's member count as a sweep just saw it (None keeps the last
+    one) and, when `complete`, that a pass has just covered every member.
+    """
     conn = get_connection()
     if not conn:
-        return
+        return False
     try:
         with conn.cursor() as cur:
             cur.execute("""
-                INSERT INTO sweep_runs
-                    (group_id, iterated, checked, flagged, errors, trigger,
-                     partial, bios_skipped, pfps_skipped)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (group_id, iterated, checked, flagged, errors, trigger,
-                  bool(partial), int(bios_skipped), int(pfps_skipped)))
+                UPDATE groups SET
+                    member_count     = COALESCE(%s, member_count),
+                    swept_through_at = CASE WHEN %s THEN NOW() ELSE swept_through_at END
+                WHERE group_id = %s
+            """, (member_count, bool(complete), group_id))
+            updated = cur.rowcount
+        conn.commit()
+        _invalidate_group_cache(group_id, conn)
+        return updated > 0
+    except Exception as e:
+        logger.error(f"record_sweep_coverage error: {e}")
+        conn.rollback()
+        return False
+    finally:
+        put_connection(conn)
+
+
+def get_sweep_schedule(group_ids: list[int]) -> list[dict]:
+    """
+    What the sweep scheduler ranks `group_ids` by, one row each: `group_id`,
+    `member_count` (None until first swept), `coverage_age` (seconds since the
+    last complete pass, None if there never was one) and `detections_7d`.
+    Empty on error; the scheduler then ranks every group alike.
+    """
+    if not group_ids:
+        return []
+    conn = get_connection()
+    if not conn:
+        return []
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT g.group_id, g.member_count,
+                       EXTRACT(EPOCH FROM NOW() - g.swept_through_at)::float AS coverage_age,
+                       {_rollup_count("logs", _7D, group="g.group_id")} AS detections_7d
+                  FROM groups g
+                 WHERE g.group_id = ANY(%(ids)s)
+            """, {"ids": list(group_ids)})  # noqa: S608
+            return cur.fetchall()
+    except Exception as e:
+        logger.error(f"get_sweep_schedule error: {e}")
+        return []
+    finally:
+        put_connection(conn)
+
+
+# ── Monthly partitions ────────────────────────────────────────────────────────
+#
+# logs, sweep_runs, name_change_log and admin_actions only grow and are only
+# trimmed by age, so each is range-partitioned by month on its timestamp:
+# <table>_pYYYY_MM, plus <table>_default for anything outside them. Retention
+# drops every partition wholly past its window — metadata only, no dead rows
+# for vacuum — and then deletes the older rows of the one partition the cutoff
+# falls inside, which partition pruning keeps to that month. maintain_partitions
+# keeps the coming months created ahead, so new rows never land in the default.
+# The primary keys gain the partition column, which Postgres requires; nothing
+# references them.
+
+# (table, partition column, id column)
+_PARTITIONED_TABLES = (
+    ("logs", "created_at", "log_id"),
+    ("sweep_runs", "created_at", "id"),
+    ("name_change_log", "changed_at", "id"),
+    ("admin_actions", "created_at", "id"),
+)
+_PARTITION_MONTHS_AHEAD = 2
+_PARTITION_NAME = re.compile(r"_p(\d{4})_(\d{2})$")
+
+
+def _month_start(d: date, months: int = 0) -> date:
+    index = d.year * 12 + d.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_month_partitions(cur, table: str, first: date, last: date) -> int:
+    """Create the monthly partitions of `table` from `first`'s month to `last`'s."""
+    created = 0
+    month, last = _month_start(first), _month_start(last)
+    while month <= last:
+        upper = _month_start(month, 1)
+        cur.execute(f"SELECT to_regclass('{table}_p{month:%Y_%m}') IS NULL AS missing")  # noqa: S608
+        if cur.fetchone()["missing"]:
+            cur.execute(
+                f"CREATE TABLE {table}_p{month:%Y_%m} PARTITION OF {table} "  # noqa: S608
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+                f"TO ('{upper.isoformat()} 00:00:00+00')"
+            )
+            created += 1
+        month = upper
+    return created
+
+
+def _partition_by_month(cur, table: str, key: str, pk: str) -> None:
+    """
+    Rebuild `table` as a monthly-partitioned table holding the same rows, with
+    its indexes, triggers and id sequence. Runs inside the caller's
+    transaction; the lock keeps other writers out until it commits.
+    """
+    old = f"{table}_unpartitioned"
+    seq = f"{table}_{pk}_seq"
+    cur.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+    cur.execute(f"SELECT MAX({pk}) AS last_id, MIN({key}) AS first FROM {table}")  # noqa: S608
+    bounds = cur.fetchone()
+    cur.execute("SELECT indexdef FROM pg_indexes WHERE tablename = %s "
+                "AND indexname <> %s", (table, f"{table}_pkey"))
+    indexes = [r["indexdef"] for r in cur.fetchall()]
+    cur.execute("SELECT pg_get_triggerdef(oid) AS triggerdef FROM pg_trigger "
+                "WHERE tgrelid = %s::regclass AND NOT tgisinternal", (table,))
+    triggers = [r["triggerdef"] for r in cur.fetchall()]
+
+    cur.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    # logs.log_id is an identity column, the others serials; either way the
+    # old sequence goes and a free-standing one takes over where it stopped.
+    cur.execute(f"ALTER TABLE {old} ALTER COLUMN {pk} DROP IDENTITY IF EXISTS")
+    cur.execute(f"ALTER TABLE {old} ALTER COLUMN {pk} DROP DEFAULT")
+    cur.execute(f"DROP SEQUENCE IF EXISTS {seq}")
+    cur.execute(f"CREATE SEQUENCE {seq}")
+    cur.execute("SELECT setval(%s, %s, %s)",
+                (seq, bounds["last_id"] or 1, bounds["last_id"] is not None))
+    cur.execute(f"UPDATE {old} SET {key} = NOW() WHERE {key} IS NULL")  # noqa: S608
+
+    cur.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) "
+                f"PARTITION BY RANGE ({key})")
+    cur.execute(f"ALTER TABLE {table} ALTER COLUMN {pk} SET DEFAULT nextval('{seq}')")
+    cur.execute(f"ALTER TABLE {table} ALTER COLUMN {key} SET NOT NULL")
+    cur.execute(f"ALTER TABLE {table} ADD PRIMARY KEY ({pk}, {key})")
+    cur.execute(f"ALTER SEQUENCE {seq} OWNED BY {table}.{pk}")
+    cur.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+    today = datetime.now(UTC).date()
+    _create_month_partitions(cur, table, min(bounds["first"].date(), today) if bounds["first"]
+                             else today, _month_start(today, _PARTITION_MONTHS_AHEAD))
+    cur.execute(f"INSERT INTO {table} SELECT * FROM {old}")  # noqa: S608
+    cur.execute(f"DROP TABLE {old}")
+    # The definitions were read before the rename, so they already name the
+    # new table. Created after the copy: the rollup triggers must not count
+    # the copied rows twice, and the index names are free once the old table
+    # is gone.
+    for ddl in indexes + triggers:
+        cur.execute(ddl)
+
+
+def _is_partitioned(cur, table: str) -> bool:
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cur.fetchone()
+    return bool(row) and row["relkind"] == "p"
+
+
+def maintain_partitions() -> int:
+    """
+    Create each partitioned table's partitions through
+    _PARTITION_MONTHS_AHEAD months from now. Returns how many were created.
+    """
+    created = 0
+    conn = get_connection()
+    if not conn:
+        return 0
+    try:
+        today = datetime.now(UTC).date()
+        with conn.cursor() as cur:
+            for table, _, _ in _PARTITIONED_TABLES:
+                if _is_partitioned(cur, table):
+                    created += _create_month_partitions(
+                        cur, table, today, _month_start(today, _PARTITION_MONTHS_AHEAD))
         conn.commit()
     except Exception as e:
-        logger.error(f"record_sweep_run error: {e}")
+        logger.error(f"maintain_partitions error: {e}")
         conn.rollback()
     finally:
         put_connection(conn)
+    return created
+
+
+def _drop_expired_partitions(cur, table: str, days: int) -> int:
+    """Drop the monthly partitions of `table` whose every row is older than `days`."""
+    cutoff = datetime.now(UTC).date() - timedelta(days=days)
+    cur.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(%s)", (table,))
+    dropped = 0
+    for row in cur.fetchall():
+        match = _PARTITION_NAME.search(row["relname"])
+        if match and _month_start(date(int(match[1]), int(match[2]), 1), 1) <= cutoff:
+            cur.execute(f"DROP TABLE {row['relname']}")
+            dropped += 1
+    return dropped
 
 
 def purge_old_records(
@@ -1216,20 +1928,31 @@ def purge_old_records(
                          safe direction. This table had NO purge at all and
                          grows by one row per (group, user) forever
       admin_actions    — append-only audit trail, kept a year
+      photo_hashes     — hashes computed longer ago than seen_days; a photo
+                         still in use is downloaded and hashed once more
 
     Every predicate here is indexed (see init_db); without those indexes each
     pass was a sequential scan, because a composite index on
     (group_id, created_at) cannot serve a query filtering on created_at alone.
+
+    The four partitioned tables first lose every month wholly past their
+    window (counted in "partitions_dropped", not per row); their DELETEs then
+    only touch the month the cutoff falls in and the default partition.
     """
     deleted = {
         "name_change_log": 0, "false_positives": 0, "logs": 0,
         "sweep_runs": 0, "seen_members": 0, "admin_actions": 0,
+        "photo_hashes": 0, "partitions_dropped": 0,
     }
+    windows = {"logs": logs_days, "sweep_runs": sweeps_days,
+               "name_change_log": 1, "admin_actions": actions_days}
     conn = get_connection()
     if not conn:
         return deleted
     try:
         with conn.cursor() as cur:
+            for table, days in windows.items():
+                deleted["partitions_dropped"] += _drop_expired_partitions(cur, table, days)
             cur.execute(
                 "DELETE FROM name_change_log WHERE changed_at < NOW() - INTERVAL '1 day'"
             )
@@ -1258,6 +1981,12 @@ def purge_old_records(
                 {"d": actions_days},
             )
             deleted["admin_actions"] = cur.rowcount or 0
+            cur.execute(
+                "DELETE FROM photo_hashes "
+                "WHERE computed_at < NOW() - (%(d)s * INTERVAL '1 day')",
+                {"d": seen_days},
+            )
+            deleted["photo_hashes"] = cur.rowcount or 0
         conn.commit()
         logger.info("Retention purge complete.", extra=deleted)
     except Exception as e:
@@ -1282,7 +2011,7 @@ def add_reserved_keyword(group_id: int, pattern: str, is_regex: bool, created_by
                 ON CONFLICT (group_id, pattern) DO UPDATE SET is_regex = EXCLUDED.is_regex
             """, (group_id, pattern, is_regex, created_by))
         conn.commit()
-        _invalidate_kw_cache(group_id)
+        _invalidate_kw_cache(group_id, conn)
         return True
     except Exception as e:
         logger.error(f"add_reserved_keyword error: {e}")
@@ -1304,7 +2033,7 @@ def remove_reserved_keyword(group_id: int, pattern: str) -> bool:
             )
             deleted = cur.rowcount > 0
         conn.commit()
-        _invalidate_kw_cache(group_id)
+        _invalidate_kw_cache(group_id, conn)
         return deleted
     except Exception as e:
         logger.error(f"remove_reserved_keyword error: {e}")
@@ -1315,34 +2044,83 @@ def remove_reserved_keyword(group_id: int, pattern: str) -> bool:
 
 
 def get_reserved_keywords(group_id: int) -> list[dict]:
-    cached = _kw_cache.get(group_id)
-    if cached and time.time() - cached[0] < _KW_CACHE_TTL:
-        return cached[1]
-
-    conn = get_connection()
-    if not conn:
-        return []
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT pattern, is_regex FROM reserved_keywords WHERE group_id = %s ORDER BY created_at",
-                (group_id,)
-            )
-            rows = cur.fetchall()
-        _kw_cache[group_id] = (time.time(), rows)
-        return rows
+        return _kw_cache.load(group_id, lambda: _read_all(
+            "SELECT pattern, is_regex FROM reserved_keywords WHERE group_id = %s ORDER BY created_at",
+            (group_id,)))
     except Exception as e:
-        logger.error(f"get_reserved_keywords error: {e}")
-        return []
-    finally:
-        put_connection(conn)
+        if not isinstance(e, _NoConnection):
+            logger.error(f"get_reserved_keywords error: {e}")
+        return _stale_or(_kw_cache, group_id, [])
 
 
-# ── Per-group threshold ────────────────────────────────────────────────────────
+def get_keyword_matcher(group_id: int, rows: list[dict]) -> tuple[KeywordMatcher, int]:
+    """
+    The compiled matcher for `rows`, the group's current keyword list, and its
+    keyword version.
 
-def set_group_threshold(group_id: int, threshold: int) -> bool:
-    conn = get_connection()
-    if not conn:
+    Takes the rows for the same reason get_whitelist_index does: the caller's
+    get_reserved_keywords() result stays the source of truth. Rebuilt, under a
+    new version, only when the pattern set differs from the one the cached
+    matcher was built from.
+    """
+    key = tuple((r["pattern"], bool(r["is_regex"])) for r in rows)
+    cached = _kw_matcher_cache.get(group_id)
+    if cached and cached[0] == key:
+        return cached[1], cached[2]
+    matcher, version = KeywordMatcher.build(rows), next(_version_counter)
+    _kw_matcher_cache[group_id] = (key, matcher, version)
+    return matcher, version
+
+
+def get_detection_versions(group_id: int, group_cfg: dict | None, whitelist_version: int,
+                           keyword_version: int) -> tuple[int, int, int]:
+    """
+    (whitelist, keyword set, group config) versions for a group, for keying
+    cached detection verdicts.
+
+    The first two are the versions get_whitelist_index / get_keyword_matcher
+    returned with the index and matcher the verdict is computed from. The
+    config version is derived here from `group_cfg`, the row the caller got
+    from get_group().
+    """
+    content = tuple(sorted(
+        (k, v) for k, v in (group_cfg or {}).items() if k not in _GROUP_VERSION_IGNORED
+    ))
+    cached = _group_versions.get(group_id)
+    if cached and cached[0] == content:
+        group_version = cached[1]
+    else:
+        group_version = next(_version_counter)
+        _group_versions[group_id] = (content, group_version)
+    return whitelist_version, keyword_version, group_version
+
+
+def get_detection_digest(group_cfg: dict | None, whitelist: list[dict],
+                         keywords: list[dict], *extra) -> int:
+    """
+    A signed 64-bit hash of the same three things get_detection_versions
+    versions (the config without its bookkeeping columns, the whitelist, the
+    keyword set) plus `extra`. Unlike the versions it depends only on content,
+    so it is the same in every process and after a restart, and can be stored.
+    """
+    content = repr((
+        sorted((k, str(v)) for k, v in (group_cfg or {}).items()
+               if k not in _GROUP_VERSION_IGNORED),
+        sorted((r["user_id"], r.get("username"), r.get("first_name"), r.get("last_name"),
+                r.get("pfp_hash")) for r in whitelist),
+        sorted((k["pattern"], bool(k.get("is_regex"))) for k in keywords),
+        extra,
+    ))
+    return int.from_bytes(hashlib.blake2b(content.encode(), digest_size=8).digest(),
+                          "big", signed=True)
+
+
+# ── Per-group threshold ────────────────────────────────────────────────────────
+
+def set_group_threshold(group_id: int, threshold: int) -> bool:
+    conn = get_connection()
+    if not conn:
         return False
     try:
         with conn.cursor() as cur:
@@ -1352,7 +2130,7 @@ def set_group_threshold(group_id: int, threshold: int) -> bool:
             )
             updated = cur.rowcount
         conn.commit()
-        _invalidate_group_cache(group_id)
+        _invalidate_group_cache(group_id, conn)
         # rowcount 0 means no such group — the UPDATE matched nothing. Reporting
         # that as success let admins believe a config change had applied while
         # detection carried on with the old settings.
@@ -1368,24 +2146,13 @@ def set_group_threshold(group_id: int, threshold: int) -> bool:
 # ── Name-change velocity ───────────────────────────────────────────────────────
 
 def log_name_change(user_id: int):
-    conn = get_connection()
-    if not conn:
-        return
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO name_change_log (user_id) VALUES (%s)",
-                (user_id,)
-            )
-        conn.commit()
-    except Exception as e:
-        logger.error(f"log_name_change error: {e}")
-        conn.rollback()
-    finally:
-        put_connection(conn)
+    # Stamped now, not at flush, so the velocity window counts the real time.
+    _queue_write("name_change", (user_id, datetime.now(UTC)))
 
 
 def count_recent_name_changes(user_id: int, window_minutes: int = 60) -> int:
+    if any(r[0] == user_id for r in _write_queue.pending("name_change")):
+        flush_writes()
     conn = get_connection()
     if not conn:
         return 0
@@ -1412,6 +2179,20 @@ def count_recent_name_changes(user_id: int, window_minutes: int = 60) -> int:
 
 # ── Recent detections log ──────────────────────────────────────────────────────
 
+_LOG_VIEW_SELECT = """
+    SELECT
+        l.user_id, l.username, l.full_name,
+        l.target_user_id, l.target_name,
+        wl.username AS target_username,
+        l.detection_type, l.similarity_score,
+        l.action_taken, l.details, l.trigger, l.created_at
+    FROM logs l
+    LEFT JOIN whitelisted_users wl
+           ON wl.group_id = l.group_id
+          AND wl.user_id  = l.target_user_id
+"""
+
+
 def get_recent_logs(group_id: int, limit: int = 10) -> list[dict]:
     """
     Recent detections for a group.
@@ -1426,21 +2207,11 @@ def get_recent_logs(group_id: int, limit: int = 10) -> list[dict]:
         return []
     try:
         with conn.cursor() as cur:
-            cur.execute("""
-                SELECT
-                    l.user_id, l.username, l.full_name,
-                    l.target_user_id, l.target_name,
-                    wl.username AS target_username,
-                    l.detection_type, l.similarity_score,
-                    l.action_taken, l.details, l.trigger, l.created_at
-                FROM logs l
-                LEFT JOIN whitelisted_users wl
-                       ON wl.group_id = l.group_id
-                      AND wl.user_id  = l.target_user_id
-                WHERE l.group_id = %s
-                ORDER BY l.created_at DESC
-                LIMIT %s
-            """, (group_id, limit))
+            cur.execute(
+                _LOG_VIEW_SELECT  # noqa: S608
+                + "WHERE l.group_id = %s ORDER BY l.created_at DESC LIMIT %s",
+                (group_id, limit),
+            )
             return cur.fetchall()
     except Exception as e:
         logger.error(f"get_recent_logs error: {e}")
@@ -1449,6 +2220,56 @@ def get_recent_logs(group_id: int, limit: int = 10) -> list[dict]:
         put_connection(conn)
 
 
+def search_logs(group_id: int, query: str, limit: int = 15) -> list[dict]:
+    """
+    Detections in a group whose suspect's name or @handle resembles `query`,
+    closest first, in get_recent_logs' shape.
+
+    Served by the trigram indexes on logs.full_name and logs.username when
+    pg_trgm is available, so it finds "J0hn Smlth" from "john smith" without
+    reading the group's history; otherwise a case-insensitive substring match.
+    """
+    query = query.strip().lstrip("@")
+    if not query:
+        return []
+    conn = get_connection()
+    if not conn:
+        return []
+    try:
+        with conn.cursor() as cur:
+            if _prefilter["available"]:
+                cur.execute(
+                    _LOG_VIEW_SELECT  # noqa: S608
+                    + """
+                    WHERE l.group_id = %(gid)s
+                      AND (l.full_name %% %(q)s OR l.full_name %%> %(q)s OR l.username %% %(q)s)
+                    ORDER BY GREATEST(word_similarity(%(q)s, l.full_name),
+                                      similarity(l.username, %(q)s)) DESC,
+                             l.created_at DESC
+                    LIMIT %(limit)s
+                    """,
+                    {"gid": group_id, "q": query, "limit": limit},
+                )
+            else:
+                like = "%" + re.sub(r"([\\%_])", r"\\\1", query) + "%"
+                cur.execute(
+                    _LOG_VIEW_SELECT  # noqa: S608
+                    + """
+                    WHERE l.group_id = %(gid)s
+                      AND (l.full_name ILIKE %(like)s OR l.username ILIKE %(like)s)
+                    ORDER BY l.created_at DESC
+                    LIMIT %(limit)s
+                    """,
+                    {"gid": group_id, "like": like, "limit": limit},
+                )
+            return cur.fetchall()
+    except Exception as e:
+        logger.error(f"search_logs error: {e}")
+        return []
+    finally:
+        put_connection(conn)
+
+
 # ── Admin action audit log ─────────────────────────────────────────────────────
 
 def log_admin_action(
@@ -1513,7 +2334,7 @@ def clear_whitelist(group_id: int) -> int:
             )
             count = cur.rowcount
         conn.commit()
-        _invalidate_whitelist_cache(group_id)
+        _invalidate_whitelist_cache(group_id, conn)
         return count
     except Exception as e:
         logger.error(f"clear_whitelist error: {e}")
@@ -1556,7 +2377,7 @@ def mark_false_positive(
         conn.commit()
         # Drop the negative cache entry so a just-cleared user isn't re-flagged
         # from a stale `is_false_positive` result (cached for _FP_CACHE_TTL).
-        _fp_cache.pop((group_id, user_id), None)
+        _invalidate_fp_cache(group_id, user_id, conn)
         return written > 0
     except Exception as e:
         logger.error(f"mark_false_positive error: {e}")
@@ -1566,31 +2387,23 @@ def mark_false_positive(
         put_connection(conn)
 
 
+def _invalidate_fp_cache(group_id: int, user_id: int, conn=None):
+    _fp_cache.pop((group_id, user_id), None)
+    _publish_invalidation(conn, "false_positive", [group_id, user_id])
+
+
 def is_false_positive(group_id: int, user_id: int) -> bool:
     """Return True if the user has an active (non-expired) false-positive record."""
     cache_key = (group_id, user_id)
-    now = time.time()
-    cached = _fp_cache.get(cache_key)
-    if cached and now - cached[0] < _FP_CACHE_TTL:
-        return cached[1]
-
-    conn = get_connection()
-    if not conn:
-        return False
     try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT 1 FROM false_positives
-                WHERE group_id = %s AND user_id = %s AND expires_at > NOW()
-            """, (group_id, user_id))
-            result = cur.fetchone() is not None
-        _fp_cache[cache_key] = (now, result)
-        return result
+        return _fp_cache.load(cache_key, lambda: _read_one("""
+            SELECT 1 FROM false_positives
+            WHERE group_id = %s AND user_id = %s AND expires_at > NOW()
+        """, (group_id, user_id)) is not None)
     except Exception as e:
-        logger.error(f"is_false_positive error: {e}")
-        return False
-    finally:
-        put_connection(conn)
+        if not isinstance(e, _NoConnection):
+            logger.error(f"is_false_positive error: {e}")
+        return _stale_or(_fp_cache, cache_key, False)
 
 
 # ── Per-type thresholds & severity score bands ─────────────────────────────────
@@ -1631,7 +2444,7 @@ def set_group_thresholds(
             )
             updated = cur.rowcount
         conn.commit()
-        _invalidate_group_cache(group_id)
+        _invalidate_group_cache(group_id, conn)
         # rowcount 0 means no such group — the UPDATE matched nothing. Reporting
         # that as success let admins believe a config change had applied while
         # detection carried on with the old settings.
@@ -1658,7 +2471,7 @@ def set_group_score_bands(group_id: int, ban_score: int, alert_score: int) -> bo
             )
             updated = cur.rowcount
         conn.commit()
-        _invalidate_group_cache(group_id)
+        _invalidate_group_cache(group_id, conn)
         # rowcount 0 means no such group — the UPDATE matched nothing. Reporting
         # that as success let admins believe a config change had applied while
         # detection carried on with the old settings.
@@ -1684,7 +2497,7 @@ def set_group_blocklist(group_id: int, enabled: bool) -> bool:
             )
             updated = cur.rowcount
         conn.commit()
-        _invalidate_group_cache(group_id)
+        _invalidate_group_cache(group_id, conn)
         # rowcount 0 means no such group — the UPDATE matched nothing. Reporting
         # that as success let admins believe a config change had applied while
         # detection carried on with the old settings.
@@ -1699,12 +2512,27 @@ def set_group_blocklist(group_id: int, enabled: bool) -> bool:
 
 # ── Cross-group blocklist (known bad actors) ───────────────────────────────────
 
-_bad_actor_cache: dict[int, tuple[float, dict | None]] = {}
 _BAD_ACTOR_CACHE_TTL = 300
+# Per user, like _fp_cache; None entries (not listed) are most of it.
+_bad_actor_cache = TTLCache("bad_actor", _BAD_ACTOR_CACHE_TTL, stale_ttl=_STALE_IF_ERROR,
+                            max_entries=200_000)
+# Every known_bad_actors.user_id, so "not listed" — nearly every answer — needs
+# no read at all (src/utils/id_set.py). Loaded whole by the first photo-index
+# refresh at startup and kept current by later ones, by the writers below and
+# by other processes' invalidations. Until that first load completes, every
+# lookup goes to the database as before.
+_bad_actor_ids = SortedIdSet()
+
 
+def _maybe_bad_actor(user_id: int) -> bool:
+    """False only when the user is certainly not on the blocklist."""
+    return not _bad_actor_ids.complete or user_id in _bad_actor_ids
 
-def _invalidate_bad_actor_cache(user_id: int):
+
+def _invalidate_bad_actor_cache(user_id: int, conn=None):
     _bad_actor_cache.pop(user_id, None)
+    _photo_index_dirty_users.add(user_id)
+    _publish_invalidation(conn, "bad_actor", user_id)
 
 
 def add_known_bad_actor(
@@ -1733,6 +2561,9 @@ def add_known_bad_actor(
         )
         return False
 
+    # Before the write, so no check between its commit and here can take the
+    # user for unlisted. A failed write leaves a harmless extra id.
+    _bad_actor_ids.add(user_id)
     conn = get_connection()
     if not conn:
         return False
@@ -1752,7 +2583,7 @@ def add_known_bad_actor(
                     last_seen_at    = NOW();
             """, (user_id, username, full_name, reason, confirmed_by, source_group_id))
         conn.commit()
-        _invalidate_bad_actor_cache(user_id)
+        _invalidate_bad_actor_cache(user_id, conn)
         return True
     except Exception as e:
         logger.error(f"add_known_bad_actor error: {e}")
@@ -1764,24 +2595,17 @@ def add_known_bad_actor(
 
 def get_known_bad_actor(user_id: int) -> dict | None:
     """Return the blocklist row for a user, or None. Cached for 5 min — this
-    is consulted in the detection hot path (join / message / sweep)."""
-    cached = _bad_actor_cache.get(user_id)
-    if cached and time.time() - cached[0] < _BAD_ACTOR_CACHE_TTL:
-        return cached[1]
-    conn = get_connection()
-    if not conn:
+    is consulted in the detection hot path (join / message / sweep). A user
+    not in _bad_actor_ids is answered without a read."""
+    if not _maybe_bad_actor(user_id):
         return None
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT * FROM known_bad_actors WHERE user_id = %s", (user_id,))
-            row = cur.fetchone()
-        _bad_actor_cache[user_id] = (time.time(), row)
-        return row
+        return _bad_actor_cache.load(user_id, lambda: _read_one(
+            "SELECT * FROM known_bad_actors WHERE user_id = %s", (user_id,)))
     except Exception as e:
-        logger.error(f"get_known_bad_actor error: {e}")
-        return None
-    finally:
-        put_connection(conn)
+        if not isinstance(e, _NoConnection):
+            logger.error(f"get_known_bad_actor error: {e}")
+        return _stale_or(_bad_actor_cache, user_id, None)
 
 
 def blocklist_entry_is_authoritative(entry: dict | None, group_id: int) -> bool:
@@ -1838,7 +2662,8 @@ def _delete_known_bad_actor(user_id: int) -> bool:
             cur.execute("DELETE FROM known_bad_actors WHERE user_id = %s", (user_id,))
             removed = cur.rowcount > 0
         conn.commit()
-        _invalidate_bad_actor_cache(user_id)
+        _bad_actor_ids.discard(user_id)
+        _invalidate_bad_actor_cache(user_id, conn)
         return removed
     except Exception as e:
         logger.error(f"remove_known_bad_actor error: {e}")
@@ -1846,3 +2671,924 @@ def _delete_known_bad_actor(user_id: int) -> bool:
         return False
     finally:
         put_connection(conn)
+
+
+def cache_info() -> dict:
+    """Counters and size of each read cache (see TTLCache.info), by namespace."""
+    info = {cache.name: cache.info()
+            for cache in (_group_cache, _whitelist_cache, _kw_cache, _fp_cache, _bad_actor_cache,
+                          _photo_hash_cache)}
+    info["bad_actor_ids"] = _bad_actor_ids.info()
+    return info
+
+
+
+# ── Cross-process cache invalidation ──────────────────────────────────────────
+#
+# The caches above are per process, and a writer's _invalidate_* call only
+# reaches the process that made the write: a second replica on the same
+# database kept serving the old whitelist for up to its TTL, which is why that
+# TTL had to stay at a minute. With CACHE_NOTIFY on, every invalidation also
+# publishes pg_notify(namespace, key) on the writer's connection, and
+# listen_for_invalidations() — a background task in main — applies the ones
+# other processes publish through the same _invalidate_* functions.
+#
+# While the listener is connected, the caches that only change through those
+# writers live for CACHE_NOTIFY_TTL. The false-positive cache keeps its short
+# TTL: a grace window ends by expiring, which no writer announces. A listener
+# that has been disconnected may have missed notifications, so connecting
+# empties the caches, and disconnecting drops the TTLs back to their defaults.
+
+_INVALIDATION_CHANNEL = "cache_invalidation"
+# Identifies this process's own notifications, which it has already applied.
+_PROCESS_TOKEN = uuid.uuid4().hex
+# How long the listener waits for notifications before checking the connection
+# is still alive; a dead socket otherwise waits silently forever.
+_INVALIDATION_PING_SECONDS = 60.0
+
+
+def _bad_actor_changed_elsewhere(user_id: int) -> None:
+    # Added or removed, the notification doesn't say; an extra id only costs
+    # the read that settles it.
+    _bad_actor_ids.add(user_id)
+    _invalidate_bad_actor_cache(user_id)
+
+
+_INVALIDATION_HANDLERS: dict[str, Callable] = {
+    "group": _invalidate_group_cache,
+    "whitelist": _invalidate_whitelist_cache,
+    "keywords": _invalidate_kw_cache,
+    "false_positive": lambda key: _invalidate_fp_cache(*key),
+    "bad_actor": _bad_actor_changed_elsewhere,
+}
+_NOTIFY_TTL_CACHES = (_group_cache, _whitelist_cache, _kw_cache, _bad_actor_cache)
+_DEFAULT_TTLS = {cache: cache.ttl for cache in _NOTIFY_TTL_CACHES}
+_invalidations = {"published": 0, "applied": 0, "listening": False}
+
+
+def _publish_invalidation(conn, namespace: str, key) -> None:
+    """
+    Tell the other processes to drop `key` from `namespace`. Best effort, on
+    the writer's connection after its commit: the write stands either way, and
+    a process that misses this still expires the entry at its TTL.
+    """
+    if conn is None or not CACHE_NOTIFY:
+        return
+    payload = json.dumps({"origin": _PROCESS_TOKEN, "namespace": namespace, "key": key})
+    try:
+        conn.execute("SELECT pg_notify(%s, %s)", (_INVALIDATION_CHANNEL, payload))
+        conn.commit()
+        _invalidations["published"] += 1
+    except Exception as e:
+        logger.warning(f"Could not publish {namespace} invalidation for {key}: {e}")
+
+
+def _apply_invalidation(payload: str) -> None:
+    """Evict what another process's notification names; ignore our own."""
+    try:
+        message = json.loads(payload)
+        if message["origin"] == _PROCESS_TOKEN:
+            return
+        _INVALIDATION_HANDLERS[message["namespace"]](message["key"])
+        _invalidations["applied"] += 1
+    except Exception as e:
+        logger.warning(f"Ignoring malformed cache invalidation {payload!r}: {e}")
+
+
+def _set_listening(listening: bool) -> None:
+    _invalidations["listening"] = listening
+    for cache in _NOTIFY_TTL_CACHES:
+        cache.ttl = CACHE_NOTIFY_TTL if listening else _DEFAULT_TTLS[cache]
+
+
+async def listen_for_invalidations() -> None:
+    """
+    Apply other processes' cache invalidations until the connection fails.
+
+    Returns only by raising; the caller reconnects. Caches are emptied once
+    LISTEN is in place, so nothing cached before it can outlive a write this
+    process never heard about.
+    """
+    conn = await AsyncConnection.connect(DATABASE_URL, autocommit=True, connect_timeout=30)
+    try:
+        await conn.execute(f"LISTEN {_INVALIDATION_CHANNEL}")
+        for cache in (_group_cache, _whitelist_cache, _kw_cache, _fp_cache, _bad_actor_cache):
+            cache.clear()
+        _bad_actor_ids_resync.set()
+        _set_listening(True)
+        logger.info("Listening for cache invalidations.")
+        while True:
+            async for notify in conn.notifies(timeout=_INVALIDATION_PING_SECONDS):
+                _apply_invalidation(notify.payload)
+            await conn.execute("SELECT 1")
+    finally:
+        _set_listening(False)
+        await conn.close()
+
+
+def invalidation_info() -> dict:
+    """Invalidations published and applied by this process, and whether it is listening."""
+    return dict(_invalidations)
+
+# ── Detection context ──────────────────────────────────────────────────────────
+#
+# A first message from an unseen sender used to cost seven pool checkouts and
+# seven round trips before any scoring: group, whitelist, seen, false positive,
+# blocklist, keywords — each getter on its own connection. load_detection_context
+# sends whichever of those reads are cold in cache as one pipelined batch on one
+# connection, stores the rows exactly where the getters would have, and then
+# assembles the answer through the getters themselves, which are all cache hits
+# by then. A warm sender costs no round trip at all, and every read keeps its
+# own failure semantics: a failed batch simply leaves each getter to try on its
+# own, as before.
+
+
+class DetectionContext(NamedTuple):
+    """Everything the checker reads about a (group, user) before scoring."""
+    group: dict | None
+    whitelist: list[dict]
+    keywords: list[dict]
+    whitelisted: bool
+    false_positive: bool
+    bad_actor: dict | None
+    seen: bool | None = None    # None unless asked for
+
+
+def _one(rows: list[dict]) -> dict | None:
+    return rows[0] if rows else None
+
+
+def _run_batch(conn, statements: list[tuple[str, tuple]]) -> list[list[dict]]:
+    """
+    Run read-only statements on one connection and return each one's rows.
+
+    Pipelined where libpq supports it (14+), so the whole batch is one round
+    trip; sequential on the same connection otherwise.
+    """
+    if Pipeline.is_supported():
+        with conn.pipeline():
+            cursors = [conn.execute(sql, params) for sql, params in statements]
+            return [cur.fetchall() for cur in cursors]
+    return [conn.execute(sql, params).fetchall() for sql, params in statements]
+
+
+# (SQL, params, cache, key, shape): a statement one of the getters runs, and
+# where that getter keeps its answer. seen_members has no cache (cache None):
+# it only grows, and mark_seen follows every scan.
+_DetectionRead = tuple[str, tuple, TTLCache | None, object, Callable[[list[dict]], object]]
+
+
+def _detection_reads_wanted(group_id: int, user_id: int, include_seen: bool,
+                            now: float, margin: float = 0.0) -> list[_DetectionRead]:
+    """
+    The reads whose cache entries are cold — or, with `margin`, due to expire
+    within that many seconds.
+    """
+    def cold(cache: TTLCache, key) -> bool:
+        return not cache.is_fresh(key, margin)
+
+    wanted: list[_DetectionRead] = []
+    if cold(_group_cache, group_id):
+        wanted.append(("SELECT * FROM groups WHERE group_id = %s", (group_id,),
+                       _group_cache, group_id, _one))
+    if cold(_whitelist_cache, group_id):
+        wanted.append(("SELECT * FROM whitelisted_users WHERE group_id = %s", (group_id,),
+                       _whitelist_cache, group_id, list))
+    if cold(_kw_cache, group_id):
+        wanted.append(("SELECT pattern, is_regex FROM reserved_keywords "
+                       "WHERE group_id = %s ORDER BY created_at", (group_id,),
+                       _kw_cache, group_id, list))
+    if cold(_fp_cache, (group_id, user_id)):
+        wanted.append(("SELECT 1 FROM false_positives "
+                       "WHERE group_id = %s AND user_id = %s AND expires_at > NOW()",
+                       (group_id, user_id), _fp_cache, (group_id, user_id), bool))
+    if cold(_bad_actor_cache, user_id) and _maybe_bad_actor(user_id):
+        wanted.append(("SELECT * FROM known_bad_actors WHERE user_id = %s", (user_id,),
+                       _bad_actor_cache, user_id, _one))
+    if include_seen:
+        wanted.append(("SELECT 1 FROM seen_members WHERE group_id = %s AND user_id = %s",
+                       (group_id, user_id), None, None, bool))
+    return wanted
+
+
+def _claim_detection_reads(wanted: list[_DetectionRead]) -> list[_DetectionRead]:
+    """
+    The reads in `wanted` this caller may load. A key another thread is
+    already loading is left out — the getter waits for that load instead of
+    repeating it (TTLCache single flight). Release with _release_detection_reads.
+    """
+    return [read for read in wanted if read[2] is None or read[2].claim(read[3])]
+
+
+def _release_detection_reads(claimed: list[_DetectionRead]) -> None:
+    for _, _, cache, key, _ in claimed:
+        if cache is not None:
+            cache.release(key)
+
+
+def _read_generations(wanted: list[_DetectionRead]) -> dict[TTLCache, int]:
+    """The generation of each cache in `wanted`, taken before the batch is sent."""
+    return {cache: cache.generation for _, _, cache, *_ in wanted if cache is not None}
+
+
+def _store_detection_reads(wanted: list[_DetectionRead], results: list[list[dict]],
+                           now: float, generations: dict[TTLCache, int]) -> bool | None:
+    """
+    Put each result where its getter looks for it, unless its cache saw an
+    invalidation after `generations` was taken. Returns the seen answer, if read.
+    """
+    seen = None
+    for (_, _, cache, key, shape), rows in zip(wanted, results, strict=True):
+        if cache is None:
+            seen = shape(rows)
+        else:
+            cache.store(key, (now, shape(rows)), generations[cache])
+    return seen
+
+
+def _prefetch_detection_reads(group_id: int, user_id: int, include_seen: bool) -> bool | None:
+    """
+    Warm the detection caches for (group_id, user_id) in one batch. Returns
+    is_seen's answer when include_seen was asked for and the batch ran, else
+    None.
+    """
+    now = time.time()
+    wanted = _claim_detection_reads(_detection_reads_wanted(group_id, user_id, include_seen, now))
+    if not wanted:
+        return None
+
+    generations = _read_generations(wanted)
+    conn = get_connection()
+    try:
+        if not conn:
+            return None
+        results = _run_batch(conn, [(sql, params) for sql, params, *_ in wanted])
+        return _store_detection_reads(wanted, results, now, generations)
+    except Exception as e:
+        logger.error(f"load_detection_context error: {e}")
+        return None
+    finally:
+        put_connection(conn)
+        _release_detection_reads(wanted)
+
+
+def load_detection_context(group_id: int, user_id: int, *,
+                           include_seen: bool = False) -> DetectionContext:
+    """
+    The reads the checker (and, with include_seen, the message scan gate) needs
+    for one user in one group, in at most one round trip.
+
+    Raises DatabaseUnavailable exactly when get_whitelist or get_group would.
+    The blocklist entry is only looked up for groups that use the global
+    blocklist; otherwise bad_actor is None.
+    """
+    seen = _prefetch_detection_reads(group_id, user_id, include_seen)
+    return _assemble_detection_context(group_id, user_id, include_seen, seen)
+
+
+def _assemble_detection_context(group_id: int, user_id: int, include_seen: bool,
+                                seen: bool | None) -> DetectionContext:
+    whitelisted = is_whitelisted(group_id, user_id)
+    false_positive = is_false_positive(group_id, user_id)
+    group = get_group(group_id)
+    bad_actor = None
+    if group is None or group.get("use_global_blocklist", True):
+        bad_actor = get_known_bad_actor(user_id)
+    if include_seen:
+        seen = is_seen(group_id, user_id) if seen is None else (
+            seen or _write_queue.contains("seen", (group_id, user_id)))
+    return DetectionContext(
+        group=group,
+        whitelist=get_whitelist(group_id),
+        keywords=get_reserved_keywords(group_id),
+        whitelisted=whitelisted,
+        false_positive=false_positive,
+        bad_actor=bad_actor,
+        seen=seen,
+    )
+
+
+# ── Sweep member state ─────────────────────────────────────────────────────────
+#
+# A sweep used to cost a thread hop per member for is_whitelisted, and a round
+# trip per member from check_user for the false-positive and blocklist reads,
+# which are keyed per user and therefore always cold. load_sweep_member_state
+# reads the group's whitelist, active false positives and recently-seen members
+# once, as sets the sweep keeps (and updates) for the run; prime_sweep_chunk
+# then warms the per-user caches check_user reads for a chunk of members at a
+# time, so screening a clean member touches no database at all.
+
+# A seen mark younger than this isn't rewritten by a sweep. The write only
+# refreshes last_checked_at for retention (180 days), so a daily sweep needs
+# to renew each mark about weekly, not every night.
+_SEEN_REFRESH_DAYS = 7
+
+
+class SweepMemberState(NamedTuple):
+    """Per-group member sets a sweep holds for its whole run."""
+    whitelisted: set[int]
+    false_positive: set[int]
+    seen: set[int]      # marked within _SEEN_REFRESH_DAYS
+    # Profile fingerprint each of `seen` was last screened clean under, where
+    # recorded (see set_member_fingerprint).
+    fingerprints: dict[int, int] = {}
+
+
+def load_sweep_member_state(group_id: int) -> SweepMemberState:
+    """
+    One round trip for the three member sets of `group_id`. The whitelist rows
+    also refresh get_whitelist's cache.
+
+    Raises DatabaseUnavailable if the sets can't be read: the whitelist set is
+    what spares protected members, so a sweep must not run without it.
+    """
+    conn = get_connection()
+    if not conn:
+        raise DatabaseUnavailable(f"sweep member state for {group_id} unavailable")
+    started, generation = time.time(), _whitelist_cache.generation
+    try:
+        whitelist, false_positives, seen = _run_batch(conn, [
+            ("SELECT * FROM whitelisted_users WHERE group_id = %s", (group_id,)),
+            ("SELECT user_id FROM false_positives WHERE group_id = %s AND expires_at > NOW()",
+             (group_id,)),
+            ("SELECT user_id, fingerprint FROM seen_members WHERE group_id = %s "
+             "AND last_checked_at > NOW() - (%s * INTERVAL '1 day')",
+             (group_id, _SEEN_REFRESH_DAYS)),
+        ])
+    except Exception as e:
+        logger.error(f"load_sweep_member_state error: {e}")
+        raise DatabaseUnavailable(f"sweep member state for {group_id} unavailable") from e
+    finally:
+        put_connection(conn)
+    _whitelist_cache.store(group_id, (started, whitelist), generation)
+    queued = {uid for gid, uid in _write_queue.pending("seen") if gid == group_id}
+    fingerprints = {r["user_id"]: r["fingerprint"] for r in seen if r.get("fingerprint") is not None}
+    for gid, uid, fingerprint in _write_queue.pending("fingerprint"):
+        if gid == group_id:
+            fingerprints[uid] = fingerprint
+    return SweepMemberState(
+        whitelisted={r["user_id"] for r in whitelist},
+        false_positive={r["user_id"] for r in false_positives},
+        seen={r["user_id"] for r in seen} | queued,
+        fingerprints=fingerprints,
+    )
+
+
+def prime_sweep_chunk(group_id: int, user_ids: list[int]) -> set[int]:
+    """
+    Fill the false-positive and blocklist caches for `user_ids` ahead of
+    check_user, with one round trip for the whole chunk. Both are read live,
+    not taken from the sweep's start-of-run sets, and nothing is stored over an
+    invalidation that lands while the read is in flight — an "Ignore (30d)"
+    pressed mid-sweep must not be replaced by the stale answer. Best-effort:
+    whatever isn't primed is read as usual.
+
+    Returns the users who are on the blocklist, or whose entry could not be
+    read: a delta sweep never skips them.
+    """
+    cold = [uid for uid in user_ids
+            if _maybe_bad_actor(uid) and not _bad_actor_cache.is_fresh(uid)]
+    started = time.time()
+    fp_generation, bad_actor_generation = _fp_cache.generation, _bad_actor_cache.generation
+    conn = get_connection() if user_ids else None
+    if conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT user_id FROM false_positives
+                    WHERE group_id = %s AND user_id = ANY(%s) AND expires_at > NOW()
+                """, (group_id, list(user_ids)))
+                false_positive = {r["user_id"] for r in cur.fetchall()}
+                rows = {}
+                if cold:
+                    cur.execute("SELECT * FROM known_bad_actors WHERE user_id = ANY(%s)", (cold,))
+                    rows = {r["user_id"]: r for r in cur.fetchall()}
+            for uid in user_ids:
+                _fp_cache.store((group_id, uid), (started, uid in false_positive), fp_generation)
+            for uid in cold:
+                _bad_actor_cache.store(uid, (started, rows.get(uid)), bad_actor_generation)
+        except Exception as e:
+            logger.error(f"prime_sweep_chunk error: {e}")
+        finally:
+            put_connection(conn)
+    listed = set()
+    for uid in user_ids:
+        if _maybe_bad_actor(uid):
+            entry = _bad_actor_cache.fresh(uid)
+            if entry is None or entry[1] is not None:
+                listed.add(uid)
+    return listed
+
+
+# ── Photo hash cache ───────────────────────────────────────────────────────────
+#
+# file_unique_id -> (pfp_hash, pfp_mirror_hash), in front of the photo_hashes
+# table. A file_unique_id names one photo's content for good, so entries never
+# go stale; the bound only keeps the most recently used ones in memory.
+
+_photo_hash_cache = TTLCache("photo_hash", math.inf, stale_ttl=None, max_entries=50_000)
+
+
+def get_photo_hashes(file_unique_id: str) -> tuple[str | None, str | None] | None:
+    """
+    The (base, mirror) phashes stored for a photo, or None if it has never
+    been hashed. Best-effort: a failed read is a miss, and costs the caller a
+    download rather than an error.
+    """
+    entry = _photo_hash_cache.fresh(file_unique_id)
+    if entry is not None:
+        return entry[1]
+    for row in _write_queue.pending("photo_hash"):
+        if row[0] == file_unique_id:
+            return row[1], row[2]
+    try:
+        row = _read_one(
+            "SELECT pfp_hash, pfp_mirror_hash FROM photo_hashes WHERE file_unique_id = %s",
+            (file_unique_id,),
+        )
+    except Exception as e:
+        if not isinstance(e, _NoConnection):
+            logger.error(f"get_photo_hashes error: {e}")
+        return None
+    if row is None:
+        return None
+    hashes = (row["pfp_hash"], row["pfp_mirror_hash"])
+    _photo_hash_cache[file_unique_id] = (time.time(), hashes)
+    return hashes
+
+
+def store_photo_hashes(file_unique_id: str, pfp_hash: str | None, mirror_hash: str | None):
+    """Remember a photo's phashes (None for one that couldn't be hashed)."""
+    _photo_hash_cache[file_unique_id] = (time.time(), (pfp_hash, mirror_hash))
+    _queue_write("photo_hash", (file_unique_id, pfp_hash, mirror_hash))
+
+
+# ── Cross-group photo index ────────────────────────────────────────────────────
+#
+# One PhotoHashIndex for the whole process over every whitelisted photo and
+# every photo logged against a known bad actor (src/utils/photo_index.py).
+# refresh_photo_index pulls it forward incrementally:
+#   - whitelisted_users rows changed since the last (updated_at, group, user)
+#     seen — new photos and refreshed ones, from any process;
+#   - logs rows past the last log_id seen, for users on the blocklist;
+#   - a wholesale reload of each group whose whitelist this process changed,
+#     and of each user whose blocklist entry it changed, since a reload is the
+#     only way a deleted row leaves the index.
+#
+# The blocklist watermark is last_seen_at, which is NOW() at the start of the
+# writer's transaction, not its commit: an entry can become visible after a
+# later one's. Each pull therefore re-reads _BAD_ACTOR_MARK_OVERLAP behind the
+# watermark, and after the invalidation listener (re)connects — when another
+# process's additions may have gone unannounced — the next pull re-reads every
+# id. A missed id would make a listed user look unlisted.
+
+_photo_index = PhotoHashIndex(PHOTO_INDEX_MAX_ENTRIES)
+_photo_index_marks: dict = {"whitelist": None, "log_id": 0, "bad_actors": None}
+_photo_index_dirty_groups: set[int] = set()
+_photo_index_dirty_users: set[int] = set()
+_photo_index_lock = threading.Lock()
+_PHOTO_INDEX_BATCH = 5000
+_BAD_ACTOR_MARK_OVERLAP = timedelta(minutes=5)
+_bad_actor_ids_resync = threading.Event()
+
+
+def refresh_photo_index() -> int:
+    """
+    Bring the photo index up to date. Returns how many rows were applied.
+
+    Safe to call from several threads; concurrent calls run one at a time. A
+    failed refresh keeps the marks and dirty sets it started with, so the next
+    call retries the same work.
+    """
+    with _photo_index_lock:
+        conn = get_connection()
+        if not conn:
+            return 0
+        # Claimed up front, so a group dirtied while this refresh runs stays
+        # dirty for the next one.
+        groups, users = set(_photo_index_dirty_groups), set(_photo_index_dirty_users)
+        _photo_index_dirty_groups.difference_update(groups)
+        _photo_index_dirty_users.difference_update(users)
+        resync = _bad_actor_ids_resync.is_set()
+        _bad_actor_ids_resync.clear()
+        marks = dict(_photo_index_marks)
+        applied = 0
+        try:
+            with conn.cursor() as cur:
+                applied += _pull_whitelist_photos(cur, marks)
+                users |= _pull_bad_actor_changes(cur, marks, resync)
+                applied += _pull_bad_actor_photos(cur, marks)
+                if groups:
+                    cur.execute(
+                        "SELECT group_id, user_id, pfp_hash FROM whitelisted_users "
+                        "WHERE group_id = ANY(%s) AND pfp_hash IS NOT NULL",
+                        (list(groups),),
+                    )
+                    rows = cur.fetchall()
+                    _photo_index.replace(
+                        lambda r: r.kind != "whitelist" or r.group_id not in groups,
+                        [(PhotoRef("whitelist", r["group_id"], r["user_id"]), r["pfp_hash"])
+                         for r in rows],
+                    )
+                    applied += len(rows)
+                if users:
+                    cur.execute("""
+                        SELECT l.group_id, l.user_id, l.user_pfp_hash
+                          FROM logs l JOIN known_bad_actors k ON k.user_id = l.user_id
+                         WHERE l.user_id = ANY(%s) AND l.user_pfp_hash IS NOT NULL
+                         ORDER BY l.log_id
+                    """, (list(users),))
+                    rows = cur.fetchall()
+                    _photo_index.replace(
+                        lambda r: r.kind != "bad_actor" or r.user_id not in users,
+                        [(PhotoRef("bad_actor", r["group_id"], r["user_id"]), r["user_pfp_hash"])
+                         for r in rows],
+                    )
+                    applied += len(rows)
+            conn.commit()
+        except Exception as e:
+            logger.error(f"refresh_photo_index error: {e}")
+            conn.rollback()
+            _photo_index_dirty_groups.update(groups)
+            _photo_index_dirty_users.update(users)
+            if resync:
+                _bad_actor_ids_resync.set()
+            return 0
+        finally:
+            put_connection(conn)
+        _photo_index_marks.update(marks)
+        return applied
+
+
+def _pull_whitelist_photos(cur, marks: dict) -> int:
+    """Apply whitelisted_users rows changed since marks['whitelist']."""
+    applied = 0
+    while True:
+        if marks["whitelist"] is None:
+            cur.execute("""
+                SELECT group_id, user_id, pfp_hash, updated_at FROM whitelisted_users
+                 ORDER BY updated_at, group_id, user_id LIMIT %s
+            """, (_PHOTO_INDEX_BATCH,))
+        else:
+            cur.execute("""
+                SELECT group_id, user_id, pfp_hash, updated_at FROM whitelisted_users
+                 WHERE (updated_at, group_id, user_id) > (%s, %s, %s)
+                 ORDER BY updated_at, group_id, user_id LIMIT %s
+            """, (*marks["whitelist"], _PHOTO_INDEX_BATCH))
+        rows = cur.fetchall()
+        for r in rows:
+            # A NULL pfp_hash unindexes the user: their photo was removed.
+            _photo_index.add(PhotoRef("whitelist", r["group_id"], r["user_id"]), r["pfp_hash"])
+        if rows:
+            last = rows[-1]
+            marks["whitelist"] = (last["updated_at"], last["group_id"], last["user_id"])
+        applied += len(rows)
+        if len(rows) < _PHOTO_INDEX_BATCH:
+            return applied
+
+
+def _pull_bad_actor_changes(cur, marks: dict, resync: bool = False) -> set[int]:
+    """
+    Users whose blocklist entry was created or re-confirmed since the last
+    refresh. Their earlier logs predate the log_id mark, so they are reloaded
+    whole. Also feeds _bad_actor_ids: the first pull and a resync read every
+    entry, the rest the overlap behind the watermark; rows already applied are
+    not reported again.
+    """
+    mark = marks["bad_actors"]
+    if mark is None or resync:
+        cur.execute("SELECT user_id, last_seen_at FROM known_bad_actors")
+    else:
+        cur.execute(
+            "SELECT user_id, last_seen_at FROM known_bad_actors WHERE last_seen_at > %s",
+            (mark - _BAD_ACTOR_MARK_OVERLAP,),
+        )
+    rows = cur.fetchall()
+    users = {r["user_id"] for r in rows
+             if mark is None or r["last_seen_at"] > mark or r["user_id"] not in _bad_actor_ids}
+    if rows:
+        latest = max(r["last_seen_at"] for r in rows)
+        marks["bad_actors"] = latest if mark is None else max(mark, latest)
+    _bad_actor_ids.update(users, complete=mark is None)
+    return users
+
+
+def _pull_bad_actor_photos(cur, marks: dict) -> int:
+    """Apply photos logged against blocklisted users past marks['log_id']."""
+    applied = 0
+    while True:
+        cur.execute("""
+            SELECT l.log_id, l.group_id, l.user_id, l.user_pfp_hash
+              FROM logs l JOIN known_bad_actors k ON k.user_id = l.user_id
+             WHERE l.log_id > %s AND l.user_pfp_hash IS NOT NULL
+             ORDER BY l.log_id LIMIT %s
+        """, (marks["log_id"], _PHOTO_INDEX_BATCH))
+        rows = cur.fetchall()
+        for r in rows:
+            _photo_index.add(PhotoRef("bad_actor", r["group_id"], r["user_id"]), r["user_pfp_hash"])
+        if rows:
+            marks["log_id"] = rows[-1]["log_id"]
+        applied += len(rows)
+        if len(rows) < _PHOTO_INDEX_BATCH:
+            return applied
+
+
+def find_reused_photo(pfp_hashes: list[str], group_id: int, user_id: int) -> list[PhotoMatch]:
+    """
+    Other places this photo (or its mirror) appears, within PFP_HASH_THRESHOLD:
+    protected identities in other groups, and photos logged against known bad
+    actors anywhere. The user's own entries, and this group's whitelist — which
+    detection already compared against — are left out. In-memory only; never
+    touches the database.
+    """
+    return [
+        m for m in _photo_index.within(pfp_hashes, PFP_HASH_THRESHOLD)
+        if m.ref.user_id != user_id
+        and not (m.ref.kind == "whitelist" and m.ref.group_id == group_id)
+    ]
+
+
+def photo_index_info() -> dict:
+    return _photo_index.info()
+
+
+# ── Async connection pool (optional) ──────────────────────────────────────────
+#
+# run_db hops every helper onto the executor, which main() bounds to
+# DB_POOL_MAX_SIZE threads. Under a join raid the hot-path reads and writes
+# queue behind those threads even when the answer is already cached, and a
+# thread parked on a query is one the checker's scoring can't use. With
+# DB_ASYNC_POOL=1, run_db awaits an async twin of the helpers in _ASYNC_TWINS
+# instead: a cache hit or a queued write is handled on the event loop with no
+# hop at all, and a cold read borrows from a psycopg_pool.AsyncConnectionPool.
+# Each twin keeps its helper's failure semantics — get_group and get_whitelist
+# still serve stale or raise DatabaseUnavailable — and every other helper still
+# goes through the executor. The two pools are separate, so this mode can hold
+# up to twice DB_POOL_MAX_SIZE connections.
+
+_apool: AsyncConnectionPool | None = None
+_apool_loop: asyncio.AbstractEventLoop | None = None
+_apool_opened: asyncio.Task | None = None
+
+# A detection read due to expire within this many seconds is fetched anyway,
+# so the context can be assembled from the caches once the batch is back.
+_ASYNC_ASSEMBLY_MARGIN = 5.0
+
+
+async def _get_async_pool() -> AsyncConnectionPool:
+    """
+    The async pool for the running event loop, built on first use.
+
+    Bound to the loop that built it; a new loop (a test's asyncio.run) gets its
+    own. Concurrent first callers share one open() rather than racing to build.
+    """
+    global _apool, _apool_loop, _apool_opened
+    loop = asyncio.get_running_loop()
+    if _apool is None or _apool_loop is not loop:
+        _apool = AsyncConnectionPool(
+            conninfo=DATABASE_URL,
+            min_size=0,
+            max_size=DB_POOL_MAX_SIZE,
+            max_idle=300,
+            timeout=30,
+            kwargs={"row_factory": dict_row, "connect_timeout": 30, "autocommit": True},
+            check=AsyncConnectionPool.check_connection,
+            open=False,
+        )
+        _apool_loop = loop
+        _apool_opened = asyncio.ensure_future(_apool.open())
+    await _apool_opened
+    return _apool
+
+
+async def aget_connection(retries: int = 3, base_delay: float = 1.0,
+                          backoff_budget: float = 15.0):
+    """get_connection() for the async pool: same budget, same None on failure."""
+    started = time.monotonic()
+    for attempt in range(retries):
+        try:
+            pool = await _get_async_pool()
+            return await pool.getconn(timeout=_POOL_ACQUIRE_TIMEOUT)
+        except Exception as e:
+            if _is_fatal_conninfo_error(e):
+                logger.error(
+                    f"DB connection rejected for a configuration reason, not "
+                    f"retrying: {e}"
+                )
+                return None
+            remaining = backoff_budget - (time.monotonic() - started)
+            if attempt >= retries - 1 or remaining <= 0:
+                logger.error(
+                    f"DB async pool getconn failed after {attempt + 1} attempt(s): {e}"
+                )
+                return None
+            delay = min(base_delay * (2 ** attempt), remaining)
+            logger.warning(
+                f"DB async pool getconn attempt {attempt + 1}/{retries} failed, "
+                f"retrying in {delay:.0f}s: {e}"
+            )
+            await asyncio.sleep(delay)
+
+
+async def aput_connection(conn) -> None:
+    """put_connection() for the async pool."""
+    if conn is None:
+        return
+    try:
+        await (await _get_async_pool()).putconn(conn)
+    except Exception as e:
+        logger.warning(f"aput_connection failed, closing raw socket: {e}")
+        try:
+            await conn.close()
+        except Exception:
+            pass
+
+
+async def close_async_pool() -> None:
+    """Close the async pool, if this process ever opened one."""
+    global _apool, _apool_loop, _apool_opened
+    pool, _apool, _apool_loop, _apool_opened = _apool, None, None, None
+    if pool is not None:
+        await pool.close()
+
+
+async def _aread(sql: str, params: tuple) -> list[dict]:
+    """One read on a borrowed async connection. Raises on any failure."""
+    conn = await aget_connection()
+    if not conn:
+        raise DatabaseUnavailable("no async connection")
+    try:
+        cur = await conn.execute(sql, params)
+        return await cur.fetchall()
+    finally:
+        await aput_connection(conn)
+
+
+async def aget_group(group_id: int) -> dict | None:
+    cached = _group_cache.fresh(group_id)
+    if cached:
+        return cached[1]
+    # As TTLCache.load does: a write committed while this read was in flight
+    # must not be cached over.
+    started, generation = time.time(), _group_cache.generation
+    try:
+        row = _one(await _aread("SELECT * FROM groups WHERE group_id = %s", (group_id,)))
+    except Exception as e:
+        logger.error(f"get_group error: {e}")
+        return _stale_or_raise(_group_cache, group_id, "group config")
+    _group_cache.store(group_id, (started, row), generation)
+    return row
+
+
+async def aget_whitelist(group_id: int) -> list[dict]:
+    cached = _whitelist_cache.fresh(group_id)
+    if cached:
+        return cached[1]
+    started, generation = time.time(), _whitelist_cache.generation
+    try:
+        rows = await _aread("SELECT * FROM whitelisted_users WHERE group_id = %s", (group_id,))
+    except Exception as e:
+        logger.error(f"get_whitelist error: {e}")
+        return _stale_or_raise(_whitelist_cache, group_id, "whitelist")
+    _whitelist_cache.store(group_id, (started, rows), generation)
+    return rows
+
+
+async def ais_whitelisted(group_id: int, user_id: int) -> bool:
+    return any(r["user_id"] == user_id for r in await aget_whitelist(group_id))
+
+
+async def ais_seen(group_id: int, user_id: int) -> bool:
+    if _write_queue.contains("seen", (group_id, user_id)):
+        return True
+    try:
+        return bool(await _aread(
+            "SELECT 1 FROM seen_members WHERE group_id = %s AND user_id = %s",
+            (group_id, user_id),
+        ))
+    except Exception as e:
+        logger.error(f"is_seen error: {e}")
+        return False
+
+
+async def aget_watched_groups_for_user(user_id: int) -> list[int]:
+    if any(uid == user_id for _, uid in _write_queue.pending("seen")):
+        await asyncio.to_thread(flush_writes)
+    try:
+        rows = await _aread(
+            """
+            SELECT s.group_id
+              FROM seen_members s
+             WHERE s.user_id = %s
+               AND NOT EXISTS (
+                   SELECT 1 FROM whitelisted_users w
+                    WHERE w.group_id = s.group_id
+                      AND w.user_id  = s.user_id
+               )
+            """,
+            (user_id,),
+        )
+    except Exception as e:
+        logger.error(f"get_watched_groups_for_user error: {e}")
+        return []
+    return [row["group_id"] for row in rows]
+
+
+async def _aqueue_write(kind: str, row: tuple) -> None:
+    if WRITE_BEHIND_FLUSH_MS:
+        if _write_queue.add(kind, row):
+            # The flush itself is blocking psycopg — it goes to the executor.
+            await asyncio.to_thread(_write_queue.flush, _write_rows, block=False)
+        return
+    conn = await aget_connection()
+    if not conn:
+        logger.error(f"write-behind {kind} error: no async connection")
+        return
+    try:
+        await conn.execute(_WRITE_BEHIND_SQL[kind], row)
+        await conn.commit()
+    except Exception as e:
+        logger.error(f"write-behind {kind} error: {e}")
+        await conn.rollback()
+    finally:
+        await aput_connection(conn)
+
+
+async def amark_seen(group_id: int, user_id: int):
+    await _aqueue_write("seen", (group_id, user_id))
+
+
+# insert_log's parameters are the log row's columns, in order.
+_INSERT_LOG_SIGNATURE = inspect.signature(insert_log)
+
+
+async def ainsert_log(*args, **kwargs):
+    bound = _INSERT_LOG_SIGNATURE.bind(*args, **kwargs)
+    bound.apply_defaults()
+    await _aqueue_write("log", tuple(bound.arguments.values()))
+
+
+async def _arun_batch(conn, statements: list[tuple[str, tuple]]) -> list[list[dict]]:
+    if Pipeline.is_supported():
+        async with conn.pipeline():
+            cursors = [await conn.execute(sql, params) for sql, params in statements]
+            return [await cur.fetchall() for cur in cursors]
+    return [await (await conn.execute(sql, params)).fetchall() for sql, params in statements]
+
+
+async def aload_detection_context(group_id: int, user_id: int, *,
+                                  include_seen: bool = False) -> DetectionContext:
+    """
+    load_detection_context() with its batch sent on the async pool. Anything
+    short of a complete, fresh batch — no connection, a failed batch, an entry
+    that expired meanwhile — is handed to the synchronous version on the
+    executor, so failure behaviour is exactly the getters'.
+    """
+    now = time.time()
+    wanted = _claim_detection_reads(_detection_reads_wanted(
+        group_id, user_id, include_seen, now, margin=_ASYNC_ASSEMBLY_MARGIN))
+    seen, complete = None, not wanted
+    if wanted:
+        generations = _read_generations(wanted)
+        try:
+            conn = await aget_connection()
+            if conn:
+                try:
+                    results = await _arun_batch(conn, [(sql, params)
+                                                       for sql, params, *_ in wanted])
+                    seen = _store_detection_reads(wanted, results, now, generations)
+                    complete = True
+                except Exception as e:
+                    logger.error(f"load_detection_context error: {e}")
+                finally:
+                    await aput_connection(conn)
+        finally:
+            _release_detection_reads(wanted)
+    if complete and not _detection_reads_wanted(group_id, user_id, False, time.time()):
+        # Every getter below is a cache hit now, so this never blocks.
+        return _assemble_detection_context(group_id, user_id, include_seen, seen)
+    return await asyncio.to_thread(load_detection_context, group_id, user_id,
+                                   include_seen=include_seen)
+
+
+async def warm_detection_context(group_id: int, user_id: int) -> None:
+    """
+    With the async pool on, load the user's detection reads on the event loop
+    so the executor thread that scores them finds the caches warm and never
+    waits on the database. A no-op otherwise.
+    """
+    if DB_ASYNC_POOL:
+        await aload_detection_context(group_id, user_id)
+
+
+# Synchronous helper -> async twin, consulted by run_db when DB_ASYNC_POOL is on.
+_ASYNC_TWINS: dict[Callable, Callable] = {
+    get_group: aget_group,
+    get_whitelist: aget_whitelist,
+    is_whitelisted: ais_whitelisted,
+    is_seen: ais_seen,
+    mark_seen: amark_seen,
+    insert_log: ainsert_log,
+    get_watched_groups_for_user: aget_watched_groups_for_user,
+    load_detection_context: aload_detection_context,
+}
@@ -15,7 +15,7 @@ from src.db import (
     set_group_action_mode, set_group_log_channel,
     get_stats_windowed, get_latest_log_entry, get_whitelist, mark_seen,
     add_reserved_keyword, remove_reserved_keyword, get_reserved_keywords,
-    set_group_threshold, get_recent_logs,
+    set_group_threshold, get_recent_logs, search_logs,
     log_admin_action, get_recent_admin_actions, insert_log,
     clear_whitelist as db_clear_whitelist,
     get_all_group_stats_windowed,
@@ -434,7 +434,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "\n<b>Moderation</b>\n"
             "/ban — Reply, or /ban 123456\n"
             "/unban 123456 — Unban a user by ID\n"
-            "/sweep — Full member scan (Pyrogram required)\n"
+            "/sweep — Member scan, skipping unchanged profiles (Pyrogram required)\n"
+            "/sweep full — Re-screen every member\n"
             "\n<b>Configuration</b>\n"
             "/settings — Overview of all settings for this group\n"
             "/setaction ban|kick|alert — Default: ban\n"
@@ -448,7 +449,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "/listkeywords — List reserved keywords\n"
             "\n<b>Insights</b>\n"
             "/stats — All-time, 30d, 7d breakdown\n"
-            "/logs 20 — Recent detections + admin actions",
+            "/logs 20 — Recent detections + admin actions\n"
+            "/logs @handle — Detections resembling a name or handle",
             parse_mode="HTML",
             reply_markup=ReplyKeyboardMarkup(
                 keyboard, resize_keyboard=True, one_time_keyboard=True
@@ -1054,6 +1056,10 @@ async def sweep(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     group_id, _ = ctx
 
+    # Members unchanged since they were last screened clean are skipped unless
+    # the admin asks for everyone.
+    full = bool(context.args) and context.args[0].lower() in ("full", "--full")
+
     pyro = _pyro()
     if not pyro:
         await update.message.reply_text(
@@ -1085,7 +1091,8 @@ async def sweep(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         result = await sweep_group(
-            pyro, context.bot, group_id, log_channel, progress_cb=progress, trigger="manual"
+            pyro, context.bot, group_id, log_channel, progress_cb=progress, trigger="manual",
+            delta=not full,
         )
     except Exception as e:
         logger.error(f"Sweep command error for {group_id}: {e}")
@@ -1104,7 +1111,12 @@ async def sweep(update: Update, context: ContextTypes.DEFAULT_TYPE):
     errors   = result.get("errors", 0)
     partial  = result.get("partial", False)
     bios_skipped = result.get("bios_skipped", 0)
-    note     = "\n<i>(All members were admins or already whitelisted.)</i>" if checked == 0 else ""
+    unchanged    = result.get("unchanged_skipped", 0)
+    note     = ("\n<i>(All members were admins or already whitelisted.)</i>"
+                if checked == 0 and not unchanged else "")
+    if unchanged:
+        note += (f"\n<code>{unchanged}</code> member(s) skipped: unchanged since they "
+                 "were last screened. /sweep full re-screens everyone.")
     if partial:
         note += ("\n⚠️ <b>Partial sweep</b> — stopped early (rate limit or time cap); "
                  "not all members were scanned. Re-run /sweep to continue.")
@@ -1475,6 +1487,15 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     threshold = group.get("similarity_threshold") if group else None
     thr_label = f"<code>{threshold}</code>" if threshold else "<code>85</code> (default)"
 
+    # Coverage age: how long since a sweep last covered every member.
+    swept_through = group.get("swept_through_at") if group else None
+    if swept_through:
+        from datetime import datetime
+        hours = (datetime.now(UTC) - swept_through).total_seconds() / 3600
+        coverage = f"<code>{hours:.0f}h ago</code>" if hours >= 1 else "<code>under 1h ago</code>"
+    else:
+        coverage = "<code>never</code>"
+
     def _row(label: str, det: int, banned: int, sweeps: int) -> str:
         return (
             f"<b>{label}</b>\n"
@@ -1487,7 +1508,8 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"📊 <b>Stats for this group</b>\n\n"
         f"Action mode: <code>{action}</code>\n"
         f"Similarity threshold: {thr_label}\n"
-        f"🛡 Protected users: <code>{s.get('whitelisted', 0)}</code>\n\n"
+        f"🛡 Protected users: <code>{s.get('whitelisted', 0)}</code>\n"
+        f"🧹 Last complete sweep: {coverage}\n\n"
         + _row("All time",   s.get("detections_all", 0), s.get("banned_all", 0), s.get("sweeps_all", 0)) + "\n"
         + _row("Last 30 days", s.get("detections_30d", 0), s.get("banned_30d", 0), s.get("sweeps_30d", 0)) + "\n"
         + _row("Last 7 days",  s.get("detections_7d", 0),  s.get("banned_7d", 0),  s.get("sweeps_7d", 0)),
@@ -1991,11 +2013,18 @@ def _logs_user_link(uid: int | None, name: str | None, username: str | None) ->
     return f"{display}{handle}"
 
 
-def _build_logs_view(group_id: int, limit: int = 50) -> tuple[str, list[str]]:
+def _build_logs_view(group_id: int, limit: int = 50,
+                     search: str | None = None) -> tuple[str, list[str]]:
     """Return (header, flat lines) merging recent detections (🚨) and admin
-    actions (🔧), newest first within each, ready for pagination."""
-    detections = get_recent_logs(group_id, limit)
-    actions    = get_recent_admin_actions(group_id, limit)
+    actions (🔧), newest first within each, ready for pagination. With
+    `search`, only the detections whose suspect resembles it, closest first,
+    one page's worth (the nav callbacks don't carry the search)."""
+    if search:
+        detections = search_logs(group_id, search, _PAGE_SIZE)
+        actions    = []
+    else:
+        detections = get_recent_logs(group_id, limit)
+        actions    = get_recent_admin_actions(group_id, limit)
     lines: list[str] = []
 
     for r in detections:
@@ -2028,6 +2057,8 @@ def _build_logs_view(group_id: int, limit: int = 50) -> tuple[str, list[str]]:
         lines.append(f"🔧 <b>{dt}</b> {who} — {r['action']}{tgt}{detail}")
 
     header = "📋 <b>Recent activity</b> — 🚨 detections + 🔧 admin actions"
+    if search:
+        header = f"🔎 <b>Detections resembling</b> <code>{html.escape(search)}</code>"
     return header, lines
 
 
@@ -2035,6 +2066,8 @@ async def logs(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Recent activity for the group — detections AND admin actions, paginated
     with ◀/▶. Usage: /logs (optional /logs <N> caps how many of each are fetched).
+    /logs <name or @handle> instead lists the detections of suspects whose
+    name or handle resembles it.
     """
     ctx = await _get_admin_group(update, context)
     if not ctx:
@@ -2042,13 +2075,20 @@ async def logs(update: Update, context: ContextTypes.DEFAULT_TYPE):
     group_id, _ = ctx
 
     limit = 50
+    search = None
     if context.args:
         try:
             limit = max(1, min(int(context.args[0]), 100))
         except ValueError:
-            pass
+            search = " ".join(context.args)
 
-    header, lines = _build_logs_view(group_id, limit)
+    header, lines = _build_logs_view(group_id, limit, search)
+    if search and not lines:
+        await update.message.reply_text(
+            f"No detections in this group resemble <code>{html.escape(search)}</code>.",
+            parse_mode="HTML",
+        )
+        return
     if not lines:
         await update.message.reply_text(
             "No activity logged for this group yet.\n"
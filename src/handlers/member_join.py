@@ -9,7 +9,7 @@ from src.db import (
     upsert_group, is_whitelisted, get_group, get_reserved_keywords,
     upsert_whitelisted_user, mark_seen, run_db,
 )
-from src.utils.checker import UserSnapshot, check_user, ban_and_log
+from src.utils.checker import UserSnapshot, check_user, ban_and_log, photo_fingerprint
 from src.utils.image import compute_pfp_hash_bytes
 from src.handlers.commands import invalidate_admin_cache
 from src.watcher.fetch import fetch_bio as _fetch_bio
@@ -188,7 +188,7 @@ async def check_impersonation(update: Update, context: ContextTypes.DEFAULT_TYPE
                 username=user.username,
                 first_name=user.first_name,
                 last_name=user.last_name,
-                pfp_hash=compute_pfp_hash_bytes(pfp_bytes) if pfp_bytes else None,
+                pfp_hash=photo_fingerprint(snapshot).base,
                 whitelisted_by=context.bot.id,
                 user_type="admin",
                 is_bot=bool(user.is_bot),
@@ -15,11 +15,10 @@ from telegram.ext import ContextTypes
 from telegram.constants import ChatMemberStatus, ChatType
 
 from src.db import (
-    get_group, is_whitelisted, is_seen, mark_seen, upsert_whitelisted_user,
+    load_detection_context, mark_seen, upsert_whitelisted_user,
     DatabaseUnavailable, run_db,
 )
-from src.utils.checker import UserSnapshot, check_user, ban_and_log
-from src.utils.image import compute_pfp_hash_bytes
+from src.utils.checker import UserSnapshot, check_user, ban_and_log, photo_fingerprint
 from src.config import LOG_CHANNEL_ID
 
 logger = logging.getLogger(__name__)
@@ -36,15 +35,17 @@ def _scan_gate(group_id: int, user_id: int):
     recoverable, acting on a half-known protection state is not.
     """
     try:
-        group = get_group(group_id)
-        if not group:
+        # include_seen rides the same batch, and the rest of it warms the caches
+        # check_user reads next — a cold first message costs one round trip.
+        ctx = load_detection_context(group_id, user_id, include_seen=True)
+        if not ctx.group:
             # Not registered yet — skip until /import_admins has been run.
             return None
-        if is_whitelisted(group_id, user_id):
+        if ctx.whitelisted:
             return None
-        if is_seen(group_id, user_id):     # already checked once; permanent skip
+        if ctx.seen:                       # already checked once; permanent skip
             return None
-        return group
+        return ctx.group
     except DatabaseUnavailable as e:
         logger.warning(f"Skipping message scan in {group_id}: {e}")
         return None
@@ -63,7 +64,8 @@ async def scan_message_sender(update: Update, context: ContextTypes.DEFAULT_TYPE
     group_id = update.effective_chat.id
 
     # Three blocking reads used to run inline here, for EVERY message in every
-    # monitored group. Collapsed into a single hop off the event loop.
+    # monitored group. Collapsed into a single hop off the event loop, and one
+    # round trip to Postgres when the sender is new.
     group = await run_db(_scan_gate, group_id, user.id)
     if group is None:
         return
@@ -104,7 +106,7 @@ async def scan_message_sender(update: Update, context: ContextTypes.DEFAULT_TYPE
                 username=user.username,
                 first_name=user.first_name,
                 last_name=user.last_name,
-                pfp_hash=compute_pfp_hash_bytes(pfp_bytes) if pfp_bytes else None,
+                pfp_hash=photo_fingerprint(snapshot).base,
                 whitelisted_by=context.bot.id,
                 user_type="admin",
                 is_bot=bool(user.is_bot),
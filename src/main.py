@@ -32,11 +32,12 @@ from telegram.ext import (
 from src.config import (
     BOT_TOKEN, LOG_CHANNEL_ID,
     PYROGRAM_API_ID, PYROGRAM_API_HASH, PYROGRAM_SESSION, PYROGRAM_ENABLED,
-    BLOCKLIST_TRUSTED_GROUPS,
+    BLOCKLIST_TRUSTED_GROUPS, PHOTO_INDEX_REFRESH_SECONDS, WRITE_BEHIND_FLUSH_MS, CACHE_NOTIFY,
 )
 from src.db import (
-    init_db, get_connection, put_connection, purge_old_records, run_db,
-    DB_POOL_MAX_SIZE,
+    init_db, get_connection, put_connection, purge_old_records, maintain_partitions, run_db,
+    refresh_photo_index, photo_index_info, flush_writes, write_behind_info, DB_POOL_MAX_SIZE,
+    close_async_pool, listen_for_invalidations, invalidation_info,
 )
 from src.handlers.commands import (
     start, handle_chat_shared, import_admins, whitelist_user,
@@ -205,10 +206,15 @@ async def _retention_loop(interval_hours: int = 24) -> None:
     depend on whether Telegram notifications are configured.
 
     Runs off the event loop, since the DELETEs are blocking psycopg. The first
-    pass is delayed by one interval so it never competes with startup.
+    purge is delayed by one interval so it never competes with startup. Each
+    pass first creates the coming months' partitions, so that runs at startup
+    too — a bot restarted more often than daily still keeps them ahead.
     """
     while True:
         try:
+            created = await run_db(maintain_partitions)
+            if created:
+                logger.info(f"Created {created} monthly partition(s).")
             await asyncio.sleep(interval_hours * 3600)
             deleted = await run_db(purge_old_records)
             if any(deleted.values()):
@@ -222,6 +228,70 @@ async def _retention_loop(interval_hours: int = 24) -> None:
             await asyncio.sleep(3600)
 
 
+async def _photo_index_loop(interval: int = PHOTO_INDEX_REFRESH_SECONDS) -> None:
+    """
+    Keep the cross-group photo index current (see src.utils.photo_index).
+
+    The first pass runs immediately and loads everything; later passes pull
+    only rows added or changed since. Off the event loop, like every other
+    DB call.
+    """
+    while True:
+        try:
+            applied = await run_db(refresh_photo_index)
+            if applied:
+                logger.info("Photo index refreshed.", extra={"applied": applied,
+                                                             **photo_index_info()})
+            await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Photo index loop crashed: {e}")
+            await asyncio.sleep(interval)
+
+
+async def _write_behind_loop(interval_ms: int = WRITE_BEHIND_FLUSH_MS,
+                             report_seconds: int = 300) -> None:
+    """
+    Flush the write-behind queues every interval (see src.utils.write_behind),
+    and log their depth and flush latency every report_seconds. A queue that
+    fills a batch between ticks has already been flushed by whoever filled it.
+    """
+    last_report = time.monotonic()
+    while True:
+        try:
+            await asyncio.sleep(interval_ms / 1000)
+            if write_behind_info()["queued"]:
+                await run_db(flush_writes)
+            if time.monotonic() - last_report >= report_seconds:
+                last_report = time.monotonic()
+                info = write_behind_info()
+                info.pop("depth")
+                logger.info("Write-behind queue.", extra=info)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Write-behind loop crashed: {e}")
+            await asyncio.sleep(interval_ms / 1000)
+
+
+async def _cache_invalidation_loop(retry_seconds: int = 30) -> None:
+    """
+    Keep listening for other processes' cache invalidations (see src.db's
+    "Cross-process cache invalidation"), reconnecting after a failure. While
+    disconnected the caches run on their short default TTLs.
+    """
+    while True:
+        try:
+            await listen_for_invalidations()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Cache invalidation listener disconnected, retrying in "
+                           f"{retry_seconds}s: {e}", extra=invalidation_info())
+            await asyncio.sleep(retry_seconds)
+
+
 async def _error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Global PTB error handler.
@@ -579,6 +649,25 @@ async def main():
         "retention", _retention_loop, notify=_report_death,
     ))
 
+    # Cross-group photo index — feeds the "photo also seen" line on alerts.
+    photo_index_task = asyncio.create_task(_supervised(
+        "photo_index", _photo_index_loop, notify=_report_death,
+    ))
+
+    # Batched seen-member, log, name-change and sweep-run writes.
+    write_behind_task = None
+    if WRITE_BEHIND_FLUSH_MS:
+        write_behind_task = asyncio.create_task(_supervised(
+            "write_behind", _write_behind_loop, notify=_report_death,
+        ))
+
+    # Evicts what other processes sharing the database change.
+    invalidation_task = None
+    if CACHE_NOTIFY:
+        invalidation_task = asyncio.create_task(_supervised(
+            "cache_invalidation", _cache_invalidation_loop, notify=_report_death,
+        ))
+
     # Detects a loop that is alive but not running — the signature of a blocking
     # call finding its way back onto it. Nothing else in the process can see that.
     watchdog_task = asyncio.create_task(_supervised(
@@ -607,9 +696,13 @@ async def main():
         except Exception as e:
             logger.warning(f"updater.stop() failed: {e}")
 
-        tasks = [keepalive_task, retention_task, watchdog_task]
+        tasks = [keepalive_task, retention_task, photo_index_task, watchdog_task]
         if summary_task:
             tasks.append(summary_task)
+        if write_behind_task:
+            tasks.append(write_behind_task)
+        if invalidation_task:
+            tasks.append(invalidation_task)
         if pyro_client:
             tasks.extend([sweep_task, health_task])
         for t in tasks:
@@ -625,3 +718,15 @@ async def main():
                 logger.warning(f"pyro_client.stop() failed: {e}")
         await ptb_app.stop()
         await ptb_app.shutdown()
+
+        # Last, once no handler, sweep or watcher can queue another row.
+        try:
+            written = await run_db(flush_writes)
+            if written:
+                logger.info(f"Flushed {written} queued write(s) on shutdown.")
+        except Exception as e:
+            logger.warning(f"Final write-behind flush failed: {e}")
+        try:
+            await close_async_pool()
+        except Exception as e:
+            logger.warning(f"close_async_pool() failed: {e}")
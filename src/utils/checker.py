@@ -5,25 +5,30 @@ Called from: join handler, message handler, sweep, and Pyrogram profile-change w
 """
 from __future__ import annotations
 
+import dataclasses
+import hashlib
 import html
 import logging
-from dataclasses import dataclass
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from typing import Optional, Callable, Awaitable
 
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 
 from src.db import (
-    get_whitelist, is_whitelisted, insert_log, get_group, get_reserved_keywords,
-    is_false_positive, get_known_bad_actor,
+    get_whitelist, get_whitelist_index, insert_log, get_group, load_detection_context,
+    get_keyword_matcher, get_detection_versions, get_detection_digest, find_reused_photo,
     DatabaseUnavailable, run_db,
+    warm_detection_context, whitelist_candidates, get_reserved_keywords,
 )
 from src.utils.detector import (
     check_username_similarity, check_name_similarity,
     check_homoglyph_danger, check_reserved_keywords,
+    batch_check_username_similarity, batch_check_name_similarity, KeywordMatcher,
 )
-from src.utils.image import (
-    compute_pfp_hash_bytes, compute_pfp_hash_variants_bytes, check_pfp_similarity,
-)
+from src.utils.image import PhotoFingerprint, check_pfp_similarity
+from src.utils.whitelist_index import WhitelistIndex
 from src.config import (
     NAME_SIMILARITY_THRESHOLD, USERNAME_SIMILARITY_THRESHOLD, PFP_HASH_THRESHOLD,
     DEFAULT_BAN_SCORE, DEFAULT_ALERT_SCORE, BLOCKLIST_TRUSTED_GROUPS,
@@ -49,6 +54,47 @@ class UserSnapshot:
     last_name: Optional[str]
     pfp_bytes: Optional[bytes] = None   # raw bytes of current profile photo
     bio: Optional[str] = None           # Telegram bio / about text (Pyrogram only)
+    # Similarity scores computed ahead of time in a batch (see
+    # prescore_snapshots). Only consulted while still valid for the whitelist
+    # and thresholds the check actually runs against.
+    prescored: Optional[PrescoredSimilarity] = field(
+        default=None, repr=False, compare=False,
+    )
+    # The photo's hashes, filled in the first time anything needs them (see
+    # photo_fingerprint) so the pipeline and ban_and_log share one decode. A
+    # Pyrogram caller sets it instead of pfp_bytes, from the photo hash cache
+    # or its own download, and the photo is never decoded here at all.
+    photo: Optional[PhotoFingerprint] = field(
+        default=None, repr=False, compare=False,
+    )
+
+
+@dataclass(frozen=True)
+class PrescoredSimilarity:
+    """
+    Stage 1-3 similarity results for one snapshot, computed in a batch.
+
+    Pinned to the exact inputs they were scored from. If the whitelist index
+    was rebuilt, a threshold changed, or the name/username on the snapshot no
+    longer matches, the checker ignores them and scores the member itself.
+    """
+    index: WhitelistIndex
+    username_threshold: int
+    name_threshold: int
+    username: Optional[str]
+    full_name: str
+    username_result: tuple[bool, Optional[str], int]
+    name_result: tuple[bool, Optional[str], int]
+
+    def applies(self, index: WhitelistIndex, username_threshold: int,
+                name_threshold: int, username: Optional[str], full_name: str) -> bool:
+        return (
+            self.index is index
+            and self.username_threshold == username_threshold
+            and self.name_threshold == name_threshold
+            and self.username == username
+            and self.full_name == full_name
+        )
 
 
 # A phash is 64 bits, so the Hamming distance between two of them runs 0-64.
@@ -88,6 +134,109 @@ class DetectionResult:
     # confidence rather than inside `score`. Useful to a reviewing admin — "how
     # close was it?" — without overloading a field that means something else.
     pfp_distance: Optional[int] = None
+    # Where an unflagged check stopped, for resume_check. Not part of the
+    # verdict, so it is left out of equality and repr.
+    continuation: Optional[CheckContinuation] = field(
+        default=None, repr=False, compare=False,
+    )
+    # False when the check stopped before looking at the profile: a sentinel
+    # account, whitelisted, inside a false-positive window, or no database. The
+    # verdict is unflagged but says nothing about the profile, so a caller must
+    # not record it as screened clean (see the sweep's seen marks).
+    screened: bool = field(default=True, repr=False, compare=False)
+
+
+@dataclass(frozen=True)
+class CheckContinuation:
+    """
+    The state an unflagged check ended in: what it screened and what the
+    photo-dependent tail of the pipeline needs to run again.
+
+    The sweep checks each member without a photo or bio first and fetches them
+    only when needed. Re-running check_user from the top afterwards repeated
+    every DB read and all of the fuzzy scoring, when a bio can only change the
+    keyword stage and a photo only stages 4-5. resume_check picks up from here.
+    """
+    group_id: int
+    versions: tuple[int, int, int]     # see db.get_detection_versions
+    user_id: int
+    username: Optional[str]
+    first_name: str
+    last_name: Optional[str]
+    bio: Optional[str]
+    pfp_digest: Optional[bytes]
+    matcher: Optional[KeywordMatcher]
+    others: WhitelistIndex             # the whitelist minus this user
+    name_is_weak: bool                 # stage 3 matched weakly: photo tiebreak applies
+    group_title: str
+    group_pfp_hash: Optional[str]
+    group_is_weak: bool                # stage 5 matched the title weakly
+    group_strong: bool
+    group_score: int
+    needs_pfp: bool
+
+    def resumable_for(self, snapshot: UserSnapshot) -> bool:
+        """Only the photo and bio may differ; anything else needs a full check."""
+        return (
+            snapshot.user_id == self.user_id
+            and snapshot.username == self.username
+            and snapshot.first_name == self.first_name
+            and snapshot.last_name == self.last_name
+        )
+
+
+class _DetectionCache:
+    """
+    Bounded LRU of detection verdicts, keyed by (group_id, whitelist version,
+    keyword version, group config version, profile fingerprint) — see
+    _check_user_sync. Entries never go stale in place: a change to any input
+    produces a different key, and the orphaned entry ages out of the LRU.
+    Shared by the worker threads check_user runs in, hence the lock.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[tuple, DetectionResult] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[DetectionResult]:
+        with self._lock:
+            result = self._data.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: tuple, result: DetectionResult) -> None:
+        with self._lock:
+            self._data[key] = result
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self._data), "max_entries": self.max_entries}
+
+
+# A verdict plus its key is a few hundred bytes; 50k covers several large
+# groups' full member lists, so tomorrow's sweep still finds today's entries.
+_detection_cache = _DetectionCache(max_entries=50_000)
+
+
+def detection_cache_info() -> dict:
+    """Counters and current size of the detection verdict cache."""
+    return _detection_cache.info()
 
 
 async def check_user(
@@ -104,7 +253,10 @@ async def check_user(
     a group's own admins because their whitelist read failed is not.
     """
     try:
-        # Off the event loop: the body below is six blocking psycopg reads plus
+        # With the async pool on, the reads happen here on the event loop, and
+        # the thread below only scores.
+        await warm_detection_context(group_id, snapshot.user_id)
+        # Off the event loop: the body below is a blocking psycopg round trip plus
         # Pillow decoding and two imagehash passes, with no await anywhere. Run
         # inline it stalled Telegram polling and the MTProto keepalive for every
         # single detection.
@@ -113,7 +265,7 @@ async def check_user(
         logger.warning(
             f"Skipping impersonation check for {snapshot.user_id} in {group_id}: {e}"
         )
-        return DetectionResult(flagged=False)
+        return DetectionResult(flagged=False, screened=False)
 
 
 def _check_user_sync(
@@ -121,16 +273,18 @@ def _check_user_sync(
     group_id: int,
 ) -> DetectionResult:
     if snapshot.user_id in _SKIP_USER_IDS:
-        return DetectionResult(flagged=False)
+        return DetectionResult(flagged=False, screened=False)
 
-    if is_whitelisted(group_id, snapshot.user_id):
-        return DetectionResult(flagged=False)
+    # One round trip at most for all of the reads below; none when warm.
+    ctx = load_detection_context(group_id, snapshot.user_id)
+    if ctx.whitelisted:
+        return DetectionResult(flagged=False, screened=False)
 
     # Skip users within their false-positive grace window
-    if is_false_positive(group_id, snapshot.user_id):
-        return DetectionResult(flagged=False)
+    if ctx.false_positive:
+        return DetectionResult(flagged=False, screened=False)
 
-    group_cfg = get_group(group_id)
+    group_cfg = ctx.group
 
     # Cross-group blocklist: a user confirmed-banned in another managed group.
     # Checked after whitelist/false-positive so trusted users win.
@@ -140,53 +294,90 @@ def _check_user_sync(
     # ACT or merely report. A ban is authoritative when it came from this same
     # group, or from a group the operator listed in BLOCKLIST_TRUSTED_GROUPS.
     # Anything else (including legacy rows with no recorded source) is advisory:
-    # still flagged for a human, but ban_and_log will only alert.
-    if (group_cfg is None) or group_cfg.get("use_global_blocklist", True):
-        bad = get_known_bad_actor(snapshot.user_id)
-        if bad:
-            source_group = bad.get("source_group_id")
-            authoritative = source_group is not None and (
-                source_group == group_id or source_group in BLOCKLIST_TRUSTED_GROUPS
-            )
-            if not authoritative:
-                logger.info(
-                    f"Blocklist hit for {snapshot.user_id} in {group_id} is advisory "
-                    f"(source group {source_group} is not trusted) — alert only."
-                )
-            return DetectionResult(
-                flagged=True, match_type="known_bad_actor",
-                matched_val=bad.get("reason") or "known bad actor",
-                score=100.0,
-                advisory=not authoritative,
+    # still flagged for a human, but ban_and_log will only alert. Groups that
+    # opted out of the global blocklist get no entry from load_detection_context.
+    bad = ctx.bad_actor
+    if bad:
+        source_group = bad.get("source_group_id")
+        authoritative = source_group is not None and (
+            source_group == group_id or source_group in BLOCKLIST_TRUSTED_GROUPS
+        )
+        if not authoritative:
+            logger.info(
+                f"Blocklist hit for {snapshot.user_id} in {group_id} is advisory "
+                f"(source group {source_group} is not trusted) — alert only."
             )
+        return DetectionResult(
+            flagged=True, match_type="known_bad_actor",
+            matched_val=bad.get("reason") or "known bad actor",
+            score=100.0,
+            advisory=not authoritative,
+        )
 
-    # Per-match-type thresholds. Each falls back: per-type override →
-    # legacy general similarity_threshold → global config default.
-    general_threshold = group_cfg.get("similarity_threshold") if group_cfg else None
-    username_threshold = (
-        (group_cfg.get("username_threshold") if group_cfg else None)
-        or general_threshold or USERNAME_SIMILARITY_THRESHOLD
-    )
-    name_threshold = (
-        (group_cfg.get("name_threshold") if group_cfg else None)
-        or general_threshold or NAME_SIMILARITY_THRESHOLD
-    )
+    index, matcher, versions = _detection_state(group_id, group_cfg, ctx.whitelist,
+                                                ctx.keywords)
+
+    # From here on the verdict is a pure function of the profile and of the
+    # group's whitelist, keywords and config — so an unchanged profile checked
+    # again (one profile event per watched group, tomorrow's sweep) is one
+    # lookup. Anything that moves a version retires the entry. The checks above
+    # stay uncached: they are cheap lookups, and a false-positive mark or a
+    # blocklist entry must apply immediately.
+    key = (group_id, *versions, _profile_fingerprint(snapshot))
+    cached = _detection_cache.get(key)
+    if cached is not None:
+        return dataclasses.replace(cached)
+    result = _detect(snapshot, group_id, versions, group_cfg, index, matcher)
+    _detection_cache.put(key, result)
+    return dataclasses.replace(result)
+
+
+def _detection_state(
+    group_id: int, group_cfg: dict | None, whitelist: list[dict], keywords: list[dict],
+) -> tuple[WhitelistIndex, KeywordMatcher, tuple[int, int, int]]:
+    """
+    The whitelist index and keyword matcher for these rows, and the versions
+    to key a verdict computed from them on — the versions they were built
+    under, not whatever another thread has rebuilt since. The matcher is built
+    for an empty list too (it is falsy then): removing the last keyword has to
+    move the keyword version like any other change.
+    """
+    index, whitelist_version = get_whitelist_index(group_id, whitelist)
+    matcher, keyword_version = get_keyword_matcher(group_id, keywords)
+    versions = get_detection_versions(group_id, group_cfg, whitelist_version, keyword_version)
+    return index, matcher, versions
 
-    whitelist = get_whitelist(group_id)
-    full_name = f"{snapshot.first_name} {snapshot.last_name or ''}".strip()
+
+def _detect(
+    snapshot: UserSnapshot,
+    group_id: int,
+    versions: tuple[int, int, int],
+    group_cfg: Optional[dict],
+    index: WhitelistIndex,
+    matcher: Optional[KeywordMatcher],
+) -> DetectionResult:
+    """
+    Stages 0-5 of the pipeline, for a user already past the skip checks. An
+    unflagged result carries a CheckContinuation for resume_check.
+    """
+    username_threshold, name_threshold = _similarity_thresholds(group_cfg)
+    full_name = _full_name(snapshot)
 
     # 0 — Reserved keyword / regex check (fastest — pure string ops, no fuzzy scoring)
-    keywords = get_reserved_keywords(group_id)
-    if keywords:
-        matched_kw = check_reserved_keywords(full_name, snapshot.username, snapshot.bio, keywords)
+    if matcher:
+        matched_kw = check_reserved_keywords(
+            full_name, snapshot.username, snapshot.bio, matcher,
+        )
         if matched_kw:
             return DetectionResult(
                 flagged=True, match_type="keyword",
                 matched_val=matched_kw, score=100.0,
             )
 
-    # Exclude the user's own whitelist entry so they can never match themselves
-    others = [w for w in whitelist if w["user_id"] != snapshot.user_id]
+    # Exclude the user's own whitelist entry so they can never match themselves.
+    # The index carries the pre-folded names, normalized handles and parsed
+    # hashes, built once per whitelist rather than once per suspect.
+    others = index.without(snapshot.user_id)
 
     # Stages 1-4 compare against the whitelist, so they need entries to compare
     # against — but they must NOT gate stage 5. Group identity is a property of
@@ -194,26 +385,35 @@ def _check_user_sync(
     # whose only entry is this very user) still needs protecting from people
     # taking its name and logo. This used to `return` here, so /import_admins not
     # having been run meant no group-impersonation protection at all.
-    usernames  = [w["username"] for w in others if w["username"]]
-    names      = [f"{w['first_name']} {w['last_name'] or ''}".strip() for w in others]
-    pfp_hashes = [w["pfp_hash"] for w in others if w["pfp_hash"]]
-
-    # Set when a stage wanted a profile photo and the snapshot had none. Carried
-    # to the END rather than returned immediately: returning aborted the pipeline
-    # before stage 5, so a user with no avatar skipped the group-identity check
-    # entirely — and only sweep.py honours the signal and re-runs, so for the
-    # join/message/profile-change paths the check was simply lost.
-    needs_pfp = False
+    prescored = snapshot.prescored
+    if prescored is not None and not prescored.applies(
+        others, username_threshold, name_threshold, snapshot.username, full_name
+    ):
+        prescored = None
+
+    # A long whitelist is first narrowed in Postgres to the entries that could
+    # plausibly match (db.whitelist_candidates); None means score them all.
+    # Stages 1-3 only: the photo stages still see every entry.
+    scored = others
+    if prescored is None:
+        shortlist = whitelist_candidates(group_id, others.rows, full_name, snapshot.username)
+        if shortlist is not None:
+            scored = others.only(shortlist)
+    usernames  = scored.usernames
+    names      = scored.names
+
+    is_weak = False
 
     if others:
 
         # 1 — Username similarity (username vs whitelist usernames only)
         if snapshot.username and usernames:
-            match, matched_val, score = check_username_similarity(
-                snapshot.username, usernames, username_threshold
+            match, matched_val, score = (
+                prescored.username_result if prescored else
+                check_username_similarity(snapshot.username, usernames, username_threshold)
             )
             if match:
-                target = _find_by_username(others, matched_val)
+                target = scored.find_by_username(matched_val)
                 return DetectionResult(
                     flagged=True, match_type="username", matched_val=matched_val,
                     score=score, **_target_fields(target)
@@ -224,92 +424,282 @@ def _check_user_sync(
         # returned on a match — so it could never fire. check_username_similarity
         # folds lookalike characters internally; homoglyph handles are caught above.)
 
+        # Stages 2 and 3 score the same name against the same list, so score
+        # it once.
+        name_result = (
+            prescored.name_result if prescored else
+            check_name_similarity(full_name, names, name_threshold)
+        )
+
         # 2 — Homoglyph name: only flag if it also fuzzy-matches a whitelisted display name
         if check_homoglyph_danger(full_name):
-            match, matched_val, score = check_name_similarity(full_name, names, name_threshold)
+            match, matched_val, score = name_result
             if match and not (len(full_name.split()) <= 1 or len(matched_val.split()) <= 1):
-                target = _find_by_name(others, matched_val)
+                target = scored.find_by_name(matched_val)
                 return DetectionResult(
                     flagged=True, match_type="homoglyph_name",
                     matched_val=matched_val, score=score, **_target_fields(target)
                 )
 
         # 3 — Display name similarity (name vs whitelist names only)
-        match, matched_val, score = check_name_similarity(full_name, names, name_threshold)
+        match, matched_val, score = name_result
         is_weak = match and (len(full_name.split()) <= 1 or len(matched_val.split()) <= 1)
 
         if match and not is_weak:
-            target = _find_by_name(others, matched_val)
+            target = scored.find_by_name(matched_val)
             return DetectionResult(
                 flagged=True, match_type="name", matched_val=matched_val,
                 score=score, **_target_fields(target)
             )
 
-        # 4 — PFP hash (tiebreaker for weak name matches only)
-        # A standalone photo match without any name/username similarity is too noisy.
-        if is_weak and pfp_hashes:
-            if not snapshot.pfp_bytes:
-                # Note that a photo would settle this, but do NOT return —
-                # stage 5 needs no photo and must still get to run.
-                needs_pfp = True
-            else:
-                target_hashes = compute_pfp_hash_variants_bytes(snapshot.pfp_bytes)
-                if target_hashes:
-                    pfp_match, pfp_matched_val, pfp_dist = check_pfp_similarity(
-                        target_hashes, pfp_hashes, PFP_HASH_THRESHOLD
-                    )
-                    if pfp_match:
-                        target = _find_by_pfp(others, pfp_matched_val)
-                        return DetectionResult(
-                            flagged=True, match_type="pfp",
-                            matched_val=pfp_matched_val,
-                            score=pfp_confidence(pfp_dist),
-                            pfp_distance=int(pfp_dist),
-                            **_target_fields(target)
-                        )
+    # 5 (name half) — Group identity: catch users impersonating the group itself
+    # by name. Computed here but applied after stage 4, as before: a photo match
+    # to a whitelisted user still outranks a strong match to the group title.
+    group_title    = (group_cfg.get("title") or "") if group_cfg else ""
+    group_pfp_hash = group_cfg.get("pfp_hash") if group_cfg else None
+    g_match = g_is_weak = False
+    g_score = 0
+    if group_title:
+        g_match, _, g_score = check_name_similarity(full_name, [group_title], name_threshold)
+        g_is_weak = g_match and (
+            len(full_name.split()) <= 1 or len(group_title.split()) <= 1
+        )
+
+    state = CheckContinuation(
+        group_id=group_id, versions=versions, user_id=snapshot.user_id,
+        username=snapshot.username, first_name=snapshot.first_name,
+        last_name=snapshot.last_name, bio=snapshot.bio,
+        pfp_digest=_pfp_digest(snapshot), matcher=matcher,
+        others=others, name_is_weak=bool(is_weak), group_title=group_title,
+        group_pfp_hash=group_pfp_hash, group_is_weak=bool(g_is_weak),
+        group_strong=bool(g_match and not g_is_weak), group_score=g_score,
+        needs_pfp=False,
+    )
+    return _photo_stages(state, snapshot)
+
+
+def _photo_stages(state: CheckContinuation, snapshot: UserSnapshot) -> DetectionResult:
+    """
+    Stage 4, the strong half of stage 5, and the photo half of stage 5 — the
+    tail of the pipeline, and the only part a profile photo can change.
+    """
+    others = state.others
+    has_photo = state.pfp_digest is not None
+
+    def hashes():
+        return photo_fingerprint(snapshot).hashes
+
+    # Set when a stage wanted a profile photo and the snapshot had none. Carried
+    # to the END rather than returned immediately: returning aborted the pipeline
+    # before stage 5, so a user with no avatar skipped the group-identity check
+    # entirely — and only sweep.py honours the signal and re-runs, so for the
+    # join/message/profile-change paths the check was simply lost.
+    needs_pfp = False
+
+    # 4 — PFP hash (tiebreaker for weak name matches only)
+    # A standalone photo match without any name/username similarity is too noisy.
+    if state.name_is_weak and others.pfp_hashes:
+        if not has_photo:
+            # Note that a photo would settle this, but do NOT return —
+            # stage 5 needs no photo and must still get to run.
+            needs_pfp = True
+        elif hashes():
+            pfp_match, pfp_matched_val, pfp_dist = check_pfp_similarity(
+                hashes(), others.pfp_hashes, PFP_HASH_THRESHOLD
+            )
+            if pfp_match:
+                target = others.find_by_pfp(pfp_matched_val)
+                return DetectionResult(
+                    flagged=True, match_type="pfp",
+                    matched_val=pfp_matched_val,
+                    score=pfp_confidence(pfp_dist),
+                    pfp_distance=int(pfp_dist),
+                    **_target_fields(target)
+                )
 
     # 5 — Group identity: catch users impersonating the group itself.
     #     Checks user name similarity to the group title, and (for weak matches)
     #     user PFP similarity to the group's stored logo hash.
-    if group_cfg:
-        group_title    = group_cfg.get("title") or ""
-        group_pfp_hash = group_cfg.get("pfp_hash")
-
-        if group_title:
-            g_match, g_matched, g_score = check_name_similarity(full_name, [group_title], name_threshold)
-            g_is_weak = g_match and (
-                len(full_name.split()) <= 1 or len(group_title.split()) <= 1
-            )
+    if state.group_strong:
+        # Strong name match to the group itself (multi-word, above threshold)
+        return DetectionResult(
+            flagged=True, match_type="group_name",
+            matched_val=state.group_title, score=state.group_score,
+            target_name=f"[Group] {state.group_title}",
+        )
 
-            if g_match and not g_is_weak:
-                # Strong name match to the group itself (multi-word, above threshold)
+    # Weak group-name match: use the group logo as tiebreaker
+    if state.group_is_weak and state.group_pfp_hash:
+        if not has_photo:
+            needs_pfp = True
+        elif hashes():
+            g_pfp_match, _, g_pfp_dist = check_pfp_similarity(
+                hashes(), [state.group_pfp_hash], PFP_HASH_THRESHOLD
+            )
+            if g_pfp_match:
                 return DetectionResult(
-                    flagged=True, match_type="group_name",
-                    matched_val=group_title, score=g_score,
-                    target_name=f"[Group] {group_title}",
+                    flagged=True, match_type="group_pfp",
+                    matched_val=state.group_title,
+                    score=pfp_confidence(g_pfp_dist),
+                    pfp_distance=int(g_pfp_dist),
+                    target_name=f"[Group] {state.group_title}",
                 )
 
-            # Weak group-name match: use the group logo as tiebreaker
-            if g_is_weak and group_pfp_hash:
-                if not snapshot.pfp_bytes:
-                    needs_pfp = True
-                    g_user_hashes = []
-                else:
-                    g_user_hashes = compute_pfp_hash_variants_bytes(snapshot.pfp_bytes)
-                if g_user_hashes:
-                    g_pfp_match, _, g_pfp_dist = check_pfp_similarity(
-                        g_user_hashes, [group_pfp_hash], PFP_HASH_THRESHOLD
-                    )
-                    if g_pfp_match:
-                        return DetectionResult(
-                            flagged=True, match_type="group_pfp",
-                            matched_val=group_title,
-                            score=pfp_confidence(g_pfp_dist),
-                            pfp_distance=int(g_pfp_dist),
-                            target_name=f"[Group] {group_title}",
-                        )
-
-    return DetectionResult(flagged=False, needs_pfp=needs_pfp)
+    return DetectionResult(
+        flagged=False, needs_pfp=needs_pfp,
+        continuation=dataclasses.replace(state, needs_pfp=needs_pfp),
+    )
+
+
+async def resume_check(result: DetectionResult, snapshot: UserSnapshot) -> DetectionResult:
+    """
+    Re-screen `snapshot` after the caller fetched its photo and/or bio, given
+    the unflagged `result` of checking it without them.
+
+    Only the stages the new data can affect are run: a bio needs just the
+    keyword stage, against the bio alone; a photo resumes at the stage 4
+    tiebreak. Everything else carried over from `result` — the skip checks,
+    the name and username scoring — so the verdict matches a full re-run of
+    check_user on the completed snapshot. Results without a continuation
+    (flagged ones, or one whose name or username has since changed) get the
+    full check instead, as does one whose group state moved in the meantime:
+    a sweep may resume minutes after the first pass.
+    """
+    state = result.continuation
+    if state is None:
+        # Flagged, or stopped before the profile mattered (whitelisted, in a
+        # false-positive window, unreachable DB): a photo or bio changes nothing.
+        return result
+    if not state.resumable_for(snapshot):
+        return await check_user(snapshot, state.group_id)
+    try:
+        await warm_detection_context(state.group_id, snapshot.user_id)
+        return await run_db(_resume_sync, state, snapshot)
+    except DatabaseUnavailable as e:
+        logger.warning(
+            f"Skipping impersonation check for {snapshot.user_id} in {state.group_id}: {e}"
+        )
+        return DetectionResult(flagged=False, screened=False)
+
+
+def _resume_sync(state: CheckContinuation, snapshot: UserSnapshot) -> DetectionResult:
+    # The skip checks and the versions were settled when the first pass ran.
+    # Re-read them (cached lookups, as in check_user): a whitelisting, a
+    # false-positive mark, a blocklist entry or a config or keyword change since
+    # then means the carried-over stages no longer stand.
+    ctx = load_detection_context(state.group_id, snapshot.user_id)
+    if not (ctx.whitelisted or ctx.false_positive or ctx.bad_actor):
+        _, _, versions = _detection_state(state.group_id, ctx.group, ctx.whitelist,
+                                          ctx.keywords)
+        if versions == state.versions:
+            return _resume_stages(state, snapshot)
+    return _check_user_sync(snapshot, state.group_id)
+
+
+def _resume_stages(state: CheckContinuation, snapshot: UserSnapshot) -> DetectionResult:
+    key = (state.group_id, *state.versions, _profile_fingerprint(snapshot))
+    cached = _detection_cache.get(key)
+    if cached is not None:
+        return dataclasses.replace(cached)
+
+    result = None
+    # 0 — keywords, bio only. The name and username already passed this stage,
+    # so the first keyword that hits the bio is also the first to hit any of
+    # the three: the pattern a full re-run would report.
+    if snapshot.bio and snapshot.bio != state.bio and state.matcher:
+        matched_kw = check_reserved_keywords("", None, snapshot.bio, state.matcher)
+        if matched_kw:
+            result = DetectionResult(
+                flagged=True, match_type="keyword",
+                matched_val=matched_kw, score=100.0,
+            )
+    if result is None:
+        state = dataclasses.replace(state, bio=snapshot.bio)
+        digest = _pfp_digest(snapshot)
+        if digest != state.pfp_digest:
+            result = _photo_stages(dataclasses.replace(state, pfp_digest=digest),
+                                   snapshot)
+        else:
+            # The photo is the one already screened, so stages 4-5 stand.
+            result = DetectionResult(flagged=False, needs_pfp=state.needs_pfp,
+                                     continuation=state)
+    _detection_cache.put(key, result)
+    return dataclasses.replace(result)
+
+
+def prescore_snapshots(snapshots: list[UserSnapshot], group_id: int) -> None:
+    """
+    Batch-score the username and name stages for many snapshots at once and
+    attach the results (snapshot.prescored), so each later check_user call
+    skips its own fuzzy matching. Blocking: call through run_db.
+
+    For the sweep, which holds a page of members at a time. The verdicts are
+    the same as unbatched scoring; this only moves the N x M comparison into
+    one rapidfuzz matrix per stage. Best-effort: if the group's state can't be
+    read, nothing is attached and check_user does its usual fail-closed work.
+    """
+    try:
+        username_threshold, name_threshold = _similarity_thresholds(get_group(group_id))
+        whitelist = get_whitelist(group_id)
+    except DatabaseUnavailable:
+        return
+    index, _ = get_whitelist_index(group_id, whitelist)
+    # Whitelisted members return before stage 1, and scoring them against an
+    # index that still contains themselves would be wrong anyway.
+    batch = [s for s in snapshots if s.user_id not in index.user_ids]
+    if not batch or not index:
+        return
+
+    full_names = [_full_name(s) for s in batch]
+    username_results = batch_check_username_similarity(
+        [s.username for s in batch], index.usernames, username_threshold
+    )
+    name_results = batch_check_name_similarity(full_names, index.names, name_threshold)
+    for snap, full_name, u_res, n_res in zip(
+        batch, full_names, username_results, name_results, strict=True
+    ):
+        snap.prescored = PrescoredSimilarity(
+            index=index,
+            username_threshold=username_threshold,
+            name_threshold=name_threshold,
+            username=snap.username,
+            full_name=full_name,
+            username_result=u_res,
+            name_result=n_res,
+        )
+
+
+def detection_versions(group_id: int) -> tuple[int, int, int]:
+    """
+    The (whitelist, keywords, config) versions check_user would key this
+    group's verdicts by now. While they are unchanged, a verdict reached under
+    them still stands unless the member's own profile changed. Blocking;
+    raises DatabaseUnavailable if the group's state can't be read.
+    """
+    group_cfg = get_group(group_id)
+    return _detection_state(group_id, group_cfg, get_whitelist(group_id),
+                            get_reserved_keywords(group_id))[2]
+
+
+# Bump when a change to the detection stages means verdicts reached before it
+# no longer stand: every stored sweep fingerprint then stops matching, and the
+# next sweep of each group screens everyone.
+_DETECTION_REVISION = 1
+
+
+def detection_digest(group_id: int) -> int:
+    """
+    A persistable stand-in for detection_versions: a hash of the group's config,
+    whitelist and keywords, the deployment's thresholds and
+    _DETECTION_REVISION. Equal digests mean a clean verdict reached under one
+    still stands under the other, unless the member's own profile changed.
+    Blocking; raises DatabaseUnavailable if the group's state can't be read.
+    """
+    return get_detection_digest(
+        get_group(group_id), get_whitelist(group_id), get_reserved_keywords(group_id),
+        _DETECTION_REVISION, NAME_SIMILARITY_THRESHOLD, USERNAME_SIMILARITY_THRESHOLD,
+        PFP_HASH_THRESHOLD, DEFAULT_BAN_SCORE, DEFAULT_ALERT_SCORE,
+    )
 
 
 async def ban_and_log(
@@ -395,7 +785,8 @@ async def ban_and_log(
 
     # Detection-time snapshot: freeze the impersonator's bio + own PFP hash so
     # the record stays accurate even after the scammer changes their profile.
-    user_pfp_hash = compute_pfp_hash_bytes(snapshot.pfp_bytes) if snapshot.pfp_bytes else None
+    photo_hashes = photo_fingerprint(snapshot).hashes
+    user_pfp_hash = photo_hashes[0] if photo_hashes else None
 
     await run_db(
         insert_log,
@@ -466,6 +857,13 @@ async def ban_and_log(
             if result.pfp_distance is not None else ""
         )
 
+        # The same avatar elsewhere in the deployment — another group's
+        # protected user, or a known bad actor — is worth a reviewer's notice
+        # whatever fired this detection.
+        reuse_line = _photo_reuse_line(
+            find_reused_photo(photo_hashes, group_id, snapshot.user_id) if photo_hashes else []
+        )
+
         log_msg = (
             f"🚨 <b>Impersonation Detected</b>\n\n"
             f"<b>Group ID:</b> <code>{group_id}</code>\n"
@@ -474,6 +872,7 @@ async def ban_and_log(
             f"<b>Method:</b> {result.match_type}\n"
             f"{match_line}"
             f"<b>Score:</b> <code>{result.score}</code>{score_detail}\n"
+            f"{reuse_line}"
             f"<b>Trigger:</b> {trigger}\n"
             f"<b>Invite link:</b> {invite_link or 'N/A'}\n"
             f"<b>Action:</b> {action}"
@@ -533,6 +932,26 @@ async def ban_and_log(
             logger.error(f"Failed to send log channel notification: {e}")
 
 
+def _photo_reuse_line(matches: list) -> str:
+    """One alert line summarising find_reused_photo's matches, or ""."""
+    protected_groups = {m.ref.group_id for m in matches if m.ref.kind == "whitelist"}
+    bad_actors = {m.ref.user_id for m in matches if m.ref.kind == "bad_actor"}
+    parts = []
+    if protected_groups:
+        n = len(protected_groups)
+        parts.append(f"protected user in {n} other group{'s' if n != 1 else ''}")
+    if bad_actors:
+        n = len(bad_actors)
+        parts.append(f"{n} known bad actor{'s' if n != 1 else ''}")
+    if not parts:
+        return ""
+    closest = min(m.distance for m in matches)
+    return (
+        f"<b>Photo also seen:</b> {'; '.join(parts)} "
+        f"<i>(closest distance {closest}/{_PHASH_BITS})</i>\n"
+    )
+
+
 def resolve_log_channel(group_id: int, fallback: str | int | None) -> str | int | None:
     """
     The group's own log channel if it has one, else the global fallback.
@@ -583,6 +1002,63 @@ def make_action_funcs(bot, log_channel_id):
 
 # ── Private helpers ────────────────────────────────────────────────────────────
 
+def _full_name(snapshot: UserSnapshot) -> str:
+    return f"{snapshot.first_name} {snapshot.last_name or ''}".strip()
+
+
+def photo_fingerprint(snapshot: UserSnapshot) -> PhotoFingerprint:
+    """
+    The snapshot's photo hashes, decoding its pfp_bytes at most once.
+
+    Cached on the snapshot against the bytes OBJECT it was computed from, so a
+    dataclasses.replace(snapshot, pfp_bytes=...) — which copies the field —
+    never serves the old photo's hashes for the new one.
+    """
+    fp = snapshot.photo
+    if fp is None or fp.source is not snapshot.pfp_bytes:
+        fp = PhotoFingerprint.from_bytes(snapshot.pfp_bytes)
+        snapshot.photo = fp
+    return fp
+
+
+def _pfp_digest(snapshot: UserSnapshot) -> Optional[bytes]:
+    """
+    The snapshot's photo reduced to a digest of its bytes — cheap next to
+    decoding and hashing it, and the bytes themselves should not be held by a
+    long-lived cache — or of its file_unique_id when it came without bytes.
+    None means no photo.
+    """
+    if snapshot.pfp_bytes:
+        return hashlib.blake2b(snapshot.pfp_bytes, digest_size=16).digest()
+    fp = snapshot.photo
+    if fp is not None and fp.source is None and fp.unique_id:
+        return hashlib.blake2b(fp.unique_id.encode(), digest_size=16).digest()
+    return None
+
+
+def _profile_fingerprint(snapshot: UserSnapshot) -> tuple:
+    """Everything about the user that the detection stages read."""
+    return (snapshot.user_id, snapshot.username, snapshot.first_name,
+            snapshot.last_name, snapshot.bio, _pfp_digest(snapshot))
+
+
+def _similarity_thresholds(group_cfg: Optional[dict]) -> tuple[int, int]:
+    """
+    (username_threshold, name_threshold) for a group. Each falls back:
+    per-type override → legacy general similarity_threshold → global default.
+    """
+    general_threshold = group_cfg.get("similarity_threshold") if group_cfg else None
+    username_threshold = (
+        (group_cfg.get("username_threshold") if group_cfg else None)
+        or general_threshold or USERNAME_SIMILARITY_THRESHOLD
+    )
+    name_threshold = (
+        (group_cfg.get("name_threshold") if group_cfg else None)
+        or general_threshold or NAME_SIMILARITY_THRESHOLD
+    )
+    return username_threshold, name_threshold
+
+
 def _target_fields(row: Optional[dict]) -> dict:
     if not row:
         return {"target_user_id": None, "target_name": None, "target_username": None}
@@ -592,19 +1068,3 @@ def _target_fields(row: Optional[dict]) -> dict:
         "target_name":      name,
         "target_username":  row.get("username"),
     }
-
-
-def _find_by_username(whitelist: list[dict], username: str) -> Optional[dict]:
-    u = username.lower()
-    return next((w for w in whitelist if w["username"] and w["username"].lower() == u), None)
-
-
-def _find_by_name(whitelist: list[dict], name: str) -> Optional[dict]:
-    return next(
-        (w for w in whitelist if f"{w['first_name']} {w['last_name'] or ''}".strip() == name),
-        None
-    )
-
-
-def _find_by_pfp(whitelist: list[dict], pfp_hash: str) -> Optional[dict]:
-    return next((w for w in whitelist if w["pfp_hash"] == pfp_hash), None)
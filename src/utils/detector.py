@@ -2,9 +2,13 @@
 import logging
 import math
 import re
+import threading
 import time
 import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
 from functools import lru_cache
+import numpy as np
 from rapidfuzz import fuzz, process
 from typing import List, Tuple, Optional
 from confusable_homoglyphs import confusables
@@ -111,6 +115,78 @@ def _build_confusable_map() -> dict[int, str]:
 _CONFUSABLE_MAP = _build_confusable_map()
 
 
+# The only ASCII code point the confusable map touches ("|" reads as "l").
+# Pure-ASCII input needs nothing else from fold_text: NFKD/NFKC are identities
+# on it, it has no combining marks or format characters, and casefold is lower.
+_ASCII_CONFUSABLE_MAP = {k: v for k, v in _CONFUSABLE_MAP.items() if k < 128}
+
+
+class _FoldCache:
+    """
+    Bounded LRU of fold_text results for non-ASCII input, with hit/miss
+    counters.
+
+    Bounded twice over: by entry count and by the total characters held (keys
+    plus values), so a burst of long bios cannot grow it past a known size.
+    Subjects longer than _FOLD_CACHE_MAX_KEY are folded but never stored — a
+    one-off message body would only evict names that recur. Shared by the
+    worker threads check_user runs in, hence the lock.
+    """
+
+    def __init__(self, max_entries: int, max_chars: int):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.hits = 0
+        self.misses = 0
+        self._chars = 0
+        self._data: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        size = len(key) + len(value)
+        if len(key) > _FOLD_CACHE_MAX_KEY or size > self.max_chars:
+            return
+        with self._lock:
+            if key in self._data:
+                return
+            self._data[key] = value
+            self._chars += size
+            while len(self._data) > self.max_entries or self._chars > self.max_chars:
+                old_key, old_value = self._data.popitem(last=False)
+                self._chars -= len(old_key) + len(old_value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._chars = 0
+            self.hits = self.misses = 0
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self._data), "chars": self._chars,
+                    "max_entries": self.max_entries, "max_chars": self.max_chars}
+
+
+_FOLD_CACHE_MAX_KEY = 256
+_fold_cache = _FoldCache(max_entries=8192, max_chars=1_000_000)
+
+
+def fold_cache_info() -> dict:
+    """Counters and current size of the fold_text cache, for diagnostics."""
+    return _fold_cache.info()
+
+
 def fold_text(s: str) -> str:
     """
     Aggressively normalize a string for comparison:
@@ -137,9 +213,23 @@ def fold_text(s: str) -> str:
     needed both cases of every entry, and it had the lowercase Cyrillic forms
     without their capitals — so "Ѕmith" (U+0405) folded to "ѕmith" and matched
     nothing.
+
+    Pure-ASCII input — most Telegram names — takes a fast path that skips the
+    Unicode passes entirely. Everything else is memoized in _fold_cache.
     """
     if not s:
         return ""
+    if s.isascii():
+        return " ".join(s.lower().translate(_ASCII_CONFUSABLE_MAP).split())
+    folded = _fold_cache.get(s)
+    if folded is None:
+        folded = _fold_unicode(s)
+        _fold_cache.put(s, folded)
+    return folded
+
+
+def _fold_unicode(s: str) -> str:
+    """The full fold_text pipeline, uncached."""
     s = unicodedata.normalize("NFKD", s)
     s = "".join(
         ch for ch in s
@@ -212,40 +302,97 @@ def _normalize_handle(s: str) -> str:
     return re.sub(r"[\s._\-]+", "", s)
 
 
+@dataclass(frozen=True)
+class UsernameCandidates:
+    """
+    Whitelist usernames with their comparison forms computed once.
+
+    check_username_similarity used to lowercase and _normalize_handle every
+    stored handle on every call — per suspect, per group, per sweep member —
+    when those forms only change when the whitelist does. Build one of these
+    per whitelist (see src.utils.whitelist_index) and pass it in place of the
+    raw list.
+    """
+    original: tuple[str, ...]
+    lower: tuple[str, ...]
+    norm: tuple[str, ...]
+
+    @classmethod
+    def build(cls, usernames: List[str]) -> "UsernameCandidates":
+        usernames = tuple(usernames)
+        return cls(
+            original=usernames,
+            lower=tuple(u.lower() for u in usernames),
+            norm=tuple(_normalize_handle(u) for u in usernames),
+        )
+
+    def __len__(self) -> int:
+        return len(self.original)
+
+
 def check_username_similarity(
-    target: str, stored: List[str], threshold: int
+    target: str, stored: List[str] | UsernameCandidates, threshold: int
 ) -> Tuple[bool, Optional[str], int]:
     if not target or not stored:
         return False, None, 0
+    if not isinstance(stored, UsernameCandidates):
+        stored = UsernameCandidates.build(stored)
 
     # Telegram usernames are case-insensitive
     target_lower = target.lower()
-    stored_lower = [u.lower() for u in stored]
 
     # Pass 1 — raw lowercase fuzzy match
     best_val: Optional[str] = None
     best_score = 0
-    raw = process.extractOne(target_lower, stored_lower, scorer=fuzz.ratio)
+    raw = process.extractOne(target_lower, stored.lower, scorer=fuzz.ratio)
     if raw:
-        best_val = stored[stored_lower.index(raw[0])]
+        best_val = stored.original[raw[2]]
         best_score = int(raw[1])
 
     # Pass 2 — separator-stripped + leetspeak-folded fuzzy match. Catches
     # j0hn_smith vs johnsmith that the raw pass scores too low.
     target_norm = _normalize_handle(target)
-    stored_norm = [_normalize_handle(u) for u in stored]
-    norm = process.extractOne(target_norm, stored_norm, scorer=fuzz.ratio)
+    norm = process.extractOne(target_norm, stored.norm, scorer=fuzz.ratio)
     if norm and int(norm[1]) > best_score:
         best_score = int(norm[1])
-        best_val = stored[stored_norm.index(norm[0])]
+        best_val = stored.original[norm[2]]
 
     if best_val is not None and best_score >= threshold:
         return True, best_val, best_score
     return False, None, 0
 
 
+@dataclass(frozen=True)
+class NameCandidates:
+    """
+    Whitelist display names with their fold_text / leet skeletons precomputed.
+
+    The folds are the expensive part of check_name_similarity — NFKD, a
+    per-character category filter, NFKC and the confusable table for every
+    stored name — and they depend only on the whitelist. Computing them per
+    suspect made a 2,000-member sweep against a 300-entry list run several
+    hundred thousand identical folds.
+    """
+    original: tuple[str, ...]
+    folded: tuple[str, ...]
+    leet: tuple[str, ...]
+
+    @classmethod
+    def build(cls, names: List[str]) -> "NameCandidates":
+        names = tuple(names)
+        folded = tuple(fold_text(n) for n in names)
+        return cls(
+            original=names,
+            folded=folded,
+            leet=tuple(_leet_fold(f) for f in folded),
+        )
+
+    def __len__(self) -> int:
+        return len(self.original)
+
+
 def check_name_similarity(
-    target: str, stored: List[str], threshold: int
+    target: str, stored: List[str] | NameCandidates, threshold: int
 ) -> Tuple[bool, Optional[str], int]:
     """
     Fuzzy-match a display name against stored whitelist names.
@@ -268,22 +415,26 @@ def check_name_similarity(
     Leet folding is a substitution rather than a deletion, so unlike separator
     tolerance it creates no new adjacencies and cannot make two unrelated names
     look alike — it only ever undoes a digit-for-letter swap.
+
+    `stored` may be a plain list or a prebuilt NameCandidates; the verdict is
+    the same either way, the latter just skips re-folding the whitelist.
     """
     if not target or not stored:
         return False, None, 0
+    if not isinstance(stored, NameCandidates):
+        stored = NameCandidates.build(stored)
 
     t_fold = fold_text(target)
     t_leet = _leet_fold(t_fold)
     best_val: Optional[str] = None
     best_score = 0
-    for original in stored:
-        o_fold = fold_text(original)
+    for original, o_fold, o_leet in zip(stored.original, stored.folded, stored.leet, strict=True):
         raw = fuzz.token_sort_ratio(target, original)
         fold = _name_score(t_fold, o_fold) if t_fold else 0
         # Only worth computing when leet folding actually changed something.
         leet = (
-            _name_score(t_leet, _leet_fold(o_fold))
-            if t_leet != t_fold or o_fold != _leet_fold(o_fold)
+            _name_score(t_leet, o_leet)
+            if t_leet != t_fold or o_fold != o_leet
             else 0
         )
         score = max(raw, fold, leet)
@@ -296,6 +447,169 @@ def check_name_similarity(
     return False, None, 0
 
 
+def name_skeleton(name: str) -> str:
+    """
+    The fold_text + leetspeak form of a display name that check_name_similarity
+    scores in its third pass. db.py stores it per whitelist entry so Postgres
+    can shortlist likely matches by trigram before any name is scored.
+    """
+    return _leet_fold(fold_text(name)) if name else ""
+
+
+def handle_skeleton(username: Optional[str]) -> str:
+    """The normalized handle check_username_similarity scores in its second pass."""
+    return _normalize_handle(username) if username else ""
+
+
+# ── Batched scoring (sweep-sized member batches) ─────────────────────────────
+#
+# The per-suspect functions above score one member at a time. A sweep already
+# holds hundreds of members per enumeration page, so scoring the whole page
+# against the whitelist as one matrix moves the N x M loop into rapidfuzz's C++
+# (process.cdist, fanned out across cores with workers=-1).
+#
+# Verdicts are IDENTICAL to the per-suspect path, including its tie-breaking,
+# so a member scored in a batch and the same member scored alone can never
+# disagree. The tests compare the two exhaustively.
+
+_NO_MATCH = (False, None, 0)
+
+
+def _score_matrix(queries, choices, scorer) -> np.ndarray:
+    # float64, not cdist's float32 default: the per-suspect path truncates
+    # scores with int(), and float32 rounding can move a score like 85.99999
+    # across that boundary.
+    return process.cdist(
+        queries, choices, scorer=scorer, dtype=np.float64, workers=-1,
+    )
+
+
+def _token_incidence(left: list[str], right: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """0/1 token-membership matrices over a shared vocabulary (split on whitespace)."""
+    vocab: dict[str, int] = {}
+    left_ids = [[vocab.setdefault(t, len(vocab)) for t in set(x.split())] for x in left]
+    right_ids = [[vocab.setdefault(t, len(vocab)) for t in set(x.split())] for x in right]
+    a = np.zeros((len(left), len(vocab)), dtype=np.int32)
+    b = np.zeros((len(right), len(vocab)), dtype=np.int32)
+    for row, ids in enumerate(left_ids):
+        a[row, ids] = 1
+    for row, ids in enumerate(right_ids):
+        b[row, ids] = 1
+    return a, b
+
+
+def _name_score_matrix(left: list[str], right: list[str]) -> np.ndarray:
+    """
+    _name_score for every (left, right) pair at once.
+
+    token_sort and token_set come from cdist; the superset-token penalty is a
+    vectorized post-pass. Strict-subset detection uses token incidence
+    matrices: |A ∩ B| is one matrix product, and A ⊂ B exactly when the
+    intersection equals |A| and |A| < |B|.
+    """
+    sort = _score_matrix(left, right, fuzz.token_sort_ratio)
+    set_ = _score_matrix(left, right, fuzz.token_set_ratio)
+
+    a, b = _token_incidence(left, right)
+    inter = a @ b.T
+    len_a = a.sum(axis=1)[:, None]
+    len_b = b.sum(axis=1)[None, :]
+    strict_subset = (
+        (len_a > 0) & (len_b > 0)
+        & (((inter == len_a) & (len_a < len_b)) | ((inter == len_b) & (len_b < len_a)))
+    )
+    penalised = np.maximum(sort, set_ - _SUPERSET_TOKEN_PENALTY * np.abs(len_b - len_a))
+    set_ = np.where(strict_subset, penalised, set_)
+    return np.floor(np.maximum(sort, set_))
+
+
+def _pick_like_loop(scores: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Per row, the column and score check_name_similarity's loop would keep.
+
+    That loop replaces its best when `score > best_score` but stores
+    int(score) — so a later 85.3 displaces an earlier 85.5 (85.3 > 85). The
+    kept column is therefore the LAST one whose score beats the truncated
+    running maximum of everything before it, which is not simply argmax.
+    """
+    n, m = scores.shape
+    prior_max = np.zeros((n, m))
+    if m > 1:
+        prior_max[:, 1:] = np.maximum.accumulate(scores, axis=1)[:, :-1]
+    beats = scores > np.floor(np.maximum(prior_max, 0.0))
+    any_beat = beats.any(axis=1)
+    last = m - 1 - np.argmax(beats[:, ::-1], axis=1)
+    best = np.where(any_beat, scores[np.arange(n), last], 0.0)
+    return np.where(any_beat, last, -1), best
+
+
+def batch_check_username_similarity(
+    targets: List[Optional[str]], stored: List[str] | UsernameCandidates, threshold: int
+) -> List[Tuple[bool, Optional[str], int]]:
+    """
+    check_username_similarity for many suspects at once, one result per target
+    in order. Empty targets get the same no-match the single path returns.
+    """
+    results: List[Tuple[bool, Optional[str], int]] = [_NO_MATCH] * len(targets)
+    if not stored:
+        return results
+    if not isinstance(stored, UsernameCandidates):
+        stored = UsernameCandidates.build(stored)
+    rows = [i for i, t in enumerate(targets) if t]
+    if not rows:
+        return results
+
+    raw = _score_matrix([targets[i].lower() for i in rows], stored.lower, fuzz.ratio)
+    norm = _score_matrix([_normalize_handle(targets[i]) for i in rows], stored.norm, fuzz.ratio)
+    # extractOne keeps the FIRST best, which is exactly argmax.
+    raw_col = raw.argmax(axis=1)
+    norm_col = norm.argmax(axis=1)
+    for k, i in enumerate(rows):
+        best_col, best_score = raw_col[k], int(raw[k, raw_col[k]])
+        norm_score = int(norm[k, norm_col[k]])
+        if norm_score > best_score:
+            best_col, best_score = norm_col[k], norm_score
+        if best_score >= threshold:
+            results[i] = (True, stored.original[best_col], best_score)
+    return results
+
+
+def batch_check_name_similarity(
+    targets: List[Optional[str]], stored: List[str] | NameCandidates, threshold: int
+) -> List[Tuple[bool, Optional[str], int]]:
+    """
+    check_name_similarity for many suspects at once, one result per target in
+    order: the raw, folded and leet-folded passes each become one score matrix.
+    """
+    results: List[Tuple[bool, Optional[str], int]] = [_NO_MATCH] * len(targets)
+    if not stored:
+        return results
+    if not isinstance(stored, NameCandidates):
+        stored = NameCandidates.build(stored)
+    rows = [i for i, t in enumerate(targets) if t]
+    if not rows:
+        return results
+
+    originals = [targets[i] for i in rows]
+    t_fold = [fold_text(t) for t in originals]
+    t_leet = [_leet_fold(t) for t in t_fold]
+
+    raw = _score_matrix(originals, stored.original, fuzz.token_sort_ratio)
+    fold = _name_score_matrix(t_fold, list(stored.folded))
+    fold[np.array([not t for t in t_fold]), :] = 0
+
+    # The single path only runs the leet pass when folding changed one side.
+    leet_row = np.array([a != b for a, b in zip(t_leet, t_fold, strict=True)])[:, None]
+    leet_col = np.array([a != b for a, b in zip(stored.folded, stored.leet, strict=True)])[None, :]
+    leet = np.where(leet_row | leet_col, _name_score_matrix(t_leet, list(stored.leet)), 0.0)
+
+    cols, best = _pick_like_loop(np.maximum(np.maximum(raw, fold), leet))
+    for k, i in enumerate(rows):
+        if cols[k] >= 0 and int(best[k]) >= threshold:
+            results[i] = (True, stored.original[cols[k]], int(best[k]))
+    return results
+
+
 def check_homoglyph_danger(text: str) -> bool:
     if not text:
         return False
@@ -361,6 +675,68 @@ def _gap_tolerant_hit(core: str, text: str) -> bool:
     return False
 
 
+@dataclass(frozen=True)
+class _PlainKeyword:
+    """A plain keyword with its wildcard anchors parsed and its core folded."""
+    pattern: str
+    cores: frozenset[str]      # folded core and its leet-folded form
+    starts_wild: bool
+    ends_wild: bool
+
+    @classmethod
+    def parse(cls, pattern: str) -> Optional["_PlainKeyword"]:
+        """None for a pattern that can never match ("", "*", "**")."""
+        if not pattern:
+            return None
+        # fold_text so a keyword like "admin" also catches "аdmin" (Cyrillic а),
+        # "ａｄｍｉｎ" (fullwidth), and zero-width-laced variants — the
+        # highest-severity check was previously the easiest to evade.
+        p = fold_text(pattern)
+        core = p.strip("*")
+        if not core:
+            return None
+        # The leet-folded core as well, so "adm1n" and "4dmin" match the keyword
+        # "admin". Substitution (unlike gap tolerance) creates no new
+        # adjacencies, so it carries no over-matching risk. Texts are folded the
+        # same way, so a keyword written as "adm1n" behaves identically.
+        return cls(pattern, frozenset({core, _leet_fold(core)}),
+                   p.startswith("*"), p.endswith("*"))
+
+    @property
+    def is_substring(self) -> bool:
+        """Bare `foo` and explicit `*foo*` — the forms gap tolerance applies to."""
+        return self.starts_wild == self.ends_wild
+
+    def hits(self, texts: frozenset[str]) -> bool:
+        """Whether this keyword matches any of the folded/leet-folded `texts`."""
+        for c in self.cores:
+            for tx in texts:
+                if self.is_substring:
+                    hit = c in tx        # bare keyword = substring (unchanged)
+                elif self.ends_wild:
+                    hit = tx.startswith(c)
+                else:
+                    hit = tx.endswith(c)
+                if hit:
+                    return True
+
+        # Separator-padded evasion. Only for the substring forms: a prefix/suffix
+        # anchor already pins the match to one end, and stretching it across
+        # separators there would change what the admin asked for.
+        if self.is_substring:
+            for c in self.cores:
+                for tx in texts:
+                    if _gap_tolerant_hit(c, tx):
+                        return True
+        return False
+
+
+def _text_forms(text: str) -> frozenset[str]:
+    """A subject folded, plus its leet-folded form."""
+    t = fold_text(text)
+    return frozenset({t, _leet_fold(t)})
+
+
 def _match_wildcard_pattern(pattern: str, text: str) -> bool:
     """
     Plain (non-regex) pattern matcher with optional `*` wildcards.
@@ -374,48 +750,114 @@ def _match_wildcard_pattern(pattern: str, text: str) -> bool:
     an interior `*` is treated literally to keep the surface small.
     All matching is case-insensitive.
     """
-    if not pattern:
-        return False
-    # fold_text on both sides so a keyword like "admin" also catches "аdmin"
-    # (Cyrillic а), "ａｄｍｉｎ" (fullwidth), and zero-width-laced variants —
-    # the highest-severity check was previously the easiest to evade.
-    p = fold_text(pattern)
-    t = fold_text(text)
-    starts_wild = p.startswith("*")
-    ends_wild   = p.endswith("*")
-    core = p.strip("*")
-    if not core:
-        return False  # pattern was just "*" / "**" — ignore
-
-    # Compare the leet-folded forms as well as the plain ones, so "adm1n" and
-    # "4dmin" match the keyword "admin". Substitution (unlike gap tolerance)
-    # creates no new adjacencies, so it carries no over-matching risk. Both
-    # sides are folded so a keyword written as "adm1n" behaves the same way.
-    cores = {core, _leet_fold(core)}
-    texts = {t, _leet_fold(t)}
-
-    for c in cores:
-        for tx in texts:
-            if starts_wild and ends_wild:
-                hit = c in tx
-            elif ends_wild:
-                hit = tx.startswith(c)
-            elif starts_wild:
-                hit = tx.endswith(c)
+    kw = _PlainKeyword.parse(pattern)
+    return kw is not None and kw.hits(_text_forms(text))
+
+
+_NON_ALNUM_RUN = re.compile(r"[^0-9a-z]+")
+
+
+def _alternation(literals) -> Optional[re.Pattern]:
+    """One regex matching any of `literals`, or None when there are none."""
+    literals = sorted(set(literals), key=len, reverse=True)
+    if not literals:
+        return None
+    return re.compile("|".join(re.escape(lit) for lit in literals))
+
+
+@dataclass(frozen=True)
+class KeywordMatcher:
+    """
+    A group's reserved keywords, compiled once for matching.
+
+    check_reserved_keywords used to re-fold and re-leet every plain keyword,
+    per subject, per call — and this stage runs first for every join, message
+    and sweep member, against groups with up to a couple of hundred keywords.
+    Building one of these folds them once and puts every plain core behind a
+    single prefilter, so a clean subject (the overwhelmingly common case) costs
+    a few regex searches instead of a loop over the keyword list:
+
+      - substring cores are one combined alternation regex;
+      - prefix / suffix anchors are a str.startswith / endswith over a tuple;
+      - gap-padded evasion is caught by the alternation of separator-stripped
+        cores over the separator-stripped text, a necessary condition for
+        _gap_tolerant_hit.
+
+    Only when the prefilter fires are the candidates checked exactly, keyword
+    by keyword, so results (including which pattern is reported first) are the
+    same as the uncompiled path. Regex keywords are merged into one
+    _RegexProgram.
+
+    db.get_keyword_matcher caches one per group beside _kw_cache.
+    """
+    keywords: tuple[dict, ...]
+    plain: dict[int, _PlainKeyword]        # keyword position -> parsed form
+    regex: "_RegexProgram"
+    _substring: Optional[re.Pattern]
+    _squeezed: Optional[re.Pattern]
+    _prefixes: tuple[str, ...]
+    _suffixes: tuple[str, ...]
+
+    @classmethod
+    def build(cls, keywords: list[dict]) -> "KeywordMatcher":
+        keywords = tuple(keywords)
+        plain: dict[int, _PlainKeyword] = {}
+        for i, kw in enumerate(keywords):
+            if not kw["is_regex"]:
+                parsed = _PlainKeyword.parse(kw["pattern"])
+                if parsed is not None:
+                    plain[i] = parsed
+
+        substring, squeezed, prefixes, suffixes = set(), set(), set(), set()
+        for kw in plain.values():
+            if kw.is_substring:
+                substring |= kw.cores
+                for c in kw.cores:
+                    if _MIN_GAP_KEYWORD_LEN <= len(c) <= _MAX_GAP_CORE:
+                        squeezed.add(_NON_ALNUM_RUN.sub("", c))
+            elif kw.ends_wild:
+                prefixes |= kw.cores
             else:
-                hit = c in tx        # bare keyword = substring (unchanged)
-            if hit:
+                suffixes |= kw.cores
+        # A core with no [0-9a-z] at all squeezes to "", which every text
+        # contains; the alternation would then match everything, which is
+        # still correct, just no longer a useful filter.
+        return cls(
+            keywords=keywords,
+            plain=plain,
+            regex=_RegexProgram.build(
+                {i: kw["pattern"] for i, kw in enumerate(keywords) if kw["is_regex"]}
+            ),
+            _substring=_alternation(substring),
+            _squeezed=_alternation(squeezed) if "" not in squeezed else re.compile(""),
+            _prefixes=tuple(prefixes),
+            _suffixes=tuple(suffixes),
+        )
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def _may_hit(self, texts: frozenset[str]) -> bool:
+        for tx in texts:
+            if self._substring and self._substring.search(tx):
                 return True
+            if tx.startswith(self._prefixes) or tx.endswith(self._suffixes):
+                return True
+            if self._squeezed and self._squeezed.search(_NON_ALNUM_RUN.sub("", tx)):
+                return True
+        return False
 
-    # Separator-padded evasion. Only for the substring forms: a prefix/suffix
-    # anchor already pins the match to one end, and stretching it across
-    # separators there would change what the admin asked for.
-    if starts_wild == ends_wild:
-        for c in cores:
-            for tx in texts:
-                if _gap_tolerant_hit(c, tx):
-                    return True
-    return False
+    def plain_hits(self, raw_texts: list[str]) -> frozenset[int]:
+        """Positions of the plain keywords matching any of `raw_texts`."""
+        if not self.plain:
+            return frozenset()
+        forms = [_text_forms(t) for t in raw_texts]
+        if not any(self._may_hit(texts) for texts in forms):
+            return frozenset()
+        return frozenset(
+            i for i, kw in self.plain.items()
+            if any(kw.hits(texts) for texts in forms)
+        )
 
 
 # ── Admin-supplied regex safety ───────────────────────────────────────────────
@@ -565,16 +1007,134 @@ def _regex_hits(pattern: str, subject: str, deadline: float) -> bool:
         return False
 
 
+# ── Combined regex program ───────────────────────────────────────────────────
+#
+# Running each r: keyword separately cost one engine call per pattern per
+# subject, and with enough patterns the shared REGEX_MATCH_BUDGET ran out and
+# the rest were silently skipped. A group's regex keywords are instead joined
+# into one alternation, each wrapped in a named group `_k<position>`, so a
+# subject is searched once and the group that matched names the pattern.
+#
+# Constructs that change meaning once a pattern is wrapped and joined with
+# others: numbered backreferences and recursion (group numbers shift), named
+# groups and their references (names can collide), conditionals on a group
+# (the same, by number or name), global inline flags (they would apply to every
+# pattern) and branch resets. Patterns using any of them stay out of the
+# program and run on their own, exactly as before.
+_UNCOMBINABLE = re.compile(
+    r"\\(?:[1-9]|g[<{]|k<)"                    # backreferences
+    r"|\(\?(?:P?=|P?<(?![=!])|\||R\)|[+-]?\d)"  # named groups/refs, branch reset, recursion
+    r"|\(\?\("                                  # conditionals on a group
+    r"|\(\?[a-zA-Z^-]+\)"                        # global inline flags
+)
+
+REGEX_PROGRAM_TIMEOUT = 0.1   # seconds, per subject, for the whole program
+
+
+@dataclass(frozen=True)
+class _RegexProgram:
+    """A group's regex keywords, combined where possible into one program."""
+    patterns: dict[int, str]          # keyword position -> pattern, in order
+    combined: frozenset[int]          # positions the program covers
+    program: object                   # compiled alternation, or None
+
+    @classmethod
+    def build(cls, patterns: dict[int, str]) -> "_RegexProgram":
+        combined = frozenset(i for i, p in patterns.items() if not _UNCOMBINABLE.search(p))
+        program = None
+        if combined:
+            # Through _compiled_regex, so the same keyword set is compiled once
+            # however many matchers are built from it. A pattern that does not
+            # compile breaks the whole alternation; it then falls back to the
+            # one-at-a-time path, where _compiled_regex skips just that one.
+            program = _compiled_regex(
+                "|".join(f"(?P<_k{i}>{patterns[i]})" for i in sorted(combined))
+            )
+        if program is None:
+            combined = frozenset()
+        return cls(patterns=patterns, combined=combined, program=program)
+
+    def _search(self, subjects: list[str], deadline: float) -> tuple[Optional[int], bool]:
+        """
+        Run the program once per subject. Returns the lowest keyword position
+        it matched (None for no match) and whether every subject was searched
+        to completion — a timeout says nothing about any single pattern.
+        """
+        found = None
+        for subject in subjects:
+            remaining = min(REGEX_PROGRAM_TIMEOUT, deadline - time.monotonic())
+            if remaining <= 0:
+                return found, False
+            try:
+                match = self.program.search(subject, timeout=remaining)
+            except TimeoutError:
+                logger.warning(
+                    f"Combined reserved-keyword regex timed out after "
+                    f"{remaining:.3f}s; checking its patterns one at a time.",
+                    extra={"patterns_total": len(self.combined)},
+                )
+                return found, False
+            except Exception as e:
+                logger.debug(f"Combined reserved-keyword regex failed: {e}")
+                return found, False
+            if match:
+                hit = min(int(name[2:]) for name, value in match.groupdict().items()
+                          if value is not None)
+                found = hit if found is None else min(found, hit)
+        return found, True
+
+    def first_hit(self, subjects: list[str], deadline: float,
+                  before: Optional[int] = None) -> Optional[int]:
+        """
+        The lowest keyword position (below `before`, when given) whose pattern
+        matches any subject, or None.
+
+        The program reports the LEFTMOST match, which can belong to a later-
+        listed pattern than one matching further along. So a program hit is
+        only an upper bound: earlier-listed patterns are then confirmed one at a
+        time. The common case — nothing matches — costs one search per subject.
+        """
+        candidates = [i for i in self.patterns if before is None or i < before]
+        if not candidates or not _HAS_TIMEOUT_ENGINE:
+            return None
+
+        found, complete = None, False
+        if self.program is not None and self.combined.intersection(candidates):
+            found, complete = self._search(subjects, deadline)
+        if found is not None and before is not None and found >= before:
+            found = None
+
+        for i in candidates:
+            if found is not None and i >= found:
+                break
+            # A complete program pass with no match clears every pattern in it.
+            if i in self.combined and complete and found is None:
+                continue
+            if time.monotonic() >= deadline:
+                logger.warning(
+                    "Regex keyword budget exhausted; remaining patterns were not "
+                    "evaluated for this user.",
+                    extra={"patterns_total": len(self.patterns)},
+                )
+                break
+            if any(_regex_hits(self.patterns[i], subject, deadline) for subject in subjects):
+                return i
+        return found
+
+
 def check_reserved_keywords(
     full_name: str,
     username: Optional[str],
     bio: Optional[str],
-    keywords: list[dict],
+    keywords: list[dict] | KeywordMatcher,
 ) -> Optional[str]:
     """
     Returns the first matched pattern if any reserved keyword/regex hits
     the user's name, username, or bio. Returns None if no match.
 
+    `keywords` is the raw keyword rows or, on the hot path, the group's
+    precompiled KeywordMatcher.
+
     Plain patterns support `*` wildcards at the start/end — see
     _match_wildcard_pattern for the rules.
 
@@ -590,28 +1150,19 @@ def check_reserved_keywords(
     if not raw_texts:
         return None
 
-    # One budget for the whole call: per-pattern timeouts multiply across
-    # patterns x subjects, and a group can have dozens of keywords.
-    deadline = time.monotonic() + REGEX_MATCH_BUDGET
-    folded_texts = None
+    if not isinstance(keywords, KeywordMatcher):
+        keywords = KeywordMatcher.build(keywords)
 
-    for kw in keywords:
-        pattern = kw["pattern"]
-        if kw["is_regex"]:
-            if folded_texts is None:
-                folded_texts = [_subject_for_regex(t) for t in raw_texts]
-            if time.monotonic() >= deadline:
-                logger.warning(
-                    "Regex keyword budget exhausted; remaining patterns were not "
-                    "evaluated for this user.",
-                    extra={"patterns_total": len(keywords)},
-                )
-                return None
-            for subject in folded_texts:
-                if subject and _regex_hits(pattern, subject, deadline):
-                    return pattern
-        else:
-            for text in raw_texts:
-                if _match_wildcard_pattern(pattern, text):
-                    return pattern
-    return None
+    plain_hits = keywords.plain_hits(raw_texts)
+    first = min(plain_hits, default=None)
+
+    if keywords.regex.patterns:
+        # One budget for the whole call: per-pattern timeouts multiply across
+        # patterns x subjects, and a group can have dozens of keywords.
+        deadline = time.monotonic() + REGEX_MATCH_BUDGET
+        subjects = [s for s in (_subject_for_regex(t) for t in raw_texts) if s]
+        regex_hit = keywords.regex.first_hit(subjects, deadline, before=first)
+        if regex_hit is not None:
+            first = regex_hit
+
+    return keywords.keywords[first]["pattern"] if first is not None else None
@@ -0,0 +1,189 @@
+"""
+Global photo-hash index across every group.
+
+Detection compares a suspect's photo only with the current group's whitelist
+and logo. An operator protecting many groups also wants to know when the same
+avatar turns up elsewhere: a protected identity in another tenant, or a photo
+already logged against a known bad actor. Scanning every group's hashes for
+that is linear in the deployment; this answers "everything within Hamming
+radius r" in sub-linear time instead.
+
+Multi-index hashing: each 64-bit phash is cut into four 16-bit chunks, and
+each chunk position has its own table of chunk value -> hashes. Two hashes
+within distance r differ by at most r // 4 bits in at least one chunk
+(pigeonhole), so probing every chunk value within that smaller radius finds
+every candidate, and each candidate is then confirmed on the full 64 bits.
+
+db.py keeps one instance, fed incrementally from whitelisted_users and logs
+(see refresh_photo_index). Memory is bounded by max_entries: past it, the
+entries added longest ago are dropped first.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from functools import cache
+from itertools import combinations
+from typing import Callable, Iterable, NamedTuple, Optional
+
+from src.utils.image import pack_phash
+
+_CHUNKS = 4
+_CHUNK_BITS = 16
+_CHUNK_MASK = (1 << _CHUNK_BITS) - 1
+
+# Past this per-chunk radius the probe sets outgrow the index itself
+# (C(16, 4) = 1820 values per chunk), so a plain scan is cheaper.
+_MAX_PROBE_RADIUS = 3
+
+
+class PhotoRef(NamedTuple):
+    """Who a stored hash belongs to. kind is 'whitelist' or 'bad_actor'."""
+    kind: str
+    group_id: Optional[int]
+    user_id: int
+
+
+class PhotoMatch(NamedTuple):
+    ref: PhotoRef
+    pfp_hash: str
+    distance: int
+
+
+def _chunks(word: int) -> list[int]:
+    return [(word >> (i * _CHUNK_BITS)) & _CHUNK_MASK for i in range(_CHUNKS)]
+
+
+@cache
+def _flip_masks(radius: int) -> tuple[int, ...]:
+    """Every 16-bit mask with at most `radius` bits set."""
+    masks = [0]
+    for k in range(1, radius + 1):
+        for bits in combinations(range(_CHUNK_BITS), k):
+            masks.append(sum(1 << b for b in bits))
+    return tuple(masks)
+
+
+class PhotoHashIndex:
+    """
+    Thread-safe radius search over 64-bit phashes.
+
+    Each ref holds at most one hash — adding a ref again replaces its old hash,
+    which is how a refreshed whitelist photo moves. Several refs may share one
+    hash.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._refs: OrderedDict[PhotoRef, int] = OrderedDict()
+        self._holders: dict[int, list[PhotoRef]] = {}
+        # Buckets and holder lists are lists, not sets: nearly all hold one item,
+        # and a one-item set costs three times the memory.
+        self._tables: list[dict[int, list[int]]] = [{} for _ in range(_CHUNKS)]
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+    def add(self, ref: PhotoRef, pfp_hash: Optional[str]) -> None:
+        """Index `ref` under `pfp_hash`. A hash that isn't 64-bit hex unindexes it."""
+        word = pack_phash(pfp_hash)
+        with self._lock:
+            old = self._refs.get(ref)
+            if old is not None and old == word:
+                self._refs.move_to_end(ref)
+                return
+            if old is not None:
+                self._unlink(ref, old)
+            if word is None:
+                return
+            self._refs[ref] = word
+            holders = self._holders.get(word)
+            if holders is None:
+                holders = self._holders[word] = []
+                for table, chunk in zip(self._tables, _chunks(word), strict=True):
+                    table.setdefault(chunk, []).append(word)
+            holders.append(ref)
+            while len(self._refs) > self.max_entries:
+                evicted, evicted_word = self._refs.popitem(last=False)
+                self._unlink(evicted, evicted_word, popped=True)
+                self.evictions += 1
+
+    def discard(self, ref: PhotoRef) -> None:
+        with self._lock:
+            word = self._refs.get(ref)
+            if word is not None:
+                self._unlink(ref, word)
+
+    def replace(self, keep: Callable[[PhotoRef], bool],
+                entries: Iterable[tuple[PhotoRef, Optional[str]]]) -> None:
+        """
+        Drop every ref for which keep(ref) is False, then add `entries`. Used
+        to reload one group's whitelist or one bad actor's photos wholesale,
+        which is the only way a deleted row leaves the index.
+        """
+        with self._lock:
+            stale = [(r, w) for r, w in self._refs.items() if not keep(r)]
+            for ref, word in stale:
+                self._unlink(ref, word)
+        for ref, pfp_hash in entries:
+            self.add(ref, pfp_hash)
+
+    def within(self, pfp_hashes: Iterable[str], radius: int) -> list[PhotoMatch]:
+        """
+        Every indexed ref whose hash is within `radius` of any of `pfp_hashes`
+        (e.g. a photo and its mirror), closest first.
+        """
+        targets = [w for w in (pack_phash(h) for h in pfp_hashes) if w is not None]
+        if not targets:
+            return []
+        with self._lock:
+            candidates = self._candidates(targets, radius)
+            found = []
+            for word in candidates:
+                distance = min((word ^ t).bit_count() for t in targets)
+                if distance <= radius:
+                    for ref in self._holders[word]:
+                        found.append(PhotoMatch(ref, f"{word:016x}", distance))
+        found.sort(key=lambda m: (m.distance, m.ref))
+        return found
+
+    def info(self) -> dict:
+        return {"entries": len(self._refs), "hashes": len(self._holders),
+                "max_entries": self.max_entries, "evictions": self.evictions}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._refs.clear()
+            self._holders.clear()
+            for table in self._tables:
+                table.clear()
+
+    def _candidates(self, targets: list[int], radius: int) -> Iterable[int]:
+        sub_radius = radius // _CHUNKS
+        if sub_radius > _MAX_PROBE_RADIUS:
+            return list(self._holders)
+        masks = _flip_masks(sub_radius)
+        candidates: set[int] = set()
+        for target in targets:
+            for table, chunk in zip(self._tables, _chunks(target), strict=True):
+                for mask in masks:
+                    bucket = table.get(chunk ^ mask)
+                    if bucket:
+                        candidates.update(bucket)
+        return candidates
+
+    def _unlink(self, ref: PhotoRef, word: int, popped: bool = False) -> None:
+        if not popped:
+            del self._refs[ref]
+        holders = self._holders[word]
+        holders.remove(ref)
+        if holders:
+            return
+        del self._holders[word]
+        for table, chunk in zip(self._tables, _chunks(word), strict=True):
+            bucket = table[chunk]
+            bucket.remove(word)
+            if not bucket:
+                del table[chunk]
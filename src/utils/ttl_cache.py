@@ -0,0 +1,265 @@
+"""
+Bounded, instrumented TTL cache for the database read caches in db.py.
+
+The group, keyword, false-positive, whitelist and blocklist caches used to be
+plain dicts of key -> (timestamp, value) with the TTL checked by hand at every
+read. Nothing was ever evicted, because _stale_or_raise falls back on expired
+entries when a read fails, so the two per-user caches grew by one entry for
+every user the bot had ever checked.
+
+TTLCache keeps that (timestamp, value) shape — `cache[key] = (time.time(), v)`,
+`cache.get(key)`, `pop` and `clear` all behave as they did — and adds:
+
+  * a bound per namespace: an entry count and, with `weigh`, a total weight
+    (rows held), evicting least-recently-used entries past either;
+  * a stale-if-error window: an entry older than `ttl` is no longer served
+    normally, but stale() still returns it for `stale_ttl` seconds more when a
+    live read fails. stale_ttl=None keeps it until evicted, for the reads that
+    decide whether someone is protected;
+  * single-flight loading: load() lets one thread run the query for a key
+    while concurrent callers for the same key wait for its answer, and
+    claim()/release() let a batched read take part in the same protocol;
+  * an invalidation generation: a read that started before a pop() or
+    clear() must not store what it read over the invalidation (store());
+  * counters, via info().
+
+Shared by every worker thread that db helpers run on, hence the locks.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Callable, Hashable, Iterator
+
+Entry = tuple[float, object]
+
+
+class TTLCache(MutableMapping):
+    """One namespace of (timestamp, value) entries. See the module docstring."""
+
+    def __init__(self, name: str, ttl: float, *, stale_ttl: float | None,
+                 max_entries: int, max_weight: int | None = None,
+                 weigh: Callable[[object], int] | None = None):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self._weigh = weigh
+        self._data: OrderedDict[Hashable, Entry] = OrderedDict()
+        self._weights: dict[Hashable, int] = {}
+        self._weight = 0
+        self._lock = threading.Lock()
+        # key -> [lock, holders + waiters]; dropped when nobody references it.
+        self._flights: dict[Hashable, list] = {}
+        # Bumped by every invalidation, whether or not the key was cached.
+        self.generation = 0
+        self.hits = self.misses = self.stale_served = 0
+        self.evictions = self.expired = self.loads = self.coalesced = 0
+
+    # ── Mapping protocol: the old dict's behaviour ─────────────────────────
+
+    def __getitem__(self, key: Hashable) -> Entry:
+        with self._lock:
+            return self._data[key]
+
+    def __setitem__(self, key: Hashable, entry: Entry) -> None:
+        weight = self._weigh(entry[1]) if self._weigh else 1
+        with self._lock:
+            self._remove(key)
+            self._data[key] = entry
+            self._weights[key] = weight
+            self._weight += weight
+            self._trim(entry[0])
+
+    def __delitem__(self, key: Hashable) -> None:
+        with self._lock:
+            if key not in self._data:
+                raise KeyError(key)
+            self.generation += 1
+            self._remove(key)
+
+    _MISSING = object()
+
+    def pop(self, key: Hashable, default: object = _MISSING) -> object:
+        # An invalidation of an uncached key still has to fence off a read
+        # that is about to store it.
+        with self._lock:
+            self.generation += 1
+            entry = self._data.get(key, default)
+            self._remove(key)
+        if entry is self._MISSING:
+            raise KeyError(key)
+        return entry
+
+    def __iter__(self) -> Iterator[Hashable]:
+        with self._lock:
+            return iter(list(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    # A namespace, not a value: Mapping would make two empty caches equal.
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+            self._weights.clear()
+            self._weight = 0
+            self.hits = self.misses = self.stale_served = 0
+            self.evictions = self.expired = self.loads = self.coalesced = 0
+
+    def store(self, key: Hashable, entry: Entry, generation: int) -> bool:
+        """
+        Set `key` unless something was invalidated since `generation` was read:
+        for a caller that read the value from the database after taking it.
+        False when the entry was dropped; the next read fetches it again.
+        """
+        weight = self._weigh(entry[1]) if self._weigh else 1
+        with self._lock:
+            if self.generation != generation:
+                return False
+            self._remove(key)
+            self._data[key] = entry
+            self._weights[key] = weight
+            self._weight += weight
+            self._trim(entry[0])
+            return True
+
+    # ── TTL reads ──────────────────────────────────────────────────────────
+
+    def is_fresh(self, key: Hashable, margin: float = 0.0) -> bool:
+        """Whether `key` has an entry with more than `margin` seconds of TTL left. Uncounted."""
+        entry = self._data.get(key)
+        return entry is not None and time.time() - entry[0] < self.ttl - margin
+
+    def fresh(self, key: Hashable) -> Entry | None:
+        """The entry for `key` if it is within its TTL, counting a hit or a miss."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and time.time() - entry[0] < self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def stale(self, key: Hashable) -> Entry | None:
+        """
+        The entry for `key`, however old, while it is inside the stale-if-error
+        window — for a caller whose live read just failed. Counted as stale.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if self.stale_ttl is not None and time.time() - entry[0] >= self.ttl + self.stale_ttl:
+                self._remove(key)
+                self.expired += 1
+                return None
+            self.stale_served += 1
+            return entry
+
+    # ── Single flight ──────────────────────────────────────────────────────
+
+    def load(self, key: Hashable, loader: Callable[[], object]) -> object:
+        """
+        The fresh value for `key`, calling loader() to produce it on a miss.
+        Concurrent misses for one key run loader() once; the rest wait and
+        take its result. An exception from loader() propagates to its caller
+        only, and the next waiter tries for itself.
+        """
+        entry = self.fresh(key)
+        if entry is not None:
+            return entry[1]
+        lock = self._flight(key)
+        try:
+            with lock:
+                entry = self._data.get(key)
+                if entry is not None and time.time() - entry[0] < self.ttl:
+                    with self._lock:
+                        self.coalesced += 1
+                    return entry[1]
+                started, generation = time.time(), self.generation
+                value = loader()
+                self.store(key, (started, value), generation)
+                with self._lock:
+                    self.loads += 1
+                return value
+        finally:
+            self._land(key)
+
+    def claim(self, key: Hashable) -> bool:
+        """
+        Take the load for `key` without waiting, for a caller reading many
+        keys in one batch. False if another load for it is in flight; the
+        caller should leave the key out and read it through load() later.
+        Every successful claim must be matched by release().
+        """
+        lock = self._flight(key)
+        if lock.acquire(blocking=False):
+            return True
+        self._land(key)
+        return False
+
+    def release(self, key: Hashable) -> None:
+        self._flights[key][0].release()
+        self._land(key)
+
+    def _flight(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = [threading.Lock(), 0]
+            flight[1] += 1
+            return flight[0]
+
+    def _land(self, key: Hashable) -> None:
+        with self._lock:
+            flight = self._flights[key]
+            flight[1] -= 1
+            if flight[1] == 0:
+                del self._flights[key]
+
+    # ── Bounds ─────────────────────────────────────────────────────────────
+
+    def _remove(self, key: Hashable) -> None:
+        if key in self._data:
+            del self._data[key]
+            self._weight -= self._weights.pop(key)
+
+    def _trim(self, now: float) -> None:
+        # Least recently used first. Entries past the stale window are useless
+        # and go regardless of the bounds; the scan stops at the first live one.
+        if self.stale_ttl is not None:
+            horizon = now - self.ttl - self.stale_ttl
+            while self._data:
+                key, entry = next(iter(self._data.items()))
+                if entry[0] >= horizon:
+                    break
+                self._remove(key)
+                self.expired += 1
+        while len(self._data) > self.max_entries or (
+                self.max_weight is not None and self._weight > self.max_weight
+                and len(self._data) > 1):
+            key = next(iter(self._data))
+            self._remove(key)
+            self.evictions += 1
+
+    def info(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits, "misses": self.misses, "stale": self.stale_served,
+                "loads": self.loads, "coalesced": self.coalesced,
+                "evictions": self.evictions, "expired": self.expired,
+                "entries": len(self._data), "weight": self._weight,
+                "max_entries": self.max_entries, "max_weight": self.max_weight,
+            }
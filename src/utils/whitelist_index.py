@@ -0,0 +1,87 @@
+"""
+Precompiled per-group whitelist match index.
+
+_check_user_sync used to rebuild its username / name / photo-hash lists from the
+raw whitelist rows on every call, and the detector then re-folded every stored
+name and re-parsed every stored hash for every suspect. None of that depends on
+the suspect. A WhitelistIndex does it once per whitelist version: db.py caches
+one per group beside _whitelist_cache, and _invalidate_whitelist_cache drops it
+with the rows.
+
+The index is immutable. A whitelist change builds a new one rather than
+patching the old, so a check running concurrently in another worker thread
+never sees a half-updated index.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+from src.utils.detector import NameCandidates, UsernameCandidates
+from src.utils.image import StoredHashes
+
+
+def _display_name(row: dict) -> str:
+    return f"{row['first_name']} {row['last_name'] or ''}".strip()
+
+
+@dataclass(frozen=True)
+class WhitelistIndex:
+    rows: tuple[dict, ...]
+    user_ids: frozenset[int]
+    usernames: UsernameCandidates
+    names: NameCandidates
+    pfp_hashes: StoredHashes
+    # First row for each key, matching the linear next(...) lookups these replace.
+    _by_username: dict[str, dict]
+    _by_name: dict[str, dict]
+    _by_pfp: dict[str, dict]
+
+    @classmethod
+    def build(cls, rows: list[dict]) -> WhitelistIndex:
+        rows = tuple(rows)
+        by_username: dict[str, dict] = {}
+        by_name: dict[str, dict] = {}
+        by_pfp: dict[str, dict] = {}
+        for w in rows:
+            if w["username"]:
+                by_username.setdefault(w["username"].lower(), w)
+            by_name.setdefault(_display_name(w), w)
+            if w["pfp_hash"]:
+                by_pfp.setdefault(w["pfp_hash"], w)
+        return cls(
+            rows=rows,
+            user_ids=frozenset(w["user_id"] for w in rows),
+            usernames=UsernameCandidates.build([w["username"] for w in rows if w["username"]]),
+            names=NameCandidates.build([_display_name(w) for w in rows]),
+            pfp_hashes=StoredHashes.build([w["pfp_hash"] for w in rows if w["pfp_hash"]]),
+            _by_username=by_username,
+            _by_name=by_name,
+            _by_pfp=by_pfp,
+        )
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def without(self, user_id: int) -> WhitelistIndex:
+        """
+        The index minus one user's own entries, so they can never match
+        themselves. Returns self when the user isn't listed — the normal case,
+        since check_user returns early for whitelisted users.
+        """
+        if user_id not in self.user_ids:
+            return self
+        return WhitelistIndex.build([w for w in self.rows if w["user_id"] != user_id])
+
+    def only(self, user_ids: frozenset[int]) -> WhitelistIndex:
+        """The index restricted to `user_ids` — a prefiltered shortlist to score."""
+        return WhitelistIndex.build([w for w in self.rows if w["user_id"] in user_ids])
+
+    def find_by_username(self, username: str) -> Optional[dict]:
+        return self._by_username.get(username.lower())
+
+    def find_by_name(self, name: str) -> Optional[dict]:
+        return self._by_name.get(name)
+
+    def find_by_pfp(self, pfp_hash: str) -> Optional[dict]:
+        return self._by_pfp.get(pfp_hash)
@@ -0,0 +1,143 @@
+"""
+Write-behind buffer for idempotent, append-only database writes.
+
+mark_seen runs once per clean sweep member and once per first message, and used
+to borrow a connection, run one INSERT and commit each time — a 5,000-member
+sweep was 5,000 single-row transactions. Writes that nothing reads back on the
+hot path are instead queued here and written in batches: when a kind reaches
+batch_rows, and on a timer (main._write_behind_loop), and once more at shutdown.
+
+Rows stay queued until their batch has committed, so a reader that consults
+pending() or contains() never sees a write vanish in between. A batch that
+fails is kept for the next flush; past max_pending rows per kind new rows are
+refused, so a long outage costs memory only up to a bound.
+
+db.py owns the instance and the SQL; this module only knows rows and kinds.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter
+from typing import Callable, Hashable
+
+# write(kind, rows) -> True on commit; False to keep the rows for a retry.
+Writer = Callable[[str, list[tuple]], bool]
+
+
+class WriteBehindQueue:
+    """Thread-safe per-kind row queues with batched, single-flusher draining."""
+
+    def __init__(self, batch_rows: int, max_pending: int):
+        self.batch_rows = batch_rows
+        self.max_pending = max_pending
+        self._lock = threading.Lock()           # guards the queues and counters
+        self._flush_lock = threading.Lock()     # one flusher at a time
+        self._rows: dict[str, list[tuple]] = {}
+        self._counts: dict[str, Counter] = {}
+        self.flushes = 0
+        self.rows_written = 0
+        self.failures = 0
+        self.dropped = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def add(self, kind: str, row: tuple) -> bool:
+        """
+        Queue `row`. Returns True once `kind` holds a full batch. A kind
+        already holding max_pending rows refuses it (counted in `dropped`).
+        """
+        with self._lock:
+            rows = self._rows.setdefault(kind, [])
+            if len(rows) >= self.max_pending:
+                self.dropped += 1
+                return True
+            rows.append(row)
+            self._counts.setdefault(kind, Counter())[row] += 1
+            return len(rows) >= self.batch_rows
+
+    def contains(self, kind: str, row: Hashable) -> bool:
+        with self._lock:
+            counts = self._counts.get(kind)
+            return bool(counts and counts[row])
+
+    def pending(self, kind: str) -> list[tuple]:
+        with self._lock:
+            return list(self._rows.get(kind, ()))
+
+    def discard(self, kind: str, row: tuple) -> None:
+        """
+        Drop every queued copy of `row`. Waits out a flush in progress, so a
+        caller that then deletes the row in the database knows no queued copy
+        can land after its delete.
+        """
+        with self._flush_lock, self._lock:
+            rows = self._rows.get(kind)
+            if not rows or not self._counts[kind][row]:
+                return
+            self._rows[kind] = [r for r in rows if r != row]
+            del self._counts[kind][row]
+
+    def depth(self) -> int:
+        with self._lock:
+            return sum(len(rows) for rows in self._rows.values())
+
+    def flush(self, write: Writer, *, block: bool = True) -> int:
+        """
+        Write everything queued so far, a batch at a time, stopping at the
+        first batch that fails. Returns rows written.
+
+        With block=False, returns 0 at once if another thread is flushing — it
+        will pick up whatever was added meanwhile.
+        """
+        if not self._flush_lock.acquire(blocking=block):
+            return 0
+        written = 0
+        try:
+            for kind in list(self._rows):
+                # Only what was queued when the flush began: under a steady
+                # stream of adds, draining "until empty" might never return.
+                with self._lock:
+                    remaining = len(self._rows[kind])
+                while remaining > 0:
+                    with self._lock:
+                        batch = self._rows[kind][:min(self.batch_rows, remaining)]
+                    remaining -= len(batch)
+                    start = time.perf_counter()
+                    ok = write(kind, batch)
+                    elapsed = (time.perf_counter() - start) * 1e3
+                    with self._lock:
+                        self.last_flush_ms = elapsed
+                        self.max_flush_ms = max(self.max_flush_ms, elapsed)
+                        if not ok:
+                            self.failures += 1
+                            return written
+                        # Only the flusher takes rows off the front, so the
+                        # batch is still the prefix.
+                        rows = self._rows[kind]
+                        for row in batch:
+                            self._forget(self._counts[kind], row)
+                        del rows[:len(batch)]
+                        self.flushes += 1
+                        self.rows_written += len(batch)
+                    written += len(batch)
+        finally:
+            self._flush_lock.release()
+        return written
+
+    def info(self) -> dict:
+        with self._lock:
+            depth = {kind: len(rows) for kind, rows in self._rows.items() if rows}
+            return {
+                "queued": sum(depth.values()), "depth": depth,
+                "flushes": self.flushes, "rows_written": self.rows_written,
+                "failures": self.failures, "dropped": self.dropped,
+                "last_flush_ms": round(self.last_flush_ms, 2),
+                "max_flush_ms": round(self.max_flush_ms, 2),
+            }
+
+    @staticmethod
+    def _forget(counts: Counter, row: tuple) -> None:
+        counts[row] -= 1
+        if counts[row] <= 0:
+            del counts[row]
@@ -153,7 +153,7 @@ async def _handle_name_change(
             )
 
     # Fetch current PFP for a full check
-    pfp_bytes = await _fetch_pfp(pyro, user_id)
+    photo = await _fetch_pfp(pyro, user_id)
     bio = await _fetch_bio(pyro, user_id)
 
     snapshot = UserSnapshot(
@@ -161,7 +161,7 @@ async def _handle_name_change(
         username=username,
         first_name=first_name,
         last_name=last_name,
-        pfp_bytes=pfp_bytes,
+        photo=photo,
         bio=bio,
     )
 
@@ -203,7 +203,7 @@ async def _handle_photo_change(
     elif user:
         username = getattr(user, "username", None)
 
-    pfp_bytes = await _fetch_pfp(pyro, user_id)
+    photo = await _fetch_pfp(pyro, user_id)
     bio = await _fetch_bio(pyro, user_id)
 
     snapshot = UserSnapshot(
@@ -211,7 +211,7 @@ async def _handle_photo_change(
         username=username,
         first_name=first_name,
         last_name=last_name,
-        pfp_bytes=pfp_bytes,
+        photo=photo,
         bio=bio,
     )
 
@@ -249,5 +249,5 @@ async def _check_and_act(
 
 
 # PFP / bio fetch helpers are shared in src.watcher.fetch (deduplicated).
-from src.watcher.fetch import fetch_pfp_bytes as _fetch_pfp  # noqa: E402
+from src.watcher.fetch import fetch_pfp_fingerprint as _fetch_pfp  # noqa: E402
 from src.watcher.fetch import fetch_bio as _fetch_bio        # noqa: E402
@@ -21,6 +21,13 @@ account limitation). Each call kind therefore gets an adaptive _Pacer:
     1.5x (capped), so repeated floods slow us down instead of repeating;
   - forgiving: pacing resets to the base interval after 10 flood-free
     minutes.
+
+Profile photos are hashed once. Every photo has a file_unique_id that is the
+same for every account and never changes, and its hashes are kept under it
+(db.get_photo_hashes: a bounded in-memory cache over the photo_hashes table).
+Sweeps, profile-change events and /whitelist used to download the same
+unchanged avatar again each time; now a known photo costs at most the photo
+list call, and a sweep, which gets the id with the member list, not even that.
 """
 from __future__ import annotations
 
@@ -33,8 +40,9 @@ from typing import Optional
 from pyrogram import Client, raw
 from pyrogram.errors import FloodWait
 
-from src.config import BIO_FETCH_MIN_INTERVAL, PFP_FETCH_MIN_INTERVAL
-from src.utils.image import compute_pfp_hash_bytes
+from src.config import BIO_FETCH_MIN_INTERVAL, MEMBER_PAGE_MIN_INTERVAL, PFP_FETCH_MIN_INTERVAL
+from src.db import get_photo_hashes, run_db, store_photo_hashes
+from src.utils.image import PhotoFingerprint
 
 logger = logging.getLogger(__name__)
 
@@ -148,6 +156,9 @@ class _Pacer:
 # download) hit different server-side budgets, so they pace independently.
 _bio_pacer = _Pacer("bio", BIO_FETCH_MIN_INTERVAL)
 _pfp_pacer = _Pacer("pfp", PFP_FETCH_MIN_INTERVAL)
+# Sweep enumeration (channels.GetParticipants). Several groups are swept at
+# once, all through the one account, so their pages share a budget too.
+_members_pacer = _Pacer("members", MEMBER_PAGE_MIN_INTERVAL)
 
 
 def report_flood(seconds: float, *, kind: str = "all") -> None:
@@ -160,11 +171,12 @@ def report_flood(seconds: float, *, kind: str = "all") -> None:
     had just pushed back, and each one earned its own FloodWait — ratcheting the
     escalation ladder from what was really a single event.
 
-    kind selects a specific pacer ("bio" / "pfp"); the default backs off both,
-    which is right for a whole-account signal like PEER_FLOOD.
+    kind selects a specific pacer ("bio" / "pfp" / "members"); the default
+    backs off all three, which is right for a whole-account signal like
+    PEER_FLOOD.
     """
-    targets = {"bio": (_bio_pacer,), "pfp": (_pfp_pacer,)}.get(
-        kind, (_bio_pacer, _pfp_pacer)
+    targets = {"bio": (_bio_pacer,), "pfp": (_pfp_pacer,), "members": (_members_pacer,)}.get(
+        kind, (_bio_pacer, _pfp_pacer, _members_pacer)
     )
     for pacer in targets:
         total = pacer.on_flood(seconds)
@@ -192,22 +204,57 @@ def pfp_cooldown_remaining() -> float:
     return _pfp_pacer.cooldown_remaining()
 
 
-async def fetch_pfp_bytes(pyro: Client, user_id: int, *, wait: bool = False) -> Optional[bytes]:
+async def pace_member_page() -> None:
+    """
+    Wait for a slot to request the next page of a sweep's member list. Never
+    skips: a sweep without its next page has nothing else to do, and the
+    sweep's own time budget bounds the wait.
     """
-    Download a user's current profile photo as raw bytes, or None.
+    while True:
+        if await _members_pacer.acquire(_SWEEP_MAX_WAIT):
+            return
+        # Cooling down for longer than that; wait most of it out and ask again.
+        await asyncio.sleep(_SWEEP_MAX_WAIT)
+
+
+async def _cached_fingerprint(unique_id: str) -> Optional[PhotoFingerprint]:
+    hashes = await run_db(get_photo_hashes, unique_id)
+    if hashes is None:
+        return None
+    return PhotoFingerprint(None, *hashes, unique_id=unique_id)
+
+
+async def fetch_pfp_fingerprint(
+    pyro: Client, user_id: int, *, wait: bool = False, unique_id: Optional[str] = None,
+) -> Optional[PhotoFingerprint]:
+    """
+    The hashes of a user's current profile photo, or None if they have none or
+    it couldn't be fetched.
+
+    unique_id is the photo's file_unique_id when the caller already has it
+    (a sweep's member list carries it as user.photo.big_photo_unique_id); a
+    photo hashed before then costs no call at all. Otherwise the photo list is
+    asked for the latest photo's id, and only a photo never hashed before is
+    downloaded. The fingerprint never holds the bytes.
 
     wait=True (sweeps) rides out flood cooldowns up to a few minutes; the
     default skips instead so event handlers stay responsive.
     """
+    if unique_id:
+        cached = await _cached_fingerprint(unique_id)
+        if cached is not None:
+            return cached
     if not await _pfp_pacer.acquire(_SWEEP_MAX_WAIT if wait else _EVENT_MAX_WAIT):
         return None
     try:
         photos = pyro.get_chat_photos(user_id, limit=1)
         photo = await photos.__anext__()
+        cached = await _cached_fingerprint(photo.file_unique_id)
+        if cached is not None:
+            return cached
         buf = BytesIO()
         async for chunk in pyro.stream_media(photo):
             buf.write(chunk)
-        return buf.getvalue() or None
     except StopAsyncIteration:
         return None
     except FloodWait as e:
@@ -220,12 +267,17 @@ async def fetch_pfp_bytes(pyro: Client, user_id: int, *, wait: bool = False) ->
     except Exception as e:
         logger.debug(f"PFP fetch failed for user {user_id}: {e}")
         return None
+    if not buf.getvalue():
+        return None
+    fp = await asyncio.to_thread(PhotoFingerprint.from_bytes, buf.getvalue())
+    await run_db(store_photo_hashes, photo.file_unique_id, fp.base, fp.mirror)
+    return PhotoFingerprint(None, fp.base, fp.mirror, unique_id=photo.file_unique_id)
 
 
 async def fetch_pfp_hash(pyro: Client, user_id: int, *, wait: bool = False) -> Optional[str]:
-    """Download + perceptual-hash a user's profile photo, or None."""
-    data = await fetch_pfp_bytes(pyro, user_id, wait=wait)
-    return compute_pfp_hash_bytes(data) if data else None
+    """A user's profile photo phash, or None (see fetch_pfp_fingerprint)."""
+    fp = await fetch_pfp_fingerprint(pyro, user_id, wait=wait)
+    return fp.base if fp else None
 
 
 async def fetch_bio(pyro: Client, user_id: int, *, wait: bool = False) -> Optional[str]:
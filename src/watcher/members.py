@@ -0,0 +1,129 @@
+"""
+Sweep member source: a group's members, one page at a time, from raw
+channels.GetParticipants.
+
+get_chat_members keeps its offset to itself, so a capped sweep used to resume
+by enumerating the group from the first member again and discarding everyone
+up to the stored position. On a 100k-member group that was hundreds of
+enumeration calls before the first new member, and more each time the cap
+was hit. Calling GetParticipants directly gives the sweep two things:
+
+  - an explicit offset, so a resumed run's first request is for the first
+    member it has not screened;
+  - the participants hash. Asked for with the hash of what a page held last
+    time, the server answers ChannelParticipantsNotModified if nobody in it
+    joined, left or moved, and sends no members at all. sweep.py decides when
+    it may offer a hash, and so skip the page.
+
+Basic groups have no GetParticipants. Their members come back as one page from
+get_chat_members, with the offset applied here.
+"""
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Optional
+
+from pyrogram import raw, types
+
+from src.watcher.fetch import pace_member_page
+
+# The most GetParticipants returns per call.
+PAGE_SIZE = 200
+
+_MASK = (1 << 64) - 1
+
+
+def participants_hash(user_ids) -> int:
+    """
+    The hash Telegram compares for channels.GetParticipants: its 64-bit vector
+    hash over the page's user ids, in order. If it ever disagreed with the
+    server's, the page would simply always be sent in full.
+    """
+    h = 0
+    for uid in user_ids:
+        h ^= h >> 21
+        h ^= (h << 35) & _MASK
+        h ^= h >> 4
+        h = (h + uid) & _MASK
+    return h - (1 << 64) if h >> 63 else h
+
+
+def member_fingerprint(digest: int, user) -> int:
+    """
+    A signed 64-bit hash of what a clean verdict on `user` rested on: the
+    group's detection digest (src.utils.checker.detection_digest), the name
+    fields, the username and the photo's unique id. A delta sweep skips a
+    member whose fingerprint matches the one stored when they were last
+    screened clean.
+    """
+    photo = getattr(user, "photo", None)
+    content = repr((digest, user.first_name, getattr(user, "last_name", None), user.username,
+                    photo.big_photo_unique_id if photo else None))
+    return int.from_bytes(hashlib.blake2b(content.encode(), digest_size=8).digest(),
+                          "big", signed=True)
+
+
+@dataclass
+class MemberPage:
+    offset: int                   # members before this page
+    members: list                 # pyrogram ChatMembers; empty when unchanged
+    user_ids: tuple[int, ...]     # in server order
+    hash: int
+    unchanged: bool = False       # NotModified for the hash offered
+
+
+def _member_id(member) -> int:
+    return member.user.id if member.user else member.chat.id
+
+
+# offset -> (hash, user_ids) of the page last seen there, when the caller is
+# willing to skip it unchanged; None asks for it in full.
+KnownPage = Callable[[int], Optional[tuple[int, tuple[int, ...]]]]
+
+
+async def member_pages(
+    client, chat_id: int, offset: int = 0, known: Optional[KnownPage] = None,
+) -> AsyncIterator[MemberPage]:
+    """
+    Yield the group's members a page at a time, starting after the first
+    `offset`, until the list runs out. Each request waits for the shared
+    member-page pacer (src.watcher.fetch). FloodWaits over pyrogram's sleep
+    threshold propagate, as they do from get_chat_members.
+    """
+    peer = await client.resolve_peer(chat_id)
+    if isinstance(peer, raw.types.InputPeerChat):
+        members = [m async for m in client.get_chat_members(chat_id)][offset:]
+        ids = tuple(_member_id(m) for m in members)
+        if members:
+            yield MemberPage(offset, members, ids, participants_hash(ids))
+        return
+
+    while True:
+        remembered = known(offset) if known else None
+        await pace_member_page()
+        r = await client.invoke(
+            raw.functions.channels.GetParticipants(
+                channel=peer,
+                filter=raw.types.ChannelParticipantsSearch(q=""),
+                offset=offset,
+                limit=PAGE_SIZE,
+                hash=remembered[0] if remembered else 0,
+            ),
+            sleep_threshold=60,
+        )
+        if isinstance(r, raw.types.channels.ChannelParticipantsNotModified):
+            if not remembered:
+                return
+            page_hash, ids = remembered
+            yield MemberPage(offset, [], ids, page_hash, unchanged=True)
+            offset += len(ids)
+            continue
+        if not r.participants:
+            return
+        users = {u.id: u for u in r.users}
+        chats = {c.id: c for c in r.chats}
+        members = [types.ChatMember._parse(client, p, users, chats) for p in r.participants]
+        ids = tuple(_member_id(m) for m in members)
+        yield MemberPage(offset, members, ids, participants_hash(ids))
+        offset += len(members)
@@ -0,0 +1,150 @@
+"""
+Scheduled sweeps of every configured group.
+
+The periodic sweep used to walk the groups one after another, each to
+completion or SWEEP_HARD_CAP_SECONDS. With a couple of hundred groups on a 24h
+interval the end of the list went stale, and one huge group held up every
+small one behind it. Now up to SWEEP_CONCURRENCY groups are swept at once, in
+turns of at most SWEEP_SLICE_SECONDS, highest priority first (see
+sweep_priority).
+
+A group not finished in its turn goes back in the queue with its priority
+divided by the turns it has had, so it gets another slot only when nothing
+fresher is waiting: a 100k-member group is swept in slices between the small
+ones rather than ahead of all of them. Each turn resumes where the last one
+stopped (groups.sweep_offset), until the group completes or has used
+SWEEP_HARD_CAP_SECONDS in the cycle. However many turns it took, the group's
+cycle is one sweep: one summary, and one row in sweep_runs with the turns'
+counts added up.
+
+The sweeps share one account, and its budget is the pacers in
+src.watcher.fetch: photo downloads, bios and member pages are each spaced
+across every sweep (and event handler) together, and a FloodWait seen by any
+of them backs all of them off (report_flood). More concurrent groups therefore
+does not mean more calls per second, only that no pacer sits idle while one
+group scores or waits on the database.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from typing import Optional
+
+from pyrogram import Client
+from telegram import Bot
+
+from src.config import (
+    SWEEP_CONCURRENCY, SWEEP_HARD_CAP_SECONDS, SWEEP_INTERVAL_HOURS, SWEEP_SLICE_SECONDS,
+)
+from src.db import get_sweep_schedule, record_sweep_run, run_db
+from src.watcher.sweep import _post_sweep_summary, sweep_group
+
+logger = logging.getLogger(__name__)
+
+# Staleness credited to a group that has never completed a pass: ahead of any
+# group merely overdue, short of one overdue for weeks.
+_NEVER_SWEPT = 10.0
+
+# Result counts summed across a group's turns for its one summary.
+_SUMMED = ("iterated", "checked", "flagged", "errors",
+           "bios_skipped", "pfps_skipped", "unchanged_skipped")
+
+
+def sweep_priority(coverage_age: Optional[float], detections_7d: int,
+                   member_count: Optional[int]) -> float:
+    """
+    How urgently a group needs sweeping; higher goes first.
+
+      - coverage age, in sweep intervals: a group a day overdue outranks one
+        swept an hour ago, and a group never swept outranks both;
+      - recent detections, logarithmically: a group being targeted now is
+        swept sooner, without a flood of alerts pinning it to the front;
+      - size, as a tiebreak of at most about half an interval: bigger groups
+        need the most turns, so among equals they start first.
+    """
+    interval = SWEEP_INTERVAL_HOURS * 3600
+    staleness = _NEVER_SWEPT if coverage_age is None else coverage_age / interval
+    return staleness + math.log1p(detections_7d or 0) + math.log10(1 + (member_count or 0)) / 10
+
+
+async def run_sweep_cycle(
+    pyro: Client, bot: Bot, group_ids: list[int], log_channel_id: Optional[str] = None,
+) -> dict[int, dict]:
+    """
+    Sweep every group in `group_ids` once, SWEEP_CONCURRENCY at a time, and
+    record and post each group's summary when it is done with. Returns each group's
+    result, its counts summed over its turns, with `turns` added.
+    """
+    rows = {r["group_id"]: r for r in await run_db(get_sweep_schedule, group_ids)}
+    order = itertools.count()
+    queue: list[tuple[float, int, int]] = []
+    base: dict[int, float] = {}
+    for gid in group_ids:
+        row = rows.get(gid) or {}
+        base[gid] = sweep_priority(row.get("coverage_age"), row.get("detections_7d") or 0,
+                                   row.get("member_count"))
+        heapq.heappush(queue, (-base[gid], next(order), gid))
+
+    used: dict[int, float] = dict.fromkeys(group_ids, 0.0)
+    results: dict[int, dict] = {}
+
+    async def _turn(gid: int) -> bool:
+        """Sweep `gid` for one slice; True if it should have another."""
+        started = time.monotonic()
+        result = await sweep_group(
+            pyro, bot, gid, log_channel_id, trigger="auto",
+            time_budget=min(SWEEP_SLICE_SECONDS, SWEEP_HARD_CAP_SECONDS - used[gid]),
+            record_run=False,
+        )
+        used[gid] += time.monotonic() - started
+        if result.get("status") == "already_running":
+            # A /sweep of it is in progress; that covers this cycle too.
+            logger.info(f"Scheduled sweep of {gid} skipped: a sweep is already running.")
+            return False
+        total = results.setdefault(gid, {"turns": 0})
+        total["turns"] += 1
+        for key in _SUMMED:
+            total[key] = total.get(key, 0) + result.get(key, 0)
+        total["partial"] = result.get("partial", False)
+        return bool(result.get("capped")) and used[gid] < SWEEP_HARD_CAP_SECONDS
+
+    async def _finish(gid: int) -> None:
+        """Record and post `gid`'s summed totals; neither step stops the other."""
+        total = results[gid]
+        logger.info(f"Scheduled sweep complete for {gid}: {total}")
+        try:
+            await run_db(
+                record_sweep_run, gid, total["iterated"], total["checked"],
+                total["flagged"], total["errors"], "auto", partial=total["partial"],
+                bios_skipped=total["bios_skipped"], pfps_skipped=total["pfps_skipped"],
+            )
+        except Exception as e:
+            logger.exception(f"Recording the scheduled sweep of {gid} failed: {e}")
+        try:
+            await _post_sweep_summary(bot, gid, total, log_channel_id)
+        except Exception as e:
+            logger.exception(f"Posting the scheduled sweep summary for {gid} failed: {e}")
+
+    async def _worker() -> None:
+        while queue:
+            _, _, gid = heapq.heappop(queue)
+            try:
+                if await _turn(gid):
+                    turns = results[gid]["turns"]
+                    heapq.heappush(queue, (-base[gid] / (1 + turns), next(order), gid))
+                    continue
+            except Exception as e:
+                # Per-group failure: log and keep going for other groups. The
+                # slices that did finish are still recorded, as a partial run.
+                logger.exception(f"Periodic sweep failed for group {gid}: {e}")
+                if gid in results:
+                    results[gid]["partial"] = True
+            if gid in results:
+                await _finish(gid)
+
+    await asyncio.gather(*(_worker() for _ in range(min(SWEEP_CONCURRENCY, len(group_ids)))))
+    return results
@@ -4,6 +4,8 @@ Full group member sweep via Pyrogram.
 
 Iterates every member of a monitored group and runs impersonation checks.
 The Bot API cannot enumerate supergroup members — this is the MTProto advantage.
+Enumeration, name scoring and the paced photo and bio fetches run as separate
+stages joined by bounded queues (see sweep_group's _pipeline).
 
 Called from:
   - /sweep command (on-demand, triggered via PTB)
@@ -12,10 +14,11 @@ Called from:
 from __future__ import annotations
 
 import asyncio
+import dataclasses
 import html
 import logging
 import time
-from typing import Optional
+from typing import NamedTuple, Optional
 
 from pyrogram import Client
 from pyrogram.enums import ChatMemberStatus as PyroChatMemberStatus
@@ -25,17 +28,83 @@ from telegram import Bot
 from src.config import SWEEP_INTERVAL_HOURS, SWEEP_HARD_CAP_SECONDS
 from src.db import (
     get_all_group_ids, get_group, get_reserved_keywords, get_whitelist,
-    is_whitelisted, mark_seen, record_sweep_run, upsert_whitelisted_user,
-    DatabaseUnavailable, run_db, get_group_sweep_offset, set_group_sweep_offset,
+    load_sweep_member_state, prime_sweep_chunk, mark_seen, record_sweep_run,
+    record_sweep_coverage, set_member_fingerprint,
+    upsert_whitelisted_user, DatabaseUnavailable, run_db, get_group_sweep_offset,
+    set_group_sweep_offset,
 )
-from src.utils.checker import UserSnapshot, check_user, ban_and_log
-from src.utils.image import compute_pfp_hash_bytes
+from src.utils.checker import (
+    DetectionResult, UserSnapshot, check_user, ban_and_log, prescore_snapshots, resume_check,
+    detection_versions, detection_digest,
+)
+from src.utils.image import PhotoFingerprint
+from src.watcher.members import member_fingerprint, member_pages
 
 logger = logging.getLogger(__name__)
 
 
 _sweep_locks: dict[int, asyncio.Lock] = {}
 
+# Members enumerated before their username/name stages are scored together.
+# Each chunk is one cdist matrix per stage instead of one fuzzy scan per member;
+# 100 keeps the matrix small and the hard-cap check close to per-member.
+_SCORE_CHUNK_SIZE = 100
+
+# Queue bounds between the sweep's pipeline stages (see sweep_group's
+# _pipeline). Enumeration runs at most this many chunks ahead of scoring, and
+# scoring at most this many members ahead of each fetch stage; a full queue
+# stalls the stage feeding it, so memory stays flat however far the paced
+# fetches fall behind.
+_SCORE_QUEUE_CHUNKS = 2
+_FETCH_QUEUE_MEMBERS = _SCORE_CHUNK_SIZE
+
+# Workers per fetch stage. The pacer still spaces the calls; a second worker
+# lets one call's round trip overlap the wait for the next slot.
+_FETCH_WORKERS = 2
+
+
+class _HardCapReached(Exception):
+    """Raised by a pipeline stage once the run is past SWEEP_HARD_CAP_SECONDS."""
+
+
+@dataclasses.dataclass
+class _Screening:
+    """A member between the sweep's scoring and fetch stages."""
+    pos: int                             # 1-based position in the member list
+    user: object                         # pyrogram User
+    snapshot: Optional[UserSnapshot]
+    result: Optional[DetectionResult] = None   # None: an admin, fetched to whitelist
+    fully_screened: bool = True          # False once a fetch was skipped by the pacer
+    fingerprint: Optional[int] = None    # member_fingerprint, recorded if screened clean
+
+
+class _ScreenedPage(NamedTuple):
+    """A GetParticipants page every member of which this process screened."""
+    hash: int
+    user_ids: tuple[int, ...]
+    exempt: frozenset[int]           # bots and deleted accounts: never screened
+    versions: tuple[int, int, int]   # detection_versions() when it was screened
+
+
+# group_id -> server offset -> the page screened there. In memory only: after a
+# restart every page is fetched in full once. A page is offered back with its
+# hash, and skipped if the server says nobody in it changed, only while the
+# group's detection versions are the same and every member in it is still
+# marked seen — a profile change unmarks the member (events.py), and marks
+# lapse after db._SEEN_REFRESH_DAYS, so no verdict outlives either.
+_screened_pages: dict[int, dict[int, _ScreenedPage]] = {}
+
+
+async def _recheck(result, snapshot: UserSnapshot, group_id: int):
+    """
+    Re-screen a member after fetching their photo or bio. Resumes the earlier
+    check where it stopped when it can (see checker.resume_check), so only the
+    stages the new data can change run again; otherwise checks from the top.
+    """
+    if result.continuation is not None:
+        return await resume_check(result, snapshot)
+    return await check_user(snapshot, group_id)
+
 
 async def sweep_group(
     pyro: Client,
@@ -44,6 +113,9 @@ async def sweep_group(
     log_channel_id: Optional[str] = None,
     progress_cb=None,
     trigger: str = "manual",
+    time_budget: Optional[float] = None,
+    delta: bool = True,
+    record_run: bool = True,
 ) -> dict:
     """
     Sweep all members of group_id.
@@ -52,8 +124,19 @@ async def sweep_group(
     trigger                                 — "manual" or "auto"; recorded in
                                               sweep_runs so we can show
                                               "sweeps in the last 24h / 30d".
-
-    Returns a summary dict with keys: iterated, checked, flagged, errors.
+    time_budget                             — seconds this run may take, if
+                                              less than SWEEP_HARD_CAP_SECONDS
+                                              (the scheduler's fair-share slice).
+    delta                                   — skip members whose profile
+                                              fingerprint matches the one they
+                                              were last screened clean under;
+                                              False screens everyone (/sweep full).
+    record_run                              — persist the run in sweep_runs; the
+                                              scheduler passes False and records
+                                              a group's turns as one run.
+
+    Returns a summary dict with keys: iterated, checked, flagged, errors,
+    partial, capped (stopped by the time budget), and the skip counts.
     """
     if group_id not in _sweep_locks:
         _sweep_locks[group_id] = asyncio.Lock()
@@ -74,7 +157,7 @@ async def sweep_group(
             # Resolve the peer first — required for new sessions where the entity
             # isn't yet in Pyrogram's local cache.
             # Timeout prevents a Pyrogram network hang from holding the lock forever.
-            await asyncio.wait_for(pyro.get_chat(group_id), timeout=30)
+            chat = await asyncio.wait_for(pyro.get_chat(group_id), timeout=30)
         except TimeoutError:
             logger.error(f"Timeout resolving group {group_id} for sweep (>30s) — releasing lock.")
             return {"iterated": 0, "checked": 0, "flagged": 0, "errors": 1}
@@ -82,12 +165,27 @@ async def sweep_group(
             logger.error(f"Cannot resolve group {group_id} for sweep: {e}")
             return {"iterated": 0, "checked": 0, "flagged": 0, "errors": 1}
 
-        sweep_deadline = time.monotonic() + SWEEP_HARD_CAP_SECONDS  # hard cap per group
+        # Hard cap per group, or the scheduler's shorter slice.
+        budget = SWEEP_HARD_CAP_SECONDS if time_budget is None else min(time_budget, SWEEP_HARD_CAP_SECONDS)
+        sweep_deadline = time.monotonic() + budget
+        capped = False
+        # For the scheduler's ranking (groups.member_count).
+        member_count = getattr(chat, "members_count", None)
 
         # Bios are expensive (one MTProto GetFullUser call each) and irrelevant
         # for groups with no reserved keywords — bio is only consulted by the
         # keyword detection stage. Resolve once and skip the call otherwise.
         has_keywords = bool(await run_db(get_reserved_keywords, group_id))
+
+        # Whitelist, false-positive and recently-seen sets for the whole run,
+        # read once (see db.load_sweep_member_state) and kept current with the
+        # sweep's own writes below. check_user still enforces the live
+        # whitelist; the set only spares protected members the thread hop.
+        try:
+            members = await run_db(load_sweep_member_state, group_id)
+        except DatabaseUnavailable as e:
+            logger.error(f"Cannot sweep {group_id}: {e}")
+            return {"iterated": 0, "checked": 0, "flagged": 0, "errors": 1}
         from src.watcher.fetch import (
             bio_cooldown_remaining, pfp_cooldown_remaining,
             fetch_bio as _fetch_bio,
@@ -100,163 +198,264 @@ async def sweep_group(
         # Where the last capped run stopped. Participant ordering is stable, so
         # without this the same prefix was re-scanned every run and the tail was
         # never reached — while /sweep told the admin "re-run to continue".
-        #
-        # We skip client-side rather than seeking server-side: get_chat_members
-        # manages its own internal offset and exposes no parameter for it, and
-        # driving raw channels.GetParticipants would be a far bigger, more
-        # layer-sensitive change. Skipping still costs a few cheap enumeration
-        # requests (200 members each), but the budget is spent almost entirely on
-        # the paced per-member GetFullUser/photo calls, so the run now advances
-        # into genuinely unscanned members instead of redoing the prefix.
+        # It is a server-side offset: member_pages asks GetParticipants for the
+        # members after it directly, instead of enumerating the prefix again
+        # and discarding it.
         start_offset = await run_db(get_group_sweep_offset, group_id)
         if start_offset:
             logger.info(
                 f"Resuming sweep of {group_id} after member {start_offset} "
                 "(previous run hit the cap)."
             )
-        position = 0        # members seen from the iterator, including skipped
+        # Every member up to this position has been screened. Members enumerated
+        # but not yet through every stage when the run stops must be picked up
+        # next time.
+        resume_at = start_offset
 
+        # Unchanged pages (see _screened_pages). No versions, no skipping.
         try:
-            async for member in pyro.get_chat_members(group_id):
-                position += 1
-                if position <= start_offset:
-                    continue          # already covered by an earlier run
-
-                if time.monotonic() > sweep_deadline:
-                    partial = True
-                    logger.warning(
-                        f"Sweep hard-cap reached for group {group_id}; stopping early "
-                        f"after {iterated} members scanned this run (position "
-                        f"{position - 1} overall) — the remainder will be picked up "
-                        "next run."
-                    )
-                    break
-
-                # Per-member isolation. Without this, ANY exception from
-                # check_user, a hash, a fetch or a write fell through to the
-                # generic handler below and terminated the whole group's sweep —
-                # after three members, say — and it was then reported as a clean
-                # run. One pathological avatar must cost one member, not the rest
-                # of the group. (imagehash.phash is called outside image.py's own
-                # try block, so this is a real path, not a hypothetical.)
-                try:
-                    iterated += 1
+            versions = await run_db(detection_versions, group_id)
+        except DatabaseUnavailable:
+            versions = None
+        # Fingerprints (see members.member_fingerprint) are recorded on every
+        # run, full or not, so the next delta run can skip on them. Without a
+        # digest none is recorded and nobody is skipped.
+        try:
+            digest = await run_db(detection_digest, group_id)
+        except DatabaseUnavailable:
+            digest = None
+        screened = _screened_pages.setdefault(group_id, {})
+        # Last position of each enumerated page -> its record, moved into
+        # `screened` once that member has been screened.
+        finishing: dict[int, tuple[int, _ScreenedPage]] = {}
+        unchanged_skipped = 0
+
+        def _known_page(offset: int):
+            page = screened.get(offset)
+            if page is None or versions is None or page.versions != versions:
+                return None
+            if all(uid in members.seen or uid in members.whitelisted or uid in page.exempt
+                   for uid in page.user_ids):
+                return page.hash, page.user_ids
+            return None
+
+        async def _mark_seen(user_id: int) -> None:
+            # A recent mark needs no rewrite — it would only renew last_checked_at.
+            if user_id not in members.seen:
+                await run_db(mark_seen, group_id, user_id)
+                members.seen.add(user_id)
+
+        # Positions screened past resume_at, waiting for the ones before them.
+        # Members finish out of order once fetches are involved; the resume
+        # point only ever advances over an unbroken run of screened members.
+        done: set[int] = set()
+
+        def _finish(pos: int) -> None:
+            nonlocal resume_at
+            done.add(pos)
+            while resume_at + 1 in done:
+                resume_at += 1
+                done.discard(resume_at)
+                if resume_at in finishing:
+                    offset, page = finishing.pop(resume_at)
+                    screened[offset] = page
+
+        def _check_deadline() -> None:
+            # Checked after each member, so even a run that starts past its cap
+            # screens one member rather than none.
+            if time.monotonic() > sweep_deadline:
+                raise _HardCapReached
+
+        score_q: asyncio.Queue = asyncio.Queue(maxsize=_SCORE_QUEUE_CHUNKS)
+        pfp_q: asyncio.Queue = asyncio.Queue(maxsize=_FETCH_QUEUE_MEMBERS)
+        bio_q: asyncio.Queue = asyncio.Queue(maxsize=_FETCH_QUEUE_MEMBERS)
+
+        async def _conclude(item: _Screening) -> None:
+            """Act on a member's final verdict."""
+            nonlocal checked, flagged
+            checked += 1
+            if item.result.flagged:
+                flagged += 1
+
+                # Per-group log channel, same as every foreground path.
+                # The summary below already resolved it correctly; the
+                # detections themselves did not.
+                from src.utils.checker import make_action_funcs, resolve_log_channel
+                channel = resolve_log_channel(group_id, log_channel_id)
+                ban_func, unban_func, log_notify = make_action_funcs(bot, channel)
+
+                await ban_and_log(
+                    result=item.result,
+                    snapshot=item.snapshot,
+                    group_id=group_id,
+                    trigger="sweep",
+                    ban_func=ban_func,
+                    unban_func=unban_func,
+                    log_channel_notify=log_notify,
+                )
+            elif item.fully_screened and item.result.screened:
+                await _mark_seen(item.user.id)
+                if item.fingerprint is not None and \
+                        members.fingerprints.get(item.user.id) != item.fingerprint:
+                    await run_db(set_member_fingerprint, group_id, item.user.id, item.fingerprint)
+            # else: unflagged but incompletely screened, or not screened at
+            # all (inside a false-positive window, say) — deliberately NOT
+            # marked seen or fingerprinted, so the next sweep (or their first
+            # message) gets another chance at them.
+
+        async def _after_name_stages(item: _Screening) -> None:
+            # Lazy bio: name/username were clean, but the group has reserved
+            # keywords — a scammer's banned word might be hiding in their bio
+            # (which Bot API can't see and `get_chat_members` doesn't return).
+            # One extra MTProto call per still-unflagged non-bot member.
+            if not item.result.flagged and item.result.screened and has_keywords:
+                await bio_q.put(item)
+            else:
+                await _conclude(item)
+                _finish(item.pos)
+
+        async def _whitelist_admin(item: _Screening, photo: Optional[PhotoFingerprint]) -> None:
+            user = item.user
+            await run_db(
+                upsert_whitelisted_user,
+                group_id=group_id,
+                user_id=user.id,
+                username=user.username,
+                first_name=user.first_name or "",
+                last_name=user.last_name,
+                pfp_hash=photo.base if photo else None,
+                whitelisted_by=bot.id,
+                user_type="admin",
+                is_bot=bool(user.is_bot),
+            )
+            members.whitelisted.add(user.id)
+            await _mark_seen(user.id)
+
+        async def _score(pos: int, member, snapshot: Optional[UserSnapshot],
+                         fingerprint: Optional[int] = None) -> None:
+            """Run one member through the name stages and route them on. `snapshot`
+            is prescored, or None for members the fast path never scores
+            (deleted, bots)."""
+            nonlocal iterated
+            iterated += 1
+            user = member.user
+            if not user or user.is_deleted:
+                _finish(pos)
+                return
+
+            # Skip whitelisted users immediately
+            if user.id in members.whitelisted:
+                _finish(pos)
+                return
+
+            # Auto-whitelist current admins that /import_admins may have missed.
+            # Include admin bots (Rose, Combot, etc.) but skip the bot itself.
+            if member.status in (PyroChatMemberStatus.ADMINISTRATOR, PyroChatMemberStatus.OWNER):
+                if user.id == bot.id:
+                    _finish(pos)
+                    return
+                # Bots don't usually have meaningful PFPs; skip the CDN download for them
+                if user.is_bot:
+                    await _whitelist_admin(_Screening(pos, user, None), None)
+                    _finish(pos)
+                    return
+                await pfp_q.put(_Screening(pos, user, None))
+                return
+
+            # Non-admin bots can't impersonate anyone — skip them
+            if user.is_bot:
+                _finish(pos)
+                return
+
+            # Fast path: username + name checks only — no PFP download.
+            # The snapshot was built and prescored with the rest of its chunk.
+            item = _Screening(pos, user, snapshot, await check_user(snapshot, group_id),
+                              fingerprint=fingerprint)
+
+            # Lazy PFP: only fetch when there's a weak name match that needs confirmation
+            if item.result.needs_pfp:
+                await pfp_q.put(item)
+            else:
+                await _after_name_stages(item)
+
+        def _member_failed(user_id, pos: int, e: Exception) -> None:
+            # Per-member isolation. Without this, ANY exception from
+            # check_user, a hash, a fetch or a write ended the whole group's
+            # sweep — after three members, say — and it was then reported as
+            # a clean run. One pathological avatar must cost one member, not
+            # the rest of the group. (imagehash.phash is called outside
+            # image.py's own try block, so this is a real path, not a
+            # hypothetical.)
+            nonlocal errors
+            errors += 1
+            logger.warning(f"Skipping member {user_id} in {group_id} after an error: {e}")
+            _finish(pos)
+
+        async def _score_stage() -> None:
+            """
+            Screen enumerated chunks of (position, member) pairs through the
+            name stages; members that need a photo or bio go on to the fetch
+            stages, the rest are concluded here.
+
+            Each chunk's username and name stages are scored together first, as
+            one matrix per stage (prescore_snapshots), so the per-member checks
+            below skip their own fuzzy matching. Verdicts are unchanged. The
+            per-user caches check_user reads are primed for the chunk too.
+
+            On a delta run, a member still marked seen whose fingerprint matches
+            the stored one is skipped before any of that: nothing the clean
+            verdict rested on has changed. Admins and anyone on the blocklist
+            (or whose entry can't be read) are always screened, and the seen
+            mark is not renewed by a skip, so everyone is screened in full
+            again once it lapses (db._SEEN_REFRESH_DAYS).
+            """
+            nonlocal iterated, unchanged_skipped
+            while True:
+                chunk = await score_q.get()
+                snapshots = {}
+                fingerprints = {}
+                for _, member in chunk:
                     user = member.user
-                    if not user or user.is_deleted:
-                        continue
-
-                    # Skip whitelisted users immediately
-                    if await run_db(is_whitelisted, group_id, user.id):
-                        continue
-
-                    # Auto-whitelist current admins that /import_admins may have missed.
-                    # Include admin bots (Rose, Combot, etc.) but skip the bot itself.
-                    if member.status in (PyroChatMemberStatus.ADMINISTRATOR, PyroChatMemberStatus.OWNER):
-                        if user.id == bot.id:
-                            continue
-                        # Bots don't usually have meaningful PFPs; skip the CDN download for them
-                        pfp_bytes_admin = None if user.is_bot else await _fetch_pfp(pyro, user.id, wait=True)
-                        await run_db(
-                            upsert_whitelisted_user,
-                            group_id=group_id,
+                    if user and not user.is_deleted and not user.is_bot:
+                        snapshots[user.id] = UserSnapshot(
                             user_id=user.id,
                             username=user.username,
                             first_name=user.first_name or "",
                             last_name=user.last_name,
-                            pfp_hash=compute_pfp_hash_bytes(pfp_bytes_admin) if pfp_bytes_admin else None,
-                            whitelisted_by=bot.id,
-                            user_type="admin",
-                            is_bot=bool(user.is_bot),
+                            pfp_bytes=None,
                         )
-                        await run_db(mark_seen, group_id, user.id)
-                        continue
-
-                    # Non-admin bots can't impersonate anyone — skip them
-                    if user.is_bot:
-                        continue
-
-                    # Fast path: username + name checks only — no PFP download
-                    snapshot = UserSnapshot(
-                        user_id=user.id,
-                        username=user.username,
-                        first_name=user.first_name or "",
-                        last_name=user.last_name,
-                        pfp_bytes=None,
-                    )
-
-                    result = await check_user(snapshot, group_id)
-
-                    # Lazy PFP: only fetch when there's a weak name match that needs confirmation
-                    # True once every check this member needed has actually
-                    # run. mark_seen is a PERMANENT skip as far as messages.py
-                    # is concerned, so claiming it for a member the pacer never
-                    # screened hides them from every future check.
-                    fully_screened = True
-
-                    if result.needs_pfp:
-                        pfp_bytes = await _fetch_pfp(pyro, user.id, wait=True)
-                        if pfp_bytes:
-                            snapshot = UserSnapshot(
-                                user_id=user.id,
-                                username=user.username,
-                                first_name=user.first_name or "",
-                                last_name=user.last_name,
-                                pfp_bytes=pfp_bytes,
-                            )
-                            result = await check_user(snapshot, group_id)
-                        elif pfp_cooldown_remaining() > 0:
-                            # The download was SKIPPED, which is not the same as
-                            # "this user has no avatar" — and the verdict for a
-                            # weak name match depends on it. Previously both
-                            # cases fell through as clean.
-                            pfps_skipped += 1
-                            fully_screened = False
-
-                    # Lazy bio: name/username were clean, but the group has reserved
-                    # keywords — a scammer's banned word might be hiding in their bio
-                    # (which Bot API can't see and `get_chat_members` doesn't return).
-                    # One extra MTProto call per still-unflagged non-bot member.
-                    # wait=True rides out flood cooldowns instead of silently
-                    # skipping; the pacer in src.watcher.fetch does the throttling.
-                    if not result.flagged and has_keywords:
-                        bio = await _fetch_bio(pyro, user.id, wait=True)
-                        if bio is None and bio_cooldown_remaining() > 0:
-                            # The fetch was skipped (or itself flooded) — this
-                            # member's bio was NOT screened. Count it so the
-                            # summary stays honest, and do not claim the member
-                            # as permanently checked.
-                            bios_skipped += 1
-                            fully_screened = False
-                        if bio:
-                            snapshot.bio = bio
-                            result = await check_user(snapshot, group_id)
-
-                    checked += 1
-
-                    if result.flagged:
-                        flagged += 1
-
-                        # Per-group log channel, same as every foreground path.
-                        # The summary below already resolved it correctly; the
-                        # detections themselves did not.
-                        from src.utils.checker import make_action_funcs, resolve_log_channel
-                        channel = resolve_log_channel(group_id, log_channel_id)
-                        ban_func, unban_func, log_notify = make_action_funcs(bot, channel)
-
-                        await ban_and_log(
-                            result=result,
-                            snapshot=snapshot,
-                            group_id=group_id,
-                            trigger="sweep",
-                            ban_func=ban_func,
-                            unban_func=unban_func,
-                            log_channel_notify=log_notify,
-                        )
-                    elif fully_screened:
-                        await run_db(mark_seen, group_id, user.id)
-                    # else: unflagged but incompletely screened — deliberately
-                    # NOT marked seen, so the next sweep (or their first message)
-                    # gets another chance at them.
+                        if digest is not None:
+                            fingerprints[user.id] = member_fingerprint(digest, user)
+                unchanged = set()
+                if snapshots:
+                    listed = await run_db(prime_sweep_chunk, group_id, list(snapshots)) or set()
+                    if delta:
+                        unchanged = {
+                            member.user.id for _, member in chunk
+                            if member.user and member.user.id in fingerprints
+                            and member.user.id in members.seen
+                            and member.user.id not in listed
+                            and member.status not in (PyroChatMemberStatus.ADMINISTRATOR,
+                                                      PyroChatMemberStatus.OWNER)
+                            and members.fingerprints.get(member.user.id)
+                            == fingerprints[member.user.id]
+                        }
+                    to_score = [snap for uid, snap in snapshots.items() if uid not in unchanged]
+                    if to_score:
+                        await run_db(prescore_snapshots, to_score, group_id)
+
+                for pos, member in chunk:
+                    user = member.user
+                    try:
+                        if user and user.id in unchanged:
+                            iterated += 1
+                            unchanged_skipped += 1
+                            _finish(pos)
+                        else:
+                            await _score(pos, member, snapshots.get(user.id) if user else None,
+                                         fingerprints.get(user.id) if user else None)
+                    except Exception as e:
+                        _member_failed(getattr(user, "id", "?"), pos, e)
 
                     # Progress update every 50 members iterated (not just checked)
                     # so the admin sees movement even when everyone is whitelisted/admin.
@@ -265,20 +464,147 @@ async def sweep_group(
 
                     # Yield control to the event loop so concurrent PTB handlers
                     # (e.g. commands run during a sweep) can process their HTTP
-                    # responses without timing out. Network-call pacing happens
-                    # inside src.watcher.fetch, shared with every other caller.
+                    # responses without timing out.
                     await asyncio.sleep(0)
+                    _check_deadline()
+                score_q.task_done()
+
+        async def _pfp_stage() -> None:
+            """Fetch photos for admins and weak name matches. Pacing happens
+            inside src.watcher.fetch, shared with every other caller; wait=True
+            rides out flood cooldowns instead of silently skipping."""
+            nonlocal pfps_skipped
+            while True:
+                item = await pfp_q.get()
+                try:
+                    # The member list carries the photo's id, so a photo
+                    # hashed before costs no call at all.
+                    photo_id = getattr(getattr(item.user, "photo", None), "big_photo_unique_id", None)
+                    photo = await _fetch_pfp(pyro, item.user.id, wait=True, unique_id=photo_id)
+                    if item.result is None:
+                        await _whitelist_admin(item, photo)
+                        _finish(item.pos)
+                    else:
+                        if photo:
+                            # replace() keeps the chunk's prescored name stages.
+                            item.snapshot = dataclasses.replace(item.snapshot, photo=photo)
+                            item.result = await _recheck(item.result, item.snapshot, group_id)
+                        elif pfp_cooldown_remaining() > 0:
+                            # The download was SKIPPED, which is not the same as
+                            # "this user has no avatar" — and the verdict for a
+                            # weak name match depends on it. Previously both
+                            # cases fell through as clean.
+                            pfps_skipped += 1
+                            item.fully_screened = False
+                        await _after_name_stages(item)
                 except Exception as e:
-                    errors += 1
-                    logger.warning(
-                        f"Skipping member {getattr(member.user, 'id', '?')} in "
-                        f"{group_id} after an error: {e}"
-                    )
+                    _member_failed(item.user.id, item.pos, e)
+                pfp_q.task_done()
+                _check_deadline()
+
+        async def _bio_stage() -> None:
+            """Fetch bios for still-unflagged members of groups with reserved
+            keywords, paced like the photo stage."""
+            nonlocal bios_skipped
+            while True:
+                item = await bio_q.get()
+                try:
+                    bio = await _fetch_bio(pyro, item.user.id, wait=True)
+                    if bio is None and bio_cooldown_remaining() > 0:
+                        # The fetch was skipped (or itself flooded) — this
+                        # member's bio was NOT screened. Count it so the
+                        # summary stays honest, and do not claim the member
+                        # as permanently checked.
+                        bios_skipped += 1
+                        item.fully_screened = False
+                    if bio:
+                        item.snapshot.bio = bio
+                        item.result = await _recheck(item.result, item.snapshot, group_id)
+                    await _conclude(item)
+                    _finish(item.pos)
+                except Exception as e:
+                    _member_failed(item.user.id, item.pos, e)
+                bio_q.task_done()
+                _check_deadline()
+
+        async def _enumerate() -> None:
+            nonlocal unchanged_skipped
+            chunk: list = []
+            async for page in member_pages(pyro, group_id, start_offset, _known_page):
+                if page.unchanged:
+                    # Everyone in it was screened under these versions and is
+                    # still marked seen.
+                    unchanged_skipped += len(page.user_ids)
+                    for pos in range(page.offset + 1, page.offset + len(page.user_ids) + 1):
+                        _finish(pos)
                     continue
+                if versions is not None:
+                    exempt = frozenset(
+                        uid for uid, m in zip(page.user_ids, page.members, strict=True)
+                        if not m.user or m.user.is_deleted or m.user.is_bot
+                    )
+                    finishing[page.offset + len(page.members)] = (
+                        page.offset, _ScreenedPage(page.hash, page.user_ids, exempt, versions))
+                for i, member in enumerate(page.members):
+                    chunk.append((page.offset + i + 1, member))
+                    if len(chunk) >= _SCORE_CHUNK_SIZE:
+                        await score_q.put(chunk)
+                        chunk = []
+            if chunk:
+                await score_q.put(chunk)
+            # Every stage only feeds the ones after it, so each is drained once
+            # the one before it is.
+            for queue in (score_q, pfp_q, bio_q):
+                await queue.join()
+
+        async def _pipeline() -> None:
+            """
+            Enumeration, name scoring and the two paced fetches run as separate
+            stages joined by bounded queues, so none of them waits for another
+            to go idle: the next page is fetched while the pacers sleep, and
+            scoring continues while a fetch is in flight. A full queue stalls
+            the stage feeding it. Ends when enumeration has run out and every
+            queue is drained, or on the first exception to escape any stage;
+            the stages still running are cancelled either way.
+            """
+            stages = [
+                asyncio.create_task(_enumerate()),
+                asyncio.create_task(_score_stage()),
+                *(asyncio.create_task(_pfp_stage()) for _ in range(_FETCH_WORKERS)),
+                *(asyncio.create_task(_bio_stage()) for _ in range(_FETCH_WORKERS)),
+            ]
+            try:
+                # Only _enumerate returns; the other stages end by raising. The
+                # stages check the cap between members; this catches one stuck
+                # in a long pacer wait, after a second's grace for a run that
+                # starts past its cap.
+                finished, _ = await asyncio.wait(
+                    stages, timeout=max(sweep_deadline - time.monotonic(), 1.0),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not finished:
+                    raise _HardCapReached
+                for task in finished:
+                    task.result()
+            finally:
+                for task in stages:
+                    task.cancel()
+                await asyncio.gather(*stages, return_exceptions=True)
+
+        try:
+            await _pipeline()
 
+        except _HardCapReached:
+            partial = capped = True
+            logger.warning(
+                f"Sweep time budget ({budget:.0f}s) reached for group {group_id}; stopping early "
+                f"after {iterated} members scanned this run (screened through "
+                f"position {resume_at} overall) — the remainder will be picked "
+                "up next run."
+            )
         except FloodWait as e:
             # The member enumeration itself got rate-limited; we can't cheaply
-            # resume the async generator mid-stream, so this run is partial.
+            # resume the page iterator mid-stream, so this run is partial.
             # Sleep, mark partial, and DON'T immediately refresh PFPs (that would
             # fire a fresh media-download burst at the same flooded DC).
             partial = True
@@ -293,15 +619,18 @@ async def sweep_group(
             # tens of minutes, and we hold the group's sweep lock throughout —
             # blocking /sweep and stalling the remaining groups.
             await asyncio.sleep(min(e.value, 300))
-            await run_db(set_group_sweep_offset, group_id, position)
+            await run_db(set_group_sweep_offset, group_id, resume_at)
+            await run_db(record_sweep_coverage, group_id, member_count, False)
             result = {"iterated": iterated, "checked": checked, "flagged": flagged,
-                      "errors": errors, "partial": True,
-                      "bios_skipped": bios_skipped, "pfps_skipped": pfps_skipped}
-            await run_db(
-                record_sweep_run, group_id, iterated, checked, flagged, errors,
-                trigger, partial=True, bios_skipped=bios_skipped,
-                pfps_skipped=pfps_skipped,
-            )
+                      "errors": errors, "partial": True, "capped": False,
+                      "bios_skipped": bios_skipped, "pfps_skipped": pfps_skipped,
+                      "unchanged_skipped": unchanged_skipped}
+            if record_run:
+                await run_db(
+                    record_sweep_run, group_id, iterated, checked, flagged, errors,
+                    trigger, partial=True, bios_skipped=bios_skipped,
+                    pfps_skipped=pfps_skipped,
+                )
             return result
         except (ChatAdminRequired, UserNotParticipant) as e:
             logger.error(f"Sweep permission error for group {group_id}: {e}")
@@ -317,7 +646,8 @@ async def sweep_group(
 
         # Persist (or clear) the resume point. A completed pass resets to 0 so
         # the next run starts from the top again.
-        await run_db(set_group_sweep_offset, group_id, position if partial else 0)
+        await run_db(set_group_sweep_offset, group_id, resume_at if partial else 0)
+        await run_db(record_sweep_coverage, group_id, member_count, not partial)
 
         # Refresh stored PFP hashes for whitelisted users — but not when the run
         # was already cut short. This is unbounded work outside the deadline, and
@@ -332,31 +662,34 @@ async def sweep_group(
             await refresh_whitelist_pfps(pyro, group_id)
 
         result = {"iterated": iterated, "checked": checked, "flagged": flagged,
-                  "errors": errors, "partial": partial,
-                  "bios_skipped": bios_skipped, "pfps_skipped": pfps_skipped}
+                  "errors": errors, "partial": partial, "capped": capped,
+                  "bios_skipped": bios_skipped, "pfps_skipped": pfps_skipped,
+                  "unchanged_skipped": unchanged_skipped}
         # Persist this run — WITH its caveats — so /stats and the daily summary
         # can tell a complete pass from a truncated one.
-        await run_db(
-            record_sweep_run, group_id, iterated, checked, flagged, errors,
-            trigger, partial=partial, bios_skipped=bios_skipped,
-            pfps_skipped=pfps_skipped,
-        )
+        if record_run:
+            await run_db(
+                record_sweep_run, group_id, iterated, checked, flagged, errors,
+                trigger, partial=partial, bios_skipped=bios_skipped,
+                pfps_skipped=pfps_skipped,
+            )
         return result
 
 
 async def refresh_whitelist_pfps(pyro: Client, group_id: int):
     """
-    Re-download and re-hash the current profile photo for every whitelisted user.
-    Called automatically after each sweep so stored hashes never go stale.
+    Re-hash the current profile photo for every whitelisted user. Called
+    automatically after each sweep so stored hashes never go stale; a photo
+    already hashed is not downloaded again (see fetch_pfp_fingerprint).
     """
     whitelist = await run_db(get_whitelist, group_id)
     refreshed = 0
     for row in whitelist:
         # Pacing happens inside fetch; wait=True rides out flood cooldowns.
-        pfp_bytes = await _fetch_pfp(pyro, row["user_id"], wait=True)
-        if not pfp_bytes:
+        photo = await _fetch_pfp(pyro, row["user_id"], wait=True)
+        if not photo:
             continue
-        new_hash = compute_pfp_hash_bytes(pfp_bytes)
+        new_hash = photo.base
         if new_hash and new_hash != row["pfp_hash"]:
             upsert_whitelisted_user(
                 group_id=group_id,
@@ -377,11 +710,12 @@ async def refresh_whitelist_pfps(pyro: Client, group_id: int):
 
 async def run_periodic_sweeps(pyro: Client, bot: Bot, log_channel_id: Optional[str] = None):
     """
-    Background task: sweeps all configured groups every SWEEP_INTERVAL_HOURS hours.
+    Background task: sweeps all configured groups every SWEEP_INTERVAL_HOURS hours,
+    several at once and in fair-share turns (src.watcher.scheduler).
     The first sweep is delayed by a full interval — the bot does NOT sweep on startup.
     Admins should run /sweep manually after initial setup.
 
-    After each sweep we post a short per-group summary to that group's
+    After each group's sweep we post a short summary to that group's
     configured log channel (falling back to the global LOG_CHANNEL_ID).
 
     The entire loop body is wrapped in try/except so a transient failure
@@ -412,14 +746,8 @@ async def run_periodic_sweeps(pyro: Client, bot: Bot, log_channel_id: Optional[s
                 f"Starting scheduled sweep of {len(group_ids)}/{len(all_ids)} "
                 "group(s) (skipping unconfigured)."
             )
-            for gid in group_ids:
-                try:
-                    result = await sweep_group(pyro, bot, gid, log_channel_id, trigger="auto")
-                    logger.info(f"Scheduled sweep complete for {gid}: {result}")
-                    await _post_sweep_summary(bot, gid, result, log_channel_id)
-                except Exception as e:
-                    # Per-group failure: log and keep going for other groups
-                    logger.exception(f"Periodic sweep failed for group {gid}: {e}")
+            from src.watcher.scheduler import run_sweep_cycle
+            await run_sweep_cycle(pyro, bot, group_ids, log_channel_id)
         except asyncio.CancelledError:
             # Propagate cancellation so the task can exit cleanly on shutdown
             raise
@@ -454,6 +782,13 @@ async def _post_sweep_summary(
         f"Flagged: <code>{result.get('flagged', 0)}</code>\n"
         f"Errors: <code>{result.get('errors', 0)}</code>"
     )
+    if result.get("turns", 1) > 1:
+        text += f"\nSwept in <code>{result['turns']}</code> turns"
+    if result.get("unchanged_skipped"):
+        text += (
+            f"\nUnchanged since last screened: "
+            f"<code>{result['unchanged_skipped']}</code>"
+        )
     if result.get("partial"):
         text += "\n⚠️ Partial — stopped early (rate limit or time cap)."
     if result.get("bios_skipped"):
@@ -467,4 +802,4 @@ async def _post_sweep_summary(
 
 # PFP / bio fetch helpers live in src.watcher.fetch (shared, deduplicated).
 # Aliased to the historical private names used throughout this module.
-from src.watcher.fetch import fetch_pfp_bytes as _fetch_pfp  # noqa: E402
+from src.watcher.fetch import fetch_pfp_fingerprint as _fetch_pfp  # noqa: E402
@@ -3,7 +3,7 @@ Pytest bootstrap. Runs before any test module — and therefore before any
 `import src.*` — so it is the only place that can neutralise config.py's
 import-time environment read.
 
-Two jobs:
+Five jobs:
 
 1. Put the repo root on sys.path so plain `pytest` works, not just
    `python -m pytest` (which inserts the cwd implicitly).
@@ -16,13 +16,30 @@ Two jobs:
    makes threshold-sensitive tests machine-dependent. load_dotenv() does not
    override variables already present in os.environ, so setting them here wins.
 
+3. Empty checker's detection verdict cache, and db's read caches, around
+   every test (autouse).
+
+4. Keep detection reads at the src.db boundary (autouse): the batched
+   prefetch behind load_detection_context is switched off, so the context is
+   assembled from whatever db getters the test stubbed, and checker's own
+   get_group / get_whitelist resolve through src.db at call time, so one stub
+   covers both check_user and ban_and_log.
+
+5. Provide `stand_in`, a factory for StandInClient: an offline Pyrogram client
+   that answers GetParticipants from a synthetic member list with the real raw
+   types, so the sweep's paging, resuming and page hashes run without Telegram.
+
 No test needs a real token or a reachable database; everything that touches the
 DB is monkeypatched at the src.db boundary.
 """
 
 import os
 import sys
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Optional
+
+import pytest
 
 _REPO_ROOT = Path(__file__).resolve().parent.parent
 if str(_REPO_ROOT) not in sys.path:
@@ -53,3 +70,95 @@ os.environ["DEFAULT_BAN_SCORE"] = "90"
 os.environ["DEFAULT_ALERT_SCORE"] = "78"
 # No group is trusted to propagate bans in tests unless one opts in.
 os.environ["BLOCKLIST_TRUSTED_GROUPS"] = ""
+# Write-through: a test that calls a writer asserts on what it executed.
+# tests/test_write_behind.py turns batching on where it is under test.
+os.environ["WRITE_BEHIND_FLUSH_MS"] = "0"
+# Every helper on the executor; tests/test_async_pool.py covers the async twins.
+os.environ["DB_ASYNC_POOL"] = "0"
+# Writers don't publish invalidations, so a fake cursor sees only the write
+# itself; tests/test_cache_invalidation.py turns it on.
+os.environ["CACHE_NOTIFY"] = "0"
+# Test sweeps page through a stand-in member list back to back;
+# tests/test_sweep_scheduler.py covers the member-page pacer.
+os.environ["MEMBER_PAGE_MIN_INTERVAL"] = "0"
+
+
+@pytest.fixture(autouse=True)
+def _fresh_detection_cache():
+    """
+    Cached verdicts must not leak between tests: many tests monkeypatch what the
+    checker reads (hashing, thresholds) without changing any input that keys
+    the cache. Nor may cached reads, or blocklist ids, from one test's fake
+    database answer the next test's.
+    """
+    from src import db
+    from src.utils import checker
+    caches = (checker._detection_cache, db._group_cache, db._whitelist_cache, db._kw_cache,
+              db._fp_cache, db._bad_actor_cache, db._bad_actor_ids, db._bad_actor_ids_resync,
+              db._photo_hash_cache)
+    for cache in caches:
+        cache.clear()
+    yield
+    for cache in caches:
+        cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def _detection_reads_at_the_db_boundary(monkeypatch):
+    from src import db
+    from src.utils import checker
+    monkeypatch.setattr(db, "_prefetch_detection_reads", lambda *a: None)
+    monkeypatch.setattr(checker, "get_group", lambda gid: db.get_group(gid))
+    monkeypatch.setattr(checker, "get_whitelist", lambda gid: db.get_whitelist(gid))
+
+
+@dataclass
+class StandInClient:
+    """
+    Serves GetParticipants pages from `members` — (user_id, first_name,
+    username) tuples, in server order — as a supergroup would, including
+    NotModified for a page whose hash is offered back unchanged. `requests`
+    records each call's (offset, limit, hash).
+    """
+    members: list[tuple[int, str, Optional[str]]]
+    chat_id: int = -1001
+    requests: list[tuple[int, int, int]] = field(default_factory=list)
+
+    async def get_chat(self, chat_id):
+        return object()
+
+    async def resolve_peer(self, chat_id):
+        from pyrogram import raw
+        return raw.types.InputPeerChannel(channel_id=abs(chat_id), access_hash=0)
+
+    async def invoke(self, query, sleep_threshold=None):
+        from pyrogram import raw
+
+        from src.watcher.members import PAGE_SIZE, participants_hash
+        if not isinstance(query, raw.functions.channels.GetParticipants):
+            raise NotImplementedError(type(query).__name__)
+        self.requests.append((query.offset, query.limit, query.hash))
+        page = self.members[query.offset:query.offset + min(query.limit, PAGE_SIZE)]
+        if query.hash and query.hash == participants_hash(uid for uid, _, _ in page):
+            return raw.types.channels.ChannelParticipantsNotModified()
+        return raw.types.channels.ChannelParticipants(
+            count=len(self.members),
+            participants=[raw.types.ChannelParticipant(user_id=uid, date=0)
+                          for uid, _, _ in page],
+            chats=[],
+            users=[raw.types.User(id=uid, first_name=name, username=username,
+                                  restriction_reason=[])
+                   for uid, name, username in page],
+        )
+
+
+@pytest.fixture
+def stand_in():
+    """
+    stand_in(count, chat_id, usernames=True): a StandInClient for `count`
+    members with ids from 1000, named User<i> (and @user<i> with usernames).
+    """
+    def make(count: int, chat_id: int, *, usernames: bool = True) -> StandInClient:
+        return StandInClient([(1000 + i, f"User{i}", f"user{i}" if usernames else None)
+                              for i in range(count)], chat_id)
+    return make
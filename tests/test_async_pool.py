@@ -0,0 +1,368 @@
+"""
+DB_ASYNC_POOL=1: run_db awaits an async twin of the hot-path helpers instead of
+hopping onto the executor. A twin must answer exactly what its helper would —
+fail-closed reads still serve stale or raise DatabaseUnavailable — and a cache
+hit or a queued write must not touch a thread at all. The last test benchmarks
+concurrent joins per second in each mode; run with -s to see the numbers.
+"""
+import asyncio
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src import db
+from src.utils.checker import UserSnapshot, check_user
+from src.utils.write_behind import WriteBehindQueue
+
+# Captured at import, before conftest switches the prefetch off for every test.
+_real_prefetch = db._prefetch_detection_reads
+
+GID = -100
+GROUP = {"group_id": GID, "title": "Hub", "use_global_blocklist": True, "action_mode": "alert"}
+ADMIN = {"group_id": GID, "user_id": 42, "username": "zoltanvex", "first_name": "Zoltan",
+         "last_name": "Vex", "pfp_hash": None}
+
+
+class _Tables:
+    """Rows both fake connections read from, and what they were asked to do."""
+
+    def __init__(self, latency=0.0):
+        self.rows = {"groups": [GROUP], "whitelisted_users": [ADMIN], "reserved_keywords": [],
+                     "false_positives": [], "known_bad_actors": [], "seen_members": []}
+        self.latency = latency
+        self.round_trips = 0
+        self.writes = []
+        self.broken = False
+        self.sync_checkouts = self.async_checkouts = 0
+
+    def run(self, sql, params):
+        if self.broken:
+            raise RuntimeError("server closed the connection unexpectedly")
+        if sql.lstrip().startswith("INSERT"):
+            self.writes.append(params)
+            return []
+        where = dict(zip(re.findall(r"(\w+) = %s", sql), params, strict=True))
+        for table, rows in self.rows.items():
+            if f"FROM {table} " in sql:
+                return [r for r in rows if all(r.get(c, v) == v for c, v in where.items())]
+        return []
+
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetchall(self):
+        return list(self.rows)
+
+    async def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+class _AsyncPipeline:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        self.conn.in_pipeline = True
+        await self.conn.round_trip()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.conn.in_pipeline = False
+        return False
+
+
+class _AsyncConn:
+    def __init__(self, tables):
+        self.tables = tables
+        self.in_pipeline = False
+
+    async def round_trip(self):
+        self.tables.round_trips += 1
+        if self.tables.latency:
+            await asyncio.sleep(self.tables.latency)
+
+    async def execute(self, sql, params=()):
+        if not self.in_pipeline:
+            await self.round_trip()
+        return _Result(self.tables.run(sql, params))
+
+    def pipeline(self):
+        return _AsyncPipeline(self)
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class _SyncCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        if not self.conn.in_pipeline:
+            self.conn.round_trip()
+        self.rows = self.conn.tables.run(sql, params)
+        return self
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _SyncPipeline:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.in_pipeline = True
+        self.conn.round_trip()
+        return self
+
+    def __exit__(self, *exc):
+        self.conn.in_pipeline = False
+        return False
+
+
+class _SyncConn:
+    def __init__(self, tables):
+        self.tables = tables
+        self.in_pipeline = False
+
+    def round_trip(self):
+        self.tables.round_trips += 1
+        if self.tables.latency:
+            time.sleep(self.tables.latency)
+
+    def cursor(self):
+        return _SyncCursor(self)
+
+    def execute(self, sql, params=()):
+        return _SyncCursor(self).execute(sql, params)
+
+    def pipeline(self):
+        return _SyncPipeline(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def _install(monkeypatch, tables, *, async_pool, pool_size=db.DB_POOL_MAX_SIZE):
+    """Both pools, each bounded to pool_size connections like the real ones."""
+    sync_slots = threading.BoundedSemaphore(pool_size)
+    async_slots = asyncio.Semaphore(pool_size)
+
+    def get_connection(*a, **k):
+        if tables.broken:
+            return None
+        sync_slots.acquire()
+        tables.sync_checkouts += 1
+        return _SyncConn(tables)
+
+    def put_connection(conn):
+        if conn is not None:
+            sync_slots.release()
+
+    async def aget_connection(*a, **k):
+        if tables.broken:
+            return None
+        await async_slots.acquire()
+        tables.async_checkouts += 1
+        return _AsyncConn(tables)
+
+    async def aput_connection(conn):
+        if conn is not None:
+            async_slots.release()
+
+    monkeypatch.setattr(db, "get_connection", get_connection)
+    monkeypatch.setattr(db, "put_connection", put_connection)
+    monkeypatch.setattr(db, "aget_connection", aget_connection)
+    monkeypatch.setattr(db, "aput_connection", aput_connection)
+    monkeypatch.setattr(db, "_prefetch_detection_reads", _real_prefetch)
+    monkeypatch.setattr(db, "DB_ASYNC_POOL", int(async_pool))
+    for name in ("_group_cache", "_whitelist_cache", "_kw_cache", "_fp_cache",
+                 "_bad_actor_cache"):
+        getattr(db, name).clear()
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    tables = _Tables()
+    _install(monkeypatch, tables, async_pool=True)
+    return tables
+
+
+def _no_threads(monkeypatch):
+    async def refuse(fn, *a, **k):
+        raise AssertionError(f"{fn.__name__} was sent to the executor")
+    monkeypatch.setattr(db.asyncio, "to_thread", refuse)
+
+
+def test_hot_path_helpers_stay_on_the_event_loop(tables, monkeypatch):
+    _no_threads(monkeypatch)
+
+    async def scenario():
+        assert await db.run_db(db.get_group, GID) == GROUP
+        assert await db.run_db(db.is_whitelisted, GID, 42)
+        assert await db.run_db(db.get_whitelist, GID) == [ADMIN]
+        assert not await db.run_db(db.is_seen, GID, 7)
+        await db.run_db(db.mark_seen, GID, 7)
+        assert await db.run_db(db.get_watched_groups_for_user, 8) == []
+    asyncio.run(scenario())
+    assert tables.sync_checkouts == 0 and tables.writes == [(GID, 7)]
+
+
+def test_the_executor_is_used_when_the_pool_is_off(tables, monkeypatch):
+    monkeypatch.setattr(db, "DB_ASYNC_POOL", 0)
+    assert asyncio.run(db.run_db(db.get_group, GID)) == GROUP
+    assert (tables.sync_checkouts, tables.async_checkouts) == (1, 0)
+
+
+def test_a_warm_read_needs_no_connection(tables):
+    asyncio.run(db.run_db(db.get_whitelist, GID))
+    asyncio.run(db.run_db(db.get_whitelist, GID))
+    assert tables.async_checkouts == 1
+
+
+def test_reads_still_fail_closed(tables):
+    tables.broken = True
+    with pytest.raises(db.DatabaseUnavailable):
+        asyncio.run(db.run_db(db.get_whitelist, GID))
+    with pytest.raises(db.DatabaseUnavailable):
+        asyncio.run(db.run_db(db.get_group, GID))
+    assert asyncio.run(db.run_db(db.get_watched_groups_for_user, 7)) == []
+
+
+def test_a_failed_read_serves_the_stale_copy(tables):
+    db._whitelist_cache[GID] = (0.0, [ADMIN])
+    tables.broken = True
+    assert asyncio.run(db.run_db(db.is_whitelisted, GID, 42))
+
+
+@pytest.mark.parametrize("read", [
+    lambda: asyncio.run(db.run_db(db.get_whitelist, GID)),
+    lambda: asyncio.run(db.run_db(db.get_group, GID)),
+    lambda: asyncio.run(db.run_db(db.load_detection_context, GID, 7)),
+    lambda: db.load_detection_context(GID, 7),
+])
+def test_a_read_is_not_cached_over_a_write_it_raced(tables, monkeypatch, read):
+    # A whitelist or config write commits while the read is in flight: caching
+    # the old rows would keep them for CACHE_NOTIFY_TTL with LISTEN on.
+    monkeypatch.setattr(db, "_photo_index_dirty_groups", set())
+    run = tables.run
+
+    def racing(sql, params):
+        rows = run(sql, params)
+        db._invalidate_whitelist_cache(GID)
+        db._invalidate_group_cache(GID)
+        return rows
+    monkeypatch.setattr(tables, "run", racing)
+    read()
+    assert GID not in db._whitelist_cache and GID not in db._group_cache
+
+
+def test_the_context_matches_the_synchronous_one(tables):
+    ctx = asyncio.run(db.run_db(db.load_detection_context, GID, 7, include_seen=True))
+    assert tables.round_trips == 1 and tables.sync_checkouts == 0
+    for name in ("_group_cache", "_whitelist_cache", "_kw_cache", "_fp_cache",
+                 "_bad_actor_cache"):
+        getattr(db, name).clear()
+    assert db.load_detection_context(GID, 7, include_seen=True) == ctx
+
+
+def test_a_failed_batch_falls_back_to_the_getters(tables, monkeypatch):
+    async def no_connection(*a, **k):
+        return None
+    monkeypatch.setattr(db, "aget_connection", no_connection)
+    ctx = asyncio.run(db.run_db(db.load_detection_context, GID, 42))
+    assert ctx.whitelisted and tables.sync_checkouts >= 1
+    tables.broken = True
+    db._whitelist_cache.clear()
+    with pytest.raises(db.DatabaseUnavailable):
+        asyncio.run(db.run_db(db.load_detection_context, GID, 42))
+
+
+def test_the_async_log_row_is_the_synchronous_one(tables, monkeypatch):
+    monkeypatch.setattr(db, "WRITE_BEHIND_FLUSH_MS", 500)
+    monkeypatch.setattr(db, "_write_queue", WriteBehindQueue(batch_rows=100, max_pending=1000))
+    fields = {"group_id": GID, "user_id": 7, "username": "x", "full_name": "X",
+              "target_user_id": 42, "target_name": "Zoltan", "detection_type": "name",
+              "similarity_score": 91.0, "action_taken": "alerted", "details": "d",
+              "trigger": "message"}
+    db.insert_log(**fields)
+    asyncio.run(db.run_db(db.insert_log, **fields))
+    first, second = db._write_queue.pending("log")
+    assert first == second and tables.writes == []
+
+
+def test_check_user_scores_on_warm_caches(tables, monkeypatch):
+    def refuse(*a, **k):
+        raise AssertionError("the scoring thread went to the database")
+    monkeypatch.setattr(db, "get_connection", refuse)
+    snap = UserSnapshot(user_id=7, username="zoltanvex", first_name="Zoltan", last_name="Vex")
+    assert asyncio.run(check_user(snap, GID)).flagged
+    assert tables.async_checkouts == 1
+
+
+def test_concurrent_join_benchmark(monkeypatch):
+    """
+    A join raid: each new member is an is_whitelisted check, check_user (one
+    round trip for their per-user reads) and a seen mark. Both modes get the
+    same number of connections. Only correctness is asserted — which mode is
+    faster depends on the database's latency and on how much scoring competes
+    with the event loop for the GIL — so run with -s for the numbers.
+    """
+    monkeypatch.setattr(db, "WRITE_BEHIND_FLUSH_MS", 500)
+    joins = 300
+
+    async def join(uid):
+        if await db.run_db(db.is_whitelisted, GID, uid):
+            return
+        snap = UserSnapshot(user_id=uid, username=f"member{uid}", first_name="Member",
+                            last_name=str(uid))
+        await check_user(snap, GID)
+        await db.run_db(db.mark_seen, GID, uid)
+
+    async def raid():
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=db.DB_POOL_MAX_SIZE))
+        await join(1)       # group-wide caches warm, as in a live group
+        start = time.perf_counter()
+        await asyncio.gather(*(join(uid) for uid in range(1000, 1000 + joins)))
+        return joins / (time.perf_counter() - start)
+
+    def rate(async_pool, latency):
+        best = 0.0
+        for _ in range(3):
+            tables = _Tables(latency=latency)
+            _install(monkeypatch, tables, async_pool=async_pool)
+            monkeypatch.setattr(db, "_write_queue", WriteBehindQueue(batch_rows=10_000,
+                                                                     max_pending=10_000))
+            best = max(best, asyncio.run(raid()))
+            assert tables.round_trips == joins + 2
+            assert len(db._write_queue.pending("seen")) == joins + 1
+        return best
+
+    for latency in (0.0, 0.002, 0.01):
+        threaded, pooled = rate(False, latency), rate(True, latency)
+        print(f"\n{joins} concurrent joins, {latency * 1e3:.0f} ms database: "
+              f"{threaded:.0f} joins/s on the executor, {pooled:.0f} with the async pool",
+              end="")
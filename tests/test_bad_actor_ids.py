@@ -0,0 +1,161 @@
+"""
+Every known_bad_actors.user_id is held in memory, so a user who isn't listed —
+nearly every user checked — is answered without a round trip, and only a
+listed one has their row read. Until the first load completes, every lookup
+still goes to the database; and nothing may make a listed user look unlisted,
+not even an entry committed out of last_seen_at order.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from src import db
+from src.utils.id_set import SortedIdSet
+from src.utils.photo_index import PhotoHashIndex
+
+T0 = datetime(2026, 1, 1)
+LISTED = {"user_id": 66, "reason": "scam", "source_group_id": -100, "last_seen_at": T0}
+
+
+def test_the_id_set_is_exact():
+    ids = SortedIdSet()
+    ids.update([5, -3, 5, 2**62])
+    ids.update(range(1000, 1100))                   # past _REBUILD_AT: rebuilt
+    ids.add(7)
+    ids.discard(5)
+    assert [x in ids for x in (-3, 7, 2**62, 1050, 5, 6)] == [True] * 4 + [False] * 2
+    assert len(ids) == 103 and ids.info()["bytes"] == 103 * 8
+    assert not ids.complete
+    ids.update([], complete=True)
+    assert ids.complete and len(ids) == 103
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        self.conn.statements.append(sql)
+        if sql.startswith("DELETE FROM known_bad_actors"):
+            self.rowcount = 1
+        elif "SELECT user_id, last_seen_at FROM known_bad_actors" in sql:
+            since = params[0] if params else None
+            self.rows = [{"user_id": r["user_id"], "last_seen_at": r["last_seen_at"]}
+                         for r in self.conn.bad_actors if since is None or r["last_seen_at"] > since]
+        elif "FROM known_bad_actors WHERE user_id = ANY" in sql:
+            self.rows = [r for r in self.conn.bad_actors if r["user_id"] in params[0]]
+        elif "FROM known_bad_actors WHERE user_id" in sql:
+            self.rows = [r for r in self.conn.bad_actors if r["user_id"] == params[0]]
+        else:
+            self.rows = []
+        return self
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Conn:
+    def __init__(self):
+        self.statements = []
+        self.bad_actors = [LISTED]
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def reads(self):
+        return [s for s in self.statements if "SELECT * FROM known_bad_actors" in s]
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = _Conn()
+    monkeypatch.setattr(db, "get_connection", lambda *a, **k: conn)
+    monkeypatch.setattr(db, "put_connection", lambda c: None)
+    monkeypatch.setattr(db, "_photo_index", PhotoHashIndex(max_entries=1000))
+    monkeypatch.setattr(db, "_photo_index_marks",
+                        {"whitelist": None, "log_id": 0, "bad_actors": None})
+    monkeypatch.setattr(db, "_photo_index_dirty_groups", set())
+    monkeypatch.setattr(db, "_photo_index_dirty_users", set())
+    return conn
+
+
+def test_until_loaded_every_lookup_reads(conn):
+    assert db.get_known_bad_actor(7) is None and len(conn.reads()) == 1
+
+
+def test_once_loaded_only_listed_users_are_read(conn):
+    db.refresh_photo_index()
+    assert [db.get_known_bad_actor(uid) for uid in range(1000)].count(None) == 999
+    assert db.get_known_bad_actor(66) == LISTED
+    assert len(conn.reads()) == 1
+
+
+def test_a_sweep_chunk_of_unlisted_users_needs_no_query(conn):
+    db.refresh_photo_index()
+    db.prime_sweep_chunk(-100, list(range(1000, 1500)))
+    assert conn.reads() == []
+    db.prime_sweep_chunk(-100, [65, 66])
+    assert len(conn.reads()) == 1
+
+
+def test_a_new_entry_is_listed_before_it_is_written(conn, monkeypatch):
+    db.refresh_photo_index()
+    monkeypatch.setattr(db, "BLOCKLIST_TRUSTED_GROUPS", {-100})
+    listed_at_write = []
+    execute = _Cursor.execute
+
+    def spy(cursor, sql, params=()):
+        if "INSERT INTO known_bad_actors" in sql:
+            listed_at_write.append(77 in db._bad_actor_ids)
+        return execute(cursor, sql, params)
+    monkeypatch.setattr(_Cursor, "execute", spy)
+    assert db.add_known_bad_actor(77, "x", "X", "scam", 1, -100)
+    assert listed_at_write == [True]
+    assert db._delete_known_bad_actor(77) and 77 not in db._bad_actor_ids
+
+
+def test_another_process_adding_a_user_reaches_the_set(conn):
+    db.refresh_photo_index()
+    db._apply_invalidation('{"origin": "replica-2", "namespace": "bad_actor", "key": 88}')
+    assert 88 in db._bad_actor_ids
+
+
+def test_a_later_refresh_never_drops_an_id(conn):
+    db.refresh_photo_index()
+    db._bad_actor_ids.add(99)                       # added while a refresh was reading
+    db.refresh_photo_index()
+    assert 99 in db._bad_actor_ids and 66 in db._bad_actor_ids
+
+
+def test_an_entry_committed_after_a_later_one_still_reaches_the_set(conn):
+    # last_seen_at is NOW() at the writer's transaction start: this row became
+    # visible after the watermark had already passed it.
+    db.refresh_photo_index()
+    conn.bad_actors.append({"user_id": 67, "last_seen_at": T0 - timedelta(seconds=30)})
+    db.refresh_photo_index()
+    assert 67 in db._bad_actor_ids
+
+
+def test_a_listener_reconnect_rereads_every_id(conn):
+    db.refresh_photo_index()
+    conn.bad_actors.append({"user_id": 68, "last_seen_at": T0 - timedelta(days=1)})
+    db._bad_actor_ids_resync.set()                  # as listen_for_invalidations does
+    db.refresh_photo_index()
+    assert 68 in db._bad_actor_ids and not db._bad_actor_ids_resync.is_set()
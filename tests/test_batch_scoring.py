@@ -0,0 +1,135 @@
+"""
+Batched similarity scoring must be a pure speed-up: for every suspect the
+matrix path returns exactly the tuple the one-at-a-time detector returns, and
+a sweep's prescored snapshots get exactly the verdict an unscored one gets.
+"""
+import asyncio
+import random
+
+import pytest
+
+from src import db
+from src.utils.checker import UserSnapshot, check_user, prescore_snapshots
+from src.utils.detector import (
+    batch_check_name_similarity, batch_check_username_similarity,
+    check_name_similarity, check_username_similarity,
+)
+
+
+NAMES = [
+    "John Smith", "Ｍａｒｙ Ann", "Crypto Boss", "Support Team", "Alex",
+    "Alexander the Great", "J. Smith", "Anna Maria Lopez",
+]
+HANDLES = ["johnsmith", "crypto_boss", "support", "alex_ceo", "mary_ann"]
+
+
+def _fuzzed(rng, source, n):
+    swaps = {"o": "0", "i": "1", "e": "3", "a": "а", "s": "5"}
+    out = ["", "Zebra Quux"]
+    for _ in range(n):
+        s = list(rng.choice(source))
+        for k, ch in enumerate(s):
+            if ch.lower() in swaps and rng.random() < 0.3:
+                s[k] = swaps[ch.lower()]
+        if rng.random() < 0.3:
+            s.append(rng.choice([" Admin", " | Support", "1", " Jr"]))
+        if rng.random() < 0.2 and len(s) > 3:
+            del s[rng.randrange(len(s))]
+        out.append("".join(s))
+    return out
+
+
+@pytest.mark.parametrize("threshold", [70, 85, 95])
+def test_batch_names_match_the_single_path(threshold):
+    suspects = _fuzzed(random.Random(threshold), NAMES, 150)
+    batched = batch_check_name_similarity(suspects, NAMES, threshold)
+    assert batched == [check_name_similarity(s, NAMES, threshold) for s in suspects]
+
+
+@pytest.mark.parametrize("threshold", [70, 85, 95])
+def test_batch_usernames_match_the_single_path(threshold):
+    suspects = _fuzzed(random.Random(threshold), HANDLES, 150) + [None]
+    batched = batch_check_username_similarity(suspects, HANDLES, threshold)
+    assert batched == [check_username_similarity(s, HANDLES, threshold) for s in suspects]
+
+
+def test_batch_keeps_the_loops_tie_breaking():
+    """
+    The per-name loop keeps a later candidate whose score beats the truncated
+    running best, not just the argmax. The batch must report the same name.
+    """
+    stored = ["Jon Smithe", "John Smyth", "Johnn Smith", "John Smith"]
+    for suspect in ("John Smith", "Jhon Smith", "John Smit", "Johm Smith"):
+        assert (batch_check_name_similarity([suspect], stored, 80)[0]
+                == check_name_similarity(suspect, stored, 80))
+
+
+def test_empty_whitelist_gives_no_match_for_everyone():
+    assert batch_check_name_similarity(["John"], [], 85) == [(False, None, 0)]
+    assert batch_check_username_similarity(["john"], [], 85) == [(False, None, 0)]
+
+
+# ── prescored snapshots through check_user ────────────────────────────────────
+
+WHITELIST = [
+    {"user_id": 1, "username": "johnsmith", "first_name": "John",
+     "last_name": "Smith", "pfp_hash": None},
+    {"user_id": 2, "username": "crypto_boss", "first_name": "Crypto",
+     "last_name": "Boss", "pfp_hash": None},
+]
+
+
+@pytest.fixture
+def patched(monkeypatch):
+    db._whitelist_index_cache.clear()
+    monkeypatch.setattr(db, "get_group", lambda gid: None)
+    monkeypatch.setattr(db, "get_whitelist", lambda gid: WHITELIST)
+    monkeypatch.setattr(db, "get_reserved_keywords", lambda gid: [])
+    monkeypatch.setattr(db, "is_whitelisted", lambda gid, uid: uid in (1, 2))
+    monkeypatch.setattr(db, "is_false_positive", lambda gid, uid: False)
+    monkeypatch.setattr(db, "get_known_bad_actor", lambda uid: None)
+    yield
+    db._whitelist_index_cache.clear()
+
+
+def _snaps():
+    return [
+        UserSnapshot(user_id=10, username="j0hnsmith", first_name="Support", last_name=None),
+        UserSnapshot(user_id=11, username=None, first_name="John", last_name="Smith"),
+        UserSnapshot(user_id=12, username=None, first_name="Crypt0", last_name="B0ss"),
+        UserSnapshot(user_id=13, username="someone", first_name="Zebra", last_name=None),
+        UserSnapshot(user_id=14, username=None, first_name="John", last_name=None),
+    ]
+
+
+def test_prescored_snapshots_get_the_unscored_verdict(patched):
+    plain = [asyncio.run(check_user(s, -100)) for s in _snaps()]
+    batch = _snaps()
+    prescore_snapshots(batch, -100)
+    assert all(s.prescored is not None for s in batch)
+    scored = [asyncio.run(check_user(s, -100)) for s in batch]
+    assert scored == plain
+    assert any(r.flagged for r in plain), "nothing flagged — the comparison proves little"
+
+
+def test_prescored_results_are_not_reused_for_a_changed_name(patched, monkeypatch):
+    snap = UserSnapshot(user_id=20, username=None, first_name="Zebra", last_name=None)
+    prescore_snapshots([snap], -100)
+    assert asyncio.run(check_user(snap, -100)).flagged is False
+    snap.first_name, snap.last_name = "John", "Smith"
+    assert asyncio.run(check_user(snap, -100)).flagged is True
+
+
+def test_whitelisted_members_are_not_prescored(patched):
+    member = UserSnapshot(user_id=1, username="johnsmith", first_name="John", last_name="Smith")
+    prescore_snapshots([member], -100)
+    assert member.prescored is None
+
+
+def test_unreachable_db_attaches_nothing(patched, monkeypatch):
+    def down(gid):
+        raise db.DatabaseUnavailable("down")
+    monkeypatch.setattr(db, "get_group", down)
+    batch = _snaps()
+    prescore_snapshots(batch, -100)
+    assert all(s.prescored is None for s in batch)
@@ -27,12 +27,12 @@ STRANGER_GROUP = -1003333333333
 
 
 def _patch(monkeypatch, *, bad_actor, trusted=frozenset()):
-    monkeypatch.setattr(checker, "is_whitelisted", lambda gid, uid: False)
-    monkeypatch.setattr(checker, "is_false_positive", lambda gid, uid: False)
-    monkeypatch.setattr(checker, "get_group", lambda gid: {"use_global_blocklist": True})
-    monkeypatch.setattr(checker, "get_known_bad_actor", lambda uid: bad_actor)
-    monkeypatch.setattr(checker, "get_whitelist", lambda gid: [])
-    monkeypatch.setattr(checker, "get_reserved_keywords", lambda gid: [])
+    monkeypatch.setattr(db_mod, "is_whitelisted", lambda gid, uid: False)
+    monkeypatch.setattr(db_mod, "is_false_positive", lambda gid, uid: False)
+    monkeypatch.setattr(db_mod, "get_group", lambda gid: {"use_global_blocklist": True})
+    monkeypatch.setattr(db_mod, "get_known_bad_actor", lambda uid: bad_actor)
+    monkeypatch.setattr(db_mod, "get_whitelist", lambda gid: [])
+    monkeypatch.setattr(db_mod, "get_reserved_keywords", lambda gid: [])
     monkeypatch.setattr(checker, "BLOCKLIST_TRUSTED_GROUPS", frozenset(trusted))
 
 
@@ -89,7 +89,7 @@ class _Recorder:
 
 
 def test_advisory_detection_alerts_even_in_ban_mode(monkeypatch):
-    monkeypatch.setattr(checker, "get_group",
+    monkeypatch.setattr(db_mod, "get_group",
                         lambda gid: {"action_mode": "ban", "ban_score": 90,
                                      "alert_score": 78})
     logged = {}
@@ -108,7 +108,7 @@ def test_advisory_detection_alerts_even_in_ban_mode(monkeypatch):
 
 def test_non_advisory_blocklist_hit_still_bans(monkeypatch):
     """The feature must keep working for trusted sources."""
-    monkeypatch.setattr(checker, "get_group",
+    monkeypatch.setattr(db_mod, "get_group",
                         lambda gid: {"action_mode": "ban", "ban_score": 90,
                                      "alert_score": 78})
     logged = {}
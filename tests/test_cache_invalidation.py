@@ -0,0 +1,141 @@
+"""
+CACHE_NOTIFY=1: a write to a cached table publishes pg_notify(namespace, key),
+and every other process sharing the database evicts its copy. While the
+listener is connected the write-invalidated caches live for CACHE_NOTIFY_TTL;
+once it drops they are back on their short defaults.
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+from src import db
+
+GID = -100
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 1
+
+    def execute(self, sql, params=()):
+        self.conn.statements.append((sql, params))
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Conn:
+    def __init__(self):
+        self.statements = []
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def execute(self, sql, params=()):
+        return _Cursor(self).execute(sql, params)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def notifications(self):
+        return [json.loads(params[1]) for sql, params in self.statements if "pg_notify" in sql]
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = _Conn()
+    monkeypatch.setattr(db, "CACHE_NOTIFY", 1)
+    monkeypatch.setattr(db, "get_connection", lambda *a, **k: conn)
+    monkeypatch.setattr(db, "put_connection", lambda c: None)
+    return conn
+
+
+def _from_another_process(namespace, key):
+    return json.dumps({"origin": "replica-2", "namespace": namespace, "key": key})
+
+
+def test_writers_publish_what_they_invalidate(conn):
+    db.set_group_action_mode(GID, "alert")
+    db.remove_whitelisted_user(GID, 42)
+    db.mark_false_positive(GID, 7, cleared_by=1)
+    assert [(n["namespace"], n["key"]) for n in conn.notifications()] == [
+        ("group", GID), ("whitelist", GID), ("false_positive", [GID, 7])]
+
+
+def test_nothing_is_published_when_off(conn, monkeypatch):
+    monkeypatch.setattr(db, "CACHE_NOTIFY", 0)
+    db.set_group_action_mode(GID, "alert")
+    assert conn.notifications() == []
+
+
+def test_another_process_write_evicts_the_local_copy():
+    now = time.time()
+    db._whitelist_cache[GID] = (now, [])
+    db._fp_cache[(GID, 7)] = (now, False)
+    db._apply_invalidation(_from_another_process("whitelist", GID))
+    db._apply_invalidation(_from_another_process("false_positive", [GID, 7]))
+    assert GID not in db._whitelist_cache and (GID, 7) not in db._fp_cache
+
+
+def test_our_own_notifications_are_already_applied(conn):
+    db.set_group_action_mode(GID, "alert")
+    db._group_cache[GID] = (time.time(), {"group_id": GID})
+    db._apply_invalidation(json.dumps(conn.notifications()[0]))
+    assert GID in db._group_cache
+
+
+class _Notify:
+    def __init__(self, payload):
+        self.payload = payload
+
+
+class _ListenConn:
+    """Delivers one batch of notifications, then fails its liveness check."""
+
+    def __init__(self, payloads):
+        self.payloads = payloads
+        self.statements = []
+        self.ttls_while_listening = None
+        self.closed = False
+
+    async def execute(self, sql, params=()):
+        self.statements.append(sql)
+        if sql == "SELECT 1":
+            self.ttls_while_listening = {c.name: c.ttl for c in db._NOTIFY_TTL_CACHES}
+            raise OSError("connection lost")
+
+    async def notifies(self, timeout=None):
+        for payload in self.payloads:
+            yield _Notify(payload)
+
+    async def close(self):
+        self.closed = True
+
+
+def test_the_listener_raises_ttls_only_while_connected(monkeypatch):
+    listen = _ListenConn([_from_another_process("keywords", GID)])
+
+    async def connect(*a, **k):
+        return listen
+    monkeypatch.setattr(db.AsyncConnection, "connect", connect)
+    db._bad_actor_cache[7] = (time.time(), None)           # cached before LISTEN
+    db._kw_cache[GID] = (time.time(), [])
+
+    with pytest.raises(OSError):
+        asyncio.run(db.listen_for_invalidations())
+    assert listen.statements[0] == "LISTEN cache_invalidation" and listen.closed
+    assert set(listen.ttls_while_listening.values()) == {db.CACHE_NOTIFY_TTL}
+    assert 7 not in db._bad_actor_cache and GID not in db._kw_cache
+    assert db._whitelist_cache.ttl == db._WHITELIST_CACHE_TTL
+    assert db._fp_cache.ttl == db._FP_CACHE_TTL
+    assert not db.invalidation_info()["listening"]
@@ -8,6 +8,7 @@ asyncio.run() so no pytest-asyncio plugin is required.
 import asyncio
 
 
+from src import db
 from src.utils import checker
 from src.utils.checker import UserSnapshot, check_user, ban_and_log
 
@@ -15,12 +16,12 @@ from src.utils.checker import UserSnapshot, check_user, ban_and_log
 def _patch_db(monkeypatch, *, group=None, whitelist=None, keywords=None,
               bad_actor=None, whitelisted_ids=()):
     """Wire up the db functions checker imports, with sensible defaults."""
-    monkeypatch.setattr(checker, "get_group", lambda gid: group)
-    monkeypatch.setattr(checker, "get_whitelist", lambda gid: whitelist or [])
-    monkeypatch.setattr(checker, "get_reserved_keywords", lambda gid: keywords or [])
-    monkeypatch.setattr(checker, "is_whitelisted", lambda gid, uid: uid in whitelisted_ids)
-    monkeypatch.setattr(checker, "is_false_positive", lambda gid, uid: False)
-    monkeypatch.setattr(checker, "get_known_bad_actor", lambda uid: bad_actor)
+    monkeypatch.setattr(db, "get_group", lambda gid: group)
+    monkeypatch.setattr(db, "get_whitelist", lambda gid: whitelist or [])
+    monkeypatch.setattr(db, "get_reserved_keywords", lambda gid: keywords or [])
+    monkeypatch.setattr(db, "is_whitelisted", lambda gid, uid: uid in whitelisted_ids)
+    monkeypatch.setattr(db, "is_false_positive", lambda gid, uid: False)
+    monkeypatch.setattr(db, "get_known_bad_actor", lambda uid: bad_actor)
 
 
 def _snap(**kw):
@@ -126,7 +127,7 @@ class _Recorder:
 
 
 def _run_ban_and_log(monkeypatch, *, score, match_type, group):
-    monkeypatch.setattr(checker, "get_group", lambda gid: group)
+    monkeypatch.setattr(db, "get_group", lambda gid: group)
     logged = {}
     monkeypatch.setattr(checker, "insert_log", lambda **kw: logged.update(kw))
     rec = _Recorder()
@@ -241,7 +242,7 @@ def test_false_positive_grace_window_suppresses_detection(monkeypatch):
     admin = {"user_id": 42, "username": "adminboss", "first_name": "Admin",
              "last_name": "Boss", "pfp_hash": None}
     _patch_db(monkeypatch, whitelist=[admin])
-    monkeypatch.setattr(checker, "is_false_positive", lambda gid, uid: True)
+    monkeypatch.setattr(db, "is_false_positive", lambda gid, uid: True)
     res = asyncio.run(check_user(
         _snap(user_id=1000, first_name="Admin", last_name="Boss"), 1))
     assert res.flagged is False
@@ -17,7 +17,6 @@ import asyncio
 import pytest
 
 from src import db
-from src.utils import checker
 from src.utils.checker import UserSnapshot, check_user
 
 
@@ -73,13 +72,13 @@ def test_check_user_does_not_flag_when_whitelist_is_unavailable(monkeypatch):
     The exact reported path: keyword cache warm, whitelist unavailable. Before
     the fix this returned flagged=True score=100 for a protected admin.
     """
-    monkeypatch.setattr(checker, "is_whitelisted",
+    monkeypatch.setattr(db, "is_whitelisted",
                         lambda gid, uid: (_ for _ in ()).throw(db.DatabaseUnavailable()))
-    monkeypatch.setattr(checker, "is_false_positive", lambda gid, uid: False)
-    monkeypatch.setattr(checker, "get_group", lambda gid: None)
-    monkeypatch.setattr(checker, "get_known_bad_actor", lambda uid: None)
-    monkeypatch.setattr(checker, "get_whitelist", lambda gid: [])
-    monkeypatch.setattr(checker, "get_reserved_keywords",
+    monkeypatch.setattr(db, "is_false_positive", lambda gid, uid: False)
+    monkeypatch.setattr(db, "get_group", lambda gid: None)
+    monkeypatch.setattr(db, "get_known_bad_actor", lambda uid: None)
+    monkeypatch.setattr(db, "get_whitelist", lambda gid: [])
+    monkeypatch.setattr(db, "get_reserved_keywords",
                         lambda gid: [{"pattern": "support", "is_regex": False}])
 
     snap = UserSnapshot(user_id=777, username="admin",
@@ -0,0 +1,156 @@
+"""
+A delta sweep skips a member whose profile fingerprint — name fields, username,
+photo id and the group's detection digest — matches the one stored when they
+were last screened clean. Unlike the in-memory page skip it survives a restart,
+and it skips members one at a time, so a joiner or a rename costs one member's
+screening rather than a page's. Anything the verdict rested on changing means
+a full screening: the profile, the config, whitelist or keywords (through the
+digest), a blocklist entry, or the seen mark lapsing. A member the checker
+passed without screening (a false-positive window) records neither.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src import db
+from src.db import SweepMemberState
+from src.utils.checker import DetectionResult
+from src.watcher import sweep as sweep_mod
+from src.watcher.members import member_fingerprint
+
+GID = -1001
+
+
+class _Bot:
+    id = 999
+
+
+@pytest.fixture
+def env(monkeypatch):
+    state = {"seen": set(), "fingerprints": {}, "writes": [], "digest": 1,
+             "listed": set(), "checked": [], "exempt": set()}
+
+    async def inline(fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+    monkeypatch.setattr(sweep_mod, "run_db", inline)
+    monkeypatch.setattr(sweep_mod, "_screened_pages", {})
+    monkeypatch.setattr(sweep_mod, "get_reserved_keywords", lambda gid: [])
+    monkeypatch.setattr(sweep_mod, "load_sweep_member_state", lambda gid: SweepMemberState(
+        set(), set(), set(state["seen"]), dict(state["fingerprints"])))
+    monkeypatch.setattr(sweep_mod, "detection_versions", lambda gid: (1, 1, 1))
+    monkeypatch.setattr(sweep_mod, "detection_digest", lambda gid: state["digest"])
+    monkeypatch.setattr(sweep_mod, "prime_sweep_chunk",
+                        lambda gid, uids: state["listed"] & set(uids))
+    monkeypatch.setattr(sweep_mod, "prescore_snapshots", lambda snaps, gid: None)
+    monkeypatch.setattr(sweep_mod, "mark_seen", lambda gid, uid: state["seen"].add(uid))
+
+    def fingerprint(gid, uid, fp):
+        state["writes"].append(uid)
+        state["fingerprints"][uid] = fp
+    monkeypatch.setattr(sweep_mod, "set_member_fingerprint", fingerprint)
+    monkeypatch.setattr(sweep_mod, "record_sweep_run", lambda *a, **k: None)
+    monkeypatch.setattr(sweep_mod, "record_sweep_coverage", lambda gid, count, complete: True)
+    monkeypatch.setattr(sweep_mod, "get_group_sweep_offset", lambda gid: 0)
+    monkeypatch.setattr(sweep_mod, "set_group_sweep_offset", lambda gid, offset: None)
+    monkeypatch.setattr(sweep_mod, "refresh_whitelist_pfps", lambda *a, **k: asyncio.sleep(0))
+
+    async def clean(snapshot, group_id):
+        state["checked"].append(snapshot.user_id)
+        return DetectionResult(flagged=False,
+                               screened=snapshot.user_id not in state["exempt"])
+    monkeypatch.setattr(sweep_mod, "check_user", clean)
+    return state
+
+
+def _sweep(env, client, **kwargs):
+    # A fresh process each time, so only the stored fingerprints carry over.
+    sweep_mod._screened_pages.clear()
+    env["checked"].clear()
+    env["writes"].clear()
+    return asyncio.run(sweep_mod.sweep_group(client, _Bot(), GID, **kwargs))
+
+
+def test_unchanged_members_are_skipped_after_a_restart(env, stand_in):
+    client = stand_in(250, GID)
+    _sweep(env, client)
+    assert len(env["writes"]) == 250
+    result = _sweep(env, client)
+    assert result["unchanged_skipped"] == 250 and env["checked"] == []
+    assert result["iterated"] == 250 and not result["partial"] and env["writes"] == []
+
+
+def test_only_the_changed_profile_is_screened(env, stand_in):
+    client = stand_in(250, GID)
+    _sweep(env, client)
+    client.members[120] = (1120, "Renamed", "user120")
+    client.members.insert(10, (7, "New", "joiner"))
+    result = _sweep(env, client)
+    assert sorted(env["checked"]) == [7, 1120] and result["unchanged_skipped"] == 249
+    assert sorted(env["writes"]) == [7, 1120]
+
+
+@pytest.mark.parametrize("change", [
+    lambda env: env.update(digest=2),                  # config, whitelist or keywords
+    lambda env: env["seen"].clear(),                   # seen marks lapsed or unmarked
+])
+def test_a_stale_verdict_is_never_skipped(env, change, stand_in):
+    client = stand_in(50, GID)
+    _sweep(env, client)
+    change(env)
+    assert _sweep(env, client)["unchanged_skipped"] == 0 and len(env["checked"]) == 50
+
+
+def test_blocklisted_members_and_full_sweeps_screen_everyone(env, stand_in):
+    client = stand_in(50, GID)
+    _sweep(env, client)
+    env["listed"] = {1003}
+    assert _sweep(env, client)["unchanged_skipped"] == 49 and env["checked"] == [1003]
+    assert _sweep(env, client, delta=False)["unchanged_skipped"] == 0
+    assert len(env["checked"]) == 50
+
+
+def test_a_member_passed_unscreened_is_screened_once_the_window_ends(env, stand_in):
+    client = stand_in(50, GID)
+    env["exempt"] = {1003}                             # inside a false-positive window
+    _sweep(env, client)
+    assert 1003 not in env["writes"] and 1003 not in env["seen"]
+    env["exempt"] = set()
+    assert _sweep(env, client)["unchanged_skipped"] == 49 and env["checked"] == [1003]
+    assert env["writes"] == [1003]
+
+
+def test_no_digest_no_skipping(env, monkeypatch, stand_in):
+    def unavailable(gid):
+        raise db.DatabaseUnavailable("down")
+    client = stand_in(20, GID)
+    _sweep(env, client)
+    monkeypatch.setattr(sweep_mod, "detection_digest", unavailable)
+    assert _sweep(env, client)["unchanged_skipped"] == 0 and env["writes"] == []
+
+
+def test_the_fingerprint_covers_names_username_photo_and_digest():
+    def user(**kw):
+        fields = {"first_name": "Ann", "last_name": None, "username": "ann",
+                  "photo": SimpleNamespace(big_photo_unique_id="AgAD1")}
+        return SimpleNamespace(**{**fields, **kw})
+    base = member_fingerprint(1, user())
+    assert base == member_fingerprint(1, user()) and -2**63 <= base < 2**63
+    for changed in (member_fingerprint(2, user()), member_fingerprint(1, user(last_name="B")),
+                    member_fingerprint(1, user(username=None)),
+                    member_fingerprint(1, user(photo=SimpleNamespace(big_photo_unique_id="AgAD2"))),
+                    member_fingerprint(1, user(photo=None))):
+        assert changed != base
+
+
+def test_the_digest_depends_on_content_only():
+    wl = [{"user_id": 1, "username": "a", "first_name": "A", "last_name": None, "pfp_hash": None},
+          {"user_id": 2, "username": "b", "first_name": "B", "last_name": None, "pfp_hash": "f0"}]
+    kw = [{"pattern": "support", "is_regex": False}]
+    digest = db.get_detection_digest({"action": "ban", "sweep_offset": 5}, wl, kw, 85)
+    assert digest == db.get_detection_digest(
+        {"action": "ban", "sweep_offset": 900}, wl[::-1], kw, 85)
+    assert digest != db.get_detection_digest({"action": "alert"}, wl, kw, 85)
+    assert digest != db.get_detection_digest({"action": "ban"}, wl[:1], kw, 85)
+    assert digest != db.get_detection_digest({"action": "ban"}, wl, [], 85)
+    assert digest != db.get_detection_digest({"action": "ban"}, wl, kw, 90)
@@ -0,0 +1,143 @@
+"""
+Re-checking an unchanged profile must cost one cache lookup, and anything that
+could change the verdict — the profile, the whitelist, the keywords, the
+group's config — must miss.
+"""
+import asyncio
+
+import pytest
+
+from src import db
+from src.utils import checker
+from src.utils.checker import UserSnapshot, check_user, detection_cache_info
+
+
+ADMIN = {"user_id": 42, "username": "adminboss", "first_name": "Admin",
+         "last_name": "Boss", "pfp_hash": None}
+
+
+@pytest.fixture
+def env(monkeypatch):
+    state = {"whitelist": [dict(ADMIN)], "keywords": [], "group": {"title": "Test Group"},
+             "runs": 0}
+    for cache in (db._whitelist_index_cache, db._kw_matcher_cache, db._group_versions):
+        cache.clear()
+    monkeypatch.setattr(db, "get_group", lambda gid: state["group"])
+    monkeypatch.setattr(db, "get_whitelist", lambda gid: state["whitelist"])
+    monkeypatch.setattr(db, "get_reserved_keywords", lambda gid: state["keywords"])
+    monkeypatch.setattr(db, "is_whitelisted", lambda gid, uid: False)
+    monkeypatch.setattr(db, "is_false_positive", lambda gid, uid: False)
+    monkeypatch.setattr(db, "get_known_bad_actor", lambda uid: None)
+    real_detect = checker._detect
+
+    def counting(*args, **kwargs):
+        state["runs"] += 1
+        return real_detect(*args, **kwargs)
+    monkeypatch.setattr(checker, "_detect", counting)
+    yield state
+    for cache in (db._whitelist_index_cache, db._kw_matcher_cache, db._group_versions):
+        cache.clear()
+
+
+def _check(**kw):
+    base = {"user_id": 7, "username": None, "first_name": "Admin", "last_name": "Boss"}
+    base.update(kw)
+    return asyncio.run(check_user(UserSnapshot(**base), -100))
+
+
+def test_an_unchanged_profile_is_served_from_the_cache(env):
+    first = _check()
+    second = _check()
+    assert first.flagged and second == first
+    assert env["runs"] == 1
+    assert detection_cache_info()["hits"] == 1
+
+
+def test_cached_results_are_copies(env):
+    _check().score = -1
+    assert _check().score != -1
+
+
+@pytest.mark.parametrize("change", [
+    {"first_name": "Someone"}, {"username": "adminboss1"},
+    {"bio": "hello"}, {"pfp_bytes": b"not really a photo"},
+])
+def test_a_profile_change_misses(env, change):
+    _check()
+    _check(**change)
+    assert env["runs"] == 2
+
+
+def test_a_whitelist_change_misses(env):
+    assert _check().flagged
+    env["whitelist"] = [dict(ADMIN, first_name="Other", last_name="Person")]
+    assert not _check().flagged
+    assert env["runs"] == 2
+
+
+def test_a_refresh_with_the_same_whitelist_still_hits(env):
+    _check()
+    env["whitelist"] = [dict(r) for r in env["whitelist"]]     # TTL refresh: new list
+    _check()
+    assert env["runs"] == 1
+
+
+def test_a_keyword_change_misses(env):
+    assert _check(first_name="Zed", last_name=None).flagged is False
+    env["keywords"] = [{"pattern": "zed", "is_regex": False}]
+    assert _check(first_name="Zed", last_name=None).flagged is True
+
+
+def test_removing_the_last_keyword_misses(env):
+    env["keywords"] = [{"pattern": "support", "is_regex": False}]
+    assert _check(first_name="Zed", last_name="Support").match_type == "keyword"
+    env["keywords"] = []
+    assert not _check(first_name="Zed", last_name="Support").flagged
+    assert env["runs"] == 2
+
+
+def test_a_group_config_change_misses(env):
+    assert _check(last_name="Bosss").flagged
+    env["group"] = {"title": "Test Group", "name_threshold": 100}
+    assert not _check(last_name="Bosss").flagged
+    assert env["runs"] == 2
+
+
+def test_bookkeeping_columns_do_not_move_the_group_version(env):
+    _check()
+    env["group"] = dict(env["group"], updated_at="later", sweep_offset=300)
+    _check()
+    assert env["runs"] == 1
+
+
+def test_a_bookkeeping_write_keeps_the_group_version(env):
+    # Every sweep ends with set_group_sweep_offset and record_sweep_coverage,
+    # each of which invalidates the group row here and in every replica.
+    v1 = db.get_detection_versions(-100, env["group"], 1, 1)
+    db._invalidate_group_cache(-100)
+    assert db.get_detection_versions(-100, dict(env["group"], sweep_offset=500), 1, 1) == v1
+    assert db.get_detection_versions(-100, dict(env["group"], action="alert"), 1, 1) != v1
+
+
+def test_a_verdict_is_keyed_on_the_index_it_was_computed_from(env, monkeypatch):
+    # Another thread rebuilds the index from newer rows between this check's
+    # build and its version read: the old verdict must not take the new version.
+    real = db.get_whitelist_index
+
+    def racing(group_id, rows):
+        built = real(group_id, rows)
+        real(group_id, [dict(ADMIN, first_name="Other", last_name="Person")])
+        return built
+    monkeypatch.setattr(checker, "get_whitelist_index", racing)
+    assert _check().flagged
+    monkeypatch.setattr(checker, "get_whitelist_index", real)
+    env["whitelist"] = [dict(ADMIN, first_name="Other", last_name="Person")]
+    assert not _check().flagged
+
+
+def test_the_cache_is_bounded():
+    cache = checker._DetectionCache(max_entries=3)
+    for i in range(10):
+        cache.put((i,), checker.DetectionResult(flagged=False))
+    assert cache.info()["entries"] == 3
+    assert cache.get((0,)) is None and cache.get((9,)) is not None
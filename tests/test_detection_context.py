@@ -0,0 +1,162 @@
+"""
+load_detection_context must answer exactly what the individual getters would,
+from one connection and at most one round trip: cold reads go out as a single
+pipelined batch, warm ones are not sent at all, and a failed batch leaves each
+getter its own failure semantics.
+"""
+import asyncio
+import re
+
+import pytest
+
+from src import db
+from src.utils.checker import UserSnapshot, check_user
+
+# Captured at import, before conftest switches the prefetch off for every test.
+_real_prefetch = db._prefetch_detection_reads
+
+GROUP = {"group_id": -100, "title": "Hub", "use_global_blocklist": True}
+ADMIN = {"group_id": -100, "user_id": 42, "username": "zoltan", "first_name": "Zoltan",
+         "last_name": None, "pfp_hash": None}
+BAD = {"user_id": 7, "reason": "spam", "source_group_id": -100}
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        if self.conn.broken:
+            raise RuntimeError("server closed the connection unexpectedly")
+        self.conn.statements.append(sql)
+        if not self.conn.in_pipeline:
+            self.conn.round_trips += 1
+        where = dict(zip(re.findall(r"(\w+) = %s", sql), params, strict=True))
+        for table, rows in self.conn.tables.items():
+            if f"FROM {table} " in sql:
+                self.rows = [r for r in rows
+                             if all(r.get(col, val) == val for col, val in where.items())]
+        return self
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Pipeline:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.in_pipeline = True
+        self.conn.round_trips += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.conn.in_pipeline = False
+        return False
+
+
+class _Conn:
+    def __init__(self):
+        self.tables = {
+            "groups": [GROUP], "whitelisted_users": [ADMIN], "reserved_keywords": [],
+            "false_positives": [], "known_bad_actors": [BAD], "seen_members": [],
+        }
+        self.statements, self.round_trips, self.checkouts = [], 0, 0
+        self.in_pipeline = self.broken = False
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def execute(self, sql, params=()):
+        return _Cursor(self).execute(sql, params)
+
+    def pipeline(self):
+        return _Pipeline(self)
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = _Conn()
+
+    def get_connection(*a, **k):
+        conn.checkouts += 1
+        return conn
+    monkeypatch.setattr(db, "get_connection", get_connection)
+    monkeypatch.setattr(db, "put_connection", lambda c: None)
+    monkeypatch.setattr(db, "_prefetch_detection_reads", _real_prefetch)
+    return conn
+
+
+def test_a_cold_first_message_is_one_round_trip(conn):
+    ctx = db.load_detection_context(-100, 7, include_seen=True)
+    assert (conn.checkouts, conn.round_trips, len(conn.statements)) == (1, 1, 6)
+    assert ctx == db.DetectionContext(group=GROUP, whitelist=[ADMIN], keywords=[],
+                                      whitelisted=False, false_positive=False,
+                                      bad_actor=BAD, seen=False)
+
+
+def test_the_batch_warms_what_the_getters_read(conn):
+    db.load_detection_context(-100, 42)
+    conn.checkouts = 0
+    assert db.get_group(-100) == GROUP and db.is_whitelisted(-100, 42)
+    assert db.get_reserved_keywords(-100) == [] and not db.is_false_positive(-100, 42)
+    assert db.get_known_bad_actor(42) is None
+    assert conn.checkouts == 0
+
+
+def test_a_warm_context_costs_nothing_but_seen(conn):
+    db.load_detection_context(-100, 7, include_seen=True)
+    conn.statements.clear()
+    conn.round_trips = conn.checkouts = 0
+    db.load_detection_context(-100, 7)
+    assert (conn.checkouts, conn.round_trips) == (0, 0)
+    conn.tables["seen_members"] = [{"group_id": -100, "user_id": 7}]
+    assert db.load_detection_context(-100, 7, include_seen=True).seen is True
+    assert len(conn.statements) == 1 and "seen_members" in conn.statements[0]
+
+
+def test_only_expired_reads_are_sent(conn):
+    db.load_detection_context(-100, 7)
+    db._fp_cache[(-100, 7)] = (0.0, False)
+    conn.statements.clear()
+    conn.tables["false_positives"] = [{"group_id": -100, "user_id": 7}]
+    assert db.load_detection_context(-100, 7).false_positive is True
+    assert len(conn.statements) == 1 and "false_positives" in conn.statements[0]
+
+
+def test_groups_off_the_global_blocklist_get_no_entry(conn):
+    conn.tables["groups"] = [dict(GROUP, use_global_blocklist=False)]
+    assert db.load_detection_context(-100, 7).bad_actor is None
+
+
+def test_without_pipeline_support_the_batch_shares_one_connection(conn, monkeypatch):
+    monkeypatch.setattr(db.Pipeline, "is_supported", staticmethod(lambda: False))
+    db.load_detection_context(-100, 7, include_seen=True)
+    assert (conn.checkouts, conn.round_trips) == (1, 6)
+
+
+def test_a_failed_batch_still_fails_closed(conn):
+    conn.broken = True
+    with pytest.raises(db.DatabaseUnavailable):
+        db.load_detection_context(-100, 7)
+    snap = UserSnapshot(user_id=7, username=None, first_name="Zoltan", last_name=None)
+    assert not asyncio.run(check_user(snap, -100)).flagged
+
+
+def test_a_failed_batch_serves_stale_protection(conn):
+    db.load_detection_context(-100, 42)
+    for cache in (db._group_cache, db._whitelist_cache):
+        cache[-100] = (0.0, cache[-100][1])
+    conn.broken = True
+    assert db.load_detection_context(-100, 42).whitelisted
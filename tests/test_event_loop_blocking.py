@@ -18,7 +18,6 @@ import time
 
 
 from src import db
-from src.utils import checker
 from src.utils.checker import UserSnapshot, check_user
 
 
@@ -27,12 +26,12 @@ TICK = 0.01          # ticker granularity
 
 
 def _patch_detection(monkeypatch, slow_fn):
-    monkeypatch.setattr(checker, "is_whitelisted", slow_fn)
-    monkeypatch.setattr(checker, "is_false_positive", lambda gid, uid: False)
-    monkeypatch.setattr(checker, "get_group", lambda gid: None)
-    monkeypatch.setattr(checker, "get_known_bad_actor", lambda uid: None)
-    monkeypatch.setattr(checker, "get_whitelist", lambda gid: [])
-    monkeypatch.setattr(checker, "get_reserved_keywords", lambda gid: [])
+    monkeypatch.setattr(db, "is_whitelisted", slow_fn)
+    monkeypatch.setattr(db, "is_false_positive", lambda gid, uid: False)
+    monkeypatch.setattr(db, "get_group", lambda gid: None)
+    monkeypatch.setattr(db, "get_known_bad_actor", lambda uid: None)
+    monkeypatch.setattr(db, "get_whitelist", lambda gid: [])
+    monkeypatch.setattr(db, "get_reserved_keywords", lambda gid: [])
 
 
 def test_check_user_leaves_the_event_loop_responsive(monkeypatch):
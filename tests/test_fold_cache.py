@@ -0,0 +1,93 @@
+"""
+fold_text's ASCII fast path and LRU must be invisible to callers: identical
+output to the full Unicode pipeline, a cache that stays inside its bounds, and
+counters that say what it did. The last test is a micro-benchmark over a
+realistic name corpus; run with -s to see the per-call numbers.
+"""
+import random
+import time
+
+import pytest
+
+from src.utils import detector
+from src.utils.detector import _FoldCache, _fold_unicode, fold_cache_info, fold_text
+
+
+# Mostly plain ASCII, as real member lists are, with the stylised and
+# accented minority the detector exists for.
+CORPUS = [
+    "John Smith", "alice", "Crypto Boss", "Support Team | Help", "Mike_88",
+    "Anna Maria Lopez", "  Spaced   Out  ", "ADMIN", "j0hn 5m1th", "Dr. Who",
+    "Jôhn Smíth", "Ｍａｒｙ Ａｎｎ", "ᴀᴅᴍɪɴ", "Ѕmith", "Z̵a̵l̵g̵o",
+    "A​B‌C", "Ĳssel", "Σίσυφος",
+]
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    detector._fold_cache.clear()
+    yield
+    detector._fold_cache.clear()
+
+
+def test_ascii_fast_path_matches_the_full_pipeline():
+    rng = random.Random(7)
+    samples = ["|", "a|b", "\t\x1c x \x0b", "ABC def", *CORPUS[:10]]
+    samples += ["".join(chr(rng.randrange(1, 128)) for _ in range(rng.randrange(1, 16)))
+                for _ in range(5000)]
+    for s in samples:
+        assert fold_text(s) == _fold_unicode(s), repr(s)
+
+
+def test_non_ascii_results_are_memoized_and_counted():
+    assert fold_text("Jôhn Smíth") == "john smith"
+    assert fold_text("Jôhn Smíth") == "john smith"
+    info = fold_cache_info()
+    assert (info["hits"], info["misses"], info["entries"]) == (1, 1, 1)
+
+
+def test_ascii_input_never_touches_the_cache():
+    for s in CORPUS[:10] * 3:
+        fold_text(s)
+    assert fold_cache_info()["entries"] == 0
+
+
+def test_cache_evicts_least_recently_used_first():
+    cache = _FoldCache(max_entries=2, max_chars=1000)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"       # refreshes "a"
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+
+
+def test_cache_stays_inside_its_character_budget():
+    cache = _FoldCache(max_entries=1000, max_chars=50)
+    for i in range(100):
+        cache.put(f"key{i:03d}", f"val{i:03d}")
+    info = cache.info()
+    assert info["chars"] <= 50
+    assert info["entries"] == 50 // len("key000val000")
+
+
+def test_long_subjects_are_folded_but_not_stored():
+    long_text = "Ｍ" * (detector._FOLD_CACHE_MAX_KEY + 1)
+    assert fold_text(long_text) == "m" * len(long_text)
+    assert fold_cache_info()["entries"] == 0
+
+
+def test_fold_text_per_call_cost():
+    names = CORPUS * 200
+
+    def per_call(fn):
+        start = time.perf_counter()
+        for n in names:
+            fn(n)
+        return (time.perf_counter() - start) / len(names) * 1e6
+
+    before = min(per_call(_fold_unicode) for _ in range(3))
+    after = min(per_call(fold_text) for _ in range(3))
+    print(f"\nfold_text: {before:.2f} us/call uncached -> {after:.2f} us/call "
+          f"({fold_cache_info()})")
+    assert [fold_text(n) for n in CORPUS] == [_fold_unicode(n) for n in CORPUS]
@@ -18,7 +18,7 @@ name, removes their photo, and is not flagged at all.
 import asyncio
 
 
-from src.utils import checker
+from src import db
 from src.utils.checker import UserSnapshot, check_user
 
 
@@ -27,12 +27,12 @@ GROUP_LOGO = "80ff00ff00ff00fb"
 
 
 def _patch(monkeypatch, *, whitelist, group):
-    monkeypatch.setattr(checker, "is_whitelisted", lambda g, u: False)
-    monkeypatch.setattr(checker, "is_false_positive", lambda g, u: False)
-    monkeypatch.setattr(checker, "get_known_bad_actor", lambda u: None)
-    monkeypatch.setattr(checker, "get_reserved_keywords", lambda g: [])
-    monkeypatch.setattr(checker, "get_whitelist", lambda g: whitelist)
-    monkeypatch.setattr(checker, "get_group", lambda g: group)
+    monkeypatch.setattr(db, "is_whitelisted", lambda g, u: False)
+    monkeypatch.setattr(db, "is_false_positive", lambda g, u: False)
+    monkeypatch.setattr(db, "get_known_bad_actor", lambda u: None)
+    monkeypatch.setattr(db, "get_reserved_keywords", lambda g: [])
+    monkeypatch.setattr(db, "get_whitelist", lambda g: whitelist)
+    monkeypatch.setattr(db, "get_group", lambda g: group)
 
 
 def _admin(first="Binance", last=None, pfp="1122334455667788"):
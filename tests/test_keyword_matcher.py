@@ -0,0 +1,96 @@
+"""
+The compiled KeywordMatcher must report exactly what the keyword-by-keyword
+loop reports — same hit, same first pattern — and be rebuilt only when the
+group's keyword set actually changes.
+"""
+import random
+
+import pytest
+
+from src import db
+from src.utils.detector import KeywordMatcher, _match_wildcard_pattern, check_reserved_keywords
+
+
+PATTERNS = [
+    "admin", "support*", "*bot", "*official*", "mod", "adm1n", "ceo",
+    "help desk", "*", "", "x.y.z", "Ｔｅａｍ*", "*_ceo", "giveaway",
+]
+SUBJECTS = [
+    "John Smith", "a d m i n", "a.d.m.i.n", "Ad Minister", "Mo Diaz",
+    "Support Team", "team support", "crypto_bot", "bot crypto", "4dmin",
+    "ᴀᴅᴍɪɴ", "THE OFFICIAL ONE", "help  desk", "h-e-l-p d.e.s.k", "xyz",
+    "x.y.z", "team lead", "jane_ceo", "Ce Oliveira", "g i v e a w a y!", "",
+]
+
+
+def _kw(patterns, regex=()):
+    return [{"pattern": p, "is_regex": p in regex} for p in patterns]
+
+
+def _loop(full_name, username, bio, keywords):
+    """The pre-compilation behaviour, for plain keywords."""
+    for kw in keywords:
+        for text in [t for t in (full_name, username, bio) if t]:
+            if _match_wildcard_pattern(kw["pattern"], text):
+                return kw["pattern"]
+    return None
+
+
+@pytest.mark.parametrize("subject", SUBJECTS)
+def test_compiled_matcher_reports_what_the_loop_reports(subject):
+    keywords = _kw(PATTERNS)
+    matcher = KeywordMatcher.build(keywords)
+    assert (check_reserved_keywords(subject, None, None, matcher)
+            == _loop(subject, None, None, keywords))
+
+
+def test_randomised_subjects_agree_with_the_loop():
+    rng = random.Random(4)
+    keywords = _kw(PATTERNS)
+    matcher = KeywordMatcher.build(keywords)
+    alphabet = "admin supporthelpbotceo.-_ 14"
+    for _ in range(3000):
+        name = "".join(rng.choice(alphabet) for _ in range(rng.randrange(1, 20)))
+        handle = rng.choice([None, "".join(rng.choice(alphabet) for _ in range(8))])
+        assert (check_reserved_keywords(name, handle, None, matcher)
+                == _loop(name, handle, None, keywords)), (name, handle)
+
+
+def test_the_first_listed_pattern_wins_across_plain_and_regex():
+    keywords = _kw(["zzz", r"adm.n", "admin"], regex={r"adm.n"})
+    assert check_reserved_keywords("admin", None, None, KeywordMatcher.build(keywords)) == r"adm.n"
+    keywords = _kw(["admin", r"adm.n"], regex={r"adm.n"})
+    assert check_reserved_keywords("admin", None, None, KeywordMatcher.build(keywords)) == "admin"
+
+
+def test_a_clean_subject_never_reaches_the_per_keyword_check(monkeypatch):
+    matcher = KeywordMatcher.build(_kw(PATTERNS))
+
+    def boom(self, texts):
+        raise AssertionError("prefilter let a clean subject through")
+    monkeypatch.setattr(type(next(iter(matcher.plain.values()))), "hits", boom)
+    assert check_reserved_keywords("Jane Doe", "jane", "just here to chat", matcher) is None
+
+
+@pytest.fixture
+def kw_cache():
+    db._kw_cache.clear()
+    db._kw_matcher_cache.clear()
+    yield
+    db._kw_cache.clear()
+    db._kw_matcher_cache.clear()
+
+
+def test_matcher_survives_a_ttl_refresh_of_the_same_rows(kw_cache):
+    first = db.get_keyword_matcher(-100, _kw(["admin", "mod"]))
+    # The 5-minute refresh hands back equal rows in a new list.
+    again = db.get_keyword_matcher(-100, _kw(["admin", "mod"]))
+    assert again[0] is first[0] and again[1] == first[1]
+
+
+def test_keyword_changes_rebuild_the_matcher(kw_cache):
+    first, version = db.get_keyword_matcher(-100, _kw(["admin"]))
+    db._invalidate_kw_cache(-100)
+    assert -100 not in db._kw_matcher_cache
+    rebuilt, new_version = db.get_keyword_matcher(-100, _kw(["admin", "mod"]))
+    assert rebuilt is not first and len(rebuilt) == 2 and new_version != version
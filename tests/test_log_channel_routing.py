@@ -15,6 +15,7 @@ exists, users were banned with NO alert and NO undo button — the admin saw onl
 import asyncio
 
 
+from src import db
 from src.utils import checker
 from src.utils.checker import DetectionResult, UserSnapshot, resolve_log_channel
 from src.watcher import events, sweep
@@ -28,19 +29,19 @@ GID = -1002222222222
 # ── the resolver itself ───────────────────────────────────────────────────────
 
 def test_group_channel_wins_over_global(monkeypatch):
-    monkeypatch.setattr(checker, "get_group",
+    monkeypatch.setattr(db, "get_group",
                         lambda gid: {"log_channel_id": GROUP_CHANNEL})
     assert resolve_log_channel(GID, GLOBAL_CHANNEL) == GROUP_CHANNEL
 
 
 def test_global_is_used_when_group_has_no_override(monkeypatch):
-    monkeypatch.setattr(checker, "get_group", lambda gid: {"log_channel_id": None})
+    monkeypatch.setattr(db, "get_group", lambda gid: {"log_channel_id": None})
     assert resolve_log_channel(GID, GLOBAL_CHANNEL) == GLOBAL_CHANNEL
 
 
 def test_group_channel_is_used_when_there_is_no_global(monkeypatch):
     """The reported silent-ban configuration: per-group channels, no global one."""
-    monkeypatch.setattr(checker, "get_group",
+    monkeypatch.setattr(db, "get_group",
                         lambda gid: {"log_channel_id": GROUP_CHANNEL})
     assert resolve_log_channel(GID, None) == GROUP_CHANNEL
 
@@ -50,7 +51,7 @@ def test_unavailable_group_config_falls_back_to_global(monkeypatch):
 
     def boom(gid):
         raise DatabaseUnavailable("down")
-    monkeypatch.setattr(checker, "get_group", boom)
+    monkeypatch.setattr(db, "get_group", boom)
     assert resolve_log_channel(GID, GLOBAL_CHANNEL) == GLOBAL_CHANNEL
 
 
@@ -77,7 +78,7 @@ def _capture_channel(monkeypatch):
 
 def test_profile_change_detection_uses_the_group_channel(monkeypatch):
     seen = _capture_channel(monkeypatch)
-    monkeypatch.setattr(checker, "get_group",
+    monkeypatch.setattr(db, "get_group",
                         lambda gid: {"log_channel_id": GROUP_CHANNEL})
 
     async def flagged(snapshot, group_id):
@@ -0,0 +1,141 @@
+"""
+Sweeps page through raw channels.GetParticipants. A capped run resumes at the
+server-side offset, with no re-enumeration of the prefix. A page offered back
+with its hash comes back NotModified when nobody in it changed. It is skipped
+only while the group's detection versions match the ones it was screened
+under and every member in it is still marked seen.
+"""
+import asyncio
+
+import pytest
+
+from src.db import SweepMemberState
+from src.utils.checker import DetectionResult
+from src.watcher import members as members_mod
+from src.watcher import sweep as sweep_mod
+from src.watcher.members import member_pages, participants_hash
+
+GID = -1001
+
+
+class _Bot:
+    id = 999
+
+
+@pytest.fixture
+def env(monkeypatch):
+    state = {"seen": set(), "versions": (1, 1, 1), "offset": 0, "offsets": [], "checked": []}
+
+    async def inline(fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+    monkeypatch.setattr(sweep_mod, "run_db", inline)
+    monkeypatch.setattr(sweep_mod, "_screened_pages", {})
+    monkeypatch.setattr(sweep_mod, "get_reserved_keywords", lambda gid: [])
+    monkeypatch.setattr(sweep_mod, "load_sweep_member_state",
+                        lambda gid: SweepMemberState(set(), set(), set(state["seen"])))
+    monkeypatch.setattr(sweep_mod, "detection_versions", lambda gid: state["versions"])
+    monkeypatch.setattr(sweep_mod, "detection_digest", lambda gid: 1)
+    monkeypatch.setattr(sweep_mod, "set_member_fingerprint", lambda gid, uid, fp: None)
+    monkeypatch.setattr(sweep_mod, "prime_sweep_chunk", lambda gid, uids: None)
+    monkeypatch.setattr(sweep_mod, "prescore_snapshots", lambda snaps, gid: None)
+    monkeypatch.setattr(sweep_mod, "mark_seen", lambda gid, uid: state["seen"].add(uid))
+    monkeypatch.setattr(sweep_mod, "record_sweep_run", lambda *a, **k: None)
+    monkeypatch.setattr(sweep_mod, "record_sweep_coverage", lambda gid, count, complete: True)
+    monkeypatch.setattr(sweep_mod, "get_group_sweep_offset", lambda gid: state["offset"])
+    monkeypatch.setattr(sweep_mod, "set_group_sweep_offset",
+                        lambda gid, offset: state["offsets"].append(offset))
+    monkeypatch.setattr(sweep_mod, "refresh_whitelist_pfps", lambda *a, **k: asyncio.sleep(0))
+
+    async def clean(snapshot, group_id):
+        state["checked"].append(snapshot.user_id)
+        return DetectionResult(flagged=False)
+    monkeypatch.setattr(sweep_mod, "check_user", clean)
+    return state
+
+
+def _sweep(client):
+    return asyncio.run(sweep_mod.sweep_group(client, _Bot(), GID))
+
+
+def test_the_hash_is_a_signed_64_bit_vector_hash():
+    assert participants_hash([]) == 0
+    h = participants_hash(range(1, 300))
+    assert -2**63 <= h < 2**63 and h != participants_hash(range(2, 301))
+
+
+def test_pages_start_at_the_requested_offset(stand_in):
+    client = stand_in(450, GID)
+
+    async def collect():
+        return [page async for page in member_pages(client, GID, 250)]
+    pages = asyncio.run(collect())
+    assert [(p.offset, len(p.members)) for p in pages] == [(250, 200)]
+    assert pages[0].user_ids[0] == 1250 and pages[0].members[0].user.username == "user250"
+    assert [offset for offset, _, _ in client.requests] == [250, 450]
+
+
+def test_a_resumed_sweep_asks_for_the_first_unscreened_member(env, stand_in):
+    env["offset"] = 300
+    client = stand_in(500, GID)
+    result = _sweep(client)
+    assert client.requests[0][0] == 300
+    assert env["checked"] == list(range(1300, 1500))
+    assert result["partial"] is False and env["offsets"][-1] == 0
+
+
+def test_unchanged_pages_are_skipped_on_the_next_run(env, stand_in):
+    client = stand_in(500, GID)
+    _sweep(client)
+    client.requests.clear()
+    env["checked"].clear()
+    result = _sweep(client)
+    assert result["unchanged_skipped"] == 500 and env["checked"] == []
+    assert all(page_hash for _, _, page_hash in client.requests[:3])
+
+
+def test_a_joiner_changes_only_their_page(env, stand_in):
+    client = stand_in(500, GID)
+    _sweep(client)
+    env["checked"].clear()
+    client.members.insert(450, (7, "New", "joiner"))
+    result = _sweep(client)
+    assert result["unchanged_skipped"] == 400
+    assert 7 in env["checked"] and len(env["checked"]) == 101
+
+
+@pytest.mark.parametrize(("change", "skipped"), [
+    (lambda env: env.update(versions=(2, 1, 1)), 0),        # whitelist edited
+    (lambda env: env["seen"].discard(1250), 200),           # profile changed: unmarked
+])
+def test_nothing_stale_is_skipped(env, change, skipped, stand_in):
+    client = stand_in(400, GID)
+    _sweep(client)
+    env["checked"].clear()
+    change(env)
+    result = _sweep(client)
+    assert 1250 in env["checked"]
+    assert result["unchanged_skipped"] == skipped
+
+
+def test_a_capped_page_is_never_skipped(env, monkeypatch, stand_in):
+    client = stand_in(300, GID)
+    monkeypatch.setattr(sweep_mod, "SWEEP_HARD_CAP_SECONDS", 0)
+    assert _sweep(client)["partial"] is True
+    monkeypatch.setattr(sweep_mod, "SWEEP_HARD_CAP_SECONDS", 7200)
+    assert not sweep_mod._screened_pages.get(GID)
+    assert _sweep(client)["unchanged_skipped"] == 0
+
+
+def test_basic_groups_page_client_side():
+    class _Basic:
+        async def resolve_peer(self, chat_id):
+            return members_mod.raw.types.InputPeerChat(chat_id=5)
+
+        async def get_chat_members(self, chat_id):
+            for uid in range(1000, 1005):
+                yield type("M", (), {"user": type("U", (), {"id": uid})()})()
+
+    async def collect():
+        return [page async for page in member_pages(_Basic(), -5, 3)]
+    (page,) = asyncio.run(collect())
+    assert page.offset == 3 and page.user_ids == (1003, 1004)
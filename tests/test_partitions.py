@@ -0,0 +1,133 @@
+"""
+logs, sweep_runs, name_change_log and admin_actions are range-partitioned by
+month, so retention drops a month in one statement instead of deleting (and
+later vacuuming) it row by row. The one-time rebuild must keep every row,
+index, rollup trigger and id; maintenance keeps the coming months created.
+"""
+from datetime import UTC, date, datetime
+
+import pytest
+
+from src import db
+
+TODAY = datetime.now(UTC).date()
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        self.conn.statements.append(" ".join(sql.split()))
+        if "AS last_id" in sql:
+            self.rows = [{"last_id": 41, "first": datetime(2026, 1, 15, tzinfo=UTC)}]
+        elif "FROM pg_indexes" in sql:
+            self.rows = [{"indexdef": "CREATE INDEX idx_logs_created ON public.logs "
+                                      "USING btree (created_at)"}]
+        elif "FROM pg_trigger" in sql:
+            self.rows = [{"triggerdef": "CREATE TRIGGER logs_daily_rollup AFTER INSERT "
+                                        "ON public.logs FOR EACH ROW EXECUTE FUNCTION "
+                                        "rollup_detection()"}]
+        elif "to_regclass('" in sql:
+            name = sql.split("'")[1]
+            self.rows = [{"missing": name not in self.conn.existing}]
+        elif "FROM pg_class WHERE" in sql:
+            self.rows = [{"relkind": "p" if params[0] in self.conn.partitioned else "r"}]
+        elif "FROM pg_inherits" in sql:
+            self.rows = [{"relname": n} for n in self.conn.children.get(params[0], [])]
+        else:
+            self.rows = []
+        return self
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Conn:
+    def __init__(self):
+        self.statements = []
+        self.existing = set()
+        self.partitioned = set()
+        self.children = {}
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = _Conn()
+    monkeypatch.setattr(db, "get_connection", lambda *a, **k: conn)
+    monkeypatch.setattr(db, "put_connection", lambda c: None)
+    return conn
+
+
+def _index(conn, prefix):
+    return next(i for i, s in enumerate(conn.statements) if s.startswith(prefix))
+
+
+def test_the_rebuild_keeps_rows_ids_indexes_and_triggers(conn):
+    db._partition_by_month(conn.cursor(), "logs", "created_at", "log_id")
+    s = conn.statements
+    copy = _index(conn, "INSERT INTO logs SELECT * FROM logs_unpartitioned")
+    assert "PARTITION BY RANGE (created_at)" in s[_index(conn, "CREATE TABLE logs (LIKE")]
+    assert "ALTER TABLE logs ADD PRIMARY KEY (log_id, created_at)" in s
+    assert "CREATE TABLE logs_default PARTITION OF logs DEFAULT" in s
+    assert _index(conn, "CREATE TABLE logs_p2026_01") < copy      # the oldest row's month
+    # The sequence resumes after the highest existing id.
+    assert any(x.startswith("SELECT setval") for x in s[:copy])
+    # Recreated only after the copy, so the rollup doesn't count old rows again.
+    assert _index(conn, "CREATE TRIGGER logs_daily_rollup") > copy
+    assert _index(conn, "CREATE INDEX idx_logs_created ON public.logs") > copy
+    assert _index(conn, "DROP TABLE logs_unpartitioned") < _index(conn, "CREATE INDEX")
+
+
+def test_partitions_are_created_ahead_and_only_once(conn):
+    conn.partitioned = {"logs"}
+    conn.existing = {f"logs_p{TODAY:%Y_%m}"}
+    assert db.maintain_partitions() == db._PARTITION_MONTHS_AHEAD
+    creates = [s for s in conn.statements if s.startswith("CREATE TABLE")]
+    assert all(s.startswith("CREATE TABLE logs_p") for s in creates)
+    ahead = db._month_start(TODAY, db._PARTITION_MONTHS_AHEAD)
+    assert f"logs_p{ahead:%Y_%m}" in creates[-1]
+
+
+def test_month_bounds_are_utc_and_contiguous(conn):
+    db._create_month_partitions(conn.cursor(), "logs", date(2026, 11, 20), date(2027, 1, 3))
+    creates = [s for s in conn.statements if s.startswith("CREATE TABLE")]
+    assert [s.split()[2] for s in creates] == ["logs_p2026_11", "logs_p2026_12", "logs_p2027_01"]
+    assert "FROM ('2026-12-01 00:00:00+00') TO ('2027-01-01 00:00:00+00')" in creates[1]
+
+
+def test_retention_drops_expired_months_whole(conn):
+    conn.children = {"logs": ["logs_p2020_01", f"logs_p{TODAY:%Y_%m}", "logs_default"]}
+    deleted = db.purge_old_records(logs_days=90)
+    drops = [s for s in conn.statements if s.startswith("DROP TABLE")]
+    assert drops == ["DROP TABLE logs_p2020_01"] and deleted["partitions_dropped"] == 1
+    # The month the cutoff falls inside, and the default partition, are trimmed
+    # row by row as before.
+    assert any(s.startswith("DELETE FROM logs WHERE") for s in conn.statements)
+
+
+def test_a_month_is_kept_until_all_of_it_has_expired(conn):
+    cutoff = db._month_start(TODAY, -1)
+    conn.children = {"admin_actions": [f"admin_actions_p{cutoff:%Y_%m}"]}
+    db.purge_old_records(actions_days=(TODAY - cutoff).days)
+    assert not any(s.startswith("DROP TABLE") for s in conn.statements)
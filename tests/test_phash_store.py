@@ -0,0 +1,95 @@
+"""
+The packed uint64 hash store must give exactly the verdict the ImageHash loop
+gave — same match, same stored hash on ties, same distance — for the original
+and mirrored suspect hashes at once. The last test benchmarks 10k stored hashes
+against the old loop; run with -s to see the numbers.
+"""
+import random
+import time
+
+import imagehash
+import numpy as np
+import pytest
+
+from src.utils import image
+from src.utils.image import StoredHashes, check_pfp_similarity
+
+
+def _loop(targets, stored, threshold):
+    """The pre-packing behaviour: parse everything, subtract pair by pair."""
+    parsed = [imagehash.hex_to_hash(t) for t in targets]
+    best, min_dist = None, 100
+    for hx in stored:
+        h = imagehash.hex_to_hash(hx)
+        for t in parsed:
+            if t - h < min_dist:
+                min_dist, best = t - h, hx
+    return (True, best, min_dist) if min_dist <= threshold else (False, None, min_dist)
+
+
+def _random_hashes(rng, n):
+    return [f"{rng.getrandbits(64):016x}" for _ in range(n)]
+
+
+def test_packed_store_agrees_with_the_loop():
+    rng = random.Random(8)
+    stored = _random_hashes(rng, 300)
+    for _ in range(200):
+        base = rng.choice(stored)
+        near = f"{int(base, 16) ^ rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64):016x}"
+        targets = [near, _random_hashes(rng, 1)[0]]
+        assert (check_pfp_similarity(targets, StoredHashes.build(stored), 10)
+                == _loop(targets, stored, 10))
+
+
+def test_the_first_stored_hash_wins_a_tie():
+    stored = ["0000000000000003", "0000000000000300", "0000000000000003"]
+    assert check_pfp_similarity("0000000000000000", stored, 10) == (True, "0000000000000003", 2)
+
+
+def test_the_mirror_hash_can_be_the_closer_one():
+    stored = ["ff00000000000000"]
+    assert check_pfp_similarity(["00000000000000ff", "ff00000000000001"], stored, 10) \
+        == (True, "ff00000000000000", 1)
+
+
+@pytest.mark.parametrize("junk", ["", None, "not-hex", "0x00000000000001", "abc", "0" * 32])
+def test_entries_that_are_not_64_bit_hex_are_dropped(junk):
+    store = StoredHashes.build([junk, "0000000000000001"])
+    assert store.hexes == ("0000000000000001",)
+    assert check_pfp_similarity(junk, store, 10) == (False, None, 100)
+
+
+def test_an_empty_store_never_matches():
+    assert check_pfp_similarity("0000000000000000", [], 10) == (False, None, 100)
+
+
+def test_the_store_is_read_only():
+    with pytest.raises(ValueError):
+        StoredHashes.build(["0000000000000001"]).packed[0] = 0
+
+
+def test_popcount_fallback_matches(monkeypatch):
+    words = np.array([0, 1, 0xFFFFFFFFFFFFFFFF, 0x8000000000000001], dtype=np.uint64)
+    monkeypatch.delattr(np, "bitwise_count", raising=False)
+    assert image._popcount(words).tolist() == [0, 1, 64, 2]
+
+
+def test_packed_store_against_the_loop_benchmark():
+    rng = random.Random(10)
+    stored = _random_hashes(rng, 10_000)
+    targets = _random_hashes(rng, 2)          # original + mirror
+    store = StoredHashes.build(stored)
+
+    def per_call(fn, n):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        return (time.perf_counter() - start) / n * 1e3
+
+    loop = per_call(lambda: _loop(targets, stored, 10), 1)
+    packed = min(per_call(lambda: check_pfp_similarity(targets, store, 10), 20)
+                 for _ in range(3))
+    print(f"\n10k stored phashes x 2 suspect hashes: {loop:.2f} ms loop -> "
+          f"{packed:.3f} ms packed")
+    assert check_pfp_similarity(targets, store, 10) == _loop(targets, stored, 10)
@@ -0,0 +1,156 @@
+"""
+A profile photo is decoded once: PhotoFingerprint gives the base hash, the
+mirror hash and the flatness verdict from a single reduced-size decode, and a
+snapshot carries it from the detection pipeline to ban_and_log. Hashes must
+match the full-decode hashes exactly for lossless formats and to within a
+couple of bits for JPEG. The last test benchmarks a 640px JPEG against the old
+full decode; run with -s to see the numbers.
+"""
+import asyncio
+import dataclasses
+import random
+import time
+from io import BytesIO
+
+import imagehash
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+from src import db
+from src.utils import checker, image
+from src.utils.checker import DetectionResult, UserSnapshot, ban_and_log, check_user, photo_fingerprint
+from src.utils.image import PhotoFingerprint
+
+
+def _photo(seed, fmt="JPEG", side=640) -> bytes:
+    rng = random.Random(seed)
+    img = Image.new("RGB", (side, side), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(30):
+        x, y = rng.randrange(side), rng.randrange(side)
+        draw.ellipse((x, y, x + rng.randrange(20, side // 2), y + rng.randrange(20, side // 2)),
+                     fill=tuple(rng.randrange(256) for _ in range(3)))
+    buf = BytesIO()
+    img.filter(ImageFilter.GaussianBlur(3)).save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def _full_decode(data):
+    """The pre-fingerprint behaviour: full decode, image and mirror hashed separately."""
+    img = Image.open(BytesIO(data)).convert("RGB")
+    return imagehash.phash(img), imagehash.phash(img.transpose(Image.FLIP_LEFT_RIGHT))
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_lossless_photos_hash_exactly_as_before(seed):
+    data = _photo(seed, fmt="PNG")
+    base, mirror = _full_decode(data)
+    fp = PhotoFingerprint.from_bytes(data)
+    assert (fp.base, fp.mirror) == (str(base), str(mirror))
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_jpeg_draft_decoding_stays_within_two_bits(seed):
+    data = _photo(seed)
+    base, mirror = _full_decode(data)
+    fp = PhotoFingerprint.from_bytes(data)
+    assert base - imagehash.hex_to_hash(fp.base) <= 2
+    assert mirror - imagehash.hex_to_hash(fp.mirror) <= 2
+
+
+def test_jpegs_are_decoded_at_reduced_size(monkeypatch):
+    sizes = []
+    real = image._load_image
+
+    def recording(data):
+        img = real(data)
+        sizes.append(img.size)
+        return img
+    monkeypatch.setattr(image, "_load_image", recording)
+    PhotoFingerprint.from_bytes(_photo(1))
+    assert sizes and max(sizes[0]) < 640 and min(sizes[0]) >= 64
+
+
+def test_undecodable_and_flat_photos_give_no_hashes():
+    flat = BytesIO()
+    Image.new("RGB", (64, 64), (200, 30, 30)).save(flat, format="PNG")
+    for data in (None, b"", b"not an image", flat.getvalue()):
+        assert PhotoFingerprint.from_bytes(data).hashes == []
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    calls = {"n": 0}
+    real = image._load_image
+
+    def counting(data):
+        calls["n"] += 1
+        return real(data)
+    monkeypatch.setattr(image, "_load_image", counting)
+    return calls
+
+
+def test_the_snapshot_keeps_its_fingerprint_until_the_bytes_change(decodes):
+    snap = UserSnapshot(user_id=1, username=None, first_name="A", last_name=None,
+                        pfp_bytes=_photo(1))
+    first = photo_fingerprint(snap)
+    assert photo_fingerprint(snap) is first and decodes["n"] == 1
+    swapped = dataclasses.replace(snap, pfp_bytes=_photo(2))
+    assert swapped.photo is first                      # replace copies the field...
+    assert photo_fingerprint(swapped).base != first.base   # ...but it isn't trusted
+    assert decodes["n"] == 2
+
+
+def test_check_and_ban_decode_the_photo_once(monkeypatch, decodes):
+    avatar = _photo(3)
+    admin = {"user_id": 42, "username": "zoltanvex", "first_name": "Zoltan",
+             "last_name": "Vex", "pfp_hash": PhotoFingerprint.from_bytes(avatar).base}
+    decodes["n"] = 0
+    monkeypatch.setattr(db, "get_group", lambda gid: {"action_mode": "alert"})
+    monkeypatch.setattr(db, "get_whitelist", lambda gid: [admin])
+    monkeypatch.setattr(db, "get_reserved_keywords", lambda gid: [])
+    monkeypatch.setattr(db, "is_whitelisted", lambda gid, uid: False)
+    monkeypatch.setattr(db, "is_false_positive", lambda gid, uid: False)
+    monkeypatch.setattr(db, "get_known_bad_actor", lambda uid: None)
+    logged = {}
+    monkeypatch.setattr(checker, "insert_log", lambda **kw: logged.update(kw))
+
+    snap = UserSnapshot(user_id=7, username=None, first_name="Zoltan", last_name=None,
+                        pfp_bytes=avatar)
+    result = asyncio.run(check_user(snap, -100))
+    assert result.flagged and result.match_type == "pfp"
+
+    async def ban(gid, uid):
+        pass
+    asyncio.run(ban_and_log(result, snap, -100, "test", ban))
+    assert logged["user_pfp_hash"] == admin["pfp_hash"]
+    assert decodes["n"] == 1
+
+
+def test_ban_and_log_hashes_a_photo_the_check_never_needed(monkeypatch, decodes):
+    monkeypatch.setattr(db, "get_group", lambda gid: {"action_mode": "alert"})
+    monkeypatch.setattr(checker, "insert_log", lambda **kw: None)
+    snap = UserSnapshot(user_id=7, username="x", first_name="X", last_name=None,
+                        pfp_bytes=_photo(4))
+
+    async def ban(gid, uid):
+        pass
+    asyncio.run(ban_and_log(DetectionResult(flagged=True, match_type="keyword", score=100),
+                            snap, -100, "test", ban))
+    assert decodes["n"] == 1 and snap.photo.base
+
+
+def test_draft_decoding_benchmark():
+    data = _photo(5)
+
+    def per_call(fn, n=20):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        return (time.perf_counter() - start) / n * 1e3
+
+    old = min(per_call(lambda: _full_decode(data)) for _ in range(3))
+    new = min(per_call(lambda: PhotoFingerprint.from_bytes(data)) for _ in range(3))
+    print(f"\n640px JPEG, image + mirror hash: {old:.2f} ms full decode -> "
+          f"{new:.2f} ms draft decode")
+    assert new < old
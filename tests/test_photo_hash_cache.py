@@ -0,0 +1,142 @@
+"""
+Profile photos are hashed once per photo, not once per look. The hashes are
+kept under the photo's file_unique_id — in memory, and in photo_hashes for
+other processes and restarts — so an unchanged avatar costs no download and no
+decode, and when the caller already knows the id (a sweep's member list) not
+even the photo list call.
+"""
+import asyncio
+import random
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image, ImageDraw
+
+from src import db
+from src.utils import checker, image
+from src.utils.checker import UserSnapshot, check_user
+from src.utils.image import PhotoFingerprint
+from src.watcher import fetch as fetch_mod
+
+
+def _photo(seed) -> bytes:
+    rng = random.Random(seed)
+    img = Image.new("RGB", (160, 160), (40, 90, 160))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rng.randrange(160), rng.randrange(160)
+        draw.ellipse((x, y, x + 40, y + 40), fill=tuple(rng.randrange(256) for _ in range(3)))
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class _Pyro:
+    """Each user's current photo as (file_unique_id, bytes)."""
+
+    def __init__(self, photos):
+        self.photos = photos
+        self.listed = 0
+        self.downloads = 0
+
+    async def get_chat_photos(self, user_id, limit=None):
+        self.listed += 1
+        if user_id in self.photos:
+            yield SimpleNamespace(file_unique_id=self.photos[user_id][0], user_id=user_id)
+
+    async def stream_media(self, photo):
+        self.downloads += 1
+        data = self.photos[photo.user_id][1]
+        for i in range(0, len(data), 1024):
+            yield data[i:i + 1024]
+
+
+@pytest.fixture
+def table(monkeypatch):
+    rows = {}
+
+    def read_one(sql, params):
+        hashes = rows.get(params[0])
+        return None if hashes is None else {"pfp_hash": hashes[0], "pfp_mirror_hash": hashes[1]}
+    monkeypatch.setattr(db, "_read_one", read_one)
+    monkeypatch.setattr(db, "_queue_write",
+                        lambda kind, row: rows.__setitem__(row[0], row[1:]))
+    monkeypatch.setattr(fetch_mod, "_pfp_pacer", fetch_mod._Pacer("pfp", 0))
+    return rows
+
+
+def _fetch(pyro, uid, **kw):
+    return asyncio.run(fetch_mod.fetch_pfp_fingerprint(pyro, uid, **kw))
+
+
+def test_an_unchanged_photo_is_downloaded_once(table):
+    pyro = _Pyro({1: ("AgAD1", _photo(1))})
+    first = _fetch(pyro, 1)
+    assert first.base == PhotoFingerprint.from_bytes(_photo(1)).base and first.mirror
+    assert first.source is None and first.unique_id == "AgAD1"
+    assert table["AgAD1"] == (first.base, first.mirror)
+    assert _fetch(pyro, 1) == first
+    assert (pyro.listed, pyro.downloads) == (2, 1)
+
+
+def test_a_known_id_costs_no_call(table):
+    pyro = _Pyro({1: ("AgAD1", _photo(1))})
+    _fetch(pyro, 1)
+    assert _fetch(pyro, 1, unique_id="AgAD1").unique_id == "AgAD1"
+    assert (pyro.listed, pyro.downloads) == (1, 1)
+
+
+def test_the_table_outlives_the_process(table):
+    pyro = _Pyro({1: ("AgAD1", _photo(1))})
+    first = _fetch(pyro, 1)
+    db._photo_hash_cache.clear()
+    assert _fetch(pyro, 1, unique_id="AgAD1") == first
+    assert (pyro.listed, pyro.downloads) == (1, 1)
+
+
+def test_a_new_photo_is_downloaded(table):
+    pyro = _Pyro({1: ("AgAD1", _photo(1))})
+    first = _fetch(pyro, 1)
+    pyro.photos[1] = ("AgAD2", _photo(2))
+    assert _fetch(pyro, 1).base != first.base and pyro.downloads == 2
+
+
+def test_an_unhashable_photo_is_remembered_too(table):
+    pyro = _Pyro({1: ("AgAD1", b"a video avatar")})
+    assert _fetch(pyro, 1).hashes == [] and table["AgAD1"] == (None, None)
+    _fetch(pyro, 1)
+    assert pyro.downloads == 1
+
+
+def test_no_photo_and_a_failed_read_are_misses(table, monkeypatch):
+    assert _fetch(_Pyro({}), 1) is None
+
+    def down(sql, params):
+        raise db._NoConnection()
+    monkeypatch.setattr(db, "_read_one", down)
+    assert db.get_photo_hashes("AgAD9") is None
+
+
+def test_a_cached_fingerprint_screens_like_the_photo(monkeypatch):
+    avatar = _photo(3)
+    fp = PhotoFingerprint.from_bytes(avatar)
+    admin = {"user_id": 42, "username": "zoltanvex", "first_name": "Zoltan",
+             "last_name": "Vex", "pfp_hash": fp.base}
+    monkeypatch.setattr(db, "get_group", lambda gid: {"action_mode": "alert"})
+    monkeypatch.setattr(db, "get_whitelist", lambda gid: [admin])
+    monkeypatch.setattr(db, "get_reserved_keywords", lambda gid: [])
+    monkeypatch.setattr(db, "is_whitelisted", lambda gid, uid: False)
+    monkeypatch.setattr(db, "is_false_positive", lambda gid, uid: False)
+    monkeypatch.setattr(db, "get_known_bad_actor", lambda uid: None)
+
+    def no_decode(data):
+        raise AssertionError("a cached photo must not be decoded")
+    monkeypatch.setattr(image, "_load_image", no_decode)
+
+    cached = PhotoFingerprint(None, fp.base, fp.mirror, unique_id="AgAD3")
+    snap = UserSnapshot(user_id=7, username=None, first_name="Zoltan", last_name=None,
+                        photo=cached)
+    result = asyncio.run(check_user(snap, -100))
+    assert result.flagged and result.match_type == "pfp"
+    assert checker.photo_fingerprint(snap) is cached
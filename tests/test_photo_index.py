@@ -0,0 +1,274 @@
+"""
+The cross-group photo index must return exactly what a linear scan returns —
+every ref within the radius, and nothing else — while keeping to its entry cap,
+and refresh_photo_index must move it forward incrementally, including the
+deletes it can only see through a wholesale reload. The last test benchmarks a
+lookup against a scan over 50k hashes; run with -s to see the numbers.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from src import db
+from src.utils.photo_index import PhotoHashIndex, PhotoRef
+
+
+def _scan(entries, targets, radius):
+    """The linear alternative: every entry, every target."""
+    out = set()
+    for ref, hx in entries.items():
+        d = min(bin(int(hx, 16) ^ int(t, 16)).count("1") for t in targets)
+        if d <= radius:
+            out.add((ref, d))
+    return out
+
+
+def _near(rng, hx, bits):
+    word = int(hx, 16)
+    for b in rng.sample(range(64), bits):
+        word ^= 1 << b
+    return f"{word:016x}"
+
+
+@pytest.mark.parametrize("radius", [0, 3, 10, 17, 30])
+def test_lookups_agree_with_a_scan(radius):
+    rng = random.Random(radius)
+    base = [f"{rng.getrandbits(64):016x}" for _ in range(40)]
+    # Clustered like real avatars: many hashes a few bits from a few originals.
+    entries = {PhotoRef("whitelist", i % 7, i): _near(rng, rng.choice(base), rng.randrange(0, 20))
+               for i in range(2000)}
+    index = PhotoHashIndex(max_entries=10_000)
+    for ref, hx in entries.items():
+        index.add(ref, hx)
+    for _ in range(50):
+        targets = [_near(rng, rng.choice(base), rng.randrange(0, 12)), f"{rng.getrandbits(64):016x}"]
+        got = {(m.ref, m.distance) for m in index.within(targets, radius)}
+        assert got == _scan(entries, targets, radius)
+
+
+def test_results_come_closest_first():
+    index = PhotoHashIndex(max_entries=10)
+    index.add(PhotoRef("whitelist", 1, 1), "0000000000000007")
+    index.add(PhotoRef("bad_actor", 2, 2), "0000000000000001")
+    assert [m.distance for m in index.within(["0000000000000000"], 10)] == [1, 3]
+
+
+def test_re_adding_a_ref_moves_its_hash():
+    index = PhotoHashIndex(max_entries=10)
+    ref = PhotoRef("whitelist", 1, 1)
+    index.add(ref, "0000000000000000")
+    index.add(ref, "ffffffffffffffff")
+    assert index.within(["0000000000000000"], 10) == []
+    assert len(index) == 1 and index.info()["hashes"] == 1
+    index.add(ref, None)
+    assert len(index) == 0
+
+
+def test_shared_hashes_survive_one_holder_leaving():
+    index = PhotoHashIndex(max_entries=10)
+    a, b = PhotoRef("whitelist", 1, 1), PhotoRef("whitelist", 2, 2)
+    index.add(a, "00000000000000ff")
+    index.add(b, "00000000000000ff")
+    index.discard(a)
+    assert [m.ref for m in index.within(["00000000000000ff"], 0)] == [b]
+
+
+def test_the_index_is_bounded():
+    index = PhotoHashIndex(max_entries=100)
+    for i in range(1000):
+        index.add(PhotoRef("bad_actor", None, i), f"{i * 2654435761:016x}")
+    assert len(index) == 100 and index.info()["evictions"] == 900
+    assert index.within([f"{0:016x}"], 0) == []                 # oldest went first
+    assert index.within([f"{999 * 2654435761:016x}"], 0)
+
+
+def test_replace_drops_only_what_it_is_told_to():
+    index = PhotoHashIndex(max_entries=10)
+    index.add(PhotoRef("whitelist", 1, 1), "0000000000000001")
+    index.add(PhotoRef("whitelist", 2, 2), "0000000000000002")
+    index.replace(lambda r: r.group_id != 1, [(PhotoRef("whitelist", 1, 3), "0000000000000003")])
+    assert {m.ref.user_id for m in index.within(["0000000000000000"], 2)} == {2, 3}
+
+
+# ── refresh_photo_index ──────────────────────────────────────────────────────
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        self.conn.statements.append(sql)
+        bad = {b["user_id"]: b for b in self.conn.bad_actors}
+        if sql.startswith("SELECT user_id, last_seen_at FROM known_bad_actors"):
+            since = params[0] if params else None
+            self.rows = [b for b in self.conn.bad_actors if since is None or b["last_seen_at"] > since]
+        elif "FROM logs l JOIN known_bad_actors" in sql and "ANY" in sql:
+            self.rows = [r for r in self.conn.logs
+                         if r["user_id"] in params[0] and r["user_id"] in bad]
+        elif "FROM logs l JOIN known_bad_actors" in sql:
+            self.rows = [r for r in self.conn.logs
+                         if r["log_id"] > params[0] and r["user_id"] in bad][:params[1]]
+        elif "ANY" in sql:
+            self.rows = [r for r in self.conn.whitelist
+                         if r["group_id"] in params[0] and r["pfp_hash"]]
+        else:
+            def key(r):
+                return (r["updated_at"], r["group_id"], r["user_id"])
+            rows = sorted(self.conn.whitelist, key=key)
+            if len(params) == 4:
+                rows = [r for r in rows if key(r) > tuple(params[:3])]
+            self.rows = rows[:params[-1]]
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Conn:
+    def __init__(self):
+        self.whitelist, self.logs, self.bad_actors, self.statements = [], [], [], []
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+T0 = datetime(2026, 1, 1)
+PHOTO = "c3c3c3c33c3c3c3c"
+
+
+@pytest.fixture
+def fresh_index(monkeypatch):
+    conn = _Conn()
+    monkeypatch.setattr(db, "get_connection", lambda *a, **k: conn)
+    monkeypatch.setattr(db, "put_connection", lambda c: None)
+    monkeypatch.setattr(db, "_photo_index", PhotoHashIndex(max_entries=1000))
+    monkeypatch.setattr(db, "_photo_index_marks",
+                        {"whitelist": None, "log_id": 0, "bad_actors": None})
+    monkeypatch.setattr(db, "_photo_index_dirty_groups", set())
+    monkeypatch.setattr(db, "_photo_index_dirty_users", set())
+    monkeypatch.setattr(db, "_PHOTO_INDEX_BATCH", 2)
+    return conn
+
+
+def _wl(group_id, user_id, pfp_hash=PHOTO, minutes=0):
+    return {"group_id": group_id, "user_id": user_id, "pfp_hash": pfp_hash,
+            "updated_at": T0 + timedelta(minutes=minutes)}
+
+
+def _found(group_id=-1, user_id=999):
+    return {(m.ref.kind, m.ref.group_id, m.ref.user_id)
+            for m in db.find_reused_photo([PHOTO], group_id, user_id)}
+
+
+def test_first_refresh_loads_everything_in_batches(fresh_index):
+    fresh_index.whitelist = [_wl(-100, 1), _wl(-200, 2), _wl(-300, 3, pfp_hash=None)]
+    fresh_index.bad_actors = [{"user_id": 66, "last_seen_at": T0}]
+    fresh_index.logs = [{"log_id": 1, "group_id": -400, "user_id": 66, "user_pfp_hash": PHOTO},
+                        {"log_id": 2, "group_id": -400, "user_id": 77, "user_pfp_hash": PHOTO}]
+    db.refresh_photo_index()
+    assert _found() == {("whitelist", -100, 1), ("whitelist", -200, 2), ("bad_actor", -400, 66)}
+
+
+def test_later_refreshes_pull_only_changes(fresh_index):
+    fresh_index.whitelist = [_wl(-100, 1)]
+    db.refresh_photo_index()
+    fresh_index.whitelist.append(_wl(-200, 2, minutes=5))
+    fresh_index.statements.clear()
+    assert db.refresh_photo_index() == 1
+    assert _found() == {("whitelist", -100, 1), ("whitelist", -200, 2)}
+
+
+def test_this_group_and_the_user_themselves_are_left_out(fresh_index):
+    fresh_index.whitelist = [_wl(-100, 1), _wl(-200, 2)]
+    db.refresh_photo_index()
+    assert _found(group_id=-100, user_id=2) == set()
+
+
+def test_a_whitelist_removal_reloads_the_group(fresh_index):
+    fresh_index.whitelist = [_wl(-100, 1), _wl(-100, 2)]
+    db.refresh_photo_index()
+    fresh_index.whitelist = [_wl(-100, 2)]          # row deleted: no updated_at to see
+    db._invalidate_whitelist_cache(-100)
+    db.refresh_photo_index()
+    assert _found() == {("whitelist", -100, 2)}
+
+
+def test_a_cleared_blocklist_entry_leaves_the_index(fresh_index):
+    fresh_index.bad_actors = [{"user_id": 66, "last_seen_at": T0}]
+    fresh_index.logs = [{"log_id": 1, "group_id": -400, "user_id": 66, "user_pfp_hash": PHOTO}]
+    db.refresh_photo_index()
+    fresh_index.bad_actors = []
+    db._invalidate_bad_actor_cache(66)
+    db.refresh_photo_index()
+    assert _found() == set()
+
+
+def test_a_new_bad_actor_brings_their_earlier_photos(fresh_index):
+    fresh_index.logs = [{"log_id": 1, "group_id": -400, "user_id": 66, "user_pfp_hash": PHOTO}]
+    db.refresh_photo_index()
+    assert _found() == set()
+    fresh_index.bad_actors = [{"user_id": 66, "last_seen_at": T0}]
+    db.refresh_photo_index()
+    assert _found() == {("bad_actor", -400, 66)}
+
+
+def test_a_failed_refresh_keeps_its_work_for_the_next(fresh_index, monkeypatch):
+    db._invalidate_whitelist_cache(-100)
+
+    def broken(*a):
+        raise RuntimeError("connection reset")
+    monkeypatch.setattr(_Cursor, "execute", broken)
+    assert db.refresh_photo_index() == 0
+    assert db._photo_index_dirty_groups == {-100}
+    assert db._photo_index_marks["whitelist"] is None
+
+
+def test_lookup_against_a_scan_benchmark():
+    rng = random.Random(9)
+    entries = {PhotoRef("whitelist", i % 500, i): f"{rng.getrandbits(64):016x}"
+               for i in range(50_000)}
+    index = PhotoHashIndex(max_entries=len(entries))
+    for ref, hx in entries.items():
+        index.add(ref, hx)
+    probe = next(iter(entries.values()))
+    targets = [_near(rng, probe, 6), f"{rng.getrandbits(64):016x}"]     # photo + mirror
+
+    def per_call(fn, n):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        return (time.perf_counter() - start) / n * 1e3
+
+    scan = per_call(lambda: _scan(entries, targets, 10), 1)
+    lookup = min(per_call(lambda: index.within(targets, 10), 10) for _ in range(3))
+    print(f"\n50k indexed photos, radius 10: {scan:.1f} ms scan -> {lookup:.2f} ms index")
+    assert {(m.ref, m.distance) for m in index.within(targets, 10)} == _scan(entries, targets, 10)
+    assert lookup < scan
+
+
+def test_the_alert_line_summarises_the_matches():
+    from src.utils.checker import _photo_reuse_line
+    from src.utils.photo_index import PhotoMatch
+    matches = [PhotoMatch(PhotoRef("whitelist", -1, 1), PHOTO, 4),
+               PhotoMatch(PhotoRef("whitelist", -2, 2), PHOTO, 0),
+               PhotoMatch(PhotoRef("bad_actor", -1, 3), PHOTO, 2)]
+    line = _photo_reuse_line(matches)
+    assert "protected user in 2 other groups; 1 known bad actor" in line
+    assert "closest distance 0/64" in line
+    assert _photo_reuse_line([]) == ""
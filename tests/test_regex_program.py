@@ -0,0 +1,116 @@
+"""
+A group's regex keywords run as one combined program. It must report the same
+first pattern as running them one at a time, keep the patterns it cannot
+safely combine working, and stay inside the same time bounds. The last test
+benchmarks 100 patterns x 3 subjects against the old loop; run with -s to see
+the numbers.
+"""
+import time
+
+import pytest
+
+from src.utils import detector
+from src.utils.detector import (
+    REGEX_MATCH_BUDGET, KeywordMatcher, _subject_for_regex, check_reserved_keywords,
+)
+
+
+def _kw(*patterns, plain=()):
+    return [{"pattern": p, "is_regex": p not in plain} for p in patterns]
+
+
+def _one_at_a_time(raw_texts, keywords):
+    """The pre-program behaviour: each pattern on its own, in order."""
+    deadline = time.monotonic() + REGEX_MATCH_BUDGET
+    subjects = [s for s in (_subject_for_regex(t) for t in raw_texts) if s]
+    for kw in keywords:
+        if any(detector._regex_hits(kw["pattern"], s, deadline) for s in subjects):
+            return kw["pattern"]
+    return None
+
+
+def test_the_program_covers_the_keyword_set():
+    matcher = KeywordMatcher.build(_kw("official", r"ad+min", "ceo$"))
+    assert matcher.regex.combined == {0, 1, 2}
+    assert matcher.regex.program is not None
+
+
+def test_an_earlier_pattern_matching_further_right_still_wins():
+    """The program's leftmost match is the LATER pattern here."""
+    keywords = _kw("support", "official")
+    subject = "official support"
+    assert check_reserved_keywords(subject, None, None, keywords) == "support"
+    assert _one_at_a_time([subject], keywords) == "support"
+
+
+@pytest.mark.parametrize("subject", [
+    "Official Support", "the ceo", "ceo of things", "aaadmin", "nothing here",
+    "Оfficial", "team lead",
+])
+def test_program_agrees_with_the_loop(subject):
+    keywords = _kw(r"ceo$", r"ad+min", r"^team\b", "official", r"sup+ort")
+    assert (check_reserved_keywords(subject, "handle", None, keywords)
+            == _one_at_a_time([subject, "handle"], keywords))
+
+
+def test_uncombinable_patterns_run_on_their_own():
+    keywords = _kw(r"(.)\1\1", r"(?x) a d m i n", r"(?P<w>mod)", "support")
+    matcher = KeywordMatcher.build(keywords)
+    assert matcher.regex.combined == {3}
+    assert check_reserved_keywords("zzz", None, None, matcher) == r"(.)\1\1"
+    assert check_reserved_keywords("admin", None, None, matcher) == r"(?x) a d m i n"
+    assert check_reserved_keywords("moderator", None, None, matcher) == r"(?P<w>mod)"
+    assert check_reserved_keywords("support", None, None, matcher) == "support"
+
+
+def test_a_conditional_group_ref_runs_on_its_own():
+    # Wrapped in the program, (1) would name the wrapper group instead.
+    keywords = _kw(r"(a)?(?(1)b|c)x", "support")
+    matcher = KeywordMatcher.build(keywords)
+    assert matcher.regex.combined == {1}
+    for subject in ("abx", "cx"):
+        assert check_reserved_keywords(subject, None, None, matcher) == r"(a)?(?(1)b|c)x"
+        assert _one_at_a_time([subject], keywords) == r"(a)?(?(1)b|c)x"
+
+
+def test_a_plain_keyword_listed_first_still_wins():
+    keywords = _kw("admin", r"adm.n", plain={"admin"})
+    assert check_reserved_keywords("admin", None, None, keywords) == "admin"
+    keywords = _kw(r"adm.n", "admin", plain={"admin"})
+    assert check_reserved_keywords("admin", None, None, keywords) == r"adm.n"
+
+
+def test_a_catastrophic_pattern_does_not_hide_the_others():
+    """
+    The program times out as a whole; the fallback then runs each pattern on
+    its own, so the sane pattern after the bad one is still evaluated.
+    """
+    subject = "a" * 60 + "! support"
+    started = time.monotonic()
+    result = check_reserved_keywords(subject, None, None, _kw(r"(a|a)*$", "support"))
+    assert time.monotonic() - started < REGEX_MATCH_BUDGET + 1.0
+    assert result == "support"
+
+
+def test_program_against_the_loop_benchmark():
+    words = ["admin", "support", "official", "moderator", "ceo", "helpdesk",
+             "wallet", "airdrop", "giveaway", "verify"]
+    patterns = [rf"{w}[\s_-]*{n}\b" for n in range(10) for w in words]
+    keywords = _kw(*patterns)
+    subjects = ["Jane Doe", "jane_doe_88", "just here to talk about cats " * 4]
+    matcher = KeywordMatcher.build(keywords)
+    check_reserved_keywords(*subjects, matcher)     # warm the compile caches
+    _one_at_a_time(subjects, keywords)
+
+    def per_call(fn):
+        start = time.perf_counter()
+        for _ in range(20):
+            fn()
+        return (time.perf_counter() - start) / 20 * 1e3
+
+    loop = min(per_call(lambda: _one_at_a_time(subjects, keywords)) for _ in range(3))
+    program = min(per_call(lambda: check_reserved_keywords(*subjects, matcher))
+                  for _ in range(3))
+    print(f"\n100 regex keywords x 3 subjects: {loop:.2f} ms loop -> "
+          f"{program:.2f} ms combined program")
+    assert check_reserved_keywords(*subjects, matcher) is None
@@ -0,0 +1,140 @@
+"""
+resume_check must give the verdict a full re-run of check_user would give on
+the completed snapshot, while running only the stages a photo or bio can
+affect: no name or username scoring. The skip checks and the group's state are
+re-read first, and anything that moved since the first pass gets a full check.
+"""
+import asyncio
+import dataclasses
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from src import db
+from src.utils import checker
+from src.utils.checker import UserSnapshot, check_user, resume_check
+from src.utils.image import compute_pfp_hash_bytes
+
+
+def _avatar(seed=(200, 60, 60)) -> bytes:
+    img = Image.new("RGB", (64, 64), (30, 60, 120))
+    for x in range(64):
+        for y in range(64):
+            if (x // 7 + y // 5) % 2 == 0:
+                img.putpixel((x, y), seed)
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+AVATAR = _avatar()
+OTHER_AVATAR = _avatar(seed=(20, 220, 20))
+ADMIN = {"user_id": 42, "username": "zoltan", "first_name": "Zoltan",
+         "last_name": None, "pfp_hash": compute_pfp_hash_bytes(AVATAR)}
+
+
+@pytest.fixture
+def env(monkeypatch):
+    state = {"reads": 0, "group": {"title": "Crypto Hub", "pfp_hash": None},
+             "keywords": [{"pattern": "support", "is_regex": False}]}
+    for cache in (db._whitelist_index_cache, db._kw_matcher_cache, db._group_versions):
+        cache.clear()
+
+    def read(value):
+        def fn(*args):
+            state["reads"] += 1
+            return value(state) if callable(value) else value
+        return fn
+    monkeypatch.setattr(db, "get_group", read(lambda st: st["group"]))
+    monkeypatch.setattr(db, "get_whitelist", read([ADMIN]))
+    monkeypatch.setattr(db, "get_reserved_keywords", read(lambda st: st["keywords"]))
+    monkeypatch.setattr(db, "is_whitelisted", read(False))
+    monkeypatch.setattr(db, "is_false_positive", read(False))
+    monkeypatch.setattr(db, "get_known_bad_actor", read(None))
+    yield state
+    for cache in (db._whitelist_index_cache, db._kw_matcher_cache, db._group_versions):
+        cache.clear()
+
+
+def _full(snapshot):
+    checker._detection_cache.clear()
+    return asyncio.run(check_user(snapshot, -100))
+
+
+def _resumed(snapshot, **added):
+    first = asyncio.run(check_user(snapshot, -100))
+    return first, asyncio.run(resume_check(first, dataclasses.replace(snapshot, **added)))
+
+
+def _snap(**kw):
+    base = {"user_id": 7, "username": None, "first_name": "Zoltan", "last_name": None}
+    base.update(kw)
+    return UserSnapshot(**base)
+
+
+@pytest.mark.parametrize("added", [
+    {"pfp_bytes": AVATAR}, {"pfp_bytes": OTHER_AVATAR},
+    {"bio": "official support account"}, {"bio": "just a person"},
+    {"bio": "hi", "pfp_bytes": AVATAR},
+])
+def test_resumed_verdict_matches_a_full_check(env, added):
+    first, resumed = _resumed(_snap(), **added)
+    assert first.needs_pfp and not first.flagged
+    assert resumed == _full(_snap(**added))
+
+
+def test_group_logo_tiebreak_resumes_too(env):
+    env["group"] = {"title": "Hub", "pfp_hash": compute_pfp_hash_bytes(AVATAR)}
+    snap = _snap(first_name="Hub", username=None)
+    first, resumed = _resumed(snap, pfp_bytes=AVATAR)
+    assert first.needs_pfp
+    assert resumed.flagged and resumed.match_type == "group_pfp"
+    assert resumed == _full(dataclasses.replace(snap, pfp_bytes=AVATAR))
+
+
+def test_resume_skips_the_name_stages(env, monkeypatch):
+    first = asyncio.run(check_user(_snap(), -100))
+
+    def no_scoring(*a, **k):
+        raise AssertionError("name scoring re-ran on resume")
+    monkeypatch.setattr(checker, "check_name_similarity", no_scoring)
+    monkeypatch.setattr(checker, "check_username_similarity", no_scoring)
+    resumed = asyncio.run(resume_check(first, _snap(pfp_bytes=AVATAR, bio="hello")))
+    assert resumed.flagged and resumed.match_type == "pfp"
+
+
+@pytest.mark.parametrize("change", [
+    lambda env, mp: mp.setattr(db, "is_whitelisted", lambda gid, uid: True),
+    lambda env, mp: mp.setattr(db, "is_false_positive", lambda gid, uid: True),
+])
+def test_a_user_exempted_while_queued_is_not_flagged(env, monkeypatch, change):
+    first = asyncio.run(check_user(_snap(), -100))
+    change(env, monkeypatch)
+    resumed = asyncio.run(resume_check(first, _snap(pfp_bytes=AVATAR)))
+    assert not resumed.flagged and not resumed.screened and first.screened
+
+
+def test_state_that_moved_while_queued_gets_the_full_check(env, monkeypatch):
+    first = asyncio.run(check_user(_snap(), -100))
+    env["keywords"] = [{"pattern": "desk", "is_regex": False}]
+    resumed = asyncio.run(resume_check(first, _snap(bio="help desk")))
+    assert resumed.flagged and resumed.matched_val == "desk"
+    first = asyncio.run(check_user(_snap(), -100))
+    listed = {"user_id": 7, "reason": "scam", "source_group_id": -100}
+    monkeypatch.setattr(db, "get_known_bad_actor", lambda uid: listed)
+    resumed = asyncio.run(resume_check(first, _snap(bio="hi")))
+    assert resumed.match_type == "known_bad_actor"
+
+
+def test_a_changed_name_gets_the_full_check(env):
+    first = asyncio.run(check_user(_snap(), -100))
+    renamed = _snap(first_name="Somebody", last_name="Else", bio="support desk")
+    assert asyncio.run(resume_check(first, renamed)) == _full(renamed)
+
+
+def test_results_without_a_continuation_are_returned_as_is(env, monkeypatch):
+    monkeypatch.setattr(db, "is_whitelisted", lambda gid, uid: True)
+    first = asyncio.run(check_user(_snap(), -100))
+    assert first.continuation is None
+    assert asyncio.run(resume_check(first, _snap(bio="support"))) is first
@@ -35,6 +35,12 @@ class _FakeCursor:
     def execute(self, sql, params=None):
         self._log.append(" ".join(sql.split()))
 
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
     def __enter__(self):
         return self
 
@@ -72,6 +78,7 @@ PURGED_TABLES = [
     "false_positives",
     "seen_members",
     "admin_actions",
+    "photo_hashes",
 ]
 
 
@@ -16,6 +16,7 @@ import asyncio
 
 import pytest
 
+from src import db
 from src.utils import checker
 from src.utils.checker import DetectionResult, UserSnapshot, pfp_confidence
 
@@ -66,12 +67,12 @@ def _structured_avatar(seed=(200, 60, 60)) -> bytes:
 
 
 def _patch(monkeypatch, whitelist, group=None):
-    monkeypatch.setattr(checker, "is_whitelisted", lambda g, u: False)
-    monkeypatch.setattr(checker, "is_false_positive", lambda g, u: False)
-    monkeypatch.setattr(checker, "get_known_bad_actor", lambda u: None)
-    monkeypatch.setattr(checker, "get_reserved_keywords", lambda g: [])
-    monkeypatch.setattr(checker, "get_whitelist", lambda g: whitelist)
-    monkeypatch.setattr(checker, "get_group", lambda g: group)
+    monkeypatch.setattr(db, "is_whitelisted", lambda g, u: False)
+    monkeypatch.setattr(db, "is_false_positive", lambda g, u: False)
+    monkeypatch.setattr(db, "get_known_bad_actor", lambda u: None)
+    monkeypatch.setattr(db, "get_reserved_keywords", lambda g: [])
+    monkeypatch.setattr(db, "get_whitelist", lambda g: whitelist)
+    monkeypatch.setattr(db, "get_group", lambda g: group)
 
 
 def test_a_perfect_photo_match_scores_full_confidence(monkeypatch):
@@ -127,7 +128,7 @@ class _Recorder:
 
 
 def _run_ban_and_log(monkeypatch, result):
-    monkeypatch.setattr(checker, "get_group",
+    monkeypatch.setattr(db, "get_group",
                         lambda g: {"action_mode": "ban", "ban_score": 90,
                                    "alert_score": 78})
     logged = {}
@@ -0,0 +1,76 @@
+"""
+/stats and the daily summary read the daily rollups, so their cost doesn't grow
+with history: no unbounded COUNT over logs or sweep_runs, no groups × whitelist
+× logs join — only the part-day at the start of each window is counted raw.
+"""
+import re
+
+import pytest
+
+from src import db
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append((sql, params))
+        return self
+
+    def fetchone(self):
+        return {"detections": 0}
+
+    def fetchall(self):
+        return []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Conn:
+    def __init__(self):
+        self.statements = []
+
+    def cursor(self):
+        return _Cursor(self)
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = _Conn()
+    monkeypatch.setattr(db, "get_connection", lambda *a, **k: conn)
+    monkeypatch.setattr(db, "put_connection", lambda c: None)
+    return conn
+
+
+def _raw_scans(sql):
+    return re.findall(r"FROM (?:logs|sweep_runs) WHERE (.*?)\)\)::bigint", sql, re.S)
+
+
+@pytest.mark.parametrize("call", [
+    lambda: db.get_stats_windowed(-100),
+    lambda: db.get_all_group_stats_windowed(),
+    lambda: db.get_recent_activity(-100, hours=24),
+])
+def test_raw_rows_are_read_for_one_day_at_most(conn, call):
+    call()
+    (sql, _), = conn.statements
+    assert "daily_rollup" in sql and "COUNT(DISTINCT" not in sql and "JOIN" not in sql
+    scans = _raw_scans(sql)
+    assert scans and all("created_at < (date_trunc('day'" in where for where in scans)
+    assert sql.count("FROM logs") + sql.count("FROM sweep_runs") == len(scans)
+
+
+def test_all_time_comes_from_the_rollup_alone():
+    sql = db._rollup_count("logs", action="banned")
+    assert "FROM logs" not in sql and "action_taken = 'banned'" in sql
+
+
+def test_the_summary_window_is_bound_server_side(conn):
+    db.get_recent_activity(-100, hours=6)
+    sql, params = conn.statements[0]
+    assert params == {"gid": -100, "h": 6} and "%(h)s * INTERVAL '1 hour'" in sql
@@ -0,0 +1,207 @@
+"""
+A sweep reads the group's whitelist, false-positive and recently-seen sets once
+and primes the per-user caches a chunk at a time, so screening a clean member
+costs no database round trip of its own: doubling the members may add one
+blocklist query per extra chunk and nothing else.
+"""
+import asyncio
+
+import pytest
+from pyrogram import raw
+
+from src import db
+from src.utils.write_behind import WriteBehindQueue
+from src.watcher import sweep as sweep_mod
+
+GID = -100
+ADMIN = {"group_id": GID, "user_id": 42, "username": "zoltan", "first_name": "Zoltan",
+         "last_name": None, "pfp_hash": None, "whitelisted_by": 1}
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        conn = self.conn
+        if conn.down:
+            raise RuntimeError("connection reset")
+        conn.statements.append(sql)
+        if "FROM groups" in sql:
+            self.rows = [{"group_id": GID, "title": "Hub", "sweep_offset": 0}]
+        elif "FROM whitelisted_users" in sql:
+            self.rows = [ADMIN]
+        elif "FROM false_positives" in sql:
+            self.rows = [{"user_id": uid} for uid in conn.false_positives]
+            conn.during_read()
+        elif "FROM seen_members" in sql:
+            self.rows = [{"user_id": uid} for uid in conn.seen]
+        elif "FROM known_bad_actors" in sql:
+            self.rows = []
+        else:
+            self.rows = []
+        return self
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Pipeline:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Conn:
+    def __init__(self):
+        self.statements, self.checkouts = [], 0
+        self.false_positives, self.seen = set(), set()
+        self.down = False
+        self.during_read = lambda: None
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def execute(self, sql, params=()):
+        return _Cursor(self).execute(sql, params)
+
+    def pipeline(self):
+        return _Pipeline()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = _Conn()
+
+    def get_connection(*a, **k):
+        conn.checkouts += 1
+        return conn
+    monkeypatch.setattr(db, "get_connection", get_connection)
+    monkeypatch.setattr(db, "put_connection", lambda c: None)
+    monkeypatch.setattr(db, "WRITE_BEHIND_FLUSH_MS", 500)
+    monkeypatch.setattr(db, "_write_queue", WriteBehindQueue(batch_rows=10_000,
+                                                             max_pending=10_000))
+    return conn
+
+
+def test_the_sets_come_back_in_one_round_trip(conn):
+    conn.false_positives, conn.seen = {7}, {8}
+    db.mark_seen(GID, 9)
+    state = db.load_sweep_member_state(GID)
+    assert state == db.SweepMemberState(whitelisted={42}, false_positive={7}, seen={8, 9})
+    assert conn.checkouts == 1 and len(conn.statements) == 3
+    assert db.get_whitelist(GID) == [ADMIN] and conn.checkouts == 1
+
+
+def test_no_sweep_runs_without_the_whitelist(conn):
+    conn.down = True
+    with pytest.raises(db.DatabaseUnavailable):
+        db.load_sweep_member_state(GID)
+
+
+def test_a_primed_chunk_needs_no_reads(conn):
+    conn.false_positives = {2}
+    db.prime_sweep_chunk(GID, [1, 2, 3])
+    conn.checkouts = 0
+    assert [db.is_false_positive(GID, u) for u in (1, 2, 3)] == [False, True, False]
+    assert db.get_known_bad_actor(3) is None and conn.checkouts == 0
+
+
+def test_priming_never_overwrites_a_mid_read_invalidation(conn):
+    # "Ignore (30d)" and a /ban commit while the chunk's read is in flight:
+    # the answers read before them must not be cached over their evictions.
+    def invalidate():
+        db._invalidate_fp_cache(GID, 2)
+        db._invalidate_bad_actor_cache(3)
+    conn.during_read = invalidate
+    db.prime_sweep_chunk(GID, [1, 2, 3])
+    assert (GID, 2) not in db._fp_cache and 3 not in db._bad_actor_cache
+    conn.during_read = lambda: None
+    conn.false_positives = {2}
+    assert db.is_false_positive(GID, 2)
+
+
+def test_the_sweeps_whitelist_read_is_not_cached_over_a_write(conn):
+    conn.during_read = lambda: db._invalidate_whitelist_cache(GID)
+    db.load_sweep_member_state(GID)
+    assert GID not in db._whitelist_cache
+
+
+class _User:
+    def __init__(self, uid):
+        self.id = uid
+        self.is_bot = self.is_deleted = False
+        self.username, self.first_name, self.last_name = f"member{uid}", "Member", f"No{uid}"
+
+
+class _Member:
+    def __init__(self, uid):
+        self.user = _User(uid)
+        self.status = "member"
+
+
+class _Pyro:
+    def __init__(self, count):
+        self.count = count
+
+    async def get_chat(self, chat_id):
+        return object()
+
+    async def resolve_peer(self, chat_id):
+        return raw.types.InputPeerChat(chat_id=abs(chat_id))
+
+    async def get_chat_members(self, chat_id):
+        for i in range(self.count):
+            yield _Member(1000 + i)
+
+
+class _Bot:
+    id = 999
+
+
+def _sweep(monkeypatch, conn, count):
+    async def inline(fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+    monkeypatch.setattr(sweep_mod, "run_db", inline)
+    monkeypatch.setattr("src.utils.checker.run_db", inline)
+    monkeypatch.setattr(sweep_mod, "refresh_whitelist_pfps", lambda *a, **k: asyncio.sleep(0))
+    for cache in (db._group_cache, db._whitelist_cache, db._kw_cache,
+                  db._fp_cache, db._bad_actor_cache):
+        cache.clear()
+    conn.checkouts = 0
+    # Full runs: the second would otherwise skip the members the first screened.
+    result = asyncio.run(sweep_mod.sweep_group(_Pyro(count), _Bot(), GID, delta=False))
+    assert result["checked"] == count and result["flagged"] == 0
+    return conn.checkouts
+
+
+def test_clean_members_cost_no_round_trips(conn, monkeypatch):
+    small = _sweep(monkeypatch, conn, 250)      # 3 chunks
+    large = _sweep(monkeypatch, conn, 500)      # 5 chunks
+    assert large - small == 2                   # one blocklist query per extra chunk
+    assert db.write_behind_info()["queued"] >= 500
+
+
+def test_recent_marks_are_not_rewritten(conn, monkeypatch):
+    conn.seen = {1000 + i for i in range(100)}
+    _sweep(monkeypatch, conn, 150)
+    queued = {uid for _, uid in db._write_queue.pending("seen")}
+    assert queued == {1000 + i for i in range(100, 150)}
@@ -0,0 +1,117 @@
+"""
+A sweep runs as a pipeline: enumeration, name scoring, and the photo and bio
+fetches are separate stages joined by bounded queues. Enumeration carries on
+while the pacers sleep, and photos are fetched while bios are, so a run takes
+about as long as its slowest stage rather than the sum of them. Members finish
+out of order, so the resume point only passes members that have finished.
+"""
+import asyncio
+import time
+
+import pytest
+
+from src.db import SweepMemberState
+from src.utils.checker import DetectionResult
+from src.utils.image import PhotoFingerprint
+from src.watcher import fetch as fetch_mod
+from src.watcher import sweep as sweep_mod
+
+GID = -1001
+DELAY = 0.02
+
+
+class _Bot:
+    id = 999
+
+
+@pytest.fixture
+def env(monkeypatch):
+    state = {"offsets": [], "pfps": [], "bios": [], "in_flight": 0, "overlap": 0,
+             "needs_pfp": set(), "slow": {}}
+
+    async def inline(fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+    monkeypatch.setattr(sweep_mod, "run_db", inline)
+    monkeypatch.setattr(sweep_mod, "_screened_pages", {})
+    monkeypatch.setattr(sweep_mod, "get_reserved_keywords",
+                        lambda gid: [{"pattern": "support", "is_regex": False}])
+    monkeypatch.setattr(sweep_mod, "load_sweep_member_state",
+                        lambda gid: SweepMemberState(set(), set(), set()))
+    monkeypatch.setattr(sweep_mod, "detection_versions", lambda gid: (1, 1, 1))
+    monkeypatch.setattr(sweep_mod, "detection_digest", lambda gid: 1)
+    monkeypatch.setattr(sweep_mod, "set_member_fingerprint", lambda gid, uid, fp: None)
+    monkeypatch.setattr(sweep_mod, "prime_sweep_chunk", lambda gid, uids: None)
+    monkeypatch.setattr(sweep_mod, "prescore_snapshots", lambda snaps, gid: None)
+    monkeypatch.setattr(sweep_mod, "mark_seen", lambda gid, uid: None)
+    monkeypatch.setattr(sweep_mod, "record_sweep_run", lambda *a, **k: None)
+    monkeypatch.setattr(sweep_mod, "record_sweep_coverage", lambda gid, count, complete: True)
+    monkeypatch.setattr(sweep_mod, "get_group_sweep_offset", lambda gid: 0)
+    monkeypatch.setattr(sweep_mod, "set_group_sweep_offset",
+                        lambda gid, offset: state["offsets"].append(offset))
+    monkeypatch.setattr(sweep_mod, "refresh_whitelist_pfps", lambda *a, **k: asyncio.sleep(0))
+    monkeypatch.setattr(fetch_mod, "pfp_cooldown_remaining", lambda: 0.0)
+    monkeypatch.setattr(fetch_mod, "bio_cooldown_remaining", lambda: 0.0)
+
+    async def check(snapshot, group_id):
+        await asyncio.sleep(state["slow"].get(snapshot.user_id, 0))
+        return DetectionResult(flagged=False, needs_pfp=snapshot.user_id in state["needs_pfp"])
+    monkeypatch.setattr(sweep_mod, "check_user", check)
+
+    async def recheck(result, snapshot, group_id):
+        return DetectionResult(flagged=False)
+    monkeypatch.setattr(sweep_mod, "_recheck", recheck)
+
+    def fetcher(kind, result):
+        async def fetch(pyro, uid, wait=False, unique_id=None):
+            state[kind].append(uid)
+            state["in_flight"] += 1
+            state["overlap"] = max(state["overlap"], state["in_flight"])
+            await asyncio.sleep(state["slow"].get(("fetch", uid), DELAY))
+            state["in_flight"] -= 1
+            return result
+        return fetch
+    monkeypatch.setattr(sweep_mod, "_fetch_pfp",
+                        fetcher("pfps", PhotoFingerprint(None, "f0" * 8, unique_id="AgAD")))
+    monkeypatch.setattr(fetch_mod, "fetch_bio", fetcher("bios", "an ordinary bio"))
+    return state
+
+
+def _sweep(client):
+    started = time.monotonic()
+    result = asyncio.run(sweep_mod.sweep_group(client, _Bot(), GID))
+    return result, time.monotonic() - started
+
+
+def test_fetches_run_alongside_each_other(env, stand_in):
+    env["needs_pfp"] = {1000 + i for i in range(20)}
+    result, elapsed = _sweep(stand_in(20, GID, usernames=False))
+    assert result["checked"] == 20 and not result["partial"]
+    assert sorted(env["pfps"]) == sorted(env["bios"]) == sorted(env["needs_pfp"])
+    # One after another this is 40 fetches of DELAY each.
+    assert env["overlap"] > 1 and elapsed < 20 * DELAY
+
+
+def test_only_members_that_need_a_fetch_get_one(env, monkeypatch, stand_in):
+    monkeypatch.setattr(sweep_mod, "get_reserved_keywords", lambda gid: [])
+    env["needs_pfp"] = {1003}
+    result, _ = _sweep(stand_in(10, GID, usernames=False))
+    assert env["pfps"] == [1003] and env["bios"] == [] and result["checked"] == 10
+
+
+def test_the_resume_point_waits_for_unfinished_members(env, monkeypatch, stand_in):
+    monkeypatch.setattr(sweep_mod, "SWEEP_HARD_CAP_SECONDS", 0.1)
+    env["needs_pfp"] = {1000}
+    env["slow"] = {("fetch", 1000): 5.0, 1005: 0.2}
+    result, elapsed = _sweep(stand_in(10, GID, usernames=False))
+    # 1001-1005 were screened, but 1000's photo never arrived.
+    assert result["partial"] and env["offsets"][-1] == 0 and elapsed < 2
+
+
+def test_enumeration_is_held_back_by_full_queues(env, monkeypatch, stand_in):
+    monkeypatch.setattr(sweep_mod, "SWEEP_HARD_CAP_SECONDS", 0.3)
+    env["slow"] = {("fetch", 1000 + i): 60 for i in range(2000)}
+    client = stand_in(2000, GID, usernames=False)
+    result = asyncio.run(sweep_mod.sweep_group(client, _Bot(), GID))
+    assert result["partial"] and env["offsets"][-1] == 0
+    # A bio queue and two chunks queued, plus what the stages hold, and no more.
+    assert len(client.requests) * 200 < 2000
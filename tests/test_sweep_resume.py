@@ -16,7 +16,9 @@ mid-iteration must mark the run partial rather than recording a clean sweep.
 import asyncio
 
 import pytest
+from pyrogram import raw
 
+from src.db import SweepMemberState
 from src.utils.checker import DetectionResult
 from src.watcher import sweep as sweep_mod
 
@@ -46,6 +48,9 @@ class _FakePyro:
     async def get_chat(self, chat_id):
         return object()
 
+    async def resolve_peer(self, chat_id):
+        return raw.types.InputPeerChat(chat_id=abs(chat_id))   # a basic group
+
     async def get_chat_members(self, chat_id):
         for i in range(self.member_count):
             if self.explode_at is not None and i == self.explode_at:
@@ -68,10 +73,17 @@ def sweep_env(monkeypatch):
 
     monkeypatch.setattr(sweep_mod, "run_db", fake_run_db)
     monkeypatch.setattr(sweep_mod, "get_reserved_keywords", lambda gid: [])
-    monkeypatch.setattr(sweep_mod, "is_whitelisted", lambda gid, uid: False)
+    monkeypatch.setattr(sweep_mod, "load_sweep_member_state",
+                        lambda gid: SweepMemberState(set(), set(), set()))
+    monkeypatch.setattr(sweep_mod, "prime_sweep_chunk", lambda gid, uids: None)
     monkeypatch.setattr(sweep_mod, "mark_seen",
                         lambda gid, uid: state["seen"].append(uid))
     monkeypatch.setattr(sweep_mod, "get_whitelist", lambda gid: [])
+    monkeypatch.setattr(sweep_mod, "prescore_snapshots", lambda snaps, gid: None)
+    monkeypatch.setattr(sweep_mod, "detection_versions", lambda gid: (1, 1, 1))
+    monkeypatch.setattr(sweep_mod, "detection_digest", lambda gid: 1)
+    monkeypatch.setattr(sweep_mod, "set_member_fingerprint", lambda gid, uid, fp: None)
+    monkeypatch.setattr(sweep_mod, "record_sweep_coverage", lambda gid, count, complete: True)
     monkeypatch.setattr(sweep_mod, "upsert_whitelisted_user", lambda **kw: True)
     monkeypatch.setattr(
         sweep_mod, "record_sweep_run",
@@ -88,7 +100,7 @@ def sweep_env(monkeypatch):
         return DetectionResult(flagged=False)
     monkeypatch.setattr(sweep_mod, "check_user", clean)
 
-    async def no_pfp(pyro, uid, wait=False):
+    async def no_pfp(pyro, uid, wait=False, unique_id=None):
         return None
     monkeypatch.setattr(sweep_mod, "_fetch_pfp", no_pfp)
 
@@ -211,7 +223,7 @@ def test_a_photo_skipped_member_is_counted_and_not_recorded(sweep_env, monkeypat
         return DetectionResult(flagged=False, needs_pfp=True)
     monkeypatch.setattr(sweep_mod, "check_user", needs_photo)
 
-    async def flooded_pfp(pyro, uid, wait=False):
+    async def flooded_pfp(pyro, uid, wait=False, unique_id=None):
         return None
     monkeypatch.setattr(sweep_mod, "_fetch_pfp", flooded_pfp)
     monkeypatch.setattr(fetch_mod, "pfp_cooldown_remaining", lambda: 30.0,
@@ -234,7 +246,7 @@ def test_a_member_with_genuinely_no_photo_is_still_screened(sweep_env, monkeypat
         return DetectionResult(flagged=False, needs_pfp=True)
     monkeypatch.setattr(sweep_mod, "check_user", needs_photo)
 
-    async def no_photo(pyro, uid, wait=False):
+    async def no_photo(pyro, uid, wait=False, unique_id=None):
         return None
     monkeypatch.setattr(sweep_mod, "_fetch_pfp", no_photo)
     monkeypatch.setattr(fetch_mod, "pfp_cooldown_remaining", lambda: 0.0,
@@ -0,0 +1,142 @@
+"""
+The periodic sweep runs several groups at once, stalest first, in fair-share
+turns: a group not finished in its slice waits behind every group that has had
+fewer turns, then resumes. All of them share the account's pacers, member pages
+included, and a flood reported anywhere backs every pacer off.
+"""
+import asyncio
+import time
+
+import pytest
+
+from src.watcher import fetch as fetch_mod
+from src.watcher import scheduler
+from src.watcher.scheduler import sweep_priority
+
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def cycle(monkeypatch):
+    state = {"turns": [], "running": 0, "peak": 0, "capped": {}, "summaries": {},
+             "schedule": [], "runs": [], "fail": {}}
+
+    async def inline(fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+    monkeypatch.setattr(scheduler, "run_db", inline)
+    monkeypatch.setattr(scheduler, "get_sweep_schedule", lambda ids: state["schedule"])
+    monkeypatch.setattr(scheduler, "record_sweep_run",
+                        lambda gid, *counts, **caveats: state["runs"].append((gid, counts, caveats)))
+
+    async def sweep(pyro, bot, gid, log_channel_id=None, trigger="manual", time_budget=None,
+                    record_run=True):
+        assert not record_run
+        state["turns"].append((gid, time_budget))
+        if state["fail"].get(gid) == [g for g, _ in state["turns"]].count(gid):
+            raise RuntimeError("slice failed")
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.01)
+        state["running"] -= 1
+        capped = state["capped"].get(gid, 0) > 0
+        state["capped"][gid] = state["capped"].get(gid, 0) - 1
+        return {"iterated": 10, "checked": 10, "flagged": 0, "errors": 0,
+                "partial": capped, "capped": capped}
+    monkeypatch.setattr(scheduler, "sweep_group", sweep)
+
+    async def summary(bot, gid, result, channel):
+        state["summaries"][gid] = result
+    monkeypatch.setattr(scheduler, "_post_sweep_summary", summary)
+    return state
+
+
+def _run(group_ids):
+    return asyncio.run(scheduler.run_sweep_cycle(object(), object(), group_ids))
+
+
+def test_stale_targeted_and_large_groups_come_first():
+    assert sweep_priority(None, 0, 10) > sweep_priority(3 * DAY, 0, 10) > sweep_priority(DAY, 0, 10)
+    assert sweep_priority(DAY, 5, 10) > sweep_priority(DAY, 0, 10)
+    assert sweep_priority(DAY, 0, 100_000) > sweep_priority(DAY, 0, 10)
+    # Size breaks ties; it never outweighs a day's staleness.
+    assert sweep_priority(2 * DAY, 0, 10) > sweep_priority(DAY, 0, 10_000_000)
+
+
+def test_groups_run_concurrently_in_priority_order(cycle, monkeypatch):
+    monkeypatch.setattr(scheduler, "SWEEP_CONCURRENCY", 2)
+    cycle["schedule"] = [
+        {"group_id": 1, "member_count": 50, "coverage_age": 600, "detections_7d": 0},
+        {"group_id": 2, "member_count": 50, "coverage_age": 3 * DAY, "detections_7d": 0},
+        {"group_id": 3, "member_count": 50, "coverage_age": None, "detections_7d": 0},
+    ]
+    _run([1, 2, 3, 4])
+    assert cycle["peak"] == 2
+    # 4 has no schedule row yet (never swept), so it ranks with 3.
+    assert [gid for gid, _ in cycle["turns"]][:2] == [3, 4]
+    assert [gid for gid, _ in cycle["turns"]][-1] == 1
+
+
+def test_a_large_group_is_swept_in_slices_between_the_rest(cycle, monkeypatch):
+    monkeypatch.setattr(scheduler, "SWEEP_CONCURRENCY", 1)
+    monkeypatch.setattr(scheduler, "SWEEP_SLICE_SECONDS", 900)
+    cycle["schedule"] = [
+        {"group_id": 1, "member_count": 100_000, "coverage_age": 2 * DAY, "detections_7d": 0},
+        {"group_id": 2, "member_count": 50, "coverage_age": 1.5 * DAY, "detections_7d": 0},
+        {"group_id": 3, "member_count": 50, "coverage_age": 1.5 * DAY, "detections_7d": 0},
+    ]
+    cycle["capped"] = {1: 2}
+    results = _run([1, 2, 3])
+    assert [gid for gid, _ in cycle["turns"]] == [1, 2, 3, 1, 1]
+    assert all(budget == 900 for _, budget in cycle["turns"])
+    # One summary per group, with its turns added up.
+    assert cycle["summaries"][1] == results[1]
+    assert results[1]["turns"] == 3 and results[1]["checked"] == 30
+    assert not results[1]["partial"]
+    # And one recorded run, not one per turn.
+    assert sorted(gid for gid, _, _ in cycle["runs"]) == [1, 2, 3]
+    assert (1, (30, 30, 0, 0, "auto"),
+            {"partial": False, "bios_skipped": 0, "pfps_skipped": 0}) in cycle["runs"]
+
+
+def test_no_group_outlasts_its_hard_cap(cycle, monkeypatch):
+    monkeypatch.setattr(scheduler, "SWEEP_HARD_CAP_SECONDS", 0.005)
+    cycle["capped"] = {1: 5}
+    results = _run([1])
+    assert results[1]["turns"] == 1 and results[1]["partial"]
+    assert cycle["runs"][0][2]["partial"]
+
+
+
+def test_a_failed_slice_still_records_the_ones_before_it(cycle):
+    cycle["capped"] = {1: 5}
+    cycle["fail"] = {1: 3, 2: 1}
+    results = _run([1, 2])
+    # 1 failed on its third slice: its first two are recorded, as partial.
+    assert results[1]["turns"] == 2 and results[1]["partial"]
+    assert cycle["runs"] == [(1, (20, 20, 0, 0, "auto"),
+                              {"partial": True, "bios_skipped": 0, "pfps_skipped": 0})]
+    assert cycle["summaries"][1] == results[1]
+    # 2 failed before screening anyone, so there is nothing to record.
+    assert 2 not in results and 2 not in cycle["summaries"]
+
+
+def test_a_failed_record_still_posts_the_summary(cycle, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("database down")
+    monkeypatch.setattr(scheduler, "record_sweep_run", broken)
+    results = _run([1, 2])
+    assert cycle["summaries"] == results and set(results) == {1, 2}
+
+def test_member_pages_share_a_pacer_that_floods_back_off(monkeypatch):
+    pacer = fetch_mod._Pacer("members", 0.05)
+    monkeypatch.setattr(fetch_mod, "_members_pacer", pacer)
+    monkeypatch.setattr(fetch_mod, "_bio_pacer", fetch_mod._Pacer("bio", 0))
+    monkeypatch.setattr(fetch_mod, "_pfp_pacer", fetch_mod._Pacer("pfp", 0))
+
+    async def three_pages():
+        started = time.monotonic()
+        await asyncio.gather(*(fetch_mod.pace_member_page() for _ in range(3)))
+        return time.monotonic() - started
+    assert asyncio.run(three_pages()) >= 0.09
+    fetch_mod.report_flood(5)
+    assert pacer.cooldown_remaining() > 0
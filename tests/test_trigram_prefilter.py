@@ -0,0 +1,147 @@
+"""
+A whitelist of WHITELIST_PREFILTER_MIN entries or more is narrowed in Postgres
+(pg_trgm) to the entries whose folded name or handle resembles the suspect's,
+and only that shortlist is scored. Without the extension, on any error, or for
+a name trigrams can't judge, every entry is scored as before.
+"""
+import asyncio
+
+import pytest
+
+from src import db
+from src.utils import checker
+from src.utils.checker import UserSnapshot, check_user
+
+GID = -100
+
+
+def _entry(uid, first, last=None, username=None):
+    return {"user_id": uid, "username": username, "first_name": first,
+            "last_name": last, "pfp_hash": None}
+
+
+WHITELIST = [_entry(42, "Admin", "Boss", "adminboss")] + [
+    _entry(1000 + i, f"Member{i}", "Person") for i in range(30)
+]
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append((" ".join(sql.split()), params))
+        if self.conn.fail and "FROM whitelisted_users" in sql:
+            raise RuntimeError("boom")
+        return self
+
+    def fetchall(self):
+        return [{"user_id": uid} for uid in self.conn.shortlist]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Conn:
+    def __init__(self):
+        self.statements = []
+        self.shortlist = [42]
+        self.fail = False
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def transaction(self):
+        return _Cursor(self)
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = _Conn()
+    monkeypatch.setattr(db, "get_connection", lambda *a, **k: conn)
+    monkeypatch.setattr(db, "put_connection", lambda c: None)
+    monkeypatch.setitem(db._prefilter, "available", True)
+    monkeypatch.setattr(db, "WHITELIST_PREFILTER_MIN", 10)
+    return conn
+
+
+@pytest.fixture
+def env(conn, monkeypatch):
+    db._whitelist_index_cache.clear()
+    monkeypatch.setattr(db, "get_group", lambda gid: {"title": "Test Group"})
+    monkeypatch.setattr(db, "get_whitelist", lambda gid: WHITELIST)
+    monkeypatch.setattr(db, "get_reserved_keywords", lambda gid: [])
+    monkeypatch.setattr(db, "is_whitelisted", lambda gid, uid: False)
+    monkeypatch.setattr(db, "is_false_positive", lambda gid, uid: False)
+    monkeypatch.setattr(db, "get_known_bad_actor", lambda uid: None)
+    scored = []
+    real = checker.check_name_similarity
+    monkeypatch.setattr(checker, "check_name_similarity",
+                        lambda target, stored, threshold: (scored.append(len(stored)),
+                                                           real(target, stored, threshold))[1])
+    yield scored
+    db._whitelist_index_cache.clear()
+
+
+def _check(first, last=None, username=None):
+    return asyncio.run(check_user(
+        UserSnapshot(user_id=7, username=username, first_name=first, last_name=last), GID))
+
+
+def test_skeletons_are_what_the_name_stages_compare():
+    assert db._whitelist_skeletons("J0hn_Smith", "Jöhn", "SM1TH") == ("john smith", "johnsmith")
+    # Too little Latin text for trigrams to judge: stored as '', always kept.
+    assert db._whitelist_skeletons(None, "🔥🔥", None) == ("", "")
+    assert db._whitelist_skeletons(None, "李小龙 Li", None)[0] == ""
+
+
+def test_a_long_whitelist_scores_only_the_shortlist(env, conn):
+    result = _check("Admin", "B0ss")
+    assert result.flagged and result.target_user_id == 42
+    assert env == [1]                                    # 1 of 31 entries scored
+    sql, params = conn.statements[-1]
+    assert "name_skeleton % %(name)s" in sql.replace("%%", "%")
+    assert params == {"gid": GID, "name": "admin boss", "handle": ""}
+    # The thresholds are set in the same transaction as the query.
+    assert "pg_trgm.similarity_threshold" in conn.statements[0][0]
+
+
+def test_a_stored_name_inside_the_suspects_is_shortlisted(env, conn, monkeypatch):
+    # word_similarity both ways: the suspect's name inside a stored one (`%>`)
+    # and a stored name inside the suspect's (`<%`), which scores as high.
+    monkeypatch.setattr(db, "get_whitelist",
+                        lambda gid: WHITELIST + [_entry(43, "Bob", "Smith")])
+    conn.shortlist = [43]
+    result = _check("Bob Smith", "Support Team")
+    assert result.flagged and result.target_user_id == 43
+    sql = conn.statements[-1][0].replace("%%", "%")
+    assert "name_skeleton %> %(name)s" in sql and "name_skeleton <% %(name)s" in sql
+
+
+@pytest.mark.parametrize("setup", [
+    lambda conn, mp: mp.setitem(db._prefilter, "available", False),
+    lambda conn, mp: mp.setattr(db, "WHITELIST_PREFILTER_MIN", 0),
+    lambda conn, mp: mp.setattr(db, "WHITELIST_PREFILTER_MIN", 1000),
+    lambda conn, mp: setattr(conn, "fail", True),
+])
+def test_otherwise_every_entry_is_scored(env, conn, monkeypatch, setup):
+    setup(conn, monkeypatch)
+    assert _check("Admin", "B0ss").flagged
+    assert env == [len(WHITELIST)]
+
+
+def test_a_name_trigrams_cannot_judge_is_never_prefiltered(conn):
+    assert db.whitelist_candidates(GID, WHITELIST, "🔥🔥🔥", None) is None
+    assert conn.statements == []
+
+
+def test_log_search_falls_back_to_an_escaped_substring_match(conn, monkeypatch):
+    db.search_logs(GID, "@john_smith")
+    assert "l.full_name % %(q)s" in conn.statements[-1][0].replace("%%", "%")
+    monkeypatch.setitem(db._prefilter, "available", False)
+    db.search_logs(GID, "@50%_off")
+    sql, params = conn.statements[-1]
+    assert "ILIKE" in sql and params["like"] == r"%50\%\_off%"
@@ -0,0 +1,169 @@
+"""
+The db read caches are bounded, single-flight TTL caches: a per-user namespace
+stays under its entry cap however many users pass through, concurrent misses
+for one key cost one query, and a failed read may fall back on an expired entry
+only inside its namespace's stale-if-error window — except for the whitelist and
+group config, which keep serving protection stale rather than none. They still
+behave like the (timestamp, value) dicts they replaced.
+"""
+import threading
+import time
+
+import pytest
+
+from src import db
+from src.utils.ttl_cache import TTLCache
+
+
+def test_it_still_looks_like_the_old_dict():
+    cache = TTLCache("t", 60, stale_ttl=None, max_entries=10)
+    cache[1] = (0.0, "old")
+    assert cache.get(1) == (0.0, "old") and 1 in cache and len(cache) == 1
+    assert cache.pop(1) == (0.0, "old") and cache.pop(1, None) is None
+    cache[2] = (time.time(), "x")
+    cache.clear()
+    assert len(cache) == 0 and cache.info()["entries"] == 0
+
+
+def test_least_recently_used_goes_first():
+    cache = TTLCache("t", 60, stale_ttl=None, max_entries=2)
+    now = time.time()
+    cache["a"], cache["b"] = (now, 1), (now, 2)
+    cache.fresh("a")
+    cache["c"] = (now, 3)
+    assert set(cache) == {"a", "c"} and cache.info()["evictions"] == 1
+
+
+def test_weight_bounds_rows_held():
+    cache = TTLCache("t", 60, stale_ttl=None, max_entries=100, max_weight=10, weigh=len)
+    now = time.time()
+    for key in range(4):
+        cache[key] = (now, [0] * 4)
+    assert list(cache) == [2, 3] and cache.info()["weight"] == 8
+
+
+def test_stale_only_inside_the_window():
+    cache = TTLCache("t", 60, stale_ttl=600, max_entries=10)
+    cache["recent"] = (time.time() - 120, 1)
+    cache["ancient"] = (time.time() - 3600, 2)
+    assert cache.fresh("recent") is None
+    assert cache.stale("recent")[1] == 1
+    assert cache.stale("ancient") is None and "ancient" not in cache
+    unlimited = TTLCache("t", 60, stale_ttl=None, max_entries=10)
+    unlimited["ancient"] = (0.0, 2)
+    assert unlimited.stale("ancient")[1] == 2
+
+
+def test_concurrent_misses_load_once():
+    cache = TTLCache("t", 60, stale_ttl=None, max_entries=10)
+    calls = []
+    gate = threading.Event()
+
+    def loader():
+        calls.append(1)
+        gate.wait(1)
+        return "rows"
+    threads = [threading.Thread(target=lambda: cache.load("k", loader)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+    info = cache.info()
+    assert len(calls) == 1 and info["loads"] == 1 and info["coalesced"] == 7
+
+
+def test_a_failed_load_leaves_the_next_caller_to_try():
+    cache = TTLCache("t", 60, stale_ttl=None, max_entries=10)
+
+    def broken():
+        raise RuntimeError("down")
+    with pytest.raises(RuntimeError):
+        cache.load("k", broken)
+    assert cache.load("k", lambda: "ok") == "ok"
+    assert not cache._flights
+
+
+def test_a_read_is_not_stored_over_an_invalidation():
+    cache = TTLCache("t", 60, stale_ttl=None, max_entries=10)
+
+    def loader():
+        cache.pop("k", None)                    # the writer commits mid-read
+        return "stale"
+    assert cache.load("k", loader) == "stale" and "k" not in cache
+    generation = cache.generation
+    assert cache.store("k", (time.time(), "fresh"), generation) and "k" in cache
+
+
+# ── db.py namespaces ─────────────────────────────────────────────────────────
+
+class _Conn:
+    def __init__(self):
+        self.queries = 0
+        self.down = False
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=()):
+        if self.down:
+            raise RuntimeError("server closed the connection unexpectedly")
+        self.queries += 1
+        time.sleep(0.01)
+        self.rows = [{"user_id": 42}] if "whitelisted_users" in sql else []
+        return self
+
+    def fetchall(self):
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = _Conn()
+    monkeypatch.setattr(db, "get_connection", lambda *a, **k: conn)
+    monkeypatch.setattr(db, "put_connection", lambda c: None)
+    return conn
+
+
+def test_a_join_burst_reads_the_whitelist_once(conn):
+    threads = [threading.Thread(target=db.get_whitelist, args=(-100,)) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert conn.queries == 1 and db.cache_info()["whitelist"]["coalesced"] == 9
+
+
+def test_per_user_caches_stay_bounded(conn, monkeypatch):
+    monkeypatch.setattr(db._bad_actor_cache, "max_entries", 100)
+    for uid in range(250):
+        db.get_known_bad_actor(uid)
+    assert len(db._bad_actor_cache) == 100
+    assert db.cache_info()["bad_actor"]["evictions"] == 150
+
+
+def test_a_failed_read_serves_a_recent_false_positive(conn):
+    db._fp_cache[(-100, 7)] = (time.time() - db._FP_CACHE_TTL - 60, True)
+    db._fp_cache[(-100, 8)] = (time.time() - db._FP_CACHE_TTL - db._STALE_IF_ERROR, True)
+    conn.down = True
+    assert db.is_false_positive(-100, 7) is True
+    assert db.is_false_positive(-100, 8) is False
+    assert db.cache_info()["false_positive"]["stale"] == 1
+
+
+def test_a_batch_skips_what_another_thread_is_loading(conn):
+    assert db._whitelist_cache.claim(-100)
+    try:
+        wanted = db._claim_detection_reads(db._detection_reads_wanted(-100, 7, True, time.time()))
+        assert db._whitelist_cache not in [read[2] for read in wanted]
+        db._release_detection_reads(wanted)
+    finally:
+        db._whitelist_cache.release(-100)
+    assert not db._whitelist_cache._flights
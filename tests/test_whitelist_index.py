@@ -0,0 +1,111 @@
+"""
+The precompiled whitelist index must be a pure cache: same verdicts as the raw
+list path, built once per whitelist, and dropped whenever the whitelist is.
+"""
+import pytest
+
+from src import db
+from src.utils import detector
+from src.utils.detector import (
+    NameCandidates, UsernameCandidates,
+    check_name_similarity, check_username_similarity,
+)
+from src.utils.image import StoredHashes, check_pfp_similarity
+from src.utils.whitelist_index import WhitelistIndex
+
+
+ROWS = [
+    {"user_id": 1, "username": "JohnSmith", "first_name": "John",
+     "last_name": "Smith", "pfp_hash": "c3c3c3c33c3c3c3c"},
+    {"user_id": 2, "username": None, "first_name": "Ｍａｒｙ",
+     "last_name": None, "pfp_hash": "not-hex"},
+    {"user_id": 3, "username": "crypto_boss", "first_name": "Crypto",
+     "last_name": "Boss", "pfp_hash": None},
+]
+
+SUSPECTS = [
+    "John Smith", "J0hn 5m1th", "JOHN SMITH | Support", "Mary",
+    "Cryptο Bοss", "Zebra Quux", "John", "",
+]
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    db._whitelist_cache.clear()
+    db._whitelist_index_cache.clear()
+    yield
+    db._whitelist_cache.clear()
+    db._whitelist_index_cache.clear()
+
+
+@pytest.mark.parametrize("suspect", SUSPECTS)
+def test_name_candidates_give_the_list_verdict(suspect):
+    names = [f"{r['first_name']} {r['last_name'] or ''}".strip() for r in ROWS]
+    assert (check_name_similarity(suspect, NameCandidates.build(names), 85)
+            == check_name_similarity(suspect, names, 85))
+
+
+@pytest.mark.parametrize("handle", ["johnsmith", "j0hn_smith", "cryptoboss1", "nobody", ""])
+def test_username_candidates_give_the_list_verdict(handle):
+    handles = [r["username"] for r in ROWS if r["username"]]
+    assert (check_username_similarity(handle, UsernameCandidates.build(handles), 85)
+            == check_username_similarity(handle, handles, 85))
+
+
+def test_stored_hashes_give_the_list_verdict():
+    hashes = [r["pfp_hash"] for r in ROWS if r["pfp_hash"]]
+    target = ["c3c3c3c33c3c3c3d"]
+    assert (check_pfp_similarity(target, StoredHashes.build(hashes), 10)
+            == check_pfp_similarity(target, hashes, 10))
+
+
+def test_stored_names_are_folded_once_not_per_suspect(monkeypatch):
+    index = WhitelistIndex.build(ROWS)
+    calls = {"n": 0}
+    real = detector.fold_text
+
+    def counting(s):
+        calls["n"] += 1
+        return real(s)
+    monkeypatch.setattr(detector, "fold_text", counting)
+
+    for suspect in SUSPECTS * 10:
+        check_name_similarity(suspect, index.names, 85)
+    # One fold of the suspect per non-empty call; none of the stored names.
+    assert calls["n"] == len([s for s in SUSPECTS if s]) * 10
+
+
+def test_lookups_return_the_first_matching_row():
+    index = WhitelistIndex.build(ROWS)
+    assert index.find_by_username("johnsmith")["user_id"] == 1
+    assert index.find_by_name("Crypto Boss")["user_id"] == 3
+    assert index.find_by_pfp("c3c3c3c33c3c3c3c")["user_id"] == 1
+    assert index.find_by_username("nobody") is None
+
+
+def test_without_drops_the_users_own_entry():
+    index = WhitelistIndex.build(ROWS)
+    assert index.without(999) is index
+    trimmed = index.without(1)
+    assert 1 not in trimmed.user_ids
+    assert "John Smith" not in trimmed.names.original
+
+
+def test_index_is_reused_while_the_rows_are_unchanged():
+    db._whitelist_cache[-100] = (9e18, ROWS)
+    rows = db.get_whitelist(-100)
+    first, version = db.get_whitelist_index(-100, rows)
+    again, same = db.get_whitelist_index(-100, db.get_whitelist(-100))
+    assert again is first and same == version
+
+
+def test_invalidating_the_whitelist_drops_the_index():
+    db._whitelist_cache[-100] = (9e18, ROWS)
+    first, version = db.get_whitelist_index(-100, db.get_whitelist(-100))
+    db._invalidate_whitelist_cache(-100)
+    assert -100 not in db._whitelist_index_cache
+
+    db._whitelist_cache[-100] = (9e18, list(ROWS[:1]))
+    rebuilt, new_version = db.get_whitelist_index(-100, db.get_whitelist(-100))
+    assert rebuilt is not first and new_version != version
+    assert len(rebuilt) == 1
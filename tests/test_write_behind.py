@@ -0,0 +1,182 @@
+"""
+Write-behind batching: a sweep's mark_seen calls must reach the database as a
+handful of batched statements rather than one transaction each, without any
+reader that depends on them noticing the delay — is_seen must see its own
+writes, unmark_seen must win over a queued mark, and rows the database can't
+take right now must wait rather than vanish.
+"""
+import pytest
+from psycopg import OperationalError
+
+from src import db
+from src.utils.write_behind import WriteBehindQueue
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = None
+
+    def execute(self, sql, params=()):
+        self.executemany(sql, [params])
+
+    def executemany(self, sql, rows):
+        conn = self.conn
+        if conn.down:
+            raise OperationalError("server closed the connection unexpectedly")
+        conn.statements += 1
+        sql = " ".join(sql.split())
+        if "FROM name_change_log" in sql:
+            uid = rows[0]["uid"]
+            self.result = [{"cnt": sum(r[0] == uid for r in conn.tables["name_change_log"])}]
+        elif "FROM seen_members" in sql:
+            self.result = [{"group_id": g} for g, u in conn.tables["seen_members"] if u == rows[0][0]]
+        else:
+            if any(row in conn.rejected for row in rows):
+                raise ValueError("invalid input syntax")
+            table = sql.split("INSERT INTO ")[1].split()[0]
+            conn.tables.setdefault(table, []).extend(rows)
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Transaction:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Conn:
+    def __init__(self):
+        self.tables, self.statements, self.checkouts = {}, 0, 0
+        self.down = False
+        self.rejected = set()
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def transaction(self):
+        return _Transaction()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = _Conn()
+
+    def get_connection(*a, **k):
+        conn.checkouts += 1
+        return conn
+    monkeypatch.setattr(db, "get_connection", get_connection)
+    monkeypatch.setattr(db, "put_connection", lambda c: None)
+    monkeypatch.setattr(db, "WRITE_BEHIND_FLUSH_MS", 500)
+    monkeypatch.setattr(db, "_write_queue", WriteBehindQueue(batch_rows=500, max_pending=5000))
+    return conn
+
+
+def test_a_sweep_of_marks_is_a_few_batches(conn):
+    for uid in range(5000):
+        db.mark_seen(-100, uid)
+    db.flush_writes()
+    assert len(conn.tables["seen_members"]) == 5000
+    assert conn.checkouts == 10 and conn.statements == 10     # was 5000 of each
+    assert db.write_behind_info()["queued"] == 0
+
+
+def test_is_seen_sees_a_queued_mark(conn):
+    db.mark_seen(-100, 7)
+    assert db.is_seen(-100, 7) and conn.checkouts == 0
+    db.unmark_seen(-100, 7)
+    db.flush_writes()
+    assert "seen_members" not in conn.tables
+
+
+def test_a_queued_mark_cannot_outlive_unmark(conn):
+    db.mark_seen(-100, 7)
+    db.mark_seen(-100, 8)
+    db.unmark_seen(-100, 7)
+    db.flush_writes()
+    assert conn.tables["seen_members"] == [(-100, 8)]
+
+
+def test_rows_wait_out_an_outage(conn):
+    db.insert_log(-100, 7, "x", "X", 42, "Admin", "name", 91.0, "alerted", "d")
+    conn.down = True
+    assert db.flush_writes() == 0
+    info = db.write_behind_info()
+    assert info["queued"] == 1 and info["failures"] == 1
+    conn.down = False
+    assert db.flush_writes() == 1 and len(conn.tables["logs"]) == 1
+
+
+def test_a_rejected_row_is_dropped_alone(conn):
+    db.record_sweep_run(-100, 10, 10, 0, 0)
+    db.record_sweep_run(-200, 5, 5, 0, 0)
+    conn.rejected = {(-200, 5, 5, 0, 0, "auto", False, 0, 0)}
+    db.flush_writes()
+    assert conn.tables["sweep_runs"] == [(-100, 10, 10, 0, 0, "auto", False, 0, 0)]
+    assert db.write_behind_info()["queued"] == 0
+
+
+def test_readers_that_count_rows_flush_first(conn):
+    db.log_name_change(7)
+    db.log_name_change(7)
+    assert db.count_recent_name_changes(7) == 2
+    db.mark_seen(-100, 7)
+    assert db.get_watched_groups_for_user(7) == [-100]
+
+
+def test_the_detection_context_sees_a_queued_mark(conn, monkeypatch):
+    for name in ("get_group", "get_whitelist", "get_reserved_keywords", "get_known_bad_actor"):
+        monkeypatch.setattr(db, name, lambda *a: None)
+    monkeypatch.setattr(db, "is_false_positive", lambda *a: False)
+    monkeypatch.setattr(db, "is_whitelisted", lambda *a: False)
+    db.mark_seen(-100, 7)
+    assert db.load_detection_context(-100, 7, include_seen=True).seen
+
+
+def test_a_full_queue_refuses_rather_than_grows():
+    queue = WriteBehindQueue(batch_rows=10, max_pending=20)
+    for i in range(25):
+        queue.add("seen", (1, i))
+    assert queue.info()["depth"] == {"seen": 20} and queue.dropped == 5
+
+
+def test_a_flush_takes_only_what_was_queued_when_it_began():
+    queue = WriteBehindQueue(batch_rows=2, max_pending=100)
+    for i in range(4):
+        queue.add("log", (i,))
+    written = []
+
+    def write(kind, rows):
+        written.extend(rows)
+        queue.add("log", (len(written) + 100,))       # a producer keeps up
+        return True
+    assert queue.flush(write) == 4
+    assert written == [(0,), (1,), (2,), (3,)] and queue.depth() == 2
+
+
+def test_metrics_record_flush_latency():
+    queue = WriteBehindQueue(batch_rows=10, max_pending=100)
+    queue.add("seen", (1, 1))
+    queue.flush(lambda kind, rows: True)
+    info = queue.info()
+    assert info["flushes"] == 1 and info["rows_written"] == 1
+    assert info["max_flush_ms"] >= info["last_flush_ms"] >= 0